@@ -0,0 +1,4 @@
+from .faults import EndpointFaults, FaultInjector, FaultPlan, FaultScenario, FaultStats, Latency
+from .server import AirCloudSimulator, SimulatorStats, server_ssl_context
+from .state import SimulatedAccount, SimulatedCommand, SimulatedUnit
+from .stomp import ClientFrame, StompProtocolException, encode_frame, parse_client_frame
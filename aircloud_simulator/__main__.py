@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import logging
+from pathlib import Path
+
+from .faults import FaultInjector, FaultScenario
+from .server import AirCloudSimulator
+
+logger = logging.getLogger("aircloud_simulator")
+
+
+async def main(args: argparse.Namespace, scenario: FaultScenario | None) -> None:
+    faults = FaultInjector(seed=scenario.seed) if scenario is not None else None
+    simulator = AirCloudSimulator(
+        accounts=args.accounts,
+        units_per_account=args.units,
+        command_latency=(args.min_latency, args.max_latency),
+        heart_beat=args.heart_beat,
+        drift_interval=args.drift_interval,
+        host=args.host,
+        port=args.port,
+        seed=args.seed,
+        faults=faults,
+    )
+    async with simulator:
+        for account in simulator.accounts:
+            logger.info(
+                "Account %s / %s, units %s", account.email, account.password, ", ".join(map(str, account.units))
+            )
+        logger.info("Client options: %s", simulator.client_options())
+        if faults is not None and scenario is not None:
+            await faults.play(scenario)
+        await asyncio.Event().wait()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m aircloud_simulator", description="Local AirCloud simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8443)
+    parser.add_argument("--accounts", type=int, default=1)
+    parser.add_argument("--units", type=int, default=2, help="Interior units per account")
+    parser.add_argument("--min-latency", type=float, default=1.0, help="Minimal command latency, in seconds")
+    parser.add_argument("--max-latency", type=float, default=3.0, help="Maximal command latency, in seconds")
+    parser.add_argument("--heart-beat", type=int, default=10_000, help="Server heart-beat, in milliseconds")
+    parser.add_argument("--drift-interval", type=float, default=None, help="Seconds between room temperature changes")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--scenario", default=None, help="JSON fault scenario, see FaultScenario.from_dict")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(levelname)s %(message)s")
+    with contextlib.suppress(KeyboardInterrupt):
+        arguments = parse_args()
+        asyncio.run(
+            main(
+                arguments,
+                FaultScenario.from_json(Path(arguments.scenario).read_text())
+                if arguments.scenario is not None
+                else None,
+            )
+        )
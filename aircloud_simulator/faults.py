@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Literal
+
+from aircloudy.errors import InvalidArgumentException
+
+logger = logging.getLogger(__name__)
+
+type LatencyDistribution = Literal["FIXED", "UNIFORM", "LOGNORMAL", "EXPONENTIAL"]
+
+_LATENCY_ARITY: dict[LatencyDistribution, int] = {"FIXED": 1, "UNIFORM": 2, "LOGNORMAL": 2, "EXPONENTIAL": 1}
+
+
+def _check_rate(name: str, rate: float) -> None:
+    if not 0 <= rate <= 1:
+        raise InvalidArgumentException(f"{name} must be between 0 and 1")
+
+
+@dataclass(frozen=True)
+class Latency:
+    """Latency distribution, in seconds
+
+    FIXED(value), UNIFORM(min, max), LOGNORMAL(median, sigma) or EXPONENTIAL(mean).
+    """
+
+    distribution: LatencyDistribution
+    parameters: tuple[float, ...]
+
+    def __post_init__(self) -> None:
+        if len(self.parameters) != _LATENCY_ARITY[self.distribution]:
+            raise InvalidArgumentException(
+                f"{self.distribution} expects {_LATENCY_ARITY[self.distribution]} parameters"
+            )
+        if any(p < 0 for p in self.parameters):
+            raise InvalidArgumentException("Latency parameters can't be negative")
+
+    @staticmethod
+    def fixed(value: float) -> Latency:
+        return Latency("FIXED", (value,))
+
+    @staticmethod
+    def uniform(minimum: float, maximum: float) -> Latency:
+        return Latency("UNIFORM", (minimum, maximum))
+
+    @staticmethod
+    def lognormal(median: float, sigma: float) -> Latency:
+        return Latency("LOGNORMAL", (median, sigma))
+
+    @staticmethod
+    def exponential(mean: float) -> Latency:
+        return Latency("EXPONENTIAL", (mean,))
+
+    @staticmethod
+    def from_dict(d: dict) -> Latency:
+        """Read `{"uniform": [0.1, 0.5]}` like latencies"""
+        [(distribution, parameters)] = d.items()
+        factory = _LATENCY_FACTORIES.get(distribution)
+        if factory is None:
+            raise InvalidArgumentException(f"Unknown latency distribution {distribution}")
+        return factory(*parameters)
+
+    def sample(self, rng: random.Random) -> float:
+        match self.distribution:
+            case "FIXED":
+                return self.parameters[0]
+            case "UNIFORM":
+                return rng.uniform(*self.parameters)
+            case "LOGNORMAL":
+                return rng.lognormvariate(math.log(self.parameters[0]), self.parameters[1])
+            case "EXPONENTIAL":
+                return rng.expovariate(1 / self.parameters[0]) if self.parameters[0] > 0 else 0
+
+
+_LATENCY_FACTORIES: dict[str, Callable[..., Latency]] = {
+    "fixed": Latency.fixed,
+    "uniform": Latency.uniform,
+    "lognormal": Latency.lognormal,
+    "exponential": Latency.exponential,
+}
+
+
+@dataclass(frozen=True)
+class EndpointFaults:
+    """Faults of one REST endpoint (or of the websocket handshake, endpoint `notifications`)
+
+    Every request is delayed by `latency`, then answered `error_status` with probability `error_rate`, otherwise its
+    connection is aborted without response with probability `drop_rate`.
+    """
+
+    latency: Latency | None = None
+    error_rate: float = 0
+    error_status: int = 503
+    retry_after: float | None = None
+    drop_rate: float = 0
+
+    def __post_init__(self) -> None:
+        _check_rate("error_rate", self.error_rate)
+        _check_rate("drop_rate", self.drop_rate)
+
+    @staticmethod
+    def from_dict(d: dict) -> EndpointFaults:
+        latency = d.get("latency")
+        return EndpointFaults(
+            Latency.from_dict(latency) if latency is not None else None,
+            d.get("error_rate", 0),
+            d.get("error_status", 503),
+            d.get("retry_after"),
+            d.get("drop_rate", 0),
+        )
+
+
+@dataclass(frozen=True)
+class FaultPlan:
+    """Faults to inject, endpoints are named after the client functions calling them (`send_command`, ...)
+
+    `command_latency` replaces the latency of the simulator. A stuck command stays `SENDING` and is never applied.
+    Websockets are aborted after `websocket_lifetime`. Each server heart-beat is skipped with probability
+    `heart_beat_loss_rate`, each notification frame is corrupted with probability `malformed_frame_rate`. The TLS
+    handshake of every new connection is delayed by `tls_handshake_delay`.
+    """
+
+    endpoints: dict[str, EndpointFaults] = field(default_factory=dict)
+    command_latency: Latency | None = None
+    stuck_command_rate: float = 0
+    websocket_lifetime: Latency | None = None
+    heart_beat_loss_rate: float = 0
+    malformed_frame_rate: float = 0
+    tls_handshake_delay: Latency | None = None
+
+    def __post_init__(self) -> None:
+        _check_rate("stuck_command_rate", self.stuck_command_rate)
+        _check_rate("heart_beat_loss_rate", self.heart_beat_loss_rate)
+        _check_rate("malformed_frame_rate", self.malformed_frame_rate)
+
+    @staticmethod
+    def from_dict(d: dict) -> FaultPlan:
+        def latency(key: str) -> Latency | None:
+            value = d.get(key)
+            return Latency.from_dict(value) if value is not None else None
+
+        return FaultPlan(
+            {endpoint: EndpointFaults.from_dict(faults) for endpoint, faults in d.get("endpoints", {}).items()},
+            latency("command_latency"),
+            d.get("stuck_command_rate", 0),
+            latency("websocket_lifetime"),
+            d.get("heart_beat_loss_rate", 0),
+            d.get("malformed_frame_rate", 0),
+            latency("tls_handshake_delay"),
+        )
+
+
+@dataclass(frozen=True)
+class FaultScenario:
+    """Plans applied one after the other, each `(at, plan)` step starts `at` seconds after the scenario"""
+
+    steps: list[tuple[float, FaultPlan]]
+    seed: int | None = None
+
+    @staticmethod
+    def from_dict(d: dict) -> FaultScenario:
+        steps = [(step.get("at", 0), FaultPlan.from_dict(step.get("plan", {}))) for step in d.get("steps", [])]
+        return FaultScenario(sorted(steps, key=lambda step: step[0]), d.get("seed"))
+
+    @staticmethod
+    def from_json(content: str) -> FaultScenario:
+        return FaultScenario.from_dict(json.loads(content))
+
+
+@dataclass(frozen=True)
+class RequestFault:
+    delay: float
+    status: int | None
+    retry_after: float | None
+    dropped: bool
+
+
+@dataclass(frozen=True)
+class FaultStats:
+    delayed_requests: int
+    failed_requests: int
+    dropped_requests: int
+    stuck_commands: int
+    dropped_websockets: int
+    skipped_heart_beats: int
+    malformed_frames: int
+    slow_handshakes: int
+
+
+class FaultInjector:
+    """Draw the faults of the current plan
+
+    All draws come from a `random.Random(seed)`: with the same seed, plan and sequence of requests, the same faults
+    are injected.
+    """
+
+    _plan: FaultPlan
+    _random: random.Random
+    _counters: dict[str, int]
+
+    def __init__(self, plan: FaultPlan | None = None, seed: int | None = None) -> None:
+        self._plan = plan if plan is not None else FaultPlan()
+        self._random = random.Random(seed)
+        self._counters = dict.fromkeys(FaultStats.__dataclass_fields__, 0)
+
+    @property
+    def plan(self) -> FaultPlan:
+        return self._plan
+
+    def apply(self, plan: FaultPlan) -> None:
+        logger.info("Apply fault plan %s", plan)
+        self._plan = plan
+
+    async def play(self, scenario: FaultScenario) -> None:
+        """Apply the steps of `scenario` at their time"""
+        started_at = time.monotonic()
+        for at, plan in scenario.steps:
+            await asyncio.sleep(max(0.0, started_at + at - time.monotonic()))
+            self.apply(plan)
+
+    def stats(self) -> FaultStats:
+        return FaultStats(**self._counters)
+
+    def _chance(self, rate: float) -> bool:
+        # Always draw, so the sequence of draws doesn't depend on the rates
+        return self._random.random() < rate
+
+    def _sample(self, latency: Latency | None) -> float | None:
+        return latency.sample(self._random) if latency is not None else None
+
+    def request_fault(self, endpoint: str) -> RequestFault:
+        faults = self._plan.endpoints.get(endpoint)
+        if faults is None:
+            return RequestFault(0, None, None, False)
+
+        delay = self._sample(faults.latency) or 0
+        failed = self._chance(faults.error_rate)
+        dropped = self._chance(faults.drop_rate) and not failed
+        self._counters["delayed_requests"] += delay > 0
+        self._counters["failed_requests"] += failed
+        self._counters["dropped_requests"] += dropped
+        return RequestFault(delay, faults.error_status if failed else None, faults.retry_after, dropped)
+
+    def command_latency(self) -> float | None:
+        return self._sample(self._plan.command_latency)
+
+    def command_stuck(self) -> bool:
+        stuck = self._chance(self._plan.stuck_command_rate)
+        self._counters["stuck_commands"] += stuck
+        return stuck
+
+    def websocket_lifetime(self) -> float | None:
+        return self._sample(self._plan.websocket_lifetime)
+
+    def websocket_dropped(self) -> None:
+        self._counters["dropped_websockets"] += 1
+
+    def skip_heart_beat(self) -> bool:
+        skipped = self._chance(self._plan.heart_beat_loss_rate)
+        self._counters["skipped_heart_beats"] += skipped
+        return skipped
+
+    def corrupt(self, frame: str) -> str:
+        """Return `frame`, or a malformed variant of it"""
+        if not self._chance(self._plan.malformed_frame_rate):
+            return frame
+        self._counters["malformed_frames"] += 1
+        match self._random.randrange(3):
+            case 0:
+                head, _, body = frame.partition("\n\n")
+                return f"{head}\n\n{body[: len(body) // 2]}\0"
+            case 1:
+                # First header without separator
+                return frame.replace(":", "", 1)
+            case _:
+                return "GARBAGE\n" + frame
+
+    def tls_delay(self) -> float:
+        delay = self._sample(self._plan.tls_handshake_delay) or 0
+        self._counters["slow_handshakes"] += delay > 0
+        return delay
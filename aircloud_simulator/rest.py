@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import json
+import logging
+from typing import TYPE_CHECKING
+
+from aiohttp import web
+
+from .state import InvalidCommandException, SimulatedAccount, SimulatedUnit, validate_command
+from .stomp import StompSession
+
+if TYPE_CHECKING:
+    from .server import AirCloudSimulator
+
+logger = logging.getLogger(__name__)
+
+TOO_MANY_REQUESTS = {"type": "TOO_MANY_REQUESTS", "desc": "Previous command is still in progress", "code": 429}
+
+
+def _json_error(error: type[web.HTTPError], body: dict) -> web.HTTPError:
+    return error(text=json.dumps(body), content_type="application/json")
+
+
+class RestApi:
+    """Handlers of the REST endpoints and of the notification websocket"""
+
+    _simulator: AirCloudSimulator
+
+    def __init__(self, simulator: AirCloudSimulator) -> None:
+        self._simulator = simulator
+
+    def routes(self) -> list[web.RouteDef]:
+        # Routes are named after the client functions calling them
+        return [
+            web.post("/iam/auth/sign-in", self.sign_in, name="perform_login"),
+            web.post("/iam/auth/refresh-token", self.refresh_token, name="refresh_token"),
+            web.get("/iam/user/v2/who-am-i", self.who_am_i, name="fetch_profile"),
+            web.get("/rac/ownership/groups/{family_id}/idu-list", self.idu_list, name="get_interior_units"),
+            web.put(
+                "/rac/basic-idu-control/general-control-command/{rac_id}",
+                self.general_control_command,
+                name="send_command",
+            ),
+            web.put("/rac/basic-idu-control/switch-on-off/{rac_id}", self.switch_on_off, name="set_power"),
+            web.post("/rac/status/command", self.commands_status, name="get_commands_state"),
+            web.put("/rac/status/{rac_id}", self.refresh_status, name="request_refresh_interior_unit_state"),
+            web.put("/rac/manage-idu/groups/{family_id}/idu/{action:start|stop}", self.power_all, name="set_power_all"),
+            web.get("/rac-notifications/websocket", self.notifications, name="notifications"),
+        ]
+
+    def _account(self, request: web.Request, refresh: bool = False) -> SimulatedAccount:
+        email = self._simulator.tokens.verify(request.headers.get("Authorization"), refresh)
+        account = self._simulator.find_account(email)
+        if account is None:
+            raise _json_error(web.HTTPUnauthorized, {"error": "unauthorized", "message": "Invalid token"})
+        return account
+
+    @staticmethod
+    def _check_family(account: SimulatedAccount, family_id: str | None) -> None:
+        if family_id != str(account.family_id):
+            raise _json_error(web.HTTPForbidden, {"error": "forbidden", "message": f"Not a member of {family_id}"})
+
+    @staticmethod
+    def _unit(account: SimulatedAccount, rac_id: str) -> SimulatedUnit:
+        unit = account.units.get(int(rac_id)) if rac_id.isdigit() else None
+        if unit is None:
+            raise _json_error(web.HTTPNotFound, {"error": "not_found", "message": f"Unknown rac {rac_id}"})
+        return unit
+
+    @staticmethod
+    async def _json(request: web.Request) -> object:
+        try:
+            return await request.json()
+        except json.JSONDecodeError as e:
+            raise _json_error(web.HTTPBadRequest, {"error": "bad_request", "message": str(e)}) from e
+
+    async def sign_in(self, request: web.Request) -> web.Response:
+        body = await self._json(request)
+        account = self._simulator.find_account(body.get("email") if isinstance(body, dict) else None)
+        if account is None or not isinstance(body, dict) or body.get("password") != account.password:
+            return web.json_response({"errorState": "INVALID_CREDENTIALS"}, status=401)
+        return web.json_response({**self._simulator.tokens.issue(account.email), "newUser": False})
+
+    async def refresh_token(self, request: web.Request) -> web.Response:
+        account = self._account(request, refresh=True)
+        tokens = self._simulator.tokens.issue(account.email)
+        del tokens["refresh_token_expires_in"]
+        return web.json_response(tokens)
+
+    async def who_am_i(self, request: web.Request) -> web.Response:
+        return web.json_response(self._account(request).profile())
+
+    async def idu_list(self, request: web.Request) -> web.Response:
+        account = self._account(request)
+        self._check_family(account, request.match_info["family_id"])
+        return web.json_response([unit.to_rest() for unit in account.units.values()])
+
+    async def general_control_command(self, request: web.Request) -> web.Response:
+        account = self._account(request)
+        self._check_family(account, request.query.get("familyId"))
+        unit = self._unit(account, request.match_info["rac_id"])
+        try:
+            command_body = validate_command(await self._json(request), unit.id)
+        except InvalidCommandException as e:
+            raise _json_error(web.HTTPBadRequest, {"error": "bad_request", "message": str(e)}) from e
+
+        command = self._simulator.submit_command(account, unit, command_body)
+        if command is None:
+            return web.json_response(TOO_MANY_REQUESTS, status=429)
+        return web.json_response({"commandId": command.command_id, "thingId": command.thing_id})
+
+    async def switch_on_off(self, request: web.Request) -> web.Response:
+        account = self._account(request)
+        unit = self._unit(account, request.match_info["rac_id"])
+        body = await self._json(request)
+        power = body.get("power") if isinstance(body, dict) else None
+        if power not in ("ON", "OFF"):
+            raise _json_error(web.HTTPBadRequest, {"error": "bad_request", "message": f"Invalid power {power}"})
+        if self._simulator.submit_command(account, unit, {**unit.control_state(), "power": power}) is None:
+            return web.json_response(TOO_MANY_REQUESTS, status=429)
+        return web.json_response({})
+
+    async def commands_status(self, request: web.Request) -> web.Response:
+        self._account(request)
+        body = await self._json(request)
+        if not isinstance(body, list):
+            raise _json_error(web.HTTPBadRequest, {"error": "bad_request", "message": "Expected a list of commands"})
+        command_ids = [item["commandId"] for item in body if isinstance(item, dict) and "commandId" in item]
+        statuses = self._simulator.commands_status(command_ids)
+        return web.json_response([{"commandId": c, "status": s} for c, s in statuses.items()])
+
+    async def refresh_status(self, request: web.Request) -> web.Response:
+        account = self._account(request)
+        self._check_family(account, request.query.get("familyId"))
+        unit = self._unit(account, request.match_info["rac_id"])
+        await self._simulator.publish(account, [unit])
+        return web.Response()
+
+    async def power_all(self, request: web.Request) -> web.Response:
+        account = self._account(request)
+        self._check_family(account, request.match_info["family_id"])
+        body = await self._json(request)
+        if not isinstance(body, list):
+            raise _json_error(web.HTTPBadRequest, {"error": "bad_request", "message": "Expected a list of units"})
+
+        power = "ON" if request.match_info["action"] == "start" else "OFF"
+        results = []
+        for item in body:
+            rac_id = item.get("id") if isinstance(item, dict) else None
+            unit = account.units.get(rac_id) if isinstance(rac_id, int) else None
+            command = (
+                self._simulator.submit_command(account, unit, {**unit.control_state(), "power": power})
+                if unit is not None
+                else None
+            )
+            if command is not None:
+                command_response = {"commandId": command.command_id, "thingId": command.thing_id}
+                results.append(
+                    {
+                        "racId": rac_id,
+                        "success": True,
+                        "errorMessage": None,
+                        "errorCode": 0,
+                        "commandResponse": command_response,
+                    }
+                )
+            else:
+                error = (
+                    (429, "Previous command is still in progress")
+                    if unit is not None
+                    else (404, f"Unknown rac {rac_id}")
+                )
+                results.append(
+                    {
+                        "racId": rac_id,
+                        "success": False,
+                        "errorMessage": error[1],
+                        "errorCode": error[0],
+                        "commandResponse": None,
+                    }
+                )
+
+        all_succeeded = all(result["success"] for result in results)
+        return web.json_response(
+            {"allSucceeded": all_succeeded, "resultSet": results}, status=200 if all_succeeded else 207
+        )
+
+    async def notifications(self, request: web.Request) -> web.StreamResponse:
+        ws = web.WebSocketResponse(heartbeat=None)
+        await ws.prepare(request)
+        session = StompSession(self._simulator, ws, request.transport)
+        self._simulator.sessions.add(session)
+        try:
+            await session.run()
+        finally:
+            self._simulator.sessions.discard(session)
+        return ws
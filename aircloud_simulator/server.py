@@ -0,0 +1,410 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import random
+import ssl
+import uuid
+from collections.abc import Awaitable, Callable, Coroutine
+from dataclasses import dataclass
+from types import TracebackType
+from typing import Self
+
+from aiohttp import web
+
+from aircloudy.contants import ApiCommandState
+from aircloudy.errors import IllegalStateException, InvalidArgumentException
+
+from .faults import FaultInjector
+from .rest import TOO_MANY_REQUESTS, RestApi
+from .state import SimulatedAccount, SimulatedCommand, SimulatedUnit
+from .stomp import StompSession
+from .tokens import TokenIssuer
+
+logger = logging.getLogger(__name__)
+
+
+def server_ssl_context(hostname: str = "127.0.0.1") -> ssl.SSLContext:
+    """Server context with a certificate issued for `hostname` by a throwaway trustme CA"""
+    import trustme  # noqa: PLC0415 (test dependency, only needed when no context is given)
+
+    ca = trustme.CA()
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    ca.issue_cert(hostname, "localhost", "127.0.0.1", "::1").configure_cert(context)
+    return context
+
+
+class _DelayedTlsProtocol(asyncio.Protocol):
+    """Wait before the TLS handshake of a connection, then hand it to the aiohttp request handler"""
+
+    _handler_factory: Callable[[], asyncio.Protocol]
+    _ssl_context: ssl.SSLContext
+    _delay: float
+    _handshake_task: asyncio.Task[None] | None
+    _early_data: list[bytes]
+
+    def __init__(
+        self, handler_factory: Callable[[], asyncio.Protocol], ssl_context: ssl.SSLContext, delay: float
+    ) -> None:
+        self._handler_factory = handler_factory
+        self._ssl_context = ssl_context
+        self._delay = delay
+        self._handshake_task = None
+        self._early_data = []
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        if not isinstance(transport, asyncio.Transport):
+            transport.close()
+            return
+        transport.pause_reading()
+        self._handshake_task = asyncio.create_task(self._handshake(transport))
+
+    async def _handshake(self, transport: asyncio.Transport) -> None:
+        await asyncio.sleep(self._delay)
+        try:
+            tls_transport = await asyncio.get_running_loop().start_tls(
+                transport, self, self._ssl_context, server_side=True
+            )
+        except (OSError, ssl.SSLError):
+            transport.abort()
+            return
+        if tls_transport is None:
+            return
+        handler = self._handler_factory()
+        tls_transport.set_protocol(handler)
+        handler.connection_made(tls_transport)
+        for data in self._early_data:
+            handler.data_received(data)
+        self._early_data = []
+
+    def data_received(self, data: bytes) -> None:
+        # Received right after the handshake, before the handler took over
+        self._early_data.append(data)
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        if self._handshake_task is not None and not self._handshake_task.done():
+            logger.debug("Connection lost before TLS handshake: %s", exc)
+            self._handshake_task.cancel()
+
+
+@dataclass(frozen=True)
+class SimulatorStats:
+    requests: int
+    commands: int
+    rejected_commands: int
+    notifications: int
+    sessions: int
+
+
+class AirCloudSimulator:
+    """Local stand-in of the AirCloud REST api and notification websocket, serving both on one TLS port
+
+    Accounts own simulated interior units. A command is acknowledged after a latency drawn uniformly from
+    `command_latency` (seconds), then applied to the unit and pushed as a `BUCKET_UPDATE` to the subscribed
+    websockets of the account. A unit accepts one command at a time, the api answers 429 meanwhile. Commands sent to
+    an offline unit stay `SENDING`. With `drift_interval`, the room temperature of one unit per account moves every
+    `drift_interval` seconds. Draws use a `random.Random(seed)`, so a seeded simulator replays the same latencies.
+
+    Failures are injected by `faults`, whose plan can be changed while running.
+    """
+
+    host: str
+    heart_beat: int
+    tokens: TokenIssuer
+    sessions: set[StompSession]
+    faults: FaultInjector | None
+    _requested_port: int
+    _ssl_context: ssl.SSLContext | None
+    _command_latency: tuple[float, float]
+    _drift_interval: float | None
+    _random: random.Random
+    _accounts: dict[str, SimulatedAccount]
+    _commands: dict[str, SimulatedCommand]
+    _busy_units: set[int]
+    _ids: itertools.count[int]
+    _tasks: set[asyncio.Task[None]]
+    _runner: web.AppRunner | None
+    _delayed_tls_server: asyncio.Server | None
+    _port: int | None
+
+    _requests: int
+    _command_count: int
+    _rejected_commands: int
+    _notifications: int
+
+    def __init__(
+        self,
+        accounts: int = 1,
+        units_per_account: int = 2,
+        command_latency: tuple[float, float] = (1.0, 3.0),
+        heart_beat: int = 10_000,
+        drift_interval: float | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        ssl_context: ssl.SSLContext | None = None,
+        access_token_ttl: int = 3600,
+        seed: int | None = None,
+        faults: FaultInjector | None = None,
+    ) -> None:
+        if command_latency[0] < 0 or command_latency[1] < command_latency[0]:
+            raise InvalidArgumentException("command_latency must satisfy 0 <= min <= max")
+
+        self.host = host
+        self.heart_beat = heart_beat
+        self.tokens = TokenIssuer(access_token_ttl)
+        self.sessions = set()
+        self.faults = faults
+        self._requested_port = port
+        self._ssl_context = ssl_context
+        self._command_latency = command_latency
+        self._drift_interval = drift_interval
+        self._random = random.Random(seed)
+        self._accounts = {}
+        self._commands = {}
+        self._busy_units = set()
+        self._ids = itertools.count(1)
+        self._tasks = set()
+        self._runner = None
+        self._delayed_tls_server = None
+        self._port = None
+
+        self._requests = 0
+        self._command_count = 0
+        self._rejected_commands = 0
+        self._notifications = 0
+
+        for _ in range(accounts):
+            self.add_account(units=units_per_account)
+
+    async def __aenter__(self) -> Self:
+        await self.start()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> bool:
+        await self.stop()
+        return False
+
+    @property
+    def accounts(self) -> list[SimulatedAccount]:
+        return list(self._accounts.values())
+
+    @property
+    def port(self) -> int:
+        if self._port is None:
+            raise IllegalStateException(__name__ + " is not started")
+        return self._port
+
+    @property
+    def notification_host(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    def client_options(self) -> dict:
+        """Keyword arguments making a `HitachiAirCloud` use this simulator"""
+        return {"api_host": self.host, "api_port": self.port, "notification_host": self.notification_host}
+
+    def stats(self) -> SimulatorStats:
+        return SimulatorStats(
+            self._requests, self._command_count, self._rejected_commands, self._notifications, len(self.sessions)
+        )
+
+    def add_account(self, email: str | None = None, password: str = "password", units: int = 2) -> SimulatedAccount:
+        n = next(self._ids)
+        account = SimulatedAccount(
+            email if email is not None else f"user{n}@aircloud.localhost", password, 1000 + n, 2000 + n
+        )
+        for i in range(units):
+            rac_id = next(self._ids)
+            account.units[rac_id] = SimulatedUnit(
+                rac_id,
+                f"Unit {i + 1}",
+                f"JCH-SIM-{rac_id:06d}",
+                f"SIM{rac_id:08d}",
+                room_temperature=round(self._random.uniform(18, 26) * 2) / 2,
+                power=self._random.choice(("ON", "OFF")),
+            )
+        self._accounts[account.email] = account
+        return account
+
+    def find_account(self, email: str | None) -> SimulatedAccount | None:
+        return self._accounts.get(email) if email is not None else None
+
+    def find_unit(self, rac_id: int) -> tuple[SimulatedAccount, SimulatedUnit]:
+        for account in self._accounts.values():
+            unit = account.units.get(rac_id)
+            if unit is not None:
+                return account, unit
+        raise InvalidArgumentException(f"Unknown rac_id {rac_id}")
+
+    async def start(self) -> None:
+        if self._runner is not None:
+            raise IllegalStateException(__name__ + " already started")
+
+        @web.middleware
+        async def count_requests(
+            request: web.Request, handler: Callable[[web.Request], Awaitable[web.StreamResponse]]
+        ) -> web.StreamResponse:
+            self._requests += 1
+            return await handler(request)
+
+        app = web.Application(middlewares=[count_requests, self._inject_faults])
+        app.add_routes(RestApi(self).routes())
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        ssl_context = self._ssl_context if self._ssl_context is not None else server_ssl_context(self.host)
+        if self.faults is None:
+            site = web.TCPSite(runner, self.host, self._requested_port, ssl_context=ssl_context)
+            await site.start()
+            self._port = site.port
+        else:
+            # TLS handshakes are delayed by the fault injector, so the listening server is built on the public
+            # request handler factory of the runner rather than on a site
+            handler_factory = runner.server
+            if handler_factory is None:
+                raise IllegalStateException("Runner is not set up")
+            faults = self.faults
+            self._delayed_tls_server = await asyncio.get_running_loop().create_server(
+                lambda: _DelayedTlsProtocol(handler_factory, ssl_context, faults.tls_delay()),
+                self.host,
+                self._requested_port,
+            )
+            self._port = self._delayed_tls_server.sockets[0].getsockname()[1]
+        self._runner = runner
+        if self._drift_interval is not None:
+            self._spawn(self._drift_loop(self._drift_interval))
+        logger.info("Simulator listening on https://%s:%d", self.host, self._port)
+
+    @web.middleware
+    async def _inject_faults(
+        self, request: web.Request, handler: Callable[[web.Request], Awaitable[web.StreamResponse]]
+    ) -> web.StreamResponse:
+        endpoint = request.match_info.route.name
+        if self.faults is None or endpoint is None:
+            return await handler(request)
+
+        fault = self.faults.request_fault(endpoint)
+        if fault.delay > 0:
+            await asyncio.sleep(fault.delay)
+        if fault.status is not None:
+            headers = {"Retry-After": f"{fault.retry_after:g}"} if fault.retry_after is not None else None
+            body = TOO_MANY_REQUESTS if fault.status == 429 else {"error": "injected", "status": fault.status}
+            return web.json_response(body, status=fault.status, headers=headers)
+        if fault.dropped and request.transport is not None:
+            request.transport.abort()
+            raise asyncio.CancelledError
+        return await handler(request)
+
+    async def stop(self) -> None:
+        runner = self._runner
+        self._runner = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await asyncio.gather(*[session.close() for session in list(self.sessions)], return_exceptions=True)
+        delayed_tls_server = self._delayed_tls_server
+        self._delayed_tls_server = None
+        if delayed_tls_server is not None:
+            delayed_tls_server.close()
+        if runner is not None:
+            await runner.cleanup()
+        if delayed_tls_server is not None:
+            # Connections still waiting for their handshake were not handed to the runner
+            delayed_tls_server.close_clients()
+            await delayed_tls_server.wait_closed()
+        logger.info("Simulator stopped")
+
+    def _spawn(self, coroutine: Coroutine[object, object, None]) -> None:
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def command_latency(self) -> float:
+        return self._random.uniform(*self._command_latency)
+
+    def submit_command(self, account: SimulatedAccount, unit: SimulatedUnit, body: dict) -> SimulatedCommand | None:
+        """Accept a command for `unit`, None if the unit is still busy with the previous one"""
+        if unit.id in self._busy_units:
+            self._rejected_commands += 1
+            return None
+
+        latency = self.faults.command_latency() if self.faults is not None else None
+        stuck = self.faults is not None and self.faults.command_stuck()
+        command = SimulatedCommand(str(uuid.uuid4()), unit.vendor_thing_id, unit.id, body)
+        self._commands[command.command_id] = command
+        self._busy_units.add(unit.id)
+        self._command_count += 1
+        self._spawn(
+            self._complete_command(
+                account, unit, command, latency if latency is not None else self.command_latency(), stuck
+            )
+        )
+        return command
+
+    def commands_status(self, command_ids: list[str]) -> dict[str, ApiCommandState]:
+        """Status of the known commands among `command_ids`"""
+        return {
+            command_id: self._commands[command_id].status for command_id in command_ids if command_id in self._commands
+        }
+
+    async def _complete_command(
+        self,
+        account: SimulatedAccount,
+        unit: SimulatedUnit,
+        command: SimulatedCommand,
+        latency: float,
+        stuck: bool,
+    ) -> None:
+        await asyncio.sleep(latency)
+        if stuck or not unit.online:
+            # Never reaches the unit, the client gives up waiting
+            self._busy_units.discard(unit.id)
+            return
+
+        unit.apply(command.body)
+        command.status = "DONE"
+        self._busy_units.discard(unit.id)
+        await self.publish(account, [unit])
+
+    async def publish(
+        self, account: SimulatedAccount, units: list[SimulatedUnit], notification_type: str = "BUCKET_UPDATE"
+    ) -> int:
+        """Push the current state of `units` to the websockets of `account`, return the number of messages sent"""
+        sent = 0
+        for session in list(self.sessions):
+            if session.account is account and not session.closed:
+                sent += await session.send_notification(notification_type, units)
+        self._notifications += sent
+        return sent
+
+    def drop_websockets(self, account: SimulatedAccount | None = None) -> int:
+        """Abort the websockets (of `account`, or all of them), return the number of dropped sessions"""
+        sessions = [s for s in self.sessions if not s.closed and (account is None or s.account is account)]
+        for session in sessions:
+            session.drop()
+        return len(sessions)
+
+    async def update_unit(self, rac_id: int, room_temperature: float | None = None, online: bool | None = None) -> int:
+        """Change what the unit measures or its connectivity, and push it like the api does"""
+        account, unit = self.find_unit(rac_id)
+        if room_temperature is not None:
+            unit.room_temperature = room_temperature
+            unit.touch()
+        if online is not None:
+            unit.set_online(online)
+        return await self.publish(account, [unit])
+
+    async def _drift_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            for account in list(self._accounts.values()):
+                if len(account.units) == 0:
+                    continue
+                unit = self._random.choice(list(account.units.values()))
+                target = unit.idu_temperature if unit.power == "ON" else self._random.uniform(16, 28)
+                step = 0.5 if target > unit.room_temperature else -0.5
+                await self.update_unit(unit.id, room_temperature=unit.room_temperature + step)
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+
+from aircloudy.contants import (
+    FAN_SPEED_VALUES,
+    FAN_SWING_VALUES,
+    OPERATING_MODE_VALUES,
+    POWER_VALUES,
+    ApiCommandState,
+    FanSpeed,
+    FanSwing,
+    OperatingMode,
+    Power,
+)
+
+
+def now_millis() -> int:
+    return time.time_ns() // 1_000_000
+
+
+class InvalidCommandException(Exception):
+    pass
+
+
+@dataclass
+class SimulatedUnit:
+    id: int
+    name: str
+    vendor_thing_id: str
+    serial_number: str
+    room_temperature: float = 20.0
+    online: bool = True
+    power: Power = "OFF"
+    mode: OperatingMode = "COOLING"
+    idu_temperature: float = 24.0
+    humidity: int = 50
+    fan_speed: FanSpeed = "AUTO"
+    fan_swing: FanSwing = "OFF"
+    updated_at: int = field(default_factory=now_millis)
+    last_online_updated_at: int = field(default_factory=now_millis)
+
+    def touch(self) -> None:
+        """Mark the unit as changed, `updatedAt` strictly increases so no client drops the change as stale"""
+        self.updated_at = max(now_millis(), self.updated_at + 1)
+
+    def set_online(self, online: bool) -> None:
+        if self.online != online:
+            self.online = online
+            self.touch()
+            self.last_online_updated_at = self.updated_at
+
+    def apply(self, command: dict) -> None:
+        """Apply the body of a control command, as validated by `validate_command`"""
+        self.power = command["power"]
+        self.mode = command["mode"]
+        self.idu_temperature = command["iduTemperature"]
+        self.humidity = command["humidity"]
+        self.fan_speed = command["fanSpeed"]
+        self.fan_swing = command["fanSwing"]
+        self.touch()
+
+    def control_state(self) -> dict:
+        return {
+            "id": self.id,
+            "power": self.power,
+            "mode": self.mode,
+            "iduTemperature": self.idu_temperature,
+            "humidity": self.humidity,
+            "fanSpeed": self.fan_speed,
+            "fanSwing": self.fan_swing,
+        }
+
+    def _common(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "roomTemperature": self.room_temperature,
+            "relativeTemperature": 0.0,
+            "updatedAt": self.updated_at,
+            "online": self.online,
+            "lastOnlineUpdatedAt": self.last_online_updated_at,
+            "model": "HITACHI",
+            "serialNumber": self.serial_number,
+            "vendorThingId": self.vendor_thing_id,
+            "power": self.power,
+            "mode": self.mode,
+            "iduTemperature": self.idu_temperature,
+            "humidity": self.humidity,
+            "fanSpeed": self.fan_speed,
+            "fanSwing": self.fan_swing,
+        }
+
+    def to_rest(self) -> dict:
+        """Payload of the unit in the idu-list response"""
+        return {**self._common(), "racTypeId": 155, "scheduleType": "SCHEDULE_DISABLED"}
+
+    def to_notification(self) -> dict:
+        """Payload of the unit in the data of a notification, keys differ slightly from the REST ones"""
+        return {**self._common(), "modelTypeId": 155, "scheduletype": "SCHEDULE_DISABLED"}
+
+
+def validate_command(body: object, rac_id: int) -> dict:
+    """Check a control command body the way the api does, return it
+
+    :raises:
+        InvalidCommandException: If the body is not a valid command for `rac_id`
+    """
+    if not isinstance(body, dict):
+        raise InvalidCommandException("Command must be an object")
+    if body.get("id") != rac_id:
+        raise InvalidCommandException(f"Command id {body.get('id')} doesn't match rac {rac_id}")
+    for key, values in (
+        ("power", POWER_VALUES),
+        ("mode", OPERATING_MODE_VALUES),
+        ("fanSpeed", FAN_SPEED_VALUES),
+        ("fanSwing", FAN_SWING_VALUES),
+    ):
+        if body.get(key) not in values:
+            raise InvalidCommandException(f"Invalid {key} {body.get(key)}")
+    if not isinstance(body.get("iduTemperature"), int | float):
+        raise InvalidCommandException("Invalid iduTemperature")
+    if not isinstance(body.get("humidity"), int) or not 0 <= body["humidity"] <= 100:
+        raise InvalidCommandException("Invalid humidity")
+    return body
+
+
+@dataclass
+class SimulatedCommand:
+    command_id: str
+    thing_id: str
+    rac_id: int
+    body: dict
+    status: ApiCommandState = "SENDING"
+
+
+@dataclass
+class SimulatedAccount:
+    email: str
+    password: str
+    user_id: int
+    family_id: int
+    units: dict[int, SimulatedUnit] = field(default_factory=dict)
+
+    def profile(self) -> dict:
+        """Body of who-am-i"""
+        return {
+            "id": self.user_id,
+            "familyId": self.family_id,
+            "email": self.email,
+            "firstName": "Simulated",
+            "middleName": None,
+            "lastName": f"User {self.user_id}",
+            "familyName": f"Family {self.family_id}",
+            "phoneNumber": None,
+            "pictureData": None,
+            "roles": [{"level": 1, "name": "OWNER", "id": 1}],
+            "settings": {
+                "outOfHomeAddress": None,
+                "sensitiveToCold": False,
+                "temperatureUnit": "degC",
+                "outOfHomeLongitude": 0.0,
+                "homeOnWeekdays": True,
+                "language": "en",
+                "outOfHomeRadius": 0.0,
+                "homeOnWeekends": True,
+                "outOfHomeRemainderEnabled": False,
+                "outOfHomeLatitude": 0.0,
+            },
+            "address": {
+                "zipCode": "00000",
+                "city": "Localhost",
+                "street": "",
+                "countryCode": "FR",
+                "state": "",
+                "addressLine": "",
+            },
+        }
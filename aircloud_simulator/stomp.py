@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import ast
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import uuid
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from aiohttp import WSMsgType, web
+
+from .state import SimulatedAccount, SimulatedUnit
+
+if TYPE_CHECKING:
+    from .server import AirCloudSimulator
+
+logger = logging.getLogger(__name__)
+
+
+class StompProtocolException(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class ClientFrame:
+    command: str
+    headers: dict[str, str]
+    body: dict | None
+
+
+def encode_frame(command: str, headers: dict[str, str], body: dict | None = None) -> str:
+    frame = command + "\n" + "".join(f"{name}:{value}\n" for name, value in headers.items()) + "\n"
+    if body is not None:
+        frame += json.dumps(body)
+    return frame + "\0"
+
+
+def _parse_body(raw: str) -> dict:
+    try:
+        body = json.loads(raw)
+    except json.JSONDecodeError:
+        # The client writes bodies as python dict literals
+        try:
+            body = ast.literal_eval(raw)
+        except (ValueError, SyntaxError) as e:
+            raise StompProtocolException(f"Unreadable body {raw!r}") from e
+    if not isinstance(body, dict):
+        raise StompProtocolException(f"Body is not an object {raw!r}")
+    return body
+
+
+def parse_client_frame(data: str) -> ClientFrame | None:
+    """Parse a frame sent by a client, None for a heart-beat
+
+    :raises:
+        StompProtocolException: If data isn't a STOMP frame
+    """
+    if data.strip("\r\n") == "":
+        return None
+
+    head, separator, body_raw = data.lstrip("\r\n").partition("\n\n")
+    if separator == "":
+        raise StompProtocolException(f"Frame without end of headers {data!r}")
+    lines = head.split("\n")
+    headers: dict[str, str] = {}
+    for line in lines[1:]:
+        name, colon, value = line.rstrip("\r").partition(":")
+        if colon == "":
+            raise StompProtocolException(f"Malformed header {line!r}")
+        # First occurrence wins, as per the STOMP spec
+        headers.setdefault(name, value)
+
+    body_raw = body_raw.rstrip("\0").strip()
+    return ClientFrame(lines[0].rstrip("\r"), headers, _parse_body(body_raw) if body_raw != "" else None)
+
+
+class StompSession:
+    """STOMP session of one notification websocket
+
+    Receipts are sent once the frame is fully handled, so the receipt of a refresh request comes after the
+    notification it triggered.
+    """
+
+    id: str
+    account: SimulatedAccount | None
+    subscriptions: dict[str, str]
+    _simulator: AirCloudSimulator
+    _ws: web.WebSocketResponse
+    _transport: asyncio.Transport | None
+    _message_ids: itertools.count[int]
+    _send_lock: asyncio.Lock
+    _heart_beat_task: asyncio.Task[None] | None
+
+    def __init__(
+        self, simulator: AirCloudSimulator, ws: web.WebSocketResponse, transport: asyncio.Transport | None
+    ) -> None:
+        self.id = uuid.uuid4().hex[:12]
+        self.account = None
+        self.subscriptions = {}
+        self._simulator = simulator
+        self._ws = ws
+        self._transport = transport
+        self._message_ids = itertools.count(1)
+        self._send_lock = asyncio.Lock()
+        self._heart_beat_task = None
+
+    @property
+    def closed(self) -> bool:
+        return self._ws.closed
+
+    async def run(self) -> None:
+        faults = self._simulator.faults
+        lifetime = faults.websocket_lifetime() if faults is not None else None
+        drop_handle = asyncio.get_running_loop().call_later(lifetime, self.drop) if lifetime is not None else None
+        try:
+            async for message in self._ws:
+                if message.type != WSMsgType.TEXT:
+                    await self._error(f"Unexpected websocket message type {message.type}")
+                    break
+                try:
+                    frame = parse_client_frame(message.data)
+                    if frame is not None and not await self._handle(frame):
+                        break
+                except StompProtocolException as e:
+                    await self._error(str(e))
+                    break
+        finally:
+            if drop_handle is not None:
+                drop_handle.cancel()
+            if self._heart_beat_task is not None:
+                self._heart_beat_task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await self._heart_beat_task
+            await self._ws.close()
+            logger.debug("Session %s closed", self.id)
+
+    async def close(self) -> None:
+        await self._ws.close()
+
+    def drop(self) -> None:
+        """Abort the connection without closing handshake, like a network failure"""
+        if self._transport is not None and not self._transport.is_closing():
+            logger.info("Drop session %s", self.id)
+            if self._simulator.faults is not None:
+                self._simulator.faults.websocket_dropped()
+            self._transport.abort()
+
+    async def send(self, data: str) -> None:
+        async with self._send_lock:
+            await self._ws.send_str(data)
+
+    async def send_notification(
+        self, notification_type: str, units: list[SimulatedUnit], subscription_id: str | None = None
+    ) -> int:
+        """Send a notification on one or every subscription, return the number of messages sent"""
+        body = {"notificationType": notification_type, "data": [unit.to_notification() for unit in units]}
+        subscriptions = (
+            list(self.subscriptions.items())
+            if subscription_id is None
+            else [(subscription_id, self.subscriptions[subscription_id])]
+        )
+        sent = 0
+        for target, destination in subscriptions:
+            headers = {
+                "destination": destination,
+                "content-type": "application/json",
+                "subscription": target,
+                "message-id": f"{self.id}-{next(self._message_ids)}",
+            }
+            frame = encode_frame("MESSAGE", headers, body)
+            if self._simulator.faults is not None:
+                frame = self._simulator.faults.corrupt(frame)
+            with contextlib.suppress(ConnectionResetError):
+                await self.send(frame)
+                sent += 1
+        return sent
+
+    async def _error(self, message: str) -> None:
+        logger.info("Session %s error: %s", self.id, message)
+        with contextlib.suppress(ConnectionResetError):
+            await self.send(encode_frame("ERROR", {"message": message}))
+
+    async def _receipt(self, frame: ClientFrame) -> None:
+        receipt = frame.headers.get("receipt")
+        if receipt is not None:
+            await self.send(encode_frame("RECEIPT", {"receipt-id": receipt}))
+
+    async def _handle(self, frame: ClientFrame) -> bool:
+        """Handle a frame, return False once the client disconnected
+
+        :raises:
+            StompProtocolException: If the frame is not acceptable, the session is then closed with an ERROR frame
+        """
+        if frame.command in ("CONNECT", "STOMP"):
+            await self._connect(frame)
+            return True
+        if self.account is None:
+            raise StompProtocolException(f"{frame.command} before CONNECT")
+
+        match frame.command:
+            case "SUBSCRIBE":
+                destination = frame.headers.get("destination")
+                if destination != f"/notification/{self.account.user_id}/{self.account.family_id}":
+                    raise StompProtocolException(f"Can't subscribe to {destination}")
+                subscription_id = frame.headers.get("id", "")
+                self.subscriptions[subscription_id] = destination
+                await self.send_notification("ON_CONNECT", list(self.account.units.values()), subscription_id)
+            case "UNSUBSCRIBE":
+                self.subscriptions.pop(frame.headers.get("id", ""), None)
+            case "SEND" | "MESSAGE":
+                await self._refresh(self.account, frame)
+            case "DISCONNECT":
+                await self._receipt(frame)
+                return False
+            case _:
+                raise StompProtocolException(f"Unsupported frame {frame.command}")
+
+        await self._receipt(frame)
+        return True
+
+    async def _connect(self, frame: ClientFrame) -> None:
+        email = self._simulator.tokens.verify(frame.headers.get("Authorization"))
+        account = self._simulator.find_account(email)
+        if account is None:
+            raise StompProtocolException("Invalid token")
+        self.account = account
+
+        heart_beat = self._simulator.heart_beat
+        client_heart_beat = frame.headers.get("heart-beat", "0,0").split(",")
+        client_expects = int(client_heart_beat[1]) if len(client_heart_beat) == 2 else 0
+        await self.send(
+            encode_frame(
+                "CONNECTED",
+                {
+                    "version": "1.2",
+                    "heart-beat": f"{heart_beat},{heart_beat}",
+                    "session": self.id,
+                    "server": "aircloud-simulator",
+                },
+            )
+        )
+        if heart_beat > 0 and client_expects > 0:
+            self._heart_beat_task = asyncio.create_task(self._heart_beat_loop(max(heart_beat, client_expects) / 1000))
+
+    async def _refresh(self, account: SimulatedAccount, frame: ClientFrame) -> None:
+        if self._simulator.tokens.verify(frame.headers.get("Authorization")) != account.email:
+            raise StompProtocolException("Invalid token")
+        destination = frame.headers.get("destination")
+        if destination != f"/app/racs/{account.user_id}/{account.family_id}" or frame.body is None:
+            raise StompProtocolException(f"Unexpected message to {destination}")
+
+        match frame.body.get("requestType"):
+            case "REFRESH_ALL":
+                await self.send_notification("REFRESH_ALL", list(account.units.values()))
+            case "REFRESH_INDIVIDUAL":
+                unit = account.units.get(frame.body.get("racId", 0))
+                if unit is not None:
+                    await self.send_notification("BUCKET_UPDATE", [unit])
+            case request_type:
+                raise StompProtocolException(f"Unknown requestType {request_type}")
+
+    async def _heart_beat_loop(self, interval: float) -> None:
+        while not self._ws.closed:
+            await asyncio.sleep(interval)
+            if self._simulator.faults is not None and self._simulator.faults.skip_heart_beat():
+                continue
+            with contextlib.suppress(ConnectionResetError):
+                await self.send("\n")
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import secrets
+import time
+import uuid
+
+import jwt
+
+ISSUER = "aircloud-simulator"
+AUDIENCE = "aircloud"
+ACCESS_SCOPE = "ROLE_USER"
+REFRESH_SCOPE = "ROLE_REFRESH_TOKEN"
+
+
+class TokenIssuer:
+    """Issue and check the JWT of simulated accounts, signed with a secret generated at startup"""
+
+    _secret: str
+    access_token_ttl: int
+    refresh_token_ttl: int
+
+    def __init__(self, access_token_ttl: int = 3600, refresh_token_ttl: int = 30 * 24 * 3600) -> None:
+        self._secret = secrets.token_hex(32)
+        self.access_token_ttl = access_token_ttl
+        self.refresh_token_ttl = refresh_token_ttl
+
+    def _issue(self, email: str, scope: str, ttl: int) -> str:
+        now = int(time.time())
+        return jwt.encode(
+            {
+                "sub": email,
+                "scopes": [scope],
+                "iss": ISSUER,
+                "aud": AUDIENCE,
+                "jti": str(uuid.uuid4()),
+                "iat": now,
+                "exp": now + ttl,
+            },
+            self._secret,
+            algorithm="HS256",
+        )
+
+    def issue(self, email: str) -> dict:
+        """Token part of the sign-in and refresh-token responses"""
+        return {
+            "token": self._issue(email, ACCESS_SCOPE, self.access_token_ttl),
+            "refreshToken": self._issue(email, REFRESH_SCOPE, self.refresh_token_ttl),
+            "errorState": "NONE",
+            "access_token_expires_in": self.access_token_ttl,
+            "refresh_token_expires_in": self.refresh_token_ttl,
+        }
+
+    def verify(self, authorization: str | None, refresh: bool = False) -> str | None:
+        """Email of the account owning the bearer token of `authorization`, None if the token isn't valid"""
+        if authorization is None or not authorization.startswith("Bearer "):
+            return None
+        try:
+            claims = jwt.decode(
+                authorization.removeprefix("Bearer "),
+                self._secret,
+                algorithms=["HS256"],
+                audience=AUDIENCE,
+                issuer=ISSUER,
+            )
+        except jwt.InvalidTokenError:
+            return None
+        if (REFRESH_SCOPE if refresh else ACCESS_SCOPE) not in claims["scopes"]:
+            return None
+        return claims["sub"]
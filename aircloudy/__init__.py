@@ -1,11 +1,32 @@
+import contextlib
+
 from .aircloud import HitachiAirCloud
+from .change_feed import ChangeFeed
+from .change_filter import ChangeFilter
+from .change_stream import ChangeStream
+from .command_outbox import CommandOutbox
 from .contants import FanSpeed, FanSwing, OperatingMode, Power, ScheduleType
 from .errors import (
+    ApiException,
     AuthenticationFailedException,
+    CircuitOpenException,
     CommandFailedException,
     ConnectionFailed,
+    HttpStatusException,
     IllegalStateException,
     InteriorUnitNotFoundException,
+    RequestTimeoutException,
     TooManyRequestsException,
 )
+from .health import HealthMonitor, HealthTransition, Staleness
+from .history import HistoryRecorder
 from .interior_unit import InteriorUnit
+from .journal import EventJournal, JournalReader
+from .registry_snapshot import RegistrySnapshot
+from .scene import SceneReport, SceneState
+from .shared_state import SharedStateReader, SharedStateWriter
+from .state_history import StateHistory
+from .store import MemoryStateStore, SqliteStateStore, StateStore
+
+with contextlib.suppress(ImportError):  # numpy extra not installed
+    from .fleet_view import FleetView
@@ -1,32 +1,63 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import datetime
 import logging
-from collections.abc import Callable
+import traceback
+from collections.abc import Awaitable, Callable, Collection
+from concurrent.futures import Executor
 from dataclasses import dataclass
+from pathlib import Path
 from types import TracebackType
-from typing import Self
+from typing import Literal, Self
+
+import websockets
 
 from . import api, notifications
-from .api.rac_models import InteriorUnitUserState
+from .api.rac_models import InteriorUnitUserState, PowerResult
+from .change_dispatcher import ChangeDispatcher, ChangeHandler, ChangeSubscription, OverflowPolicy
+from .change_filter import ChangeFilter
+from .change_stream import ChangeStream
+from .command_outbox import CommandOutbox, OutboxEntry
 from .contants import (
     DEFAULT_REST_API_HOST,
     DEFAULT_STOMP_WEBSOCKET_HOST,
+    CommandPriority,
+    NotificationMode,
+    OfflinePolicy,
+    StateSource,
     TemperatureUnit,
 )
-from .errors import IllegalStateException, InteriorUnitNotFoundException
-from .interior_unit import InteriorUnit
+from .errors import (
+    CommandFailedException,
+    IllegalStateException,
+    InteriorUnitNotFoundException,
+    UnitIsOfflineException,
+)
+from .health import HealthMonitor, HealthTransition, Staleness, is_api_unavailable
+from .interior_unit import CommandOptions, InteriorUnit
 from .interior_unit_base import InteriorUnitBase
 from .interior_unit_changes import InteriorUnitChanges
+from .journal import EventJournal
+from .registry_snapshot import RegistrySnapshot
+from .scene import ScenePowerBatch, SceneReport, SceneState, SceneUnitResult
+from .store import StateStore
 
 logger = logging.getLogger(__name__)
 
+type UpdateListener = Callable[[list[InteriorUnitBase], dict[int, InteriorUnitChanges]], None]
+type CommandListener = Callable[[InteriorUnitUserState], None]
+type RemovalListener = Callable[[list[int]], None]
+
+_POWER_BATCH_WINDOW = 0.5
+
 
 @dataclass
 class ConnectionInfo:
     auth_manager: api.AuthManager
     user_profile: api.UserProfile
-    notification_socket: notifications.NotificationsWebsocket
+    notification_socket: notifications.NotificationsWebsocket | notifications.AdaptivePoller
 
 
 class HitachiAirCloud:
@@ -34,10 +65,36 @@ class HitachiAirCloud:
     _password: str
     _api_host: str
     _api_port: int
+    _notification_compression: Literal["deflate"] | None
+    _notification_mode: NotificationMode
+    _polling_min_interval: float
+    _polling_max_interval: float
 
     _command_state_monitor: api.CommandStateMonitor
+    _command_scheduler: api.CommandScheduler | None
+    _request_cache: api.RequestCache
     _connection_info: ConnectionInfo | None
     _interior_units: dict[int, InteriorUnit]
+    _change_dispatcher: ChangeDispatcher
+    _unit_changes: ChangeSubscription | None
+    _update_listeners: list[UpdateListener]
+    _command_listeners: list[CommandListener]
+    _removal_listeners: list[RemovalListener]
+    _state_store: StateStore | None
+    _event_journal: EventJournal | None
+    _registry_snapshot: RegistrySnapshot | None
+    _registry_snapshot_interval: float
+    _registry_snapshot_saver: asyncio.Task[None] | None
+    _connecting: asyncio.Task[None] | None
+    _connection_error: BaseException | None
+    _health: HealthMonitor
+    _serve_stale: bool
+    _command_outbox: CommandOutbox | None
+    _health_probe_interval: float
+    _health_probe: asyncio.Task[None] | None
+    _outbox_replay: asyncio.Task[None] | None
+    _offline_policy: OfflinePolicy
+    _offline_hold_ttl: float
 
     on_change: Callable[[dict[int, InteriorUnitChanges]], None] | None
 
@@ -48,18 +105,70 @@ class HitachiAirCloud:
         api_host: str = DEFAULT_REST_API_HOST,
         api_port: int = 443,
         notification_host: str = DEFAULT_STOMP_WEBSOCKET_HOST,
+        *,
+        notification_compression: Literal["deflate"] | None = "deflate",
+        state_store: StateStore | None = None,
+        event_journal: EventJournal | None = None,
+        registry_snapshot_path: str | Path | None = None,
+        registry_snapshot_interval: float = 300,
+        command_scheduler: api.CommandScheduler | None = None,
+        request_cache: api.RequestCache | None = None,
+        serve_stale: bool = False,
+        command_outbox: CommandOutbox | None = None,
+        health_probe_interval: float = 30,
+        offline_policy: OfflinePolicy = "RAISE",
+        offline_hold_ttl: float = 600,
+        notification_mode: NotificationMode = "WEBSOCKET",
+        polling_min_interval: float = 5,
+        polling_max_interval: float = 120,
     ) -> None:
         self._email = email
         self._password = password
         self._api_host = api_host
         self._api_port = api_port
         self.notification_host = notification_host
+        self._notification_compression = notification_compression
+        self._notification_mode = notification_mode
+        self._polling_min_interval = polling_min_interval
+        self._polling_max_interval = polling_max_interval
 
+        self._request_cache = request_cache if request_cache is not None else api.RequestCache()
         self._command_state_monitor = api.CommandStateMonitor(
-            self._get_auth_token_or_fail, host=api_host, port=api_port
+            self._get_auth_token_or_fail, host=api_host, port=api_port, request_cache=self._request_cache
         )
+        # Without scheduler, commands are sent as soon as requested
+        self._command_scheduler = command_scheduler
         self._connection_info = None
         self._interior_units = {}
+        self._change_dispatcher = ChangeDispatcher()
+        self._unit_changes = None
+        self._update_listeners = []
+        self._command_listeners = []
+        self._removal_listeners = []
+        self._state_store = state_store
+        if state_store is not None:
+            self.add_update_listener(state_store.record)
+        # Fed by _notify_update_listeners, which knows the source of the states
+        self._event_journal = event_journal
+        if event_journal is not None:
+            self.add_command_listener(event_journal.record_command)
+        self._registry_snapshot = None
+        if registry_snapshot_path is not None:
+            self._registry_snapshot = RegistrySnapshot(registry_snapshot_path, email)
+            self.add_update_listener(self._registry_snapshot.record)
+        self._registry_snapshot_interval = registry_snapshot_interval
+        self._registry_snapshot_saver = None
+        self._connecting = None
+        self._connection_error = None
+        self._health = HealthMonitor()
+        self._health.add_listener(self._on_health_transition)
+        self._serve_stale = serve_stale
+        self._command_outbox = command_outbox
+        self._health_probe_interval = health_probe_interval
+        self._health_probe = None
+        self._outbox_replay = None
+        self._offline_policy = offline_policy
+        self._offline_hold_ttl = offline_hold_ttl
 
         self.on_change = None
 
@@ -94,6 +203,48 @@ class HitachiAirCloud:
 
         return "FAHRENHEIT"
 
+    @property
+    def notification_stats(self) -> notifications.WebsocketStats | None:
+        if self._connection_info is None or not isinstance(
+            self._connection_info.notification_socket, notifications.NotificationsWebsocket
+        ):
+            return None
+        return self._connection_info.notification_socket.stats()
+
+    @property
+    def polling_stats(self) -> notifications.PollingStats | None:
+        if self._connection_info is None or not isinstance(
+            self._connection_info.notification_socket, notifications.AdaptivePoller
+        ):
+            return None
+        return self._connection_info.notification_socket.stats()
+
+    @property
+    def command_scheduler_stats(self) -> api.CommandSchedulerStats | None:
+        """Stats of the command scheduler, None if commands are not paced"""
+        return self._command_scheduler.stats() if self._command_scheduler is not None else None
+
+    @property
+    def request_cache_stats(self) -> api.RequestCacheStats:
+        return self._request_cache.stats()
+
+    @property
+    def health(self) -> HealthMonitor:
+        return self._health
+
+    def staleness(self, rac_id: int) -> Staleness:
+        """How old the known state of the interior unit is, and whether it may be outdated
+
+        :raises:
+            InteriorUnitNotFoundException: If the interior unit isn't known
+        """
+        interior_unit = self.get_interior_unit(rac_id)
+        return Staleness(
+            interior_unit.source,
+            datetime.datetime.now(datetime.UTC) - interior_unit.received_at,
+            self._health.state,
+        )
+
     def find_interior_unit(self, rac_id: int) -> InteriorUnit | None:
         return self._interior_units.get(rac_id)
 
@@ -103,118 +254,691 @@ class HitachiAirCloud:
             raise InteriorUnitNotFoundException(f"Interior unit {rac_id} not found")
         return iu
 
+    def subscribe_changes(
+        self,
+        handler: ChangeHandler,
+        rac_ids: Collection[int] | None = None,
+        overflow_policy: OverflowPolicy = "DROP_OLDEST",
+        max_queue_size: int = 100,
+        run_in_executor: bool = False,
+        executor: Executor | None = None,
+        change_filter: ChangeFilter | None = None,
+    ) -> ChangeSubscription:
+        """Register a change handler that runs outside the notification receive loop
+
+        Unlike `on_change`, the handler may be a coroutine function and is fed from its own bounded queue.
+
+        :param handler: Called with changes by interior unit id
+        :param rac_ids: Only forward changes of these interior units
+        :param overflow_policy: What to do when the queue is full: drop the oldest batch, merge the batch into the
+            last queued one, or wait for the handler to catch up (this slows down notification processing)
+        :param run_in_executor: Run a synchronous handler in `executor` (default executor of the loop if None)
+        :param change_filter: Only forward updates accepted by this filter (fields, dead-bands, throttling)
+        """
+        return self._change_dispatcher.subscribe(
+            handler, rac_ids, overflow_policy, max_queue_size, run_in_executor, executor, change_filter
+        )
+
+    async def unsubscribe_changes(self, subscription: ChangeSubscription) -> None:
+        await self._change_dispatcher.unsubscribe(subscription)
+
+    def changes(
+        self,
+        rac_ids: Collection[int] | None = None,
+        fields: Collection[str] | None = None,
+        max_pending_units: int = 1000,
+        change_filter: ChangeFilter | None = None,
+    ) -> ChangeStream:
+        """Open a stream of changes to consume with `async for batch in stream`
+
+        Each stream has its own buffer where changes of the same interior unit are merged while the consumer lags.
+        The stream ends when it is closed, or when this instance is closed.
+
+        :param rac_ids: Only stream changes of these interior units
+        :param fields: Only stream changes where one of these `InteriorUnitChanges` fields changed
+        :param change_filter: Only stream updates accepted by this filter (fields, dead-bands, throttling)
+        """
+        return self._change_dispatcher.open_stream(rac_ids, fields, max_pending_units, change_filter)
+
+    def add_update_listener(self, listener: UpdateListener) -> None:
+        """Register a listener called inline with every applied update
+
+        The listener gets the received interior units and the changes of the ones that changed. It is also called
+        at connection with the initial interior units and no changes. It must be fast (no I/O) since it runs in the
+        notification receive loop.
+        """
+        self._update_listeners.append(listener)
+
+    def remove_update_listener(self, listener: UpdateListener) -> None:
+        self._update_listeners.remove(listener)
+
+    def _notify_update_listeners(
+        self, interior_units: list[InteriorUnitBase], changes: dict[int, InteriorUnitChanges], source: StateSource
+    ) -> None:
+        if self._event_journal is not None:
+            self._event_journal.record_states(interior_units, source)
+        for listener in self._update_listeners:
+            try:
+                listener(interior_units, changes)
+            except Exception:
+                logger.error("Unexpected error in update listener : %s", traceback.format_exc())
+
+    def _notify_interior_units(self, changes: dict[int, InteriorUnitChanges]) -> None:
+        for rac_id, change in changes.items():
+            interior_unit = self._interior_units.get(rac_id)
+            if interior_unit is None or interior_unit.on_changes is None:
+                continue
+            try:
+                interior_unit.on_changes(change)
+            except Exception:
+                logger.error("Unexpected error in changes handler of %d : %s", rac_id, traceback.format_exc())
+
+    def add_removal_listener(self, listener: RemovalListener) -> None:
+        """Register a listener called inline with the ids of interior units no longer part of the account"""
+        self._removal_listeners.append(listener)
+
+    def remove_removal_listener(self, listener: RemovalListener) -> None:
+        self._removal_listeners.remove(listener)
+
+    def _notify_removal_listeners(self, rac_ids: list[int]) -> None:
+        for listener in self._removal_listeners:
+            try:
+                listener(rac_ids)
+            except Exception:
+                logger.error("Unexpected error in removal listener : %s", traceback.format_exc())
+
+    def add_command_listener(self, listener: CommandListener) -> None:
+        """Register a listener called with every command just before it is sent"""
+        self._command_listeners.append(listener)
+
+    def remove_command_listener(self, listener: CommandListener) -> None:
+        self._command_listeners.remove(listener)
+
+    def _notify_command_listeners(self, command: InteriorUnitUserState) -> None:
+        for listener in self._command_listeners:
+            try:
+                listener(command)
+            except Exception:
+                logger.error("Unexpected error in command listener : %s", traceback.format_exc())
+
     async def _get_auth_token_or_fail(self) -> str:
         if self._connection_info is None:
             raise Exception("AirCloud is not connected")
         return await self._connection_info.auth_manager.token()
 
     async def connect(self) -> None:
-        if self.is_open:
+        """
+        Connect to the api and start receiving notifications
+
+        If a registry snapshot or a state store holds interior units, they are loaded first and flagged as stale;
+        this method then returns immediately while the connection is opened in background and fresh data is
+        reconciled with the loaded units. Errors of that background connection (bad credentials, api unreachable)
+        are then not raised here: they are logged, mark the api as failed in `health` and are raised by
+        `wait_connected`, after which `connect` can be called again.
+        """
+        if self.is_open or self._connecting is not None:
             raise IllegalStateException("AirCloud already connected")
+        self._connection_error = None
+        if self._unit_changes is None:
+            # Handlers of the interior units run from the dispatcher, not in the notification receive loop
+            self._unit_changes = self._change_dispatcher.subscribe(
+                self._notify_interior_units, overflow_policy="COALESCE_PER_UNIT"
+            )
+
+        initial_units, source, received_at = await self._load_initial_interior_units()
+        if len(initial_units) > 0:
+            self._interior_units = {
+                iu.rac_id: self._new_interior_unit(
+                    iu, source, received_at if received_at is not None else iu.updated_at
+                )
+                for iu in initial_units
+            }
+            self._notify_update_listeners(initial_units, {}, source)
+
+        if self._registry_snapshot is not None and self._registry_snapshot_saver is None:
+            self._registry_snapshot_saver = asyncio.create_task(self._save_registry_snapshot_periodically())
+
+        if len(initial_units) > 0:
+            logger.info("Loaded %d interior units from %s, connect in background", len(initial_units), source)
+            self._connecting = asyncio.create_task(self._open_connection())
+            self._connecting.add_done_callback(self._on_background_connection_done)
+            return
+
+        await self._open_connection()
+
+    def _on_background_connection_done(self, task: asyncio.Task[None]) -> None:
+        if task.cancelled() or task is not self._connecting:
+            return
+        error = task.exception()
+        if error is None:
+            return
+        logger.error("Background connection failed : %s", error, exc_info=error)
+        self._health.api_failed(f"{type(error).__name__}: {error}")
+        self._connection_error = error
+        self._connecting = None
+
+    async def wait_connected(self) -> None:
+        """Wait until the connection started by `connect` is open
+
+        :raises:
+            IllegalStateException: If connect wasn't called
+            Exception: The error of the background connection, if it failed
+        """
+        await self._connection()
 
+    async def _connection(self) -> ConnectionInfo:
+        if self._connection_info is None and self._connecting is not None:
+            await asyncio.shield(self._connecting)
+        if self._connection_info is None and self._connection_error is not None:
+            raise self._connection_error
+        if self._connection_info is None:
+            raise IllegalStateException("Connect must be called before calling this method")
+        return self._connection_info
+
+    async def _load_initial_interior_units(
+        self,
+    ) -> tuple[list[InteriorUnitBase], StateSource, datetime.datetime | None]:
+        """Interior units known before connecting, their source and when they were received if known"""
+        if self._registry_snapshot is not None:
+            snapshot = self._registry_snapshot.load()
+            if snapshot is not None and len(snapshot.interior_units) > 0:
+                return snapshot.interior_units, "SNAPSHOT", snapshot.saved_at
+        if self._state_store is not None:
+            return await self._state_store.load_units(), "STORE", None
+        return [], "REST", None
+
+    async def _open_connection(self) -> None:
         auth_manager = api.AuthManager(self._email, self._password, self._api_host, self._api_port)
-        user_profile = await api.fetch_profile(auth_manager.token, self._api_host, self._api_port)
-        self._interior_units = {
-            iu.rac_id: InteriorUnit(self._send_command_and_wait_ack, iu)
-            for iu in await api.get_interior_units(
-                auth_manager.token, user_profile.familyId, self._api_host, self._api_port
-            )
-        }
+        user_profile = await self._request_cache.get(
+            ("fetch_profile", self._api_host, self._api_port, self._email),
+            lambda: api.fetch_profile(auth_manager.token, self._api_host, self._api_port),
+        )
+        interior_units = await self._get_interior_units(auth_manager, user_profile.familyId)
+        await self._reconcile_interior_units(interior_units)
 
+        notification_socket = (
+            self._create_notification_socket(auth_manager, user_profile)
+            if self._notification_mode == "WEBSOCKET"
+            else self._create_poller(auth_manager, user_profile)
+        )
+        await self._init_notification_socket(notification_socket)
+
+        self._connection_info = ConnectionInfo(
+            auth_manager,
+            user_profile,
+            notification_socket,
+        )
+
+        logger.info("Connected")
+
+    def _create_notification_socket(
+        self, auth_manager: api.AuthManager, user_profile: api.UserProfile
+    ) -> notifications.NotificationsWebsocket:
         notification_socket = notifications.NotificationsWebsocket(
             self.notification_host,
             auth_manager.token,
             user_profile.id,
             user_profile.familyId,
             self._update_interior_units,
+            compression=self._notification_compression,
         )
-        notification_socket.on_unexpected_connection_close = lambda _: self._init_notification_socket(
-            notification_socket
+        notification_socket.on_unexpected_connection_close = lambda e: self._on_notification_socket_closed(
+            notification_socket, e
         )
-        await self._init_notification_socket(notification_socket)
+        return notification_socket
+
+    def _create_poller(
+        self, auth_manager: api.AuthManager, user_profile: api.UserProfile
+    ) -> notifications.AdaptivePoller:
+        async def fetch() -> str:
+            try:
+                body = await api.fetch_interior_units_payload(
+                    auth_manager.token, user_profile.familyId, self._api_host, self._api_port
+                )
+            except Exception as e:
+                self._record_api_error(e)
+                raise
+            self._record_api_success()
+            return body
+
+        async def removed(rac_ids: list[int]) -> None:
+            self._remove_interior_units([rac_id for rac_id in rac_ids if rac_id in self._interior_units])
+
+        poller = notifications.AdaptivePoller(
+            fetch,
+            lambda interior_units, partial: self._update_interior_units(interior_units, partial, "REST"),
+            self._polling_min_interval,
+            self._polling_max_interval,
+            removal_callback=removed,
+        )
+        self.add_command_listener(poller.record_command)
+        return poller
 
-        self._connection_info = ConnectionInfo(
-            auth_manager,
-            user_profile,
-            notification_socket,
+    async def _get_interior_units(self, auth_manager: api.AuthManager, family_id: int) -> list[InteriorUnitBase]:
+        return await self._request_cache.get(
+            ("get_interior_units", self._api_host, self._api_port, self._email, family_id),
+            lambda: api.get_interior_units(auth_manager.token, family_id, self._api_host, self._api_port),
         )
 
-        logger.info("Connected")
+    def _new_interior_unit(
+        self, base: InteriorUnitBase, source: StateSource = "REST", received_at: datetime.datetime | None = None
+    ) -> InteriorUnit:
+        return InteriorUnit(
+            self._send_unit_command,
+            base,
+            source,
+            received_at,
+            offline_policy=self._offline_policy,
+            offline_hold_ttl=self._offline_hold_ttl,
+        )
+
+    async def _reconcile_interior_units(self, interior_units: list[InteriorUnitBase]) -> None:
+        """Apply fresh interior units to the ones loaded at startup, only publishing real differences"""
+        if len(self._interior_units) == 0:
+            self._interior_units = {iu.rac_id: self._new_interior_unit(iu) for iu in interior_units}
+            self._notify_update_listeners(interior_units, {}, "REST")
+            return
+
+        fresh_ids = {iu.rac_id for iu in interior_units}
+        self._remove_interior_units([rac_id for rac_id in self._interior_units if rac_id not in fresh_ids])
+        await self._update_interior_units(interior_units, False, "REST")
+
+    def _remove_interior_units(self, rac_ids: list[int]) -> None:
+        if len(rac_ids) == 0:
+            return
+        for rac_id in rac_ids:
+            logger.info("Interior unit %d no longer exists", rac_id)
+            del self._interior_units[rac_id]
+            if self._registry_snapshot is not None:
+                self._registry_snapshot.forget(rac_id)
+            if self._state_store is not None:
+                self._state_store.forget(rac_id)
+        self._notify_removal_listeners(rac_ids)
+
+    async def _save_registry_snapshot_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self._registry_snapshot_interval)
+            self._save_registry_snapshot()
+
+    def _save_registry_snapshot(self) -> None:
+        if self._registry_snapshot is None:
+            return
+        try:
+            self._registry_snapshot.save()
+        except OSError:
+            logger.error("Failed to save registry snapshot : %s", traceback.format_exc())
 
-    async def _init_notification_socket(self, socket: notifications.NotificationsWebsocket) -> None:
+    async def _init_notification_socket(
+        self, socket: notifications.NotificationsWebsocket | notifications.AdaptivePoller
+    ) -> None:
         await socket.connect()
         await socket.subscribe()
 
+    async def _on_notification_socket_closed(
+        self, socket: notifications.NotificationsWebsocket, error: websockets.ConnectionClosed
+    ) -> None:
+        self._health.notifications_lost(f"notifications closed with code {error.code}")
+        await self._reconnect_notification_socket(socket)
+
+    async def _reconnect_notification_socket(
+        self, socket: notifications.NotificationsWebsocket | notifications.AdaptivePoller
+    ) -> None:
+        try:
+            await self._init_notification_socket(socket)
+        except Exception:
+            logger.warning("Failed to reconnect notifications : %s", traceback.format_exc())
+            return
+        self._health.notifications_recovered()
+        try:
+            # Changes that happened while disconnected were not notified
+            await socket.refresh_all()
+        except Exception:
+            logger.warning("Failed to request refresh after reconnection : %s", traceback.format_exc())
+
+    def _on_health_transition(self, transition: HealthTransition) -> None:
+        if transition.current != "HEALTHY" and (self._health_probe is None or self._health_probe.done()):
+            self._health_probe = asyncio.create_task(self._probe_health())
+
+    async def _probe_health(self) -> None:
+        """Try to restore what is down until healthy, or closed"""
+        while self._health.state != "HEALTHY":
+            await asyncio.sleep(self._health_probe_interval)
+            connection_info = self._connection_info
+            if connection_info is None:
+                return
+            if not self._health.notifications_available:
+                await self._reconnect_notification_socket(connection_info.notification_socket)
+            if not self._health.api_available:
+                try:
+                    await self._refresh_from_api(connection_info)
+                except Exception:
+                    logger.info("Api still unavailable : %s", traceback.format_exc())
+
+    def _record_api_error(self, error: BaseException) -> None:
+        if is_api_unavailable(error):
+            self._health.api_failed(f"{type(error).__name__}: {error}")
+
+    def _record_api_success(self) -> None:
+        self._health.api_recovered()
+        if (
+            self._command_outbox is not None
+            and len(self._command_outbox) > 0
+            and (self._outbox_replay is None or self._outbox_replay.done())
+        ):
+            self._outbox_replay = asyncio.create_task(self._replay_command_outbox(self._command_outbox))
+
+    async def _replay_command_outbox(self, outbox: CommandOutbox) -> None:
+        connection_info = await self._connection()
+        entries = outbox.take()
+        logger.info("Replay %d queued commands", len(entries))
+
+        async def replay(entry: OutboxEntry) -> None:
+            try:
+                await self._send_command_now(connection_info, entry.command, entry.priority)
+            except Exception as e:
+                if is_api_unavailable(e):
+                    outbox.give_back([entry])
+                elif not entry.future.done():
+                    entry.future.set_exception(e)
+                return
+            if not entry.future.done():
+                entry.future.set_result(None)
+
+        await asyncio.gather(*[replay(entry) for entry in entries])
+
     async def close(self) -> None:
         try:
+            if self._connecting is not None:
+                self._connecting.cancel()
+                with contextlib.suppress(asyncio.CancelledError, Exception):
+                    await self._connecting
             if self._connection_info is not None:
-                await self._connection_info.notification_socket.close()
+                notification_socket = self._connection_info.notification_socket
+                if isinstance(notification_socket, notifications.AdaptivePoller):
+                    self.remove_command_listener(notification_socket.record_command)
+                await notification_socket.close()
         finally:
+            if self._registry_snapshot_saver is not None:
+                self._registry_snapshot_saver.cancel()
+                self._registry_snapshot_saver = None
+            for task in (self._health_probe, self._outbox_replay):
+                if task is not None:
+                    task.cancel()
+            self._health_probe = None
+            self._outbox_replay = None
+            if self._command_outbox is not None:
+                self._command_outbox.clear("AirCloud closed before the command was sent")
+            self._save_registry_snapshot()
+            self._connecting = None
+            self._connection_error = None
             self._connection_info = None
             self._interior_units = {}
-
-    def _update_interior_units(self, interior_units: list[InteriorUnitBase], partial: bool) -> None:
+            self._unit_changes = None
+            await self._change_dispatcher.close()
+            if self._state_store is not None:
+                await self._state_store.flush()
+            if self._event_journal is not None:
+                await self._event_journal.flush()
+
+    async def _update_interior_units(
+        self, interior_units: list[InteriorUnitBase], partial: bool, source: StateSource = "NOTIFICATION"
+    ) -> None:
         logger.debug("Received interior units update: %s", interior_units)
+        new_units = [iu for iu in interior_units if iu.rac_id not in self._interior_units]
+        if len(new_units) > 0:
+            logger.info("New interior units %s", [iu.rac_id for iu in new_units])
+            for iu in new_units:
+                self._interior_units[iu.rac_id] = self._new_interior_unit(iu, source)
+            self._notify_update_listeners(new_units, {}, source)
+            new_ids = {iu.rac_id for iu in new_units}
+            interior_units = [iu for iu in interior_units if iu.rac_id not in new_ids]
+
+        selection = self._change_dispatcher.new_selection()
         changes: dict[int, InteriorUnitChanges] = {}
         for iu in interior_units:
-            changes[iu.rac_id] = self._interior_units[iu.rac_id].update(iu)
+            interior_unit = self._interior_units[iu.rac_id]
+            if selection is not None:
+                selection.evaluate(interior_unit, iu)
+            # on_changes is called by the change dispatcher
+            change = interior_unit.update(iu, source, call_on_changes=False)
+            if change.has_changes:
+                changes[iu.rac_id] = change
 
         # If update is not partial, compare given list and current list to detected deleted interior_unit
         # and notify change
         if partial:
             pass
 
+        self._notify_update_listeners(interior_units, changes, source)
+
+        if len(changes) == 0:
+            return
+
+        if source == "NOTIFICATION":
+            # A cached list would bring back the state before the notification
+            self._request_cache.invalidate("get_interior_units")
+
         if self.on_change is not None:
             self.on_change(changes)
 
+        await self._change_dispatcher.publish(changes, selection)
+
     async def update_all(self) -> None:
-        if self._connection_info is None:
-            raise IllegalStateException("Connect must be called before calling this method")
+        """
+        Fetch the state of all interior units from the api
 
-        self._update_interior_units(
-            await api.get_interior_units(
-                self._connection_info.auth_manager.token,
-                self._connection_info.user_profile.familyId,
-                self._api_host,
-                self._api_port,
-            ),
-            False,
-        )
+        With `serve_stale`, an unreachable api doesn't raise: interior units keep their last known state, see
+        `staleness` and `health`.
+        """
+        connection_info = await self._connection()
+        try:
+            await self._refresh_from_api(connection_info)
+        except Exception as e:
+            if not self._serve_stale or not is_api_unavailable(e) or len(self._interior_units) == 0:
+                raise
+            logger.warning("Api unavailable, serve last known state : %s", e)
 
-    async def request_update_all(self) -> None:
-        if self._connection_info is None:
-            raise IllegalStateException("Connect must be called before calling this method")
+    async def _refresh_from_api(self, connection_info: ConnectionInfo) -> None:
+        try:
+            interior_units = await self._get_interior_units(
+                connection_info.auth_manager, connection_info.user_profile.familyId
+            )
+        except Exception as e:
+            self._record_api_error(e)
+            raise
+        self._record_api_success()
+        await self._update_interior_units(interior_units, False, "REST")
 
-        await self._connection_info.notification_socket.refresh_all()
+    async def request_update_all(self, receipt: bool = False) -> asyncio.Future[float] | None:
+        connection_info = await self._connection()
+        return await connection_info.notification_socket.refresh_all(receipt)
 
-    async def request_update(self, rac_id: int) -> None:
-        if self._connection_info is None:
-            raise IllegalStateException("Connect must be called before calling this method")
+    async def request_update(self, rac_id: int, receipt: bool = False) -> asyncio.Future[float] | None:
+        connection_info = await self._connection()
+        return await connection_info.notification_socket.refresh(rac_id, receipt)
+
+    async def apply_scene(
+        self,
+        state: SceneState,
+        units: Collection[int] | None = None,
+        max_concurrency: int = 4,
+        priority: CommandPriority = "AUTOMATION",
+    ) -> SceneReport:
+        """
+        Bring several interior units (all by default) to the same state
 
-        await self._connection_info.notification_socket.refresh(rac_id)
+        Each unit gets the state through `InteriorUnit.send_command`, merged with its pending state and following the
+        offline policy. Units already in the requested state are skipped. If only power differs, units are switched
+        in a single call; other units get their own command, at most `max_concurrency` at a time. Failures are
+        reported per unit instead of being raised, units held by the HOLD offline policy are reported HELD without
+        waiting for them.
+        """
+        connection_info = await self._connection()
+
+        results: dict[int, SceneUnitResult] = {}
+        power_only: dict[int, InteriorUnitUserState] = {}
+        others: list[InteriorUnit] = []
+        for rac_id in units if units is not None else list(self._interior_units):
+            interior_unit = self.find_interior_unit(rac_id)
+            if interior_unit is None:
+                results[rac_id] = SceneUnitResult(rac_id, "NOT_FOUND")
+                continue
+
+            target = state.target(interior_unit.user_state)
+            if target is None:
+                results[rac_id] = SceneUnitResult(rac_id, "UNCHANGED")
+            elif (
+                state.power is not None
+                and interior_unit.online
+                and interior_unit.user_state.copy(power=state.power) == target
+            ):
+                power_only[rac_id] = target
+            else:
+                others.append(interior_unit)
+
+        async def apply(interior_unit: InteriorUnit, options: CommandOptions) -> None:
+            rac_id = interior_unit.id
+            try:
+                outcome = await interior_unit.send_command(**state.fields(), options=options)
+            except UnitIsOfflineException:
+                results[rac_id] = SceneUnitResult(rac_id, "OFFLINE")
+                return
+            if not interior_unit.online:
+                results[rac_id] = SceneUnitResult(rac_id, "HELD")
+                return
+            try:
+                await outcome
+                results[rac_id] = SceneUnitResult(rac_id, "APPLIED")
+            except Exception as e:
+                logger.warning("Failed to apply scene to %d: %s", rac_id, e)
+                results[rac_id] = SceneUnitResult(rac_id, "FAILED", repr(e))
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+        options = CommandOptions(priority)
+
+        async def apply_paced(interior_unit: InteriorUnit) -> None:
+            async with semaphore:
+                await apply(interior_unit, options)
+
+        tasks = [apply_paced(interior_unit) for interior_unit in others]
+        if state.power is not None and len(power_only) > 0:
+            batch = ScenePowerBatch(state.power, priority, power_only)
+            batch_options = CommandOptions(priority, batch)
+            tasks.append(self._set_power_all(connection_info, batch))
+            tasks.extend(apply(self._interior_units[rac_id], batch_options) for rac_id in power_only)
+
+        await asyncio.gather(*tasks)
+        return SceneReport(results)
+
+    async def _send_unit_command(self, interior_unit_command: InteriorUnitUserState, options: CommandOptions) -> None:
+        """Transport of the interior units, states requested by a scene may be switched with a single call"""
+        if options.power_batch is not None and await options.power_batch.take(interior_unit_command):
+            return
+        await self._send_command_and_wait_ack(interior_unit_command, options.priority)
+
+    async def _set_power_all(self, connection_info: ConnectionInfo, batch: ScenePowerBatch) -> None:
+        """Switch the units of the batch with one call, units send their command alone if the call failed"""
+        commands = await batch.close(_POWER_BATCH_WINDOW)
+        if len(commands) == 0:
+            return
+
+        for command in commands:
+            self._notify_command_listeners(command)
+        try:
+            response = await self._submit_command(
+                None,
+                lambda: api.set_power_all(
+                    connection_info.auth_manager.token,
+                    connection_info.user_profile.familyId,
+                    batch.power,
+                    commands,
+                    host=self._api_host,
+                    port=self._api_port,
+                ),
+                batch.priority,
+            )
+        except Exception as e:
+            self._record_api_error(e)
+            logger.warning("Failed to set power of %d units at once: %s", len(commands), traceback.format_exc())
+            batch.send_alone()
+            return
+        finally:
+            self._request_cache.invalidate("get_interior_units")
+        self._record_api_success()
+
+        async def wait_done(result: PowerResult) -> None:
+            try:
+                if not result.success or result.commandResponse is None:
+                    raise CommandFailedException(f"{result.errorCode}: {result.errorMessage}")
+                command_state = await self._command_state_monitor.watch_command(result.commandResponse)
+                await asyncio.wait_for(command_state.wait_done(), 30)
+                batch.resolve(result.racId)
+            except Exception as e:
+                batch.resolve(result.racId, e)
+
+        await asyncio.gather(*[wait_done(result) for result in response.resultSet])
+        for command in commands:
+            batch.resolve(command.rac_id, CommandFailedException("No result"))
+        await self.request_update_all()
 
     async def _send_command_and_wait_ack(
         self,
         interior_unit_command: InteriorUnitUserState,
+        priority: CommandPriority = "INTERACTIVE",
     ) -> None:
         """
-        Send command to set interior_unit state
+        Send command to set interior_unit state, paced by the command scheduler if there is one
+
+        With a command outbox, a command that can't reach the api is queued and sent once it is reachable again.
 
         :raises:
             IllegalStateException: If instance is not connected
-            CommandFailedException: If state isn't done after wait delay
+            TooManyRequestsException: If the api answered 429, after the scheduler attempts if commands are paced
+            CommandFailedException: If state isn't done after wait delay, or the queued command expired
         """
-        if self._connection_info is None:
-            raise IllegalStateException("Connect must be called before calling this method")
+        connection_info = await self._connection()
+        if self._command_outbox is not None and not self._health.api_available:
+            await self._command_outbox.put(interior_unit_command, priority)
+            return
 
-        command_state = await self._command_state_monitor.watch_command(
-            await api.send_command(
-                self._connection_info.auth_manager.token,
-                self._connection_info.user_profile.familyId,
-                interior_unit_command,
-                host=self._api_host,
-                port=self._api_port,
+        try:
+            await self._send_command_now(connection_info, interior_unit_command, priority)
+        except Exception as e:
+            if self._command_outbox is None or not is_api_unavailable(e):
+                raise
+            logger.warning("Api unavailable, queue command %s", interior_unit_command)
+            await self._command_outbox.put(interior_unit_command, priority)
+
+    async def _submit_command[T](
+        self, rac_id: int | None, operation: Callable[[], Awaitable[T]], priority: CommandPriority
+    ) -> T:
+        """Run a command operation, through the command scheduler if commands are paced"""
+        if self._command_scheduler is None:
+            return await operation()
+        return await self._command_scheduler.submit(self._email, rac_id, operation, priority)
+
+    async def _send_command_now(
+        self, connection_info: ConnectionInfo, interior_unit_command: InteriorUnitUserState, priority: CommandPriority
+    ) -> None:
+        self._notify_command_listeners(interior_unit_command)
+        try:
+            command_response = await self._submit_command(
+                interior_unit_command.rac_id,
+                lambda: api.send_command(
+                    connection_info.auth_manager.token,
+                    connection_info.user_profile.familyId,
+                    interior_unit_command,
+                    host=self._api_host,
+                    port=self._api_port,
+                ),
+                priority,
             )
-        )
+        except Exception as e:
+            self._record_api_error(e)
+            raise
+        self._record_api_success()
+        self._request_cache.invalidate("get_interior_units")
+        command_state = await self._command_state_monitor.watch_command(command_response)
         await asyncio.wait_for(command_state.wait_done(), 30)
+        self._request_cache.invalidate("get_interior_units")
         await self.request_update(interior_unit_command.rac_id)
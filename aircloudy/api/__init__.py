@@ -1,13 +1,26 @@
 from .auth_manager import AuthManager
+from .command_scheduler import CommandScheduler, CommandSchedulerStats
 from .command_state_monitor import CommandStateMonitor
+from .http_policy import (
+    CircuitBreaker,
+    RequestPolicy,
+    request_policy,
+    reset_circuit_breakers,
+    reset_request_policies,
+    set_request_policy,
+)
 from .iam import fetch_profile, perform_login
 from .iam_models import AuthenticationSuccess, UserProfile
 from .rac import (
+    fetch_interior_units_payload,
     get_commands_state,
     get_interior_units,
+    interior_unit_from_api,
+    parse_interior_units,
     request_refresh_interior_unit_state,
     send_command,
     set_power,
     set_power_all,
 )
 from .rac_models import CommandResponse
+from .request_cache import RequestCache, RequestCacheStats
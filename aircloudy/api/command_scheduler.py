@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from aircloudy.contants import COMMAND_PRIORITIES, CommandPriority
+
+from ..errors import TooManyRequestsException
+from ..metrics import LatencyGauge, LatencySnapshot
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second, holding at most `capacity` tokens"""
+
+    rate: float
+    capacity: float
+    _tokens: float
+    _updated_at: float
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available"""
+        self._refill(now)
+        return max(0.0, (1 - self._tokens) / self.rate)
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self._tokens -= 1
+
+    def drain(self, now: float) -> None:
+        self._refill(now)
+        self._tokens = min(self._tokens, 0.0)
+
+
+@dataclass(frozen=True)
+class CommandSchedulerStats:
+    queue_depth: int
+    queue_depth_by_priority: dict[CommandPriority, int]
+    wait_time: LatencySnapshot
+    dispatched: int
+    throttled: int
+    account_rates: dict[str, float]
+
+
+class _Request[T]:
+    account: str
+    rac_id: int | None
+    operation: Callable[[], Awaitable[T]]
+    priority: CommandPriority
+    future: asyncio.Future[T]
+    submitted_at: float
+    attempts: int
+
+    def __init__(
+        self, account: str, rac_id: int | None, operation: Callable[[], Awaitable[T]], priority: CommandPriority
+    ) -> None:
+        self.account = account
+        self.rac_id = rac_id
+        self.operation = operation
+        self.priority = priority
+        self.future = asyncio.get_running_loop().create_future()
+        self.submitted_at = time.monotonic()
+        self.attempts = 0
+
+
+class CommandScheduler:
+    """Pace commands sent to the api.
+
+    Every command waits in a queue until both the bucket of its account and the bucket of its unit have a token;
+    interactive commands are dispatched before automation ones. When the api answers 429, the account rate is
+    halved (down to `min_account_rate`), the unit bucket is drained and the command is queued again, up to
+    `max_attempts` times; each success raises the account rate back by `rate_increase` until `account_rate`.
+    A scheduler can be shared by several `HitachiAirCloud` to pace all accounts of a process.
+    """
+
+    _account_rate: float
+    _account_burst: float
+    _unit_rate: float
+    _unit_burst: float
+    _min_account_rate: float
+    _rate_increase: float
+    _max_attempts: int
+
+    _account_buckets: dict[str, TokenBucket]
+    _unit_buckets: dict[tuple[str, int], TokenBucket]
+    _queues: dict[CommandPriority, deque[_Request]]
+    _wakeup: asyncio.Event
+    _worker: asyncio.Task[None] | None
+    _running: set[asyncio.Task[None]]
+
+    _wait_time: LatencyGauge
+    _dispatched: int
+    _throttled: int
+
+    def __init__(
+        self,
+        account_rate: float = 1.0,
+        account_burst: float = 5,
+        unit_rate: float = 0.5,
+        unit_burst: float = 1,
+        min_account_rate: float = 0.1,
+        rate_increase: float = 0.05,
+        max_attempts: int = 5,
+    ) -> None:
+        self._account_rate = account_rate
+        self._account_burst = account_burst
+        self._unit_rate = unit_rate
+        self._unit_burst = unit_burst
+        self._min_account_rate = min_account_rate
+        self._rate_increase = rate_increase
+        self._max_attempts = max_attempts
+
+        self._account_buckets = {}
+        self._unit_buckets = {}
+        self._queues = {priority: deque() for priority in COMMAND_PRIORITIES}
+        self._wakeup = asyncio.Event()
+        self._worker = None
+        self._running = set()
+
+        self._wait_time = LatencyGauge()
+        self._dispatched = 0
+        self._throttled = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> CommandSchedulerStats:
+        return CommandSchedulerStats(
+            self.queue_depth,
+            {priority: len(queue) for priority, queue in self._queues.items()},
+            self._wait_time.snapshot(),
+            self._dispatched,
+            self._throttled,
+            {account: bucket.rate for account, bucket in self._account_buckets.items()},
+        )
+
+    async def submit[T](
+        self,
+        account: str,
+        rac_id: int | None,
+        operation: Callable[[], Awaitable[T]],
+        priority: CommandPriority = "INTERACTIVE",
+    ) -> T:
+        """Queue `operation` and return its result once it was run
+
+        :param rac_id: Unit targeted by the operation, None if it targets several units
+        :raises:
+            TooManyRequestsException: If the api still answers 429 after `max_attempts` attempts
+        """
+        request = _Request(account, rac_id, operation, priority)
+        self._enqueue(request)
+        return await request.future
+
+    def _account_bucket(self, account: str) -> TokenBucket:
+        bucket = self._account_buckets.get(account)
+        if bucket is None:
+            bucket = TokenBucket(self._account_rate, self._account_burst)
+            self._account_buckets[account] = bucket
+        return bucket
+
+    def _unit_bucket(self, account: str, rac_id: int | None) -> TokenBucket | None:
+        if rac_id is None:
+            return None
+        bucket = self._unit_buckets.get((account, rac_id))
+        if bucket is None:
+            bucket = TokenBucket(self._unit_rate, self._unit_burst)
+            self._unit_buckets[(account, rac_id)] = bucket
+        return bucket
+
+    async def _dispatch_loop(self) -> None:
+        while self.queue_depth > 0:
+            self._wakeup.clear()
+            next_wait = self._dispatch_ready(time.monotonic())
+            if next_wait is None:
+                continue
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), next_wait)
+
+    def _dispatch_ready(self, now: float) -> float | None:
+        """Dispatch the first request allowed by its buckets, or return how long to wait for one"""
+        next_wait = float("inf")
+        for queue in self._queues.values():
+            for request in queue:
+                if request.future.done():
+                    # Cancelled by the caller
+                    queue.remove(request)
+                    return None
+
+                account_bucket = self._account_bucket(request.account)
+                unit_bucket = self._unit_bucket(request.account, request.rac_id)
+                wait = max(account_bucket.wait_time(now), unit_bucket.wait_time(now) if unit_bucket else 0.0)
+                if wait > 0:
+                    next_wait = min(next_wait, wait)
+                    continue
+
+                queue.remove(request)
+                account_bucket.take(now)
+                if unit_bucket is not None:
+                    unit_bucket.take(now)
+                task = asyncio.create_task(self._run(request, now))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+                return None
+        return next_wait
+
+    async def _run(self, request: _Request, dispatched_at: float) -> None:
+        request.attempts += 1
+        if request.attempts == 1:
+            self._wait_time.record(dispatched_at - request.submitted_at)
+        self._dispatched += 1
+        try:
+            result = await request.operation()
+        except TooManyRequestsException as e:
+            self._throttled += 1
+            self._slow_down(request)
+            if request.attempts < self._max_attempts and not request.future.done():
+                logger.info("Command throttled by api (attempt %d), queue it again", request.attempts)
+                # Retry before the other commands of the same priority
+                self._enqueue(request, first=True)
+            elif not request.future.done():
+                request.future.set_exception(e)
+            return
+        except Exception as e:
+            if not request.future.done():
+                request.future.set_exception(e)
+            return
+
+        account_bucket = self._account_bucket(request.account)
+        account_bucket.rate = min(self._account_rate, account_bucket.rate + self._rate_increase)
+        if not request.future.done():
+            request.future.set_result(result)
+
+    def _slow_down(self, request: _Request) -> None:
+        now = time.monotonic()
+        account_bucket = self._account_bucket(request.account)
+        account_bucket.rate = max(self._min_account_rate, account_bucket.rate / 2)
+        account_bucket.drain(now)
+        unit_bucket = self._unit_bucket(request.account, request.rac_id)
+        if unit_bucket is not None:
+            unit_bucket.drain(now)
+        logger.debug("Account %s rate lowered to %.2f commands/s", request.account, account_bucket.rate)
+
+    def _enqueue(self, request: _Request, first: bool = False) -> None:
+        if first:
+            self._queues[request.priority].appendleft(request)
+        else:
+            self._queues[request.priority].append(request)
+        self._wakeup.set()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._dispatch_loop())
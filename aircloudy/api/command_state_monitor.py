@@ -4,9 +4,11 @@ import asyncio
 import logging
 import traceback
 from asyncio import Task
+from collections.abc import Awaitable
 
 from aircloudy.api.rac import get_commands_state
 from aircloudy.api.rac_models import CommandResponse
+from aircloudy.api.request_cache import RequestCache
 from aircloudy.contants import DEFAULT_REST_API_HOST, ApiCommandState, TokenSupplier
 
 logger = logging.getLogger(__name__)
@@ -64,6 +66,7 @@ class CommandStateMonitor:
     _update_interval: int
     _api_host: str
     _port: int
+    _request_cache: RequestCache | None
 
     _commands: dict[str, CommandState]
     _task_fetch_command_status: Task | None
@@ -76,11 +79,13 @@ class CommandStateMonitor:
         update_interval: int = 2,
         host: str = DEFAULT_REST_API_HOST,
         port: int = 443,
+        request_cache: RequestCache | None = None,
     ) -> None:
         self._token_supplier = token_supplier
         self._update_interval = update_interval
         self._api_host = host
         self._port = port
+        self._request_cache = request_cache
 
         self._lock = asyncio.Lock()
         self._commands = {}
@@ -95,6 +100,16 @@ class CommandStateMonitor:
                 self._task_fetch_command_status = asyncio.create_task(self._fetch_command_status_loop())
             return command_status
 
+    async def _get_commands_state(self, commands: list[CommandResponse]) -> dict[str, ApiCommandState]:
+        def fetch() -> Awaitable[dict[str, ApiCommandState]]:
+            return get_commands_state(self._token_supplier, commands, self._api_host, self._port)
+
+        if self._request_cache is None:
+            return await fetch()
+        key = ("get_commands_state", self._api_host, self._port, *sorted(c.commandId for c in commands))
+        # Command states change by themselves, only share in-flight requests
+        return await self._request_cache.get(key, fetch, ttl=0)
+
     async def _fetch_command_status_loop(self) -> None:
         logger.debug("Start fetch_command_status_loop")
         try:
@@ -105,9 +120,7 @@ class CommandStateMonitor:
 
                     commands_to_watch = [command_status.command for command_status in self._commands.values()]
                 try:
-                    commands_state = await get_commands_state(
-                        self._token_supplier, commands_to_watch, self._api_host, self._port
-                    )
+                    commands_state = await self._get_commands_state(commands_to_watch)
 
                     async with self._lock:
                         await asyncio.gather(
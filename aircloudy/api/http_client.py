@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 from typing import Literal
 
@@ -7,9 +8,10 @@ import aiohttp
 from aiohttp import TCPConnector
 
 from aircloudy.contants import DEFAULT_REST_API_HOST, SSL_CONTEXT, TokenSupplier
-from aircloudy.errors import ConnectionFailed
+from aircloudy.errors import ApiException, ConnectionFailed, HttpStatusException, RequestTimeoutException
 
 from .http_client_models import HttpResponse
+from .http_policy import DEFAULT_REQUEST_POLICY, RequestPolicy, circuit_breaker, parse_retry_after
 
 logger = logging.getLogger(__name__)
 
@@ -42,11 +44,86 @@ async def perform_request(
     do_not_raise_exception_on: tuple[int, ...] = (200,),
     host: str = DEFAULT_REST_API_HOST,
     port: int = 443,
+    policy: RequestPolicy | None = None,
 ) -> HttpResponse:
+    """Perform the request, retrying it as allowed by `policy`
+
+    :raises:
+        HttpStatusException: If the response status is not in `do_not_raise_exception_on`
+        ConnectionFailed: If the host could not be reached
+        RequestTimeoutException: If the host did not answer in time
+        CircuitOpenException: If the host failed too many times recently, the request was not sent
+    """
+    policy = policy if policy is not None else DEFAULT_REQUEST_POLICY
+    breaker = circuit_breaker(host, port)
+    max_attempts = policy.max_attempts if policy.is_idempotent(method) else 1
+
+    attempt = 0
+    while True:
+        attempt += 1
+        breaker.before_request()
+        try:
+            response = await _perform_request_once(
+                method, url, additional_headers, body, token_supplier, host, port, policy
+            )
+        except (ConnectionFailed, RequestTimeoutException) as e:
+            breaker.record_failure(policy)
+            error: ApiException = e
+            retry_after = None
+        except BaseException:
+            # Cancelled, or failed before reaching the host (token supplier...): says nothing about the host
+            breaker.release_probe()
+            raise
+        else:
+            if response.status >= 500:
+                breaker.record_failure(policy)
+            else:
+                breaker.record_success()
+
+            if response.status in do_not_raise_exception_on:
+                return HttpResponse(response.status, response.body)
+
+            retry_after = parse_retry_after(response.retry_after)
+            error = HttpStatusException(
+                response.status, response.body, response.status in policy.retry_statuses, retry_after
+            )
+
+        if not error.retryable or attempt >= max_attempts:
+            raise error
+
+        delay = policy.retry_delay(attempt, retry_after)
+        logger.info("%s %s failed (%s), retry in %.2fs (attempt %d)", method, url, error, delay, attempt)
+        await asyncio.sleep(delay)
+
+
+class _RawResponse:
+    status: int
+    body: str
+    retry_after: str | None
+
+    def __init__(self, status: int, body: str, retry_after: str | None) -> None:
+        self.status = status
+        self.body = body
+        self.retry_after = retry_after
+
+
+async def _perform_request_once(
+    method: Literal["GET", "POST", "PUT"],
+    url: str,
+    additional_headers: dict[str, str] | None,
+    body: object | None,
+    token_supplier: TokenSupplier | None,
+    host: str,
+    port: int,
+    policy: RequestPolicy,
+) -> _RawResponse:
     logger.debug("Perform %s %s on %s:%d, %s", method, url, host, port, body)
+    timeout = aiohttp.ClientTimeout(total=policy.total_timeout, connect=policy.connect_timeout)
     try:
         async with (
-            aiohttp.ClientSession(f"https://{host}:{port}", connector=TCPConnector(ssl=SSL_CONTEXT)) as session,
+            aiohttp.ClientSession(
+                f"https://{host}:{port}", connector=TCPConnector(ssl=SSL_CONTEXT), timeout=timeout
+            ) as session,
             session.request(
                 method, url, json=body, headers=await create_headers(host, additional_headers, token_supplier)
             ) as response_http,
@@ -54,10 +131,10 @@ async def perform_request(
             response_status = response_http.status
             response_body = await response_http.text()
             logger.debug("Response status=%d body=%s", response_status, response_body)
-
-            if response_status not in do_not_raise_exception_on:
-                raise Exception(f"Call failed (status={response_status} body={response_body})")
-
-            return HttpResponse(response_status, response_body)
-    except aiohttp.client_exceptions.ClientConnectorError as e:
+            return _RawResponse(response_status, response_body, response_http.headers.get("Retry-After"))
+    except TimeoutError as e:
+        raise RequestTimeoutException(f"Request {method} {url} to host {host} timed out") from e
+    except aiohttp.ClientConnectorError as e:
         raise ConnectionFailed(f"Failed to connect to host: {host}") from e
+    except aiohttp.ClientError as e:
+        raise ConnectionFailed(f"Request {method} {url} to host {host} failed: {e}") from e
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import datetime
+import email.utils
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Literal
+
+from ..errors import CircuitOpenException
+
+logger = logging.getLogger(__name__)
+
+type CircuitState = Literal["CLOSED", "OPEN", "HALF_OPEN"]
+
+IDEMPOTENT_METHODS = ("GET", "PUT")
+
+
+@dataclass(frozen=True)
+class RequestPolicy:
+    """How a request is sent and retried.
+
+    Only idempotent requests are retried (GET and PUT, or any method when `idempotent` is True), on connection
+    failures, timeouts and `retry_statuses`. The delay before a retry is the `Retry-After` of the response if any
+    (capped to `max_retry_after`), else a random delay up to `backoff_base * 2**(attempt - 1)` capped to `backoff_max`.
+    The circuit of a host opens after `failure_threshold` consecutive failures and rejects calls for `reset_timeout`
+    seconds, then lets a single probe through.
+    """
+
+    total_timeout: float = 30.0
+    connect_timeout: float = 10.0
+    max_attempts: int = 3
+    idempotent: bool | None = None
+    backoff_base: float = 0.5
+    backoff_max: float = 10.0
+    max_retry_after: float = 60.0
+    retry_statuses: frozenset[int] = field(default=frozenset({408, 429, 500, 502, 503, 504}))
+    failure_threshold: int = 5
+    reset_timeout: float = 30.0
+
+    def is_idempotent(self, method: str) -> bool:
+        return self.idempotent if self.idempotent is not None else method in IDEMPOTENT_METHODS
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retrying after the failed `attempt` (starting at 1)"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def retry_delay(self, attempt: int, retry_after: float | None) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return self.backoff(attempt)
+
+
+DEFAULT_REQUEST_POLICY = RequestPolicy()
+
+_DEFAULT_REQUEST_POLICIES: dict[str, RequestPolicy] = {
+    # Credentials must not be sent twice on a slow answer, failures are reported to the caller
+    "perform_login": RequestPolicy(max_attempts=1),
+    "refresh_token": RequestPolicy(max_attempts=1),
+    # Only reads the state of commands
+    "get_commands_state": RequestPolicy(idempotent=True),
+    # 429 is handled by the command scheduler, retrying here would bypass its pacing
+    "send_command": RequestPolicy(max_attempts=1),
+    "set_power_all": RequestPolicy(max_attempts=1),
+}
+
+_request_policies: dict[str, RequestPolicy] = dict(_DEFAULT_REQUEST_POLICIES)
+
+
+def request_policy(endpoint: str) -> RequestPolicy:
+    """Policy used by the api function named `endpoint`"""
+    return _request_policies.get(endpoint, DEFAULT_REQUEST_POLICY)
+
+
+def set_request_policy(endpoint: str, policy: RequestPolicy | None) -> None:
+    """Use `policy` for the api function named `endpoint`, None restores the default policy"""
+    if policy is None:
+        _request_policies.pop(endpoint, None)
+    else:
+        _request_policies[endpoint] = policy
+
+
+def reset_request_policies() -> None:
+    """Restore the default policy of every endpoint"""
+    _request_policies.clear()
+    _request_policies.update(_DEFAULT_REQUEST_POLICIES)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a `Retry-After` header, given either as seconds or as an HTTP date"""
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        logger.debug("Ignore invalid Retry-After header: %s", value)
+        return None
+    return max(0.0, (date - datetime.datetime.now(datetime.UTC)).total_seconds())
+
+
+class CircuitBreaker:
+    """Track consecutive failures of a host and reject calls while it is considered down"""
+
+    host: str
+    _failure_count: int
+    _state: CircuitState
+    _opened_at: float
+    _reset_timeout: float
+    _probe_in_flight: bool
+
+    def __init__(self, host: str) -> None:
+        self.host = host
+        self._failure_count = 0
+        self._state = "CLOSED"
+        self._opened_at = 0.0
+        self._reset_timeout = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> CircuitState:
+        return self._state
+
+    @property
+    def failure_count(self) -> int:
+        return self._failure_count
+
+    def before_request(self) -> None:
+        """
+        :raises:
+            CircuitOpenException: If the circuit is open, or half open with a probe already in flight
+        """
+        if self._state == "CLOSED":
+            return
+
+        remaining = self._opened_at + self._reset_timeout - time.monotonic()
+        if self._state == "OPEN" and remaining <= 0:
+            logger.info("Circuit of %s half open, let a probe request through", self.host)
+            self._state = "HALF_OPEN"
+        if self._state == "HALF_OPEN" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return
+        raise CircuitOpenException(self.host, max(0.0, remaining))
+
+    def record_success(self) -> None:
+        if self._state != "CLOSED":
+            logger.info("Circuit of %s closed", self.host)
+        self._state = "CLOSED"
+        self._failure_count = 0
+        self._probe_in_flight = False
+
+    def record_failure(self, policy: RequestPolicy) -> None:
+        self._failure_count += 1
+        self._probe_in_flight = False
+        if self._state == "HALF_OPEN" or self._failure_count >= policy.failure_threshold:
+            if self._state != "OPEN":
+                logger.warning("Circuit of %s opened after %d failures", self.host, self._failure_count)
+            self._state = "OPEN"
+            self._opened_at = time.monotonic()
+            self._reset_timeout = policy.reset_timeout
+
+    def release_probe(self) -> None:
+        """Let another probe through, the probe in flight ended without telling whether the host is up"""
+        self._probe_in_flight = False
+
+    def reset(self) -> None:
+        self.record_success()
+
+
+_circuit_breakers: dict[str, CircuitBreaker] = {}
+
+
+def circuit_breaker(host: str, port: int) -> CircuitBreaker:
+    """Circuit breaker shared by all requests to `host`:`port`"""
+    key = f"{host}:{port}"
+    breaker = _circuit_breakers.get(key)
+    if breaker is None:
+        breaker = CircuitBreaker(key)
+        _circuit_breakers[key] = breaker
+    return breaker
+
+
+def reset_circuit_breakers() -> None:
+    """Forget the failures of every host, the registry is shared by all clients of the process"""
+    _circuit_breakers.clear()
@@ -5,6 +5,7 @@ from aircloudy.contants import DEFAULT_REST_API_HOST, TokenSupplier
 
 from ..errors import AuthenticationFailedException
 from .http_client import perform_request
+from .http_policy import request_policy
 from .iam_models import AuthenticationSuccess, TokenRefreshSuccess, UserProfile
 
 logger = logging.getLogger(__name__)
@@ -23,6 +24,7 @@ async def perform_login(
         do_not_raise_exception_on=(200, 401),
         host=host,
         port=port,
+        policy=request_policy("perform_login"),
     )
 
     if response.status == 401:
@@ -35,7 +37,12 @@ async def fetch_profile(
     token_supplier: TokenSupplier, host: str = DEFAULT_REST_API_HOST, port: int = 443
 ) -> UserProfile:
     response = await perform_request(
-        "GET", "/iam/user/v2/who-am-i", token_supplier=token_supplier, host=host, port=port
+        "GET",
+        "/iam/user/v2/who-am-i",
+        token_supplier=token_supplier,
+        host=host,
+        port=port,
+        policy=request_policy("fetch_profile"),
     )
 
     return json.loads(response.body, object_hook=UserProfile)
@@ -51,6 +58,7 @@ async def refresh_token(
         token_supplier=refresh_token_supplier,
         host=host,
         port=port,
+        policy=request_policy("refresh_token"),
     )
 
     return json.loads(response.body, object_hook=TokenRefreshSuccess)
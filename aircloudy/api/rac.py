@@ -5,48 +5,66 @@ import logging
 
 from aircloudy.contants import DEFAULT_REST_API_HOST, ApiCommandState, Power, TokenSupplier
 
-from ..errors import TooManyRequestsException
+from ..errors import HttpStatusException, TooManyRequestsException
 from ..interior_unit_base import InteriorUnitBase
 from ..utils import utc_datetime_from_millis
 from .http_client import perform_request
+from .http_policy import request_policy
 from .rac_models import CommandResponse, InteriorUnitUserState, PowerAllResponse
 
 logger = logging.getLogger(__name__)
 
 
-async def get_interior_units(
+def interior_unit_from_api(d: dict) -> InteriorUnitBase:
+    return InteriorUnitBase(
+        d["id"],
+        d["name"],
+        d["roomTemperature"],
+        d["relativeTemperature"],
+        utc_datetime_from_millis(d["updatedAt"]),
+        d["online"],
+        utc_datetime_from_millis(d["lastOnlineUpdatedAt"]),
+        d["model"],
+        str(d["racTypeId"]),
+        d["serialNumber"],
+        d["vendorThingId"],
+        d["scheduleType"],
+        d["power"],
+        d["mode"],
+        d["iduTemperature"],
+        d["humidity"],
+        d["fanSpeed"],
+        d["fanSwing"],
+    )
+
+
+def parse_interior_units(body: str) -> list[InteriorUnitBase]:
+    return [interior_unit_from_api(d) for d in json.loads(body)]
+
+
+async def fetch_interior_units_payload(
     token_supplier: TokenSupplier, family_id: int, host: str = DEFAULT_REST_API_HOST, port: int = 443
-) -> list[InteriorUnitBase]:
+) -> str:
+    """Raw body of the interior units list, see `parse_interior_units`"""
     response = await perform_request(
-        "GET", f"/rac/ownership/groups/{family_id}/idu-list", token_supplier=token_supplier, host=host, port=port
+        "GET",
+        f"/rac/ownership/groups/{family_id}/idu-list",
+        token_supplier=token_supplier,
+        host=host,
+        port=port,
+        policy=request_policy("get_interior_units"),
     )
 
     if response.status != 200:
-        raise Exception(f"Call failed (status={response.status} body={response.body}")
-
-    return [
-        InteriorUnitBase(
-            d["id"],
-            d["name"],
-            d["roomTemperature"],
-            d["relativeTemperature"],
-            utc_datetime_from_millis(d["updatedAt"]),
-            d["online"],
-            utc_datetime_from_millis(d["lastOnlineUpdatedAt"]),
-            d["model"],
-            str(d["racTypeId"]),
-            d["serialNumber"],
-            d["vendorThingId"],
-            d["scheduleType"],
-            d["power"],
-            d["mode"],
-            d["iduTemperature"],
-            d["humidity"],
-            d["fanSpeed"],
-            d["fanSwing"],
-        )
-        for d in response.body_as_json
-    ]
+        raise HttpStatusException(response.status, response.body, False)
+
+    return response.body
+
+
+async def get_interior_units(
+    token_supplier: TokenSupplier, family_id: int, host: str = DEFAULT_REST_API_HOST, port: int = 443
+) -> list[InteriorUnitBase]:
+    return parse_interior_units(await fetch_interior_units_payload(token_supplier, family_id, host, port))
 
 
 async def get_commands_state(
@@ -59,6 +77,7 @@ async def get_commands_state(
         token_supplier=token_supplier,
         host=host,
         port=port,
+        policy=request_policy("get_commands_state"),
     )
 
     return {item["commandId"]: item["status"] for item in response.body_as_json}
@@ -86,6 +105,7 @@ async def send_command(
         token_supplier=token_supplier,
         host=host,
         port=port,
+        policy=request_policy("send_command"),
     )
 
     if response.status == 429:
@@ -99,7 +119,12 @@ async def request_refresh_interior_unit_state(
 ) -> None:
     logger.debug("Request refresh interior unit state for rac id=%s, family_id=%s", rac_id, family_id)
     await perform_request(
-        "PUT", f"/rac/status/{rac_id}?familyId={family_id}", token_supplier=token_supplier, host=host, port=port
+        "PUT",
+        f"/rac/status/{rac_id}?familyId={family_id}",
+        token_supplier=token_supplier,
+        host=host,
+        port=port,
+        policy=request_policy("request_refresh_interior_unit_state"),
     )
 
 
@@ -116,17 +141,19 @@ async def set_power(
         token_supplier=token_supplier,
         host=host,
         port=port,
+        policy=request_policy("set_power"),
     )
 
 
 async def set_power_all(
     token_supplier: TokenSupplier,
-    family_id: str,
+    family_id: int,
     power: Power,
     interior_units_state: list[InteriorUnitUserState],
     host: str = DEFAULT_REST_API_HOST,
     port: int = 443,
 ) -> PowerAllResponse:
+    """Switch several interior units on or off in a single call, the other values of their state are kept"""
     match power:
         case "ON":
             url = f"/rac/manage-idu/groups/{family_id}/idu/start"
@@ -141,11 +168,12 @@ async def set_power_all(
     response = await perform_request(
         "PUT",
         url,
-        body=json.dumps(units),
+        body=units,
         do_not_raise_exception_on=(200, 207),
         token_supplier=token_supplier,
         host=host,
         port=port,
+        policy=request_policy("set_power_all"),
     )
 
     return PowerAllResponse(response.body_as_json)
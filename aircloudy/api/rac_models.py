@@ -20,10 +20,12 @@ class PowerResult:
     success: bool
     errorMessage: str | None
     errorCode: int
-    commandResponse: CommandResponse
+    commandResponse: CommandResponse | None
 
     def __init__(self, data: dict) -> None:
         self.__dict__.update(data)
+        command_response = data.get("commandResponse")
+        self.commandResponse = CommandResponse(command_response) if command_response is not None else None
 
 
 @dataclass
@@ -33,6 +35,7 @@ class PowerAllResponse:
 
     def __init__(self, data: dict) -> None:
         self.__dict__.update(data)
+        self.resultSet = [PowerResult(result) for result in data.get("resultSet", [])]
 
 
 class InteriorUnitUserState:
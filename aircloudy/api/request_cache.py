@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# First item is the endpoint name, used by `invalidate`
+type RequestKey = tuple[Hashable, ...]
+
+
+@dataclass(frozen=True)
+class RequestCacheStats:
+    hits: int
+    misses: int
+    coalesced: int
+    invalidations: int
+    size: int
+
+
+class RequestCache:
+    """Share identical read requests between concurrent callers.
+
+    A request whose key is already in flight is not sent again, callers wait for the pending one. With a `ttl`
+    greater than 0, results are also kept for `ttl` seconds. `invalidate` drops cached results and detaches
+    pending requests, so callers coming after it always get data fetched after it.
+    A cache can be shared by several `HitachiAirCloud`: keys include the account.
+    """
+
+    _ttl: float
+    _entries: dict[RequestKey, tuple[float, Any]]
+    _in_flight: dict[RequestKey, asyncio.Task[Any]]
+    _generation: int
+
+    _hits: int
+    _misses: int
+    _coalesced: int
+    _invalidations: int
+
+    def __init__(self, ttl: float = 0.0) -> None:
+        self._ttl = ttl
+        self._entries = {}
+        self._in_flight = {}
+        self._generation = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._invalidations = 0
+
+    def stats(self) -> RequestCacheStats:
+        return RequestCacheStats(self._hits, self._misses, self._coalesced, self._invalidations, len(self._entries))
+
+    async def get[T](self, key: RequestKey, fetch: Callable[[], Awaitable[T]], ttl: float | None = None) -> T:
+        """Result of `fetch`, from the cache or from a pending identical request if possible
+
+        :param ttl: Overrides the ttl of the cache for this key, 0 to only share in-flight requests
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if time.monotonic() < expires_at:
+                self._hits += 1
+                return value
+            del self._entries[key]
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self._coalesced += 1
+        else:
+            self._misses += 1
+            task = asyncio.create_task(self._fetch(key, fetch, self._ttl if ttl is None else ttl))
+            self._in_flight[key] = task
+        # A cancelled caller must not cancel the request of the others
+        return await asyncio.shield(task)
+
+    async def _fetch[T](self, key: RequestKey, fetch: Callable[[], Awaitable[T]], ttl: float) -> T:
+        generation = self._generation
+        try:
+            value = await fetch()
+        finally:
+            if self._in_flight.get(key) is asyncio.current_task():
+                del self._in_flight[key]
+
+        if ttl > 0 and generation == self._generation:
+            self._entries[key] = (time.monotonic() + ttl, value)
+        return value
+
+    def invalidate(self, endpoint: str | None = None) -> None:
+        """Forget results of `endpoint`, or of all endpoints if None"""
+        self._invalidations += 1
+        self._generation += 1
+        if endpoint is None:
+            self._entries.clear()
+            self._in_flight.clear()
+            return
+        for key in [key for key in self._entries if key[0] == endpoint]:
+            del self._entries[key]
+        for key in [key for key in self._in_flight if key[0] == endpoint]:
+            del self._in_flight[key]
@@ -0,0 +1,326 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import time
+import traceback
+from collections import deque
+from collections.abc import Awaitable, Callable, Collection, Iterable
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Literal
+
+from .change_filter import ChangeFilter
+from .change_stream import ChangeStream
+from .interior_unit_changes import InteriorUnitChanges
+from .metrics import LatencyGauge, LatencySnapshot
+
+if TYPE_CHECKING:
+    from .interior_unit import InteriorUnit
+    from .interior_unit_base import InteriorUnitBase
+
+logger = logging.getLogger(__name__)
+
+type OverflowPolicy = Literal["DROP_OLDEST", "COALESCE_PER_UNIT", "BLOCK"]
+type ChangeHandler = Callable[[dict[int, InteriorUnitChanges]], Awaitable[None] | None]
+
+
+@dataclass(frozen=True)
+class ChangeSubscriptionStats:
+    queued: int
+    handled: int
+    dropped: int
+    coalesced: int
+    failed: int
+    handler_latency: LatencySnapshot
+
+
+class ChangeSelection:
+    """Interior units accepted by each change filter, evaluated before the update is applied
+
+    Changes of throttled units are handed back to their filter, which delivers them once the throttling is over.
+    """
+
+    _accepted: dict[ChangeFilter, set[int]]
+    _throttled: dict[ChangeFilter, set[int]]
+
+    def __init__(self, change_filters: Iterable[ChangeFilter]) -> None:
+        self._accepted = {change_filter: set() for change_filter in change_filters}
+        self._throttled = {change_filter: set() for change_filter in self._accepted}
+
+    def evaluate(self, current: InteriorUnit, incoming: InteriorUnitBase) -> None:
+        for change_filter, accepted in self._accepted.items():
+            match change_filter.decide(current, incoming):
+                case "ACCEPTED":
+                    accepted.add(incoming.rac_id)
+                case "THROTTLED":
+                    self._throttled[change_filter].add(incoming.rac_id)
+                case "REJECTED":
+                    pass
+
+    def hold_throttled(self, changes: dict[int, InteriorUnitChanges]) -> None:
+        for change_filter, throttled in self._throttled.items():
+            for rac_id in throttled:
+                change = changes.get(rac_id)
+                if change is not None:
+                    change_filter.hold(rac_id, change)
+
+    def select(
+        self, change_filter: ChangeFilter, changes: dict[int, InteriorUnitChanges]
+    ) -> dict[int, InteriorUnitChanges]:
+        accepted = self._accepted.get(change_filter)
+        if accepted is None:
+            return changes
+        return {rac_id: change for rac_id, change in changes.items() if rac_id in accepted}
+
+
+class ChangeSubscription:
+    """A change handler fed from its own bounded queue by a dedicated task.
+
+    The handler may be a plain function or a coroutine function. A plain function can be run in an executor
+    so a slow handler never holds the event loop.
+    """
+
+    _handler: ChangeHandler
+    _rac_ids: frozenset[int] | None
+    _overflow_policy: OverflowPolicy
+    _max_queue_size: int
+    _run_in_executor: bool
+    _executor: Executor | None
+    change_filter: ChangeFilter | None
+
+    _queue: deque[dict[int, InteriorUnitChanges]]
+    _queue_changed: asyncio.Condition
+    _worker: asyncio.Task | None
+    _closed: bool
+
+    _handled: int
+    _dropped: int
+    _coalesced: int
+    _failed: int
+    _handler_latency: LatencyGauge
+
+    def __init__(
+        self,
+        handler: ChangeHandler,
+        rac_ids: Collection[int] | None = None,
+        overflow_policy: OverflowPolicy = "DROP_OLDEST",
+        max_queue_size: int = 100,
+        run_in_executor: bool = False,
+        executor: Executor | None = None,
+        change_filter: ChangeFilter | None = None,
+    ) -> None:
+        if max_queue_size < 1:
+            raise ValueError("max_queue_size must be at least 1")
+
+        self._handler = handler
+        self._rac_ids = frozenset(rac_ids) if rac_ids is not None else None
+        self._overflow_policy = overflow_policy
+        self._max_queue_size = max_queue_size
+        self._run_in_executor = run_in_executor
+        self._executor = executor
+        self.change_filter = change_filter
+
+        self._queue = deque()
+        self._queue_changed = asyncio.Condition()
+        self._worker = None
+        self._closed = False
+
+        self._handled = 0
+        self._dropped = 0
+        self._coalesced = 0
+        self._failed = 0
+        self._handler_latency = LatencyGauge()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def stats(self) -> ChangeSubscriptionStats:
+        return ChangeSubscriptionStats(
+            len(self._queue),
+            self._handled,
+            self._dropped,
+            self._coalesced,
+            self._failed,
+            self._handler_latency.snapshot(),
+        )
+
+    async def offer(self, changes: dict[int, InteriorUnitChanges]) -> None:
+        if self._closed:
+            return
+
+        if self._rac_ids is not None:
+            changes = {rac_id: change for rac_id, change in changes.items() if rac_id in self._rac_ids}
+        if len(changes) == 0:
+            return
+
+        async with self._queue_changed:
+            if len(self._queue) >= self._max_queue_size:
+                match self._overflow_policy:
+                    case "DROP_OLDEST":
+                        self._queue.popleft()
+                        self._dropped += 1
+                    case "COALESCE_PER_UNIT":
+                        self._coalesce_into_last(changes)
+                        self._coalesced += 1
+                        return
+                    case "BLOCK":
+                        await self._queue_changed.wait_for(
+                            lambda: len(self._queue) < self._max_queue_size or self._closed
+                        )
+                        if self._closed:
+                            return
+
+            # Copied since the batch is shared between subscriptions and may be coalesced later
+            self._queue.append(dict(changes))
+            self._queue_changed.notify_all()
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._handle_queue_loop())
+
+    def _coalesce_into_last(self, changes: dict[int, InteriorUnitChanges]) -> None:
+        last = self._queue[-1]
+        for rac_id, change in changes.items():
+            previous = last.get(rac_id)
+            last[rac_id] = change if previous is None else previous.merge(change)
+
+    async def _handle_queue_loop(self) -> None:
+        while not self._closed:
+            async with self._queue_changed:
+                if len(self._queue) == 0:
+                    break
+                changes = self._queue.popleft()
+                self._queue_changed.notify_all()
+
+            started_at = time.perf_counter()
+            try:
+                await self._call_handler(changes)
+                self._handled += 1
+            except Exception:
+                self._failed += 1
+                logger.error("Unexpected error in change handler : %s", traceback.format_exc())
+            finally:
+                self._handler_latency.record(time.perf_counter() - started_at)
+
+    async def _call_handler(self, changes: dict[int, InteriorUnitChanges]) -> None:
+        if self._run_in_executor:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, self._handler, changes)
+        else:
+            result = self._handler(changes)
+
+        if inspect.isawaitable(result):
+            await result
+
+    async def close(self) -> None:
+        async with self._queue_changed:
+            self._closed = True
+            self._queue.clear()
+            self._queue_changed.notify_all()
+
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+
+
+class ChangeDispatcher:
+    _subscriptions: list[ChangeSubscription]
+    _streams: list[ChangeStream]
+    _trailing_deliveries: set[asyncio.Task[None]]
+
+    def __init__(self) -> None:
+        self._subscriptions = []
+        self._streams = []
+        self._trailing_deliveries = set()
+
+    def subscribe(
+        self,
+        handler: ChangeHandler,
+        rac_ids: Collection[int] | None = None,
+        overflow_policy: OverflowPolicy = "DROP_OLDEST",
+        max_queue_size: int = 100,
+        run_in_executor: bool = False,
+        executor: Executor | None = None,
+        change_filter: ChangeFilter | None = None,
+    ) -> ChangeSubscription:
+        subscription = ChangeSubscription(
+            handler, rac_ids, overflow_policy, max_queue_size, run_in_executor, executor, change_filter
+        )
+        self._subscriptions.append(subscription)
+        self._watch_trailing(change_filter)
+        return subscription
+
+    async def unsubscribe(self, subscription: ChangeSubscription) -> None:
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+        await subscription.close()
+
+    def open_stream(
+        self,
+        rac_ids: Collection[int] | None = None,
+        fields: Collection[str] | None = None,
+        max_pending_units: int = 1000,
+        change_filter: ChangeFilter | None = None,
+    ) -> ChangeStream:
+        stream = ChangeStream(rac_ids, fields, max_pending_units, self._streams.remove, change_filter)
+        self._streams.append(stream)
+        self._watch_trailing(change_filter)
+        return stream
+
+    def _watch_trailing(self, change_filter: ChangeFilter | None) -> None:
+        if change_filter is not None:
+            change_filter.on_trailing = lambda changes: self._publish_trailing(change_filter, changes)
+
+    def _publish_trailing(self, change_filter: ChangeFilter, changes: dict[int, InteriorUnitChanges]) -> None:
+        for stream in self._streams:
+            if stream.change_filter is change_filter:
+                stream.offer(changes)
+        for subscription in self._subscriptions:
+            if subscription.change_filter is change_filter:
+                task = asyncio.create_task(subscription.offer(changes))
+                self._trailing_deliveries.add(task)
+                task.add_done_callback(self._trailing_deliveries.discard)
+
+    def new_selection(self) -> ChangeSelection | None:
+        """Prepare the evaluation of change filters, None if no subscription nor stream has one"""
+        change_filters = {stream.change_filter for stream in self._streams if stream.change_filter is not None} | {
+            subscription.change_filter for subscription in self._subscriptions if subscription.change_filter is not None
+        }
+        return ChangeSelection(change_filters) if len(change_filters) > 0 else None
+
+    async def publish(self, changes: dict[int, InteriorUnitChanges], selection: ChangeSelection | None = None) -> None:
+        if selection is not None:
+            selection.hold_throttled(changes)
+        for stream in self._streams:
+            stream.offer(self._select(stream.change_filter, changes, selection))
+        for subscription in self._subscriptions:
+            await subscription.offer(self._select(subscription.change_filter, changes, selection))
+
+    @staticmethod
+    def _select(
+        change_filter: ChangeFilter | None, changes: dict[int, InteriorUnitChanges], selection: ChangeSelection | None
+    ) -> dict[int, InteriorUnitChanges]:
+        if change_filter is None or selection is None:
+            return changes
+        return selection.select(change_filter, changes)
+
+    def close_streams(self) -> None:
+        for stream in list(self._streams):
+            if stream.change_filter is not None:
+                stream.change_filter.close()
+            stream.close()
+
+    async def close(self) -> None:
+        """Close streams and subscriptions, cancelling their pending deliveries"""
+        self.close_streams()
+        for task in self._trailing_deliveries:
+            task.cancel()
+        subscriptions = self._subscriptions
+        self._subscriptions = []
+        for subscription in subscriptions:
+            if subscription.change_filter is not None:
+                subscription.change_filter.close()
+        await asyncio.gather(*[subscription.close() for subscription in subscriptions])
@@ -0,0 +1,392 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import queue
+import re
+import threading
+import traceback
+from array import array
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+from .errors import IllegalStateException
+from .interior_unit_base import InteriorUnitBase
+from .interior_unit_changes import InteriorUnitChanges
+from .serialization import interior_unit_changes_from_dict, interior_unit_changes_to_dict, millis_from_datetime
+from .utils import utc_datetime_from_millis
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ChangeFeedEntry:
+    sequence: int
+    rac_id: int
+    recorded_at: datetime.datetime
+    changes: InteriorUnitChanges
+
+
+@dataclass(frozen=True)
+class ChangeFeedRead:
+    """Result of a feed read.
+
+    If the requested cursor was evicted, `snapshot` holds the latest state of every unit and `entries` is empty:
+    the consumer must resync from the snapshot then resume from `cursor`.
+    """
+
+    cursor: int
+    entries: list[ChangeFeedEntry]
+    snapshot: dict[int, InteriorUnitBase] | None = None
+
+
+@dataclass
+class _SpillSegment:
+    path: Path
+    first_sequence: int
+    offsets: array
+    size: int
+
+
+# Entries to read from a spill segment file: path, offset of the first one and count
+type _SegmentRange = tuple[Path, int, int]
+
+
+@dataclass(frozen=True)
+class _Delete:
+    path: Path
+
+
+class _Stop:
+    pass
+
+
+class ChangeFeed:
+    """Sequenced log of applied interior unit changes.
+
+    Each change gets a monotonically increasing sequence number. The last `capacity` entries are kept in memory;
+    older ones are either dropped or, when `spill_path` is set, spilled by batch to JSON lines segment files
+    (`<spill_path>.<n>`) that can still be read. A segment holds `spill_segment_size` entries, the oldest segment
+    is deleted once there are more than `max_spill_segments`. Segments are written by a dedicated thread, so
+    `record` never waits on disk, and read in the default executor. If the writer stops on an error, the spilled
+    entries are dropped and the feed keeps only the last `capacity` entries.
+    Use `record` as an update listener of `HitachiAirCloud`.
+    """
+
+    _capacity: int
+    _entries: deque[ChangeFeedEntry]
+    _last_sequence: int
+    _latest_states: dict[int, InteriorUnitBase]
+    _appended: asyncio.Event
+
+    _spill_path: Path | None
+    _spill_batch_size: int
+    _spill_segment_size: int
+    _max_spill_segments: int
+    _spill_first_sequence: int
+    _segments: deque[_SpillSegment]
+    _next_segment: int
+    _spilled: int
+    _written: int
+    _unwritten: deque[ChangeFeedEntry]
+    _queue: queue.SimpleQueue[tuple[Path, bytes] | _Delete | Future[None] | _Stop]
+    _writer: threading.Thread | None
+    _writer_failed: bool
+    _closed: bool
+
+    def __init__(
+        self,
+        capacity: int = 10_000,
+        spill_path: str | Path | None = None,
+        spill_segment_size: int = 100_000,
+        max_spill_segments: int = 10,
+    ) -> None:
+        self._capacity = capacity
+        self._entries = deque()
+        self._last_sequence = 0
+        self._latest_states = {}
+        self._appended = asyncio.Event()
+
+        self._spill_path = Path(spill_path) if spill_path is not None else None
+        self._spill_batch_size = max(capacity // 10, 1)
+        self._spill_segment_size = max(spill_segment_size, 1)
+        self._max_spill_segments = max(max_spill_segments, 1)
+        self._spill_first_sequence = 1
+        self._segments = deque()
+        self._next_segment = 0
+        self._spilled = 0
+        self._written = 0
+        self._unwritten = deque()
+        self._queue = queue.SimpleQueue()
+        self._writer = None
+        self._writer_failed = False
+        self._closed = False
+        if self._spill_path is not None:
+            self._discard_previous_segments(self._spill_path)
+            self._writer = threading.Thread(
+                target=self._write_loop, name=f"ChangeFeed({self._spill_path})", daemon=True
+            )
+            self._writer.start()
+
+    @staticmethod
+    def _discard_previous_segments(spill_path: Path) -> None:
+        """Sequences restart at 1, segments left by a previous feed can't be resumed"""
+        pattern = re.compile(re.escape(spill_path.name) + r"\.\d+")
+        previous = [path for path in spill_path.parent.glob(spill_path.name + ".*") if pattern.fullmatch(path.name)]
+        if len(previous) > 0:
+            logger.warning("Discard %d spill segments of a previous feed in %s", len(previous), spill_path.parent)
+        for path in previous:
+            path.unlink()
+
+    @property
+    def last_sequence(self) -> int:
+        return self._last_sequence
+
+    @property
+    def first_available_sequence(self) -> int:
+        if self._spill_path is not None and self._spilled > 0:
+            return self._spill_first_sequence
+        return self._entries[0].sequence if len(self._entries) > 0 else self._last_sequence + 1
+
+    def record(self, interior_units: list[InteriorUnitBase], changes: dict[int, InteriorUnitChanges]) -> None:
+        for iu in interior_units:
+            self._latest_states[iu.rac_id] = iu
+
+        if self._writer_failed and self._spill_path is not None:
+            self._drop_spill()
+
+        now = datetime.datetime.now(datetime.UTC)
+        for rac_id, change in changes.items():
+            self._last_sequence += 1
+            self._entries.append(ChangeFeedEntry(self._last_sequence, rac_id, now, change))
+
+        if self._spill_path is None or self._closed:
+            while len(self._entries) > self._capacity:
+                self._entries.popleft()
+        elif len(self._entries) >= self._capacity + self._spill_batch_size:
+            self._spill([self._entries.popleft() for _ in range(len(self._entries) - self._capacity)])
+
+        if len(changes) > 0:
+            self._appended.set()
+
+    def _spill(self, entries: list[ChangeFeedEntry]) -> None:
+        """Hand the entries to the writer thread, they are read from memory until written"""
+        if self._spill_path is None:
+            return
+
+        self._forget_written()
+        for entry in entries:
+            segment = self._segments[-1] if len(self._segments) > 0 else None
+            if segment is None or len(segment.offsets) >= self._spill_segment_size:
+                segment = self._open_segment(self._spill_path, entry.sequence)
+            line = (
+                json.dumps(
+                    {
+                        "sequence": entry.sequence,
+                        "rac_id": entry.rac_id,
+                        "recorded_at": millis_from_datetime(entry.recorded_at),
+                        "changes": interior_unit_changes_to_dict(entry.changes),
+                    }
+                ).encode()
+                + b"\n"
+            )
+            segment.offsets.append(segment.size)
+            segment.size += len(line)
+            self._queue.put((segment.path, line))
+            self._unwritten.append(entry)
+            self._spilled += 1
+
+    def _drop_spill(self) -> None:
+        """Keep entries in memory only, spilled entries are no longer readable once the writer stopped"""
+        logger.warning("Change feed writer stopped, drop %d spilled entries and stop spilling", self._spilled)
+        self._spill_path = None
+        self._segments.clear()
+        self._unwritten.clear()
+        self._spilled = 0
+
+    def _open_segment(self, spill_path: Path, first_sequence: int) -> _SpillSegment:
+        segment = _SpillSegment(
+            spill_path.with_name(f"{spill_path.name}.{self._next_segment}"), first_sequence, array("q"), 0
+        )
+        self._next_segment += 1
+        self._segments.append(segment)
+        while len(self._segments) > self._max_spill_segments:
+            dropped = self._segments.popleft()
+            logger.debug("Drop spill segment %s", dropped.path)
+            self._queue.put(_Delete(dropped.path))
+        self._spill_first_sequence = self._segments[0].first_sequence
+        return segment
+
+    def _forget_written(self) -> None:
+        pending = self._spilled - self._written
+        while len(self._unwritten) > pending:
+            self._unwritten.popleft()
+
+    def _write_loop(self) -> None:
+        file: BinaryIO | None = None
+        waiters: list[Future[None]] = []
+        try:
+            stop = False
+            while not stop:
+                written = 0
+                waiters = []
+                item = self._queue.get()
+                while True:
+                    match item:
+                        case _Stop():
+                            stop = True
+                        case Future():
+                            waiters.append(item)
+                        case _Delete():
+                            if file is not None and file.name == str(item.path):
+                                file.close()
+                                file = None
+                            item.path.unlink(missing_ok=True)
+                        case (path, line):
+                            if file is None or file.name != str(path):
+                                if file is not None:
+                                    file.close()
+                                file = path.open("ab")
+                            file.write(line)
+                            written += 1
+                    if stop:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+
+                if file is not None:
+                    file.flush()
+                self._written += written
+                for waiter in waiters:
+                    waiter.set_result(None)
+        except Exception as e:
+            logger.error("Change feed writer stopped : %s", traceback.format_exc())
+            self._writer_failed = True
+            self._fail_waiters(waiters, e)
+        finally:
+            if file is not None:
+                file.close()
+
+    def _fail_waiters(self, waiters: list[Future[None]], error: Exception) -> None:
+        """Fail the flushes waiting for a writer that stopped, including the ones still queued"""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, Future):
+                waiters.append(item)
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_exception(IllegalStateException(f"Change feed writer stopped: {error!r}"))
+
+    async def flush(self) -> None:
+        """Wait until the entries spilled so far are written
+
+        :raises:
+            IllegalStateException: If the writer thread stopped on an error
+        """
+        if self._writer is None or self._closed:
+            return
+        if self._writer_failed:
+            raise IllegalStateException("Change feed writer stopped")
+        waiter: Future[None] = Future()
+        self._queue.put(waiter)
+        if self._writer_failed:
+            # The writer may have drained the queue before the waiter was put
+            self._fail_waiters([waiter], IllegalStateException("Writer stopped"))
+        await asyncio.wrap_future(waiter)
+
+    async def close(self) -> None:
+        """Stop the writer thread, entries recorded afterwards are no longer spilled"""
+        if self._writer is None or self._closed:
+            return
+        self._closed = True
+        self._queue.put(_Stop())
+        await asyncio.to_thread(self._writer.join)
+
+    async def read(self, cursor: int = 0, limit: int | None = None) -> ChangeFeedRead:
+        """Read entries recorded after `cursor` (the sequence of the last entry already consumed)"""
+        while True:
+            cursor = min(cursor, self._last_sequence)
+            if cursor + 1 < self.first_available_sequence:
+                logger.debug("Cursor %d was evicted, answer with compacted state", cursor)
+                return ChangeFeedRead(self._last_sequence, [], dict(self._latest_states))
+
+            ranges, in_memory = self._plan_read(cursor, limit)
+            try:
+                entries = await asyncio.to_thread(self._read_segments, ranges) if len(ranges) > 0 else []
+            except FileNotFoundError:
+                # The segment was evicted meanwhile, the cursor may be evicted too
+                logger.debug("Spill segment deleted while read, read again from %d", cursor)
+                continue
+            entries.extend(in_memory)
+            return ChangeFeedRead(entries[-1].sequence if len(entries) > 0 else cursor, entries)
+
+    def _plan_read(self, cursor: int, limit: int | None) -> tuple[list[_SegmentRange], list[ChangeFeedEntry]]:
+        """Ranges of the written entries to read from disk, and the following entries still in memory"""
+        ranges: list[_SegmentRange] = []
+        planned = 0
+        in_memory: list[ChangeFeedEntry] = []
+        if self._spilled > 0:
+            self._forget_written()
+            first_unwritten = (
+                self._unwritten[0].sequence
+                if len(self._unwritten) > 0
+                else self._segments[-1].first_sequence + len(self._segments[-1].offsets)
+            )
+            for segment in self._segments:
+                start = max(cursor + 1, segment.first_sequence)
+                end = min(segment.first_sequence + len(segment.offsets), first_unwritten)
+                if limit is not None:
+                    end = min(end, start + limit - planned)
+                if start < end:
+                    ranges.append((segment.path, segment.offsets[start - segment.first_sequence], end - start))
+                    planned += end - start
+
+            skip = max(cursor + 1 - first_unwritten, 0)
+            stop = None if limit is None else skip + limit - planned
+            in_memory.extend(itertools.islice(self._unwritten, skip, stop))
+
+        if limit is None or planned + len(in_memory) < limit:
+            first_in_memory = self._entries[0].sequence if len(self._entries) > 0 else self._last_sequence + 1
+            skip = max(cursor + 1 - first_in_memory, 0)
+            stop = None if limit is None else skip + limit - planned - len(in_memory)
+            in_memory.extend(itertools.islice(self._entries, skip, stop))
+        return ranges, in_memory
+
+    @staticmethod
+    def _read_segments(ranges: list[_SegmentRange]) -> list[ChangeFeedEntry]:
+        entries: list[ChangeFeedEntry] = []
+        for path, offset, count in ranges:
+            with path.open("rb") as f:
+                f.seek(offset)
+                for _ in range(count):
+                    line = f.readline()
+                    if len(line) == 0:
+                        logger.warning("Spill segment %s is shorter than expected", path)
+                        break
+                    d = json.loads(line)
+                    entries.append(
+                        ChangeFeedEntry(
+                            d["sequence"],
+                            d["rac_id"],
+                            utc_datetime_from_millis(d["recorded_at"]),
+                            interior_unit_changes_from_dict(d["changes"]),
+                        )
+                    )
+        return entries
+
+    async def wait(self, cursor: int) -> None:
+        """Wait until an entry is recorded after `cursor`"""
+        while self._last_sequence <= cursor:
+            self._appended.clear()
+            await self._appended.wait()
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Callable, Collection, Mapping
+from typing import TYPE_CHECKING, Literal
+
+from .errors import InvalidArgumentException
+from .interior_unit_changes import CHANGE_FIELDS, InteriorUnitChanges
+
+if TYPE_CHECKING:
+    from .interior_unit import InteriorUnit
+    from .interior_unit_base import InteriorUnitBase
+
+NUMERIC_FIELDS = frozenset({"room_temperature", "relative_temperature", "requested_temperature", "humidity"})
+
+type FilterDecision = Literal["ACCEPTED", "REJECTED", "THROTTLED"]
+
+
+class ChangeFilter:
+    """Decide, from the current and the incoming state, if an interior unit update is worth notifying.
+
+    Values are compared to the ones of the last accepted update of each unit (not to the previous update), so
+    a slow drift is notified once it crosses the dead-band.
+
+    :param fields: Only consider these fields (if None: the dead-band fields, or all fields if there is no dead-band)
+    :param dead_bands: Minimal absolute variation of numeric fields, like `{"room_temperature": 0.5}`
+    :param min_interval: Minimal delay in seconds between two accepted updates of the same unit. Updates within
+        that delay are merged and, if still significant, delivered to `on_trailing` once the delay is over, so the
+        last state of a unit is never lost.
+    """
+
+    _fields: tuple[str, ...]
+    _dead_bands: dict[str, float]
+    _min_interval: float | None
+
+    _reference_values: dict[int, tuple]
+    _accepted_at: dict[int, float]
+    _trailing_values: dict[int, tuple]
+    _trailing_changes: dict[int, InteriorUnitChanges]
+    _trailing_timers: dict[int, asyncio.TimerHandle]
+    on_trailing: Callable[[dict[int, InteriorUnitChanges]], None] | None
+
+    def __init__(
+        self,
+        fields: Collection[str] | None = None,
+        dead_bands: Mapping[str, float] | None = None,
+        min_interval: float | None = None,
+    ) -> None:
+        dead_bands = {} if dead_bands is None else dict(dead_bands)
+        default_fields = frozenset() if len(dead_bands) > 0 else CHANGE_FIELDS
+        fields = default_fields if fields is None else frozenset(fields)
+
+        unknown_fields = (fields | dead_bands.keys()) - CHANGE_FIELDS
+        if len(unknown_fields) > 0:
+            raise InvalidArgumentException(f"Unknown change fields: {', '.join(sorted(unknown_fields))}")
+        non_numeric_fields = dead_bands.keys() - NUMERIC_FIELDS
+        if len(non_numeric_fields) > 0:
+            raise InvalidArgumentException(f"Dead-band on non numeric fields: {', '.join(sorted(non_numeric_fields))}")
+
+        self._fields = tuple(sorted(fields | dead_bands.keys()))
+        self._dead_bands = dead_bands
+        self._min_interval = min_interval
+        self._reference_values = {}
+        self._accepted_at = {}
+        self._trailing_values = {}
+        self._trailing_changes = {}
+        self._trailing_timers = {}
+        self.on_trailing = None
+
+    def accepts(self, current: InteriorUnit, incoming: InteriorUnitBase) -> bool:
+        return self.decide(current, incoming) == "ACCEPTED"
+
+    def decide(self, current: InteriorUnit, incoming: InteriorUnitBase) -> FilterDecision:
+        """Accept, reject, or throttle (hold until the end of `min_interval`) the incoming update"""
+        rac_id = incoming.rac_id
+        reference_values = self._reference_values.get(rac_id)
+        if reference_values is None:
+            reference_values = tuple(getattr(current, field) for field in self._fields)
+            self._reference_values[rac_id] = reference_values
+
+        incoming_values = tuple(getattr(incoming, field) for field in self._fields)
+        if rac_id in self._trailing_timers:
+            # Merged with the held update, even if not significant: it may cancel it
+            self._trailing_values[rac_id] = incoming_values
+            return "THROTTLED"
+        if not self._is_significant_values(reference_values, incoming_values):
+            return "REJECTED"
+
+        now = time.monotonic()
+        if self._min_interval is not None:
+            accepted_at = self._accepted_at.get(rac_id)
+            if accepted_at is not None and now - accepted_at < self._min_interval:
+                self._trailing_values[rac_id] = incoming_values
+                return "THROTTLED"
+
+        self._trailing_values.pop(rac_id, None)
+        self._reference_values[rac_id] = incoming_values
+        self._accepted_at[rac_id] = now
+        return "ACCEPTED"
+
+    def hold(self, rac_id: int, change: InteriorUnitChanges) -> None:
+        """Keep the change of a throttled update, to deliver it at the end of the throttling delay"""
+        previous = self._trailing_changes.get(rac_id)
+        self._trailing_changes[rac_id] = change if previous is None else previous.merge(change)
+        if rac_id not in self._trailing_timers:
+            delay = self._accepted_at.get(rac_id, 0) + (self._min_interval or 0) - time.monotonic()
+            self._trailing_timers[rac_id] = asyncio.get_running_loop().call_later(
+                max(0.0, delay), self._deliver_trailing, rac_id
+            )
+
+    def close(self) -> None:
+        """Drop the held updates"""
+        for timer in self._trailing_timers.values():
+            timer.cancel()
+        self._trailing_timers.clear()
+        self._trailing_changes.clear()
+        self._trailing_values.clear()
+
+    def _deliver_trailing(self, rac_id: int) -> None:
+        self._trailing_timers.pop(rac_id, None)
+        values = self._trailing_values.pop(rac_id, None)
+        change = self._trailing_changes.pop(rac_id, None)
+        if values is None or change is None or not change.has_changes:
+            return
+        if not self._is_significant_values(self._reference_values[rac_id], values):
+            return
+        self._reference_values[rac_id] = values
+        self._accepted_at[rac_id] = time.monotonic()
+        if self.on_trailing is not None:
+            self.on_trailing({rac_id: change})
+
+    def _is_significant_values(self, reference_values: tuple, values: tuple) -> bool:
+        return any(
+            self._is_significant(field, reference, value)
+            for field, reference, value in zip(self._fields, reference_values, values, strict=True)
+        )
+
+    def _is_significant(self, field: str, reference: object, value: object) -> bool:
+        dead_band = self._dead_bands.get(field)
+        if dead_band is None:
+            return reference != value
+        return abs(value - reference) >= dead_band  # type: ignore[operator]
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Callable, Collection
+from types import TracebackType
+from typing import TYPE_CHECKING, Self
+
+from .errors import InvalidArgumentException
+from .interior_unit_changes import CHANGE_FIELDS, InteriorUnitChanges
+
+if TYPE_CHECKING:
+    from .change_filter import ChangeFilter
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeStream:
+    """Async iterator over batches of interior unit changes.
+
+    While the consumer lags, changes of the same unit are merged, so the buffer holds at most one pending change
+    per unit. If more than `max_pending_units` units are pending, the oldest pending unit is dropped.
+    """
+
+    _rac_ids: frozenset[int] | None
+    _fields: frozenset[str] | None
+    _max_pending_units: int
+    _on_close: Callable[[ChangeStream], None] | None
+    change_filter: ChangeFilter | None
+
+    _pending: dict[int, InteriorUnitChanges]
+    _available: asyncio.Event
+    _closed: bool
+
+    dropped: int
+
+    def __init__(
+        self,
+        rac_ids: Collection[int] | None = None,
+        fields: Collection[str] | None = None,
+        max_pending_units: int = 1000,
+        on_close: Callable[[ChangeStream], None] | None = None,
+        change_filter: ChangeFilter | None = None,
+    ) -> None:
+        if fields is not None:
+            unknown_fields = set(fields) - CHANGE_FIELDS
+            if len(unknown_fields) > 0:
+                raise InvalidArgumentException(f"Unknown change fields: {', '.join(sorted(unknown_fields))}")
+
+        self._rac_ids = frozenset(rac_ids) if rac_ids is not None else None
+        self._fields = frozenset(fields) if fields is not None else None
+        self._max_pending_units = max_pending_units
+        self._on_close = on_close
+        self.change_filter = change_filter
+
+        self._pending = {}
+        self._available = asyncio.Event()
+        self._closed = False
+        self.dropped = 0
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def offer(self, changes: dict[int, InteriorUnitChanges]) -> None:
+        if self._closed:
+            return
+
+        for rac_id, change in changes.items():
+            if not self._accept(rac_id, change):
+                continue
+
+            previous = self._pending.pop(rac_id, None)
+            self._pending[rac_id] = change if previous is None else previous.merge(change)
+            if len(self._pending) > self._max_pending_units:
+                del self._pending[next(iter(self._pending))]
+                self.dropped += 1
+
+        if len(self._pending) > 0:
+            self._available.set()
+
+    def _accept(self, rac_id: int, change: InteriorUnitChanges) -> bool:
+        if self._rac_ids is not None and rac_id not in self._rac_ids:
+            return False
+        if self._fields is not None:
+            return any(getattr(change, field) is not None for field in self._fields)
+        return True
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._available.set()
+        if self._on_close is not None:
+            self._on_close(self)
+
+    def __aiter__(self) -> Self:
+        return self
+
+    async def __anext__(self) -> dict[int, InteriorUnitChanges]:
+        while len(self._pending) == 0:
+            if self._closed:
+                raise StopAsyncIteration
+            self._available.clear()
+            await self._available.wait()
+
+        batch = self._pending
+        self._pending = {}
+        return batch
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> bool:
+        self.close()
+        return False
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .api.rac_models import InteriorUnitUserState
+from .contants import CommandPriority
+from .errors import CommandFailedException, InvalidArgumentException
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OutboxEntry:
+    command: InteriorUnitUserState
+    priority: CommandPriority
+    expires_at: float
+    future: asyncio.Future[None]
+    timer: asyncio.TimerHandle | None = None
+
+
+class CommandOutbox:
+    """Commands waiting for the api to be reachable again.
+
+    Only the last command of each unit is kept: a newer one replaces it and its callers get the outcome of the newer
+    one. Commands not replayed within `ttl` seconds fail with `CommandFailedException`, even if nothing else is
+    queued meanwhile; when `max_size` units already wait, the oldest command is dropped the same way.
+    """
+
+    _max_size: int
+    _ttl: float
+    _entries: OrderedDict[int, OutboxEntry]
+
+    def __init__(self, max_size: int = 100, ttl: float = 300.0) -> None:
+        if max_size < 1:
+            raise InvalidArgumentException("max_size must be at least 1")
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, command: InteriorUnitUserState, priority: CommandPriority) -> asyncio.Future[None]:
+        """Queue `command`, the returned future is resolved once it was replayed"""
+        self.expire()
+        loop = asyncio.get_running_loop()
+        expires_at = loop.time() + self._ttl
+        entry = self._entries.pop(command.rac_id, None)
+        if entry is not None:
+            logger.debug("Queued command for %d replaced by %s", command.rac_id, command)
+            _cancel_timer(entry)
+            entry.command = command
+            entry.priority = priority
+            entry.expires_at = expires_at
+        else:
+            entry = OutboxEntry(command, priority, expires_at, loop.create_future())
+            if len(self._entries) >= self._max_size:
+                _, dropped = self._entries.popitem(last=False)
+                logger.warning("Outbox full, drop command %s", dropped.command)
+                _cancel_timer(dropped)
+                _fail(dropped, "Command dropped, too many commands waiting for the api")
+        self._queue(entry)
+        return entry.future
+
+    def expire(self) -> None:
+        now = asyncio.get_running_loop().time()
+        for entry in [entry for entry in self._entries.values() if entry.expires_at <= now]:
+            self._expire(entry)
+
+    def _expire(self, entry: OutboxEntry) -> None:
+        if self._entries.get(entry.command.rac_id) is not entry:
+            return
+        del self._entries[entry.command.rac_id]
+        _cancel_timer(entry)
+        logger.warning("Queued command %s expired", entry.command)
+        _fail(entry, "Command expired before the api was reachable again")
+
+    def _queue(self, entry: OutboxEntry) -> None:
+        self._entries[entry.command.rac_id] = entry
+        entry.timer = asyncio.get_running_loop().call_at(entry.expires_at, self._expire, entry)
+
+    def take(self) -> list[OutboxEntry]:
+        """Remove and return the commands still valid, oldest first"""
+        self.expire()
+        entries = list(self._entries.values())
+        for entry in entries:
+            _cancel_timer(entry)
+        self._entries.clear()
+        return entries
+
+    def give_back(self, entries: list[OutboxEntry]) -> None:
+        """Queue again entries that could not be replayed, unless a newer command was queued for their unit"""
+        for entry in reversed(entries):
+            if entry.future.done():
+                continue
+            newer = self._entries.get(entry.command.rac_id)
+            if newer is not None:
+                newer.future.add_done_callback(functools.partial(_copy_outcome, entry))
+                continue
+            self._queue(entry)
+            self._entries.move_to_end(entry.command.rac_id, last=False)
+
+    def clear(self, reason: str) -> None:
+        for entry in self._entries.values():
+            _cancel_timer(entry)
+            _fail(entry, reason)
+        self._entries.clear()
+
+
+def _cancel_timer(entry: OutboxEntry) -> None:
+    if entry.timer is not None:
+        entry.timer.cancel()
+        entry.timer = None
+
+
+def _fail(entry: OutboxEntry, reason: str) -> None:
+    if not entry.future.done():
+        entry.future.set_exception(CommandFailedException(reason))
+
+
+def _copy_outcome(entry: OutboxEntry, future: asyncio.Future[None]) -> None:
+    if entry.future.done():
+        return
+    if future.cancelled():
+        entry.future.cancel()
+        return
+    error = future.exception()
+    if error is not None:
+        entry.future.set_exception(error)
+    else:
+        entry.future.set_result(None)
@@ -25,3 +25,24 @@ type ScheduleType = Literal[
     "WEEKLY_TIMER_ENABLED",
     "HOLIDAY_MODE_ENABLED",
 ]
+
+# Interactive commands are sent before automation ones
+type CommandPriority = Literal["INTERACTIVE", "AUTOMATION"]
+
+# Where the current state of an interior unit comes from
+type StateSource = Literal["SNAPSHOT", "STORE", "REST", "NOTIFICATION"]
+
+# What send_command does when the unit is offline: raise, or hold the state until the unit is back online
+type OfflinePolicy = Literal["RAISE", "HOLD"]
+
+# How interior units changes are received: pushed by the notification websocket or polled from the api
+type NotificationMode = Literal["WEBSOCKET", "POLLING"]
+
+# HEALTHY: api and notifications reachable, DEGRADED: one of them is down, OFFLINE: both are down
+type HealthState = Literal["HEALTHY", "DEGRADED", "OFFLINE"]
+
+POWER_VALUES: tuple[Power, ...] = ("OFF", "ON")
+OPERATING_MODE_VALUES: tuple[OperatingMode, ...] = ("AUTO", "COOLING", "DRY", "FAN", "HEATING")
+FAN_SPEED_VALUES: tuple[FanSpeed, ...] = ("LV1", "LV2", "LV3", "LV4", "LV5", "AUTO")
+FAN_SWING_VALUES: tuple[FanSwing, ...] = ("OFF", "VERTICAL", "HORIZONTAL", "BOTH", "AUTO")
+COMMAND_PRIORITIES: tuple[CommandPriority, ...] = ("INTERACTIVE", "AUTOMATION")
@@ -48,6 +48,43 @@ class AuthenticationFailedException(Exception):
         Exception.__init__(self, message)
 
 
-class ConnectionFailed(Exception):
-    def __init__(self, message: str) -> None:
+class ApiException(Exception):
+    """Failure of an api call, `retryable` tells if the same call may succeed later"""
+
+    retryable: bool
+
+    def __init__(self, message: str, retryable: bool) -> None:
         Exception.__init__(self, message)
+        self.retryable = retryable
+
+
+class ConnectionFailed(ApiException):
+    def __init__(self, message: str) -> None:
+        ApiException.__init__(self, message, True)
+
+
+class RequestTimeoutException(ApiException):
+    def __init__(self, message: str) -> None:
+        ApiException.__init__(self, message, True)
+
+
+class HttpStatusException(ApiException):
+    status: int
+    body: str
+    retry_after: float | None
+
+    def __init__(self, status: int, body: str, retryable: bool, retry_after: float | None = None) -> None:
+        ApiException.__init__(self, f"Call failed (status={status} body={body})", retryable)
+        self.status = status
+        self.body = body
+        self.retry_after = retry_after
+
+
+class CircuitOpenException(ApiException):
+    """The api host failed repeatedly, calls are rejected without being sent until `retry_after` seconds"""
+
+    retry_after: float
+
+    def __init__(self, host: str, retry_after: float) -> None:
+        ApiException.__init__(self, f"Circuit open for {host}, retry in {retry_after:.1f}s", True)
+        self.retry_after = retry_after
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable
+from typing import Literal
+
+import numpy as np
+import numpy.typing as npt
+
+from .contants import FanSpeed, OperatingMode, Power
+from .interior_unit_base import InteriorUnitBase
+from .interior_unit_changes import InteriorUnitChanges
+from .state_codes import fan_speed_code, fan_swing_code, operating_mode_code, power_code
+
+type NumericColumn = Literal["room_temperature", "relative_temperature", "requested_temperature", "humidity"]
+type CategoricalColumn = Literal["family_id", "power", "operating_mode", "fan_speed", "fan_swing", "online"]
+type Mask = npt.NDArray[np.bool_]
+
+_DTYPES: dict[str, type[np.generic]] = {
+    "rac_id": np.int64,
+    "family_id": np.int64,
+    "room_temperature": np.float64,
+    "relative_temperature": np.float64,
+    "requested_temperature": np.float64,
+    "humidity": np.int32,
+    "power": np.int8,
+    "operating_mode": np.int8,
+    "fan_speed": np.int8,
+    "fan_swing": np.int8,
+    "online": np.int8,
+}
+
+
+class FleetView:
+    """Columnar view of interior units state, possibly spanning several accounts (requires the `numpy` extra).
+
+    Each field is stored in its own numpy array (categorical fields as codes from `state_codes`), one row per unit.
+    Rows are updated from the change masks, so only changed columns are written, and dropped by `remove()` (fed by
+    `HitachiAirCloud.add_removal_listener`). Queries are array operations, masks are boolean arrays.
+    """
+
+    _rows: dict[int, int]
+    _names: list[str]
+    _size: int
+    _columns: dict[str, npt.NDArray[np.generic]]
+
+    def __init__(self, capacity: int = 64) -> None:
+        self._rows = {}
+        self._names = []
+        self._size = 0
+        self._columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in _DTYPES.items()}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def listener(self, family_id: int = 0) -> Callable[[list[InteriorUnitBase], dict[int, InteriorUnitChanges]], None]:
+        """Update listener feeding this view with the units of one account"""
+        return lambda interior_units, changes: self.update(family_id, interior_units, changes)
+
+    def update(
+        self, family_id: int, interior_units: list[InteriorUnitBase], changes: dict[int, InteriorUnitChanges]
+    ) -> None:
+        columns = self._columns
+        for iu in interior_units:
+            row = self._rows.get(iu.rac_id)
+            if row is None:
+                self._append(family_id, iu)
+                continue
+
+            change = changes.get(iu.rac_id)
+            if change is None:
+                continue
+            if change.name is not None:
+                self._names[row] = iu.name
+            if change.room_temperature is not None:
+                columns["room_temperature"][row] = iu.room_temperature
+            if change.relative_temperature is not None:
+                columns["relative_temperature"][row] = iu.relative_temperature
+            if change.requested_temperature is not None:
+                columns["requested_temperature"][row] = iu.requested_temperature
+            if change.humidity is not None:
+                columns["humidity"][row] = iu.humidity
+            if change.power is not None:
+                columns["power"][row] = power_code(iu.power)
+            if change.operating_mode is not None:
+                columns["operating_mode"][row] = operating_mode_code(iu.operating_mode)
+            if change.fan_speed is not None:
+                columns["fan_speed"][row] = fan_speed_code(iu.fan_speed)
+            if change.fan_swing is not None:
+                columns["fan_swing"][row] = fan_swing_code(iu.fan_swing)
+            if change.online is not None:
+                columns["online"][row] = iu.online
+
+    def _append(self, family_id: int, iu: InteriorUnitBase) -> None:
+        row = self._size
+        if row == len(self._columns["rac_id"]):
+            # Double the capacity so appends stay amortized O(1)
+            self._columns = {
+                name: np.concatenate((values, np.zeros_like(values))) for name, values in self._columns.items()
+            }
+        self._rows[iu.rac_id] = row
+        self._names.append(iu.name)
+        self._size += 1
+        columns = self._columns
+        columns["rac_id"][row] = iu.rac_id
+        columns["family_id"][row] = family_id
+        columns["room_temperature"][row] = iu.room_temperature
+        columns["relative_temperature"][row] = iu.relative_temperature
+        columns["requested_temperature"][row] = iu.requested_temperature
+        columns["humidity"][row] = iu.humidity
+        columns["power"][row] = power_code(iu.power)
+        columns["operating_mode"][row] = operating_mode_code(iu.operating_mode)
+        columns["fan_speed"][row] = fan_speed_code(iu.fan_speed)
+        columns["fan_swing"][row] = fan_swing_code(iu.fan_swing)
+        columns["online"][row] = iu.online
+
+    def remove(self, rac_ids: Iterable[int]) -> None:
+        """Drop the rows of interior units no longer part of their account, the last row takes the freed place"""
+        for rac_id in rac_ids:
+            row = self._rows.pop(rac_id, None)
+            if row is None:
+                continue
+            last = self._size - 1
+            if row != last:
+                self._rows[int(self._columns["rac_id"][last])] = row
+                self._names[row] = self._names[last]
+                for values in self._columns.values():
+                    values[row] = values[last]
+            self._names.pop()
+            self._size = last
+
+    def column(self, name: str) -> npt.NDArray[np.generic]:
+        """Read-only view of a column, valid until the next update"""
+        values = self._columns[name][: self._size]
+        values.flags.writeable = False
+        return values
+
+    def name(self, rac_id: int) -> str:
+        return self._names[self._rows[rac_id]]
+
+    def mask(
+        self,
+        family_id: int | None = None,
+        power: Power | None = None,
+        operating_mode: OperatingMode | None = None,
+        fan_speed: FanSpeed | None = None,
+        online: bool | None = None,
+    ) -> Mask:
+        """Rows matching all given criteria"""
+        criteria: list[tuple[str, int]] = []
+        if family_id is not None:
+            criteria.append(("family_id", family_id))
+        if power is not None:
+            criteria.append(("power", power_code(power)))
+        if operating_mode is not None:
+            criteria.append(("operating_mode", operating_mode_code(operating_mode)))
+        if fan_speed is not None:
+            criteria.append(("fan_speed", fan_speed_code(fan_speed)))
+        if online is not None:
+            criteria.append(("online", int(online)))
+
+        result = np.ones(self._size, dtype=np.bool_)
+        for column, code in criteria:
+            result &= self.column(column) == code
+        return result
+
+    def select(self, mask: Mask) -> list[int]:
+        """Interior unit ids of the rows selected by `mask`"""
+        return [int(rac_id) for rac_id in self.column("rac_id")[mask]]
+
+    def count(self, mask: Mask) -> int:
+        return int(np.count_nonzero(mask))
+
+    def far_from_setpoint(self, delta: float, mask: Mask | None = None) -> list[int]:
+        """Interior unit ids whose room temperature is more than `delta` away from the requested temperature"""
+        room = self.column("room_temperature").astype(np.float64)
+        requested = self.column("requested_temperature").astype(np.float64)
+        far = np.abs(room - requested) > delta
+        if mask is not None:
+            far &= mask
+        return self.select(far)
+
+    def mean(self, column: NumericColumn, mask: Mask | None = None) -> float | None:
+        values = self.column(column) if mask is None else self.column(column)[mask]
+        return float(values.mean()) if len(values) > 0 else None
+
+    def mean_by(self, column: NumericColumn, group_by: CategoricalColumn, mask: Mask | None = None) -> dict[int, float]:
+        """Mean of `column` by value (or code) of `group_by`"""
+        keys = self.column(group_by)
+        values = self.column(column).astype(np.float64)
+        if mask is not None:
+            keys = keys[mask]
+            values = values[mask]
+        groups, inverse = np.unique(keys, return_inverse=True)
+        means = np.bincount(inverse, weights=values) / np.bincount(inverse)
+        return {int(key): float(mean) for key, mean in zip(groups, means, strict=True)}
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import datetime
+import logging
+import traceback
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from .contants import HealthState, StateSource
+from .errors import CircuitOpenException, ConnectionFailed, HttpStatusException, RequestTimeoutException
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class HealthTransition:
+    previous: HealthState
+    current: HealthState
+    at: datetime.datetime
+    reason: str
+
+
+@dataclass(frozen=True)
+class Staleness:
+    """How much the known state of an interior unit can be trusted"""
+
+    source: StateSource
+    age: datetime.timedelta
+    health: HealthState
+
+    @property
+    def is_stale(self) -> bool:
+        """True if the state wasn't confirmed by the api, or may have changed without being notified"""
+        return self.health != "HEALTHY" or self.source in ("SNAPSHOT", "STORE")
+
+
+type HealthListener = Callable[[HealthTransition], None]
+
+
+class HealthMonitor:
+    """Health of the connection, derived from the availability of the api and of the notification socket"""
+
+    _api_available: bool
+    _notifications_available: bool
+    _since: datetime.datetime
+    _transitions: deque[HealthTransition]
+    _listeners: list[HealthListener]
+
+    def __init__(self, max_transitions: int = 100) -> None:
+        self._api_available = True
+        self._notifications_available = True
+        self._since = datetime.datetime.now(datetime.UTC)
+        self._transitions = deque(maxlen=max_transitions)
+        self._listeners = []
+
+    @property
+    def state(self) -> HealthState:
+        if self._api_available and self._notifications_available:
+            return "HEALTHY"
+        if self._api_available or self._notifications_available:
+            return "DEGRADED"
+        return "OFFLINE"
+
+    @property
+    def api_available(self) -> bool:
+        return self._api_available
+
+    @property
+    def notifications_available(self) -> bool:
+        return self._notifications_available
+
+    @property
+    def since(self) -> datetime.datetime:
+        """When the current state was entered"""
+        return self._since
+
+    @property
+    def transitions(self) -> list[HealthTransition]:
+        """Last transitions, oldest first"""
+        return list(self._transitions)
+
+    def add_listener(self, listener: HealthListener) -> None:
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: HealthListener) -> None:
+        self._listeners.remove(listener)
+
+    def api_failed(self, reason: str) -> None:
+        self._set(reason, api_available=False)
+
+    def api_recovered(self) -> None:
+        self._set("api reachable", api_available=True)
+
+    def notifications_lost(self, reason: str) -> None:
+        self._set(reason, notifications_available=False)
+
+    def notifications_recovered(self) -> None:
+        self._set("notifications connected", notifications_available=True)
+
+    def _set(self, reason: str, api_available: bool | None = None, notifications_available: bool | None = None) -> None:
+        previous = self.state
+        if api_available is not None:
+            self._api_available = api_available
+        if notifications_available is not None:
+            self._notifications_available = notifications_available
+        current = self.state
+        if current == previous:
+            return
+
+        self._since = datetime.datetime.now(datetime.UTC)
+        transition = HealthTransition(previous, current, self._since, reason)
+        self._transitions.append(transition)
+        logger.log(
+            logging.INFO if current == "HEALTHY" else logging.WARNING,
+            "Health %s -> %s (%s)",
+            previous,
+            current,
+            reason,
+        )
+        for listener in self._listeners:
+            try:
+                listener(transition)
+            except Exception:
+                logger.error("Unexpected error in health listener : %s", traceback.format_exc())
+
+
+def is_api_unavailable(error: BaseException) -> bool:
+    """True if `error` means the api can't be reached, rather than the request being wrong or throttled"""
+    if isinstance(error, HttpStatusException):
+        return error.status >= 500
+    return isinstance(error, ConnectionFailed | RequestTimeoutException | CircuitOpenException)
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import bisect
+import datetime
+import math
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Literal
+
+from .contants import FanSpeed, FanSwing, OperatingMode, Power
+from .interior_unit_base import InteriorUnitBase
+from .interior_unit_changes import InteriorUnitChanges
+from .serialization import millis_from_datetime
+from .state_codes import pack_state, unpack_state
+from .utils import utc_datetime_from_millis
+
+type HistoryField = Literal["room_temperature", "relative_temperature", "requested_temperature"]
+
+
+@dataclass(frozen=True)
+class HistorySample:
+    recorded_at: datetime.datetime
+    room_temperature: float
+    relative_temperature: float
+    requested_temperature: float
+    power: Power | None
+    operating_mode: OperatingMode | None
+    fan_speed: FanSpeed | None
+    fan_swing: FanSwing | None
+    online: bool
+
+
+@dataclass(frozen=True)
+class HistoryBucket:
+    start: datetime.datetime
+    count: int
+    min: float
+    max: float
+    mean: float
+
+
+class UnitHistory:
+    """Fixed capacity ring buffer of samples of one interior unit, stored column by column in arrays"""
+
+    _capacity: int
+    _size: int
+    _next: int
+    _timestamps: array
+    _room_temperatures: array
+    _relative_temperatures: array
+    _requested_temperatures: array
+    _states: array
+
+    def __init__(self, capacity: int) -> None:
+        self._capacity = capacity
+        self._size = 0
+        self._next = 0
+        self._timestamps = array("q", bytes(8 * capacity))
+        self._room_temperatures = array("d", bytes(8 * capacity))
+        self._relative_temperatures = array("d", bytes(8 * capacity))
+        self._requested_temperatures = array("d", bytes(8 * capacity))
+        self._states = array("i", bytes(4 * capacity))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _position(self, index: int) -> int:
+        return (self._next - self._size + index) % self._capacity
+
+    def timestamp_at(self, index: int) -> int:
+        return self._timestamps[self._position(index)]
+
+    def append(self, timestamp: int, iu: InteriorUnitBase) -> None:
+        if self._size > 0:
+            # Keep timestamps sorted even if the wall clock goes backward
+            timestamp = max(timestamp, self.timestamp_at(self._size - 1))
+
+        position = self._next
+        self._timestamps[position] = timestamp
+        self._room_temperatures[position] = iu.room_temperature
+        self._relative_temperatures[position] = iu.relative_temperature
+        self._requested_temperatures[position] = iu.requested_temperature
+        self._states[position] = pack_state(iu.power, iu.operating_mode, iu.fan_speed, iu.fan_swing, iu.online)
+
+        self._next = (self._next + 1) % self._capacity
+        self._size = min(self._size + 1, self._capacity)
+
+    def index_range(self, start: int | None, end: int | None) -> range:
+        """Indexes of samples with `start <= timestamp < end` (epoch millis)"""
+        timestamps = _TimestampView(self)
+        first = 0 if start is None else bisect.bisect_left(timestamps, start)
+        last = self._size if end is None else bisect.bisect_left(timestamps, end)
+        return range(first, last)
+
+    def sample_at(self, index: int) -> HistorySample:
+        position = self._position(index)
+        power, operating_mode, fan_speed, fan_swing, online = unpack_state(self._states[position])
+        return HistorySample(
+            utc_datetime_from_millis(self._timestamps[position]),
+            self._room_temperatures[position],
+            self._relative_temperatures[position],
+            self._requested_temperatures[position],
+            power,
+            operating_mode,
+            fan_speed,
+            fan_swing,
+            online,
+        )
+
+    def value_at(self, field: HistoryField, index: int) -> float:
+        position = self._position(index)
+        match field:
+            case "room_temperature":
+                return self._room_temperatures[position]
+            case "relative_temperature":
+                return self._relative_temperatures[position]
+            case "requested_temperature":
+                return self._requested_temperatures[position]
+
+
+class _TimestampView:
+    _history: UnitHistory
+
+    def __init__(self, history: UnitHistory) -> None:
+        self._history = history
+
+    def __len__(self) -> int:
+        return len(self._history)
+
+    def __getitem__(self, index: int) -> int:
+        return self._history.timestamp_at(index)
+
+
+class HistoryRecorder:
+    """Record a bounded time-series per interior unit.
+
+    A sample is appended each time a unit changes, with the time it was received. Memory is allocated once per unit
+    (`capacity` samples) and appending is O(1). Use `record` as an update listener of `HitachiAirCloud`.
+    """
+
+    _capacity: int
+    _histories: dict[int, UnitHistory]
+
+    def __init__(self, capacity: int = 1440) -> None:
+        self._capacity = capacity
+        self._histories = {}
+
+    def record(self, interior_units: list[InteriorUnitBase], changes: dict[int, InteriorUnitChanges]) -> None:
+        now = time.time_ns() // 1_000_000
+        for iu in interior_units:
+            history = self._histories.get(iu.rac_id)
+            if history is None:
+                history = UnitHistory(self._capacity)
+                self._histories[iu.rac_id] = history
+            elif iu.rac_id not in changes:
+                continue
+            history.append(now, iu)
+
+    def samples(
+        self, rac_id: int, start: datetime.datetime | None = None, end: datetime.datetime | None = None
+    ) -> list[HistorySample]:
+        history = self._histories.get(rac_id)
+        if history is None:
+            return []
+        indexes = history.index_range(_to_millis(start), _to_millis(end))
+        return [history.sample_at(index) for index in indexes]
+
+    def downsample(
+        self,
+        rac_id: int,
+        field: HistoryField,
+        bucket: datetime.timedelta,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ) -> list[HistoryBucket]:
+        """Aggregate `field` by time bucket (aligned on epoch), empty buckets are omitted"""
+        history = self._histories.get(rac_id)
+        if history is None:
+            return []
+
+        bucket_millis = int(bucket.total_seconds() * 1000)
+        buckets: list[HistoryBucket] = []
+        current_bucket: int | None = None
+        count = 0
+        total = 0.0
+        minimum = math.inf
+        maximum = -math.inf
+        for index in history.index_range(_to_millis(start), _to_millis(end)):
+            sample_bucket = history.timestamp_at(index) // bucket_millis
+            if sample_bucket != current_bucket:
+                if current_bucket is not None:
+                    buckets.append(_bucket(current_bucket * bucket_millis, count, minimum, maximum, total))
+                current_bucket = sample_bucket
+                count = 0
+                total = 0.0
+                minimum = math.inf
+                maximum = -math.inf
+
+            value = history.value_at(field, index)
+            count += 1
+            total += value
+            minimum = min(minimum, value)
+            maximum = max(maximum, value)
+
+        if current_bucket is not None:
+            buckets.append(_bucket(current_bucket * bucket_millis, count, minimum, maximum, total))
+        return buckets
+
+    def clear(self, rac_id: int | None = None) -> None:
+        if rac_id is None:
+            self._histories.clear()
+        else:
+            self._histories.pop(rac_id, None)
+
+
+def _to_millis(value: datetime.datetime | None) -> int | None:
+    return millis_from_datetime(value) if value is not None else None
+
+
+def _bucket(start: int, count: int, minimum: float, maximum: float, total: float) -> HistoryBucket:
+    return HistoryBucket(utc_datetime_from_millis(start), count, minimum, maximum, total / count)
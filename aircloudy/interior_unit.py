@@ -8,22 +8,56 @@ from collections.abc import Awaitable, Callable
 from dataclasses import dataclass
 
 from .api.rac_models import InteriorUnitUserState
-from .contants import ApiCommandState, FanSpeed, FanSwing, OperatingMode, Power
+from .contants import (
+    CommandPriority,
+    FanSpeed,
+    FanSwing,
+    OfflinePolicy,
+    OperatingMode,
+    Power,
+    StateSource,
+)
 from .errors import CommandFailedException, InvalidArgumentException, UnitIsOfflineException
 from .interior_unit_base import InteriorUnitBase
 from .interior_unit_changes import InteriorUnitChanges
+from .scene import ScenePowerBatch
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True)
+class CommandOptions:
+    """How a state is sent, given by the call requesting it and kept with the state until it is sent"""
+
+    priority: CommandPriority = "INTERACTIVE"
+    # Scene batch allowed to switch the unit along with others, when the state is the one computed by the scene
+    power_batch: ScenePowerBatch | None = None
+
+
+type CommandTransport = Callable[[InteriorUnitUserState, CommandOptions], Awaitable[None]]
+
+
 @dataclass
 class NextState:
     _command: InteriorUnitUserState
     _created_at: datetime.datetime
+    _outcome: asyncio.Future[None]
+    _expiry: asyncio.TimerHandle | None
+    options: CommandOptions
+    in_flight: bool
 
-    def __init__(self, command: InteriorUnitUserState) -> None:
+    def __init__(
+        self,
+        command: InteriorUnitUserState,
+        outcome: asyncio.Future[None] | None = None,
+        options: CommandOptions | None = None,
+    ) -> None:
         self._command = command
+        self.options = options if options is not None else CommandOptions()
         self._created_at = datetime.datetime.now(datetime.UTC)
+        self._outcome = outcome if outcome is not None else _new_outcome()
+        self._expiry = None
+        self.in_flight = False
 
     @property
     def command(self) -> InteriorUnitUserState:
@@ -33,6 +67,29 @@ class NextState:
     def created_at(self) -> datetime.datetime:
         return self._created_at
 
+    @property
+    def outcome(self) -> asyncio.Future[None]:
+        """Resolved once the state is acknowledged, shared by all commands merged in this state"""
+        return self._outcome
+
+    def expire_after(self, delay: float, on_expiry: Callable[[NextState], None]) -> None:
+        self.cancel_expiry()
+        self._expiry = asyncio.get_running_loop().call_later(delay, on_expiry, self)
+
+    def cancel_expiry(self) -> None:
+        if self._expiry is not None:
+            self._expiry.cancel()
+            self._expiry = None
+
+    def resolve(self, error: BaseException | None = None) -> None:
+        self.cancel_expiry()
+        if self._outcome.done():
+            return
+        if error is None:
+            self._outcome.set_result(None)
+        else:
+            self._outcome.set_exception(error)
+
     def __hash__(self) -> int:
         return hash(self._command)
 
@@ -44,7 +101,7 @@ class NextState:
 
 @dataclass
 class InteriorUnit:
-    _send_command_and_wait_ack: Callable[[InteriorUnitUserState], Awaitable[ApiCommandState | None]]
+    _send_command_and_wait_ack: CommandTransport
 
     _id: int
     _name: str
@@ -56,17 +113,27 @@ class InteriorUnit:
     _vendor: str
     _model_id: str
     _user_state: InteriorUnitUserState
+    _source: StateSource
+    _received_at: datetime.datetime
+    _offline_policy: OfflinePolicy
+    _offline_hold_ttl: float
 
-    on_changes: Callable[[InteriorUnitChanges], None] | None = None
+    _state_lock: asyncio.Lock
+    _next_state: NextState | None
+    _state_updater: asyncio.Task | None
 
-    _state_lock: asyncio.Lock = asyncio.Lock()
-    _next_state: NextState | None = None
-    _state_updater: asyncio.Task | None = None
+    # Called inline by `update`. Units of a HitachiAirCloud are instead called from its change dispatcher, off the
+    # notification receive loop and only when something changed
+    on_changes: Callable[[InteriorUnitChanges], None] | None = None
 
     def __init__(
         self,
-        send_command_and_wait_ack: Callable[[InteriorUnitUserState], Awaitable[None]],
+        send_command_and_wait_ack: CommandTransport,
         base: InteriorUnitBase,
+        source: StateSource = "REST",
+        received_at: datetime.datetime | None = None,
+        offline_policy: OfflinePolicy = "RAISE",
+        offline_hold_ttl: float = 600,
     ) -> None:
         self._send_command_and_wait_ack = send_command_and_wait_ack
         self._id = base.rac_id
@@ -79,8 +146,19 @@ class InteriorUnit:
         self._vendor = base.vendor
         self._model_id = base.model_id
         self._user_state = base.user_state
-
-    def update(self, base: InteriorUnitBase) -> InteriorUnitChanges:
+        self._source = source
+        self._received_at = received_at if received_at is not None else datetime.datetime.now(datetime.UTC)
+        self._offline_policy = offline_policy
+        self._offline_hold_ttl = offline_hold_ttl
+
+        self._state_lock = asyncio.Lock()
+        self._next_state = None
+        self._state_updater = None
+        self.on_changes = None
+
+    def update(
+        self, base: InteriorUnitBase, source: StateSource = "NOTIFICATION", call_on_changes: bool = True
+    ) -> InteriorUnitChanges:
         if base.rac_id != self.id:
             raise InvalidArgumentException("Update must come from the same id")
         changes = InteriorUnitChanges(
@@ -129,8 +207,13 @@ class InteriorUnit:
         self._vendor = base.vendor
         self._model_id = base.model_id
         self._user_state = base.user_state
+        self._source = source
+        self._received_at = datetime.datetime.now(datetime.UTC)
+
+        if changes.online is not None and base.online:
+            self._flush_held_state()
 
-        if self.on_changes is not None:
+        if call_on_changes and self.on_changes is not None:
             self.on_changes(changes)
 
         return changes
@@ -171,6 +254,24 @@ class InteriorUnit:
     def model_id(self) -> str:
         return self._model_id
 
+    @property
+    def source(self) -> StateSource:
+        return self._source
+
+    @property
+    def received_at(self) -> datetime.datetime:
+        """When the current state was received from `source`"""
+        return self._received_at
+
+    @property
+    def is_stale(self) -> bool:
+        """True until the state loaded at startup (from a snapshot or a store) is confirmed by the api"""
+        return self._source in ("SNAPSHOT", "STORE")
+
+    @property
+    def user_state(self) -> InteriorUnitUserState:
+        return self._user_state
+
     @property
     def power(self) -> Power:
         return self._user_state._power
@@ -203,37 +304,92 @@ class InteriorUnit:
         humidity: int | None = None,
         fan_speed: FanSpeed | None = None,
         fan_swing: FanSwing | None = None,
-    ) -> None:
-        if not self._online:
+        *,
+        options: CommandOptions | None = None,
+    ) -> asyncio.Future[None]:
+        """
+        Request a new state, merged with the state requested by previous calls not sent yet
+
+        With the HOLD offline policy, the state of an offline unit is held until the unit comes back online, at most
+        `offline_hold_ttl` seconds. The merged state is sent with the `options` of the last call.
+
+        :return: Future resolved once the state is acknowledged, shared by all calls merged in the same state
+        :raises:
+            UnitIsOfflineException: If the unit is offline and the offline policy is RAISE
+        """
+        if not self._online and self._offline_policy == "RAISE":
             raise UnitIsOfflineException
 
         async with self._state_lock:
+            previous = self._next_state
             base_state = (
-                self._next_state.command
-                if self._next_state is not None and self._next_state.created_at > self._updated_at
+                previous.command
+                if previous is not None and previous.created_at > self._updated_at
                 else self._user_state
             )
-            self._next_state = NextState(
-                base_state.copy(power, mode, requested_temperature, humidity, fan_speed, fan_swing)
+            # Callers of a state not sent yet get the outcome of the state replacing it
+            outcome = previous.outcome if previous is not None and not previous.in_flight else None
+            if previous is not None:
+                previous.cancel_expiry()
+            next_state = NextState(
+                base_state.copy(power, mode, requested_temperature, humidity, fan_speed, fan_swing), outcome, options
             )
-            if self._state_updater is None or self._state_updater.done():
+            self._next_state = next_state
+
+            if not self._online:
+                logger.info("Interior unit %d is offline, hold %s", self._id, next_state.command)
+                next_state.expire_after(self._offline_hold_ttl, self._expire_held_state)
+            elif self._state_updater is None:
                 self._state_updater = asyncio.create_task(self._update_state())
+            return next_state.outcome
+
+    def _expire_held_state(self, next_state: NextState) -> None:
+        if self._next_state is not next_state or next_state.in_flight:
+            return
+        logger.warning("Interior unit %d still offline, drop %s", self._id, next_state.command)
+        self._next_state = None
+        next_state.resolve(CommandFailedException(f"Interior unit {self._id} stayed offline"))
+
+    def _flush_held_state(self) -> None:
+        next_state = self._next_state
+        if next_state is None or next_state.in_flight or next_state.outcome.done() or self._state_updater is not None:
+            return
+        logger.info("Interior unit %d is back online, send held %s", self._id, next_state.command)
+        self._state_updater = asyncio.create_task(self._update_state())
 
     async def _update_state(self) -> None:
         last_state: NextState | None = None
         while True:
             async with self._state_lock:
                 new_state = self._next_state
-                if new_state is None or new_state == last_state:
+                if new_state is not None and new_state == last_state and _succeeded(last_state):
+                    # Same state requested again after it was acknowledged
+                    new_state.resolve()
+                if (
+                    new_state is None
+                    or new_state is last_state
+                    or new_state.outcome.done()
+                    or (not self._online and self._offline_policy == "HOLD")
+                ):
+                    if new_state is not None and not new_state.outcome.done():
+                        new_state.expire_after(self._offline_hold_ttl, self._expire_held_state)
+                    self._state_updater = None
                     break
+                new_state.in_flight = True
+                new_state.cancel_expiry()
 
             try:
-                await self._send_command_and_wait_ack(new_state.command)
+                await self._send_command_and_wait_ack(new_state.command, new_state.options)
                 async with self._state_lock:
                     self._user_state = new_state.command
                     self._updated_at = new_state.created_at
-            except CommandFailedException:
+                new_state.resolve()
+            except CommandFailedException as e:
                 logger.warning("Failed to acknowledge command execution: %s", traceback.format_exc())
+                new_state.resolve(e)
+            except Exception as e:
+                logger.error("Failed to send command: %s", traceback.format_exc())
+                new_state.resolve(e)
 
             last_state = new_state
 
@@ -256,3 +412,19 @@ class InteriorUnit:
             and self._model_id == other._model_id
             and self._user_state == other._user_state
         )
+
+
+def _new_outcome() -> asyncio.Future[None]:
+    outcome: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+    # Callers are free to ignore the outcome, don't log errors nobody awaited
+    outcome.add_done_callback(lambda f: f.cancelled() or f.exception())
+    return outcome
+
+
+def _succeeded(state: NextState | None) -> bool:
+    return (
+        state is not None
+        and state.outcome.done()
+        and not state.outcome.cancelled()
+        and state.outcome.exception() is None
+    )
@@ -92,6 +92,18 @@ class InteriorUnitBase:
     def model_id(self) -> str:
         return self._model_id
 
+    @property
+    def serial_number(self) -> str:
+        return self._serial_number
+
+    @property
+    def vendor_thing_id(self) -> str:
+        return self._vendor_thing_id
+
+    @property
+    def schedule_type(self) -> ScheduleType:
+        return self._schedule_type
+
     @property
     def user_state(self) -> InteriorUnitUserState:
         return self._user_state
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import dataclasses
 import datetime
 from dataclasses import dataclass
 
@@ -42,6 +43,20 @@ class InteriorUnitChanges:
             or self.fan_swing is not None
         )
 
+    def merge(self, newer: InteriorUnitChanges) -> InteriorUnitChanges:
+        """Combine with changes that happened after this one, as if both were a single change"""
+        merged: dict[str, tuple | None] = {}
+        for field in dataclasses.fields(self):
+            before: tuple | None = getattr(self, field.name)
+            after: tuple | None = getattr(newer, field.name)
+            if before is None:
+                merged[field.name] = after
+            elif after is None:
+                merged[field.name] = before
+            else:
+                merged[field.name] = (before[0], after[1]) if before[0] != after[1] else None
+        return InteriorUnitChanges(**merged)
+
     def __repr__(self) -> str:
         changes_as_string: list[str] = []
         if self.name is not None:
@@ -78,3 +93,6 @@ class InteriorUnitChanges:
             changes_as_string.append(f"fan_swing={self.fan_swing[0]}->{self.fan_swing[1]}")
 
         return f"InteriorUnitChanges({', '.join(changes_as_string)})"
+
+
+CHANGE_FIELDS = frozenset(field.name for field in dataclasses.fields(InteriorUnitChanges))
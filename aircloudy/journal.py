@@ -0,0 +1,465 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import datetime
+import logging
+import math
+import mmap
+import queue
+import struct
+import threading
+import time
+import traceback
+from collections.abc import Iterator
+from concurrent.futures import Future
+from dataclasses import dataclass
+from io import BufferedWriter
+from pathlib import Path
+from types import TracebackType
+from typing import Literal
+
+from .api.rac_models import InteriorUnitUserState
+from .contants import FanSpeed, FanSwing, OperatingMode, Power, StateSource
+from .errors import IllegalStateException, InvalidArgumentException
+from .interior_unit_base import InteriorUnitBase
+from .serialization import millis_from_datetime
+from .state_codes import pack_state, unpack_state
+from .utils import utc_datetime_from_millis
+
+logger = logging.getLogger(__name__)
+
+type JournalRecordKind = Literal["NOTIFICATION", "COMMAND", "REST"]
+
+_MAGIC = b"ACJRNL01"
+# Record: timestamp (epoch millis), kind, name index in the string table, rac_id, room, relative and requested
+# temperature, humidity, packed categorical state (see `state_codes.pack_state`)
+_RECORD = struct.Struct("<qB3xIqdddii")
+_TIMESTAMP = struct.Struct("<q")
+_STRING_LENGTH = struct.Struct("<H")
+# Indexes are written in the files, new kinds are appended
+_KINDS: tuple[JournalRecordKind, ...] = ("NOTIFICATION", "COMMAND", "REST")
+_NO_NAME = 0xFFFFFFFF
+
+# Record to write: timestamp, kind, name, rac_id, then the values packed after the name index
+type _PendingRecord = tuple[int, int, str | None, int, float, float, float, int, int]
+
+
+class _Stop:
+    pass
+
+
+@dataclass(frozen=True)
+class JournalRecord:
+    """A journal entry, temperatures and online flag are not known for commands"""
+
+    recorded_at: datetime.datetime
+    kind: JournalRecordKind
+    rac_id: int
+    name: str | None
+    room_temperature: float | None
+    relative_temperature: float | None
+    requested_temperature: float
+    humidity: int
+    power: Power | None
+    operating_mode: OperatingMode | None
+    fan_speed: FanSpeed | None
+    fan_swing: FanSwing | None
+    online: bool | None
+
+
+def _journal_files(directory: Path) -> list[Path]:
+    return sorted(directory.glob("journal-*.bin"))
+
+
+def _strings_path(journal_file: Path) -> Path:
+    return journal_file.with_suffix(".str")
+
+
+class EventJournal:
+    """Append-only binary journal of received interior unit states and sent commands.
+
+    Records have a fixed layout, unit names are stored once per file in a `.str` string table next to it. A new
+    file is started when the current one would exceed `max_file_size`, and on each opening.
+    Recording only takes a timestamp and enqueues; a dedicated thread writes the records and flushes them once
+    `flush_size` bytes are buffered or `flush_interval` seconds after the first unflushed record.
+    Give it to `HitachiAirCloud` as `event_journal`, which records received states with their source and sent
+    commands, then read the files with `JournalReader`.
+    """
+
+    _directory: Path
+    _max_file_size: int
+    _flush_size: int
+    _flush_interval: float
+    _file_index: int
+    _file: BufferedWriter | None
+    _file_size: int
+    _strings_file: BufferedWriter | None
+    _strings: dict[str, int]
+    _last_timestamp: int
+    _unflushed: int
+    _unflushed_since: float
+    _queue: queue.SimpleQueue[_PendingRecord | Future[None] | _Stop]
+    _writer: threading.Thread
+    _writer_failed: bool
+    _closed: bool
+
+    def __init__(
+        self,
+        directory: str | Path,
+        max_file_size: int = 64 * 1024 * 1024,
+        flush_size: int = 64 * 1024,
+        flush_interval: float = 1.0,
+    ) -> None:
+        if max_file_size < len(_MAGIC) + _RECORD.size:
+            raise InvalidArgumentException("max_file_size is too small to hold a record")
+
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._max_file_size = max_file_size
+        self._flush_size = flush_size
+        self._flush_interval = flush_interval
+        self._file = None
+        self._file_size = 0
+        self._strings_file = None
+        self._strings = {}
+        self._unflushed = 0
+        self._unflushed_since = 0.0
+        self._queue = queue.SimpleQueue()
+        self._writer_failed = False
+        self._closed = False
+
+        existing = _journal_files(self._directory)
+        self._file_index = int(existing[-1].stem.removeprefix("journal-")) + 1 if len(existing) > 0 else 0
+        self._last_timestamp = _last_timestamp(existing[-1]) if len(existing) > 0 else 0
+
+        self._writer = threading.Thread(target=self._write_loop, name=f"EventJournal({self._directory})", daemon=True)
+        self._writer.start()
+
+    def record_states(self, interior_units: list[InteriorUnitBase], source: StateSource = "NOTIFICATION") -> None:
+        """Record the full state of every received interior unit, changed or not
+
+        States loaded from a snapshot or a store were already received, they are not recorded again.
+        """
+        if self._closed or source not in _KINDS:
+            return
+        kind = _KINDS.index(source)
+        timestamp = self._timestamp()
+        for iu in interior_units:
+            self._queue.put(
+                (
+                    timestamp,
+                    kind,
+                    iu.name,
+                    iu.rac_id,
+                    iu.room_temperature,
+                    iu.relative_temperature,
+                    iu.requested_temperature,
+                    iu.humidity,
+                    pack_state(iu.power, iu.operating_mode, iu.fan_speed, iu.fan_swing, iu.online),
+                )
+            )
+
+    def record_command(self, command: InteriorUnitUserState) -> None:
+        if self._closed:
+            return
+        self._queue.put(
+            (
+                self._timestamp(),
+                1,
+                None,
+                command.rac_id,
+                math.nan,
+                math.nan,
+                command.requested_temperature,
+                command.humidity,
+                pack_state(command.power, command.operating_mode, command.fan_speed, command.fan_swing, False),
+            )
+        )
+
+    def _timestamp(self) -> int:
+        # Keep timestamps sorted even if the wall clock goes backward, readers rely on it to search by time
+        self._last_timestamp = max(time.time_ns() // 1_000_000, self._last_timestamp)
+        return self._last_timestamp
+
+    def _write_loop(self) -> None:
+        waiters: list[Future[None]] = []
+        try:
+            while True:
+                timeout = (
+                    None
+                    if self._unflushed == 0
+                    else max(self._unflushed_since + self._flush_interval - time.monotonic(), 0)
+                )
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    self._flush_files()
+                    continue
+                match item:
+                    case _Stop():
+                        break
+                    case Future():
+                        waiters = [item]
+                        self._flush_files()
+                        item.set_result(None)
+                    case _:
+                        self._write(*item)
+                        if self._unflushed >= self._flush_size:
+                            self._flush_files()
+        except Exception as e:
+            logger.error("Journal writer stopped : %s", traceback.format_exc())
+            self._writer_failed = True
+            self._fail_waiters(waiters, e)
+        finally:
+            self._close_files()
+
+    def _open_file(self) -> BufferedWriter:
+        if self._file is not None and self._file_size + _RECORD.size > self._max_file_size:
+            self._close_files()
+            self._file_index += 1
+
+        if self._file is None:
+            path = self._directory / f"journal-{self._file_index:08d}.bin"
+            logger.debug("Start journal file %s", path)
+            self._file = path.open("wb")
+            self._file.write(_MAGIC)
+            self._file_size = len(_MAGIC)
+            self._strings_file = _strings_path(path).open("wb")
+            self._strings = {}
+        return self._file
+
+    def _string_index(self, value: str | None) -> int:
+        if value is None or self._strings_file is None:
+            return _NO_NAME
+        index = self._strings.get(value)
+        if index is None:
+            encoded = value.encode()[:0xFFFF]
+            self._strings_file.write(_STRING_LENGTH.pack(len(encoded)) + encoded)
+            # String must be readable before any record referencing it
+            self._strings_file.flush()
+            index = len(self._strings)
+            self._strings[value] = index
+        return index
+
+    def _write(self, timestamp: int, kind: int, name: str | None, rac_id: int, *values: float) -> None:
+        f = self._open_file()
+        f.write(_RECORD.pack(timestamp, kind, self._string_index(name), rac_id, *values))
+        self._file_size += _RECORD.size
+        if self._unflushed == 0:
+            self._unflushed_since = time.monotonic()
+        self._unflushed += _RECORD.size
+
+    def _flush_files(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+        self._unflushed = 0
+
+    def _fail_waiters(self, waiters: list[Future[None]], error: Exception) -> None:
+        """Fail the flushes waiting for a writer that stopped, including the ones still queued"""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, Future):
+                waiters.append(item)
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_exception(IllegalStateException(f"Journal writer stopped: {error!r}"))
+
+    async def flush(self) -> None:
+        """Wait until the records recorded so far are written and flushed
+
+        :raises:
+            IllegalStateException: If the writer thread stopped on an error
+        """
+        if self._closed:
+            return
+        if self._writer_failed:
+            raise IllegalStateException("Journal writer stopped")
+        waiter: Future[None] = Future()
+        self._queue.put(waiter)
+        if self._writer_failed:
+            # The writer may have drained the queue before the waiter was put
+            self._fail_waiters([waiter], IllegalStateException("Writer stopped"))
+        await asyncio.wrap_future(waiter)
+
+    def _close_files(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._strings_file is not None:
+            self._strings_file.close()
+            self._strings_file = None
+        self._unflushed = 0
+
+    async def close(self) -> None:
+        """Write the pending records then stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_Stop())
+        await asyncio.to_thread(self._writer.join)
+
+    async def __aenter__(self) -> EventJournal:
+        return self
+
+    async def __aexit__(
+        self, exc_type: type[BaseException] | None, exc_val: BaseException | None, exc_tb: TracebackType | None
+    ) -> None:
+        await self.close()
+
+
+def _last_timestamp(path: Path) -> int:
+    count = (path.stat().st_size - len(_MAGIC)) // _RECORD.size
+    if count <= 0:
+        return 0
+    with path.open("rb") as f:
+        f.seek(len(_MAGIC) + (count - 1) * _RECORD.size)
+        return int(_TIMESTAMP.unpack(f.read(_TIMESTAMP.size))[0])
+
+
+class _JournalFile:
+    _path: Path
+    _mmap: mmap.mmap | None
+    _strings: list[str]
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._mmap = None
+        self._strings = []
+        with path.open("rb") as f:
+            if path.stat().st_size > len(_MAGIC):
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap is not None and self._mmap[: len(_MAGIC)] != _MAGIC:
+            self.close()
+            raise IllegalStateException(f"{path} is not a journal file")
+
+    def __len__(self) -> int:
+        if self._mmap is None:
+            return 0
+        return (len(self._mmap) - len(_MAGIC)) // _RECORD.size
+
+    def __getitem__(self, index: int) -> int:
+        """Timestamp of the record at `index`, allow bisecting on the file"""
+        if self._mmap is None:
+            raise IndexError(index)
+        return int(_TIMESTAMP.unpack_from(self._mmap, len(_MAGIC) + index * _RECORD.size)[0])
+
+    def _string(self, index: int) -> str | None:
+        if index == _NO_NAME:
+            return None
+        if index >= len(self._strings):
+            self._load_strings()
+        return self._strings[index] if index < len(self._strings) else None
+
+    def _load_strings(self) -> None:
+        data = _strings_path(self._path).read_bytes()
+        strings: list[str] = []
+        offset = 0
+        while offset + _STRING_LENGTH.size <= len(data):
+            (length,) = _STRING_LENGTH.unpack_from(data, offset)
+            offset += _STRING_LENGTH.size
+            strings.append(data[offset : offset + length].decode(errors="replace"))
+            offset += length
+        self._strings = strings
+
+    def record(self, index: int) -> JournalRecord:
+        if self._mmap is None:
+            raise IndexError(index)
+        (
+            timestamp,
+            kind,
+            name_index,
+            rac_id,
+            room_temperature,
+            relative_temperature,
+            requested_temperature,
+            humidity,
+            state,
+        ) = _RECORD.unpack_from(self._mmap, len(_MAGIC) + index * _RECORD.size)
+        power, operating_mode, fan_speed, fan_swing, online = unpack_state(state)
+        is_command = _KINDS[kind] == "COMMAND"
+        return JournalRecord(
+            utc_datetime_from_millis(timestamp),
+            _KINDS[kind],
+            rac_id,
+            self._string(name_index),
+            None if is_command else room_temperature,
+            None if is_command else relative_temperature,
+            requested_temperature,
+            humidity,
+            power,
+            operating_mode,
+            fan_speed,
+            fan_swing,
+            None if is_command else online,
+        )
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+
+class JournalReader:
+    """Read journal files written by `EventJournal`.
+
+    Files are memory-mapped, records are decoded on iteration only. Records written after the reader was opened are
+    not visible; open a new reader to see them.
+    """
+
+    _files: list[_JournalFile]
+
+    def __init__(self, directory: str | Path) -> None:
+        self._files = []
+        try:
+            for path in _journal_files(Path(directory)):
+                self._files.append(_JournalFile(path))
+        except Exception:
+            self.close()
+            raise
+
+    def __len__(self) -> int:
+        return sum(len(f) for f in self._files)
+
+    def __iter__(self) -> Iterator[JournalRecord]:
+        return self.records()
+
+    def records(
+        self,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+        rac_id: int | None = None,
+        kind: JournalRecordKind | None = None,
+    ) -> Iterator[JournalRecord]:
+        """Records with `start <= recorded_at < end`, in recording order"""
+        start_millis = millis_from_datetime(start) if start is not None else None
+        end_millis = millis_from_datetime(end) if end is not None else None
+        for f in self._files:
+            size = len(f)
+            if size == 0 or (start_millis is not None and f[size - 1] < start_millis):
+                continue
+            if end_millis is not None and f[0] >= end_millis:
+                return
+
+            first = 0 if start_millis is None else bisect.bisect_left(f, start_millis, 0, size)
+            last = size if end_millis is None else bisect.bisect_left(f, end_millis, first, size)
+            for index in range(first, last):
+                record = f.record(index)
+                if (rac_id is None or record.rac_id == rac_id) and (kind is None or record.kind == kind):
+                    yield record
+
+    def close(self) -> None:
+        for f in self._files:
+            f.close()
+        self._files = []
+
+    def __enter__(self) -> JournalReader:
+        return self
+
+    def __exit__(
+        self, exc_type: type[BaseException] | None, exc_val: BaseException | None, exc_tb: TracebackType | None
+    ) -> None:
+        self.close()
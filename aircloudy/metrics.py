@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import time
+from collections import deque
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class LatencySnapshot:
+    count: int
+    last: float | None
+    mean: float | None
+    min: float | None
+    max: float | None
+
+
+class LatencyGauge:
+    """Running statistics of durations expressed in seconds."""
+
+    _count: int
+    _total: float
+    _last: float | None
+    _min: float | None
+    _max: float | None
+
+    def __init__(self) -> None:
+        self._count = 0
+        self._total = 0.0
+        self._last = None
+        self._min = None
+        self._max = None
+
+    def record(self, seconds: float) -> None:
+        self._count += 1
+        self._total += seconds
+        self._last = seconds
+        self._min = seconds if self._min is None else min(self._min, seconds)
+        self._max = seconds if self._max is None else max(self._max, seconds)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def mean(self) -> float | None:
+        return self._total / self._count if self._count > 0 else None
+
+    def snapshot(self) -> LatencySnapshot:
+        return LatencySnapshot(self._count, self._last, self.mean, self._min, self._max)
+
+
+class RateMeter:
+    """Count events over a sliding time window."""
+
+    _window: float
+    _events: deque[float]
+
+    def __init__(self, window: float = 60.0) -> None:
+        self._window = window
+        self._events = deque()
+
+    def mark(self, now: float | None = None) -> None:
+        now = time.monotonic() if now is None else now
+        self._events.append(now)
+        self._evict(now)
+
+    def rate(self, now: float | None = None) -> float:
+        """Events per second over the window."""
+        self._evict(time.monotonic() if now is None else now)
+        return len(self._events) / self._window
+
+    def _evict(self, now: float) -> None:
+        limit = now - self._window
+        while len(self._events) > 0 and self._events[0] < limit:
+            self._events.popleft()
@@ -1 +1,3 @@
 from .notifications_websocket import NotificationsWebsocket
+from .polling import AdaptivePoller, PollingStats
+from .websocket_stats import WebsocketStats
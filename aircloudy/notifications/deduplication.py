@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationDeduplicator:
+    """Drop redelivered STOMP messages and out-of-order interior unit states.
+
+    Message ids are remembered per subscription in a bounded LRU. Interior unit states are compared to the
+    last accepted `updatedAt` of the same unit, so an older state never overwrites a fresher one.
+    """
+
+    _max_message_ids: int
+    _message_ids: dict[str, OrderedDict[str, None]]
+    _last_updated_at: dict[int, int]
+
+    duplicate_messages: int
+    stale_interior_units: int
+
+    def __init__(self, max_message_ids: int = 256) -> None:
+        self._max_message_ids = max_message_ids
+        self._message_ids = {}
+        self._last_updated_at = {}
+        self.duplicate_messages = 0
+        self.stale_interior_units = 0
+
+    def is_duplicate_message(self, subscription: str, message_id: str) -> bool:
+        message_ids = self._message_ids.get(subscription)
+        if message_ids is None:
+            message_ids = OrderedDict()
+            self._message_ids[subscription] = message_ids
+
+        if message_id in message_ids:
+            message_ids.move_to_end(message_id)
+            self.duplicate_messages += 1
+            logger.debug("Drop duplicate message %s on subscription %s", message_id, subscription)
+            return True
+
+        message_ids[message_id] = None
+        if len(message_ids) > self._max_message_ids:
+            message_ids.popitem(last=False)
+        return False
+
+    def is_stale_interior_unit(self, rac_id: int, updated_at: int) -> bool:
+        """Tell if `updated_at` (epoch millis) is older than the last accepted state of the unit.
+
+        A state with the same `updated_at` is accepted since it can't be told apart from a real change.
+        """
+        last_updated_at = self._last_updated_at.get(rac_id)
+        if last_updated_at is not None and updated_at < last_updated_at:
+            self.stale_interior_units += 1
+            logger.debug("Drop stale state of rac_id=%d (%d < %d)", rac_id, updated_at, last_updated_at)
+            return True
+
+        self._last_updated_at[rac_id] = updated_at
+        return False
+
+    def forget_subscription(self, subscription: str) -> None:
+        self._message_ids.pop(subscription, None)
@@ -3,6 +3,12 @@ from uuid import UUID
 from .stomp import StompFrame
 
 
+def _with_receipt(headers: dict[str, str], receipt: str | None) -> dict[str, str]:
+    if receipt is not None:
+        headers["receipt"] = receipt
+    return headers
+
+
 class ConnectFrame(StompFrame):
     def __init__(self, token: str) -> None:
         StompFrame.__init__(
@@ -17,14 +23,17 @@ class ConnectFrame(StompFrame):
 
 
 class RefreshAllInteriorUnitFrame(StompFrame):
-    def __init__(self, token: str, user_id: int, family_id: int) -> None:
+    def __init__(self, token: str, user_id: int, family_id: int, receipt: str | None = None) -> None:
         StompFrame.__init__(
             self,
             "MESSAGE",
-            {
-                "Authorization": f"Bearer {token}",
-                "destination": f"/app/racs/{user_id}/{family_id}",
-            },
+            _with_receipt(
+                {
+                    "Authorization": f"Bearer {token}",
+                    "destination": f"/app/racs/{user_id}/{family_id}",
+                },
+                receipt,
+            ),
             {
                 "racId": 0,
                 "requestType": "REFRESH_ALL",
@@ -33,14 +42,17 @@ class RefreshAllInteriorUnitFrame(StompFrame):
 
 
 class RefreshInteriorUnitFrame(StompFrame):
-    def __init__(self, token: str, user_id: int, family_id: int, rac_id: int) -> None:
+    def __init__(self, token: str, user_id: int, family_id: int, rac_id: int, receipt: str | None = None) -> None:
         StompFrame.__init__(
             self,
             "MESSAGE",
-            {
-                "Authorization": f"Bearer {token}",
-                "destination": f"/app/racs/{user_id}/{family_id}",
-            },
+            _with_receipt(
+                {
+                    "Authorization": f"Bearer {token}",
+                    "destination": f"/app/racs/{user_id}/{family_id}",
+                },
+                receipt,
+            ),
             {
                 "racId": rac_id,
                 "requestType": "REFRESH_INDIVIDUAL",
@@ -49,15 +61,18 @@ class RefreshInteriorUnitFrame(StompFrame):
 
 
 class SubscribeFrame(StompFrame):
-    def __init__(self, uuid: UUID, user_id: int, family_id: int) -> None:
+    def __init__(self, uuid: UUID, user_id: int, family_id: int, receipt: str | None = None) -> None:
         StompFrame.__init__(
             self,
             "SUBSCRIBE",
-            {
-                "id": str(uuid),
-                "destination": f"/notification/{user_id}/{family_id}",
-                "ack": "auto",
-            },
+            _with_receipt(
+                {
+                    "id": str(uuid),
+                    "destination": f"/notification/{user_id}/{family_id}",
+                    "ack": "auto",
+                },
+                receipt,
+            ),
         )
 
 
@@ -1,15 +1,18 @@
 from __future__ import annotations
 
 import asyncio
+import functools
 import logging
+import time
 import traceback
 import uuid
 from asyncio import Task
 from collections.abc import Awaitable, Callable
 from types import TracebackType
-from typing import Self
+from typing import Literal, Self, cast
 
 import websockets
+from websockets.asyncio.client import ClientConnection, ClientProtocol
 
 from aircloudy.contants import SSL_CONTEXT, TokenSupplier
 from aircloudy.errors import IllegalStateException
@@ -17,21 +20,104 @@ from aircloudy.utils import current_task_is_running, utc_datetime_from_millis
 
 from ..interior_unit_base import InteriorUnitBase
 from . import hitachi_frame_models, stomp
+from .deduplication import NotificationDeduplicator
+from .websocket_stats import WebsocketStats, WebsocketStatsRecorder
 
 logger = logging.getLogger(__name__)
 
 
+def interior_unit_from_notification(d: dict) -> InteriorUnitBase:
+    return InteriorUnitBase(
+        d["id"],
+        d["name"],
+        d["roomTemperature"],
+        d["relativeTemperature"],
+        utc_datetime_from_millis(d["updatedAt"]),
+        d["online"],
+        utc_datetime_from_millis(d["lastOnlineUpdatedAt"]),
+        d["model"],
+        str(d["modelTypeId"]),
+        d["serialNumber"],
+        d["vendorThingId"],
+        d["scheduletype"],
+        d["power"],
+        d["mode"],
+        d["iduTemperature"],
+        d["humidity"],
+        d["fanSpeed"],
+        d["fanSwing"],
+    )
+
+
+class _MeteredTransport:
+    """Transport counting the bytes written, everything else is delegated"""
+
+    _transport: asyncio.Transport
+    _stats: WebsocketStatsRecorder
+
+    def __init__(self, transport: asyncio.Transport, stats: WebsocketStatsRecorder) -> None:
+        self._transport = transport
+        self._stats = stats
+
+    def write(self, data: bytes | bytearray | memoryview) -> None:
+        self._stats.record_wire_sent(len(data))
+        self._transport.write(data)
+
+    def __getattr__(self, name: str) -> object:
+        return getattr(self._transport, name)
+
+
+class _MeteredConnection(ClientConnection):
+    """Websocket connection counting the bytes exchanged with the TLS layer, so compressed frame sizes"""
+
+    _stats: WebsocketStatsRecorder
+
+    def __init__(
+        self,
+        protocol: ClientProtocol,
+        *,
+        stats: WebsocketStatsRecorder,
+        ping_interval: float | None = 20,
+        ping_timeout: float | None = 20,
+        close_timeout: float | None = 10,
+        max_queue: int | None | tuple[int | None, int | None] = 16,
+        write_limit: int | tuple[int, int | None] = 2**15,
+    ) -> None:
+        super().__init__(
+            protocol,
+            ping_interval=ping_interval,
+            ping_timeout=ping_timeout,
+            close_timeout=close_timeout,
+            max_queue=max_queue,
+            write_limit=write_limit,
+        )
+        self._stats = stats
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        super().connection_made(transport)
+        self.transport = cast(asyncio.Transport, _MeteredTransport(self.transport, self._stats))
+
+    def data_received(self, data: bytes) -> None:
+        self._stats.record_wire_received(len(data))
+        super().data_received(data)
+
+
 class NotificationsWebsocket:
     _notification_host: str
     _token_supplier: TokenSupplier
     _user_id: int
     _family_id: int
-    state_callback: Callable[[list[InteriorUnitBase], bool], None]
+    state_callback: Callable[[list[InteriorUnitBase], bool], Awaitable[None]]
     on_unexpected_connection_close: Callable[[websockets.ConnectionClosed], Awaitable[None]] | None
 
     _notification_socket: websockets.WebSocketClientProtocol | None = None
     _handle_connection_task: Task | None
     _closed_by_client: bool
+    _deduplicator: NotificationDeduplicator
+    _compression: Literal["deflate"] | None
+    _stats: WebsocketStatsRecorder
+    _receipt_timeout: float
+    _pending_receipts: dict[str, tuple[float, asyncio.Future[float]]]
 
     def __init__(
         self,
@@ -39,8 +125,11 @@ class NotificationsWebsocket:
         token_supplier: TokenSupplier,
         user_id: int,
         family_id: int,
-        state_callback: Callable[[list[InteriorUnitBase], bool], None],
+        state_callback: Callable[[list[InteriorUnitBase], bool], Awaitable[None]],
         on_unexpected_connection_close: Callable[[websockets.ConnectionClosed], Awaitable[None]] | None = None,
+        max_remembered_message_ids: int = 256,
+        compression: Literal["deflate"] | None = "deflate",
+        receipt_timeout: float = 10,
     ) -> None:
         self._notification_host = notification_host
         self._token_supplier = token_supplier
@@ -50,6 +139,11 @@ class NotificationsWebsocket:
         self.on_unexpected_connection_close = on_unexpected_connection_close
         self.notification_subscription_id = uuid.uuid4()
         self._closed_by_client = True
+        self._deduplicator = NotificationDeduplicator(max_remembered_message_ids)
+        self._compression = compression
+        self._stats = WebsocketStatsRecorder()
+        self._receipt_timeout = receipt_timeout
+        self._pending_receipts = {}
 
     async def __aenter__(self) -> Self:
         await self.connect()
@@ -68,6 +162,21 @@ class NotificationsWebsocket:
     def is_open(self) -> bool:
         return self._notification_socket is not None
 
+    @property
+    def dropped_duplicate_messages(self) -> int:
+        return self._deduplicator.duplicate_messages
+
+    @property
+    def dropped_stale_interior_units(self) -> int:
+        return self._deduplicator.stale_interior_units
+
+    def stats(self) -> WebsocketStats:
+        return self._stats.snapshot(
+            len(self._pending_receipts),
+            self._deduplicator.duplicate_messages,
+            self._deduplicator.stale_interior_units,
+        )
+
     async def connect(self) -> None:
         self._closed_by_client = False
         await self._init_connection()
@@ -89,8 +198,12 @@ class NotificationsWebsocket:
                 logger.info(
                     "Connection closed with status %d and reason %s", connection_closed.code, connection_closed.reason
                 )
+                # Allow the connection to be opened again
+                self._notification_socket = None
                 if not self._closed_by_client and self.on_unexpected_connection_close is not None:
                     await self.on_unexpected_connection_close(connection_closed)
+        finally:
+            self._fail_pending_receipts()
 
     async def _init_connection(self) -> None:
         if self.is_open:
@@ -98,21 +211,52 @@ class NotificationsWebsocket:
 
         websocket_url = f"wss://{self._notification_host}/rac-notifications/websocket"
         logger.info("Open websocket to %s", websocket_url)
-        self._notification_socket = await websockets.connect(websocket_url, ssl=SSL_CONTEXT)
-        logger.debug("Send CONNECT stomp frame")
-        await self._notification_socket.send(
-            hitachi_frame_models.ConnectFrame(await self._token_supplier()).get_frame()
+        self._notification_socket = await websockets.connect(
+            websocket_url,
+            ssl=SSL_CONTEXT,
+            compression=self._compression,
+            # The websockets documentation allows a wrapper of the connection class
+            create_connection=cast(type[ClientConnection], functools.partial(_MeteredConnection, stats=self._stats)),
         )
+        try:
+            await self._init_stomp_session()
+        except BaseException:
+            socket = self._notification_socket
+            self._notification_socket = None
+            await socket.close()
+            raise
+
+    async def _init_stomp_session(self) -> None:
+        if self._notification_socket is None:
+            raise IllegalStateException(__name__ + " is not connected")
+
+        handshake_response = self._notification_socket.response
+        extensions = (
+            handshake_response.headers.get("Sec-WebSocket-Extensions", "") if handshake_response is not None else ""
+        )
+        self._stats.compression_negotiated = "permessage-deflate" in extensions
+        logger.debug("Websocket extensions negotiated: %s", extensions)
+        logger.debug("Send CONNECT stomp frame")
+        await self._send(hitachi_frame_models.ConnectFrame(await self._token_supplier()).get_frame())
 
         logger.debug("Wait first server frame (expect CONNECTED frame)")
         frame_data = await self._notification_socket.recv()
         if isinstance(frame_data, bytes):
             raise Exception("Binary frame was unexpected")
+        self._stats.record_received(len(frame_data))
+        decode_started_at = time.perf_counter()
         first_server_frame = stomp.parse_server_frame(frame_data)
+        self._stats.record_decode_time(time.perf_counter() - decode_started_at)
         if not isinstance(first_server_frame, stomp.ConnectedFrame):
             raise Exception(f"Expected stomp.ConnectedFrame but got {first_server_frame}")
 
-    async def subscribe(self) -> uuid.UUID:
+    async def subscribe(self, receipt: bool = False) -> uuid.UUID:
+        """Subscribe to interior units notifications
+
+        :param receipt: If true, wait for the server to acknowledge the subscription
+        :raises:
+            TimeoutError: If receipt is requested and not received in time
+        """
         if self._notification_socket is None:
             raise IllegalStateException(__name__ + " is not connected")
 
@@ -123,8 +267,11 @@ class NotificationsWebsocket:
             self._user_id,
             self._family_id,
         )
-        payload = hitachi_frame_models.SubscribeFrame(subscription_id, self._user_id, self._family_id)
-        await self._notification_socket.send(payload.get_frame())
+        receipt_id, receipt_future = self._create_receipt() if receipt else (None, None)
+        payload = hitachi_frame_models.SubscribeFrame(subscription_id, self._user_id, self._family_id, receipt_id)
+        await self._send(payload.get_frame())
+        if receipt_future is not None:
+            await receipt_future
         return subscription_id
 
     async def unsubscribe(self, subscription_id: uuid.UUID) -> None:
@@ -133,34 +280,89 @@ class NotificationsWebsocket:
 
         logger.info("Remove subscription %s", subscription_id)
         payload = hitachi_frame_models.UnsubscribeFrame(subscription_id)
-        await self._notification_socket.send(payload.get_frame())
+        await self._send(payload.get_frame())
+        self._deduplicator.forget_subscription(str(subscription_id))
+
+    async def refresh_all(self, receipt: bool = False) -> asyncio.Future[float] | None:
+        """Request a refresh of all interior units
 
-    async def refresh_all(self) -> None:
+        :param receipt: If true, return a future resolved with the round-trip time (in seconds) of the request
+        """
         if self._notification_socket is None:
             raise IllegalStateException(__name__ + " is not connected")
 
         logger.info("Request refresh all")
+        receipt_id, receipt_future = self._create_receipt() if receipt else (None, None)
         payload = hitachi_frame_models.RefreshAllInteriorUnitFrame(
-            await self._token_supplier(), self._user_id, self._family_id
+            await self._token_supplier(), self._user_id, self._family_id, receipt_id
         )
-        await self._notification_socket.send(payload.get_frame())
+        await self._send(payload.get_frame())
+        return receipt_future
 
-    async def refresh(self, rac_id: int) -> None:
+    async def refresh(self, rac_id: int, receipt: bool = False) -> asyncio.Future[float] | None:
+        """Request a refresh of an interior unit
+
+        :param receipt: If true, return a future resolved with the round-trip time (in seconds) of the request
+        """
         if self._notification_socket is None:
             raise IllegalStateException(__name__ + " is not connected")
 
         logger.info("Request refresh rac_id=%d", rac_id)
+        receipt_id, receipt_future = self._create_receipt() if receipt else (None, None)
         payload = hitachi_frame_models.RefreshInteriorUnitFrame(
-            await self._token_supplier(), self._user_id, self._family_id, rac_id
+            await self._token_supplier(), self._user_id, self._family_id, rac_id, receipt_id
         )
-        await self._notification_socket.send(payload.get_frame())
+        await self._send(payload.get_frame())
+        return receipt_future
+
+    def _create_receipt(self) -> tuple[str, asyncio.Future[float]]:
+        receipt_id = str(uuid.uuid4())
+        future: asyncio.Future[float] = asyncio.get_running_loop().create_future()
+        self._pending_receipts[receipt_id] = (time.perf_counter(), future)
+
+        def on_timeout() -> None:
+            if receipt_id in self._pending_receipts:
+                del self._pending_receipts[receipt_id]
+                if not future.done():
+                    future.set_exception(TimeoutError(f"Receipt {receipt_id} not received"))
+
+        timeout_handle = asyncio.get_running_loop().call_later(self._receipt_timeout, on_timeout)
+        future.add_done_callback(lambda _: timeout_handle.cancel())
+        return receipt_id, future
+
+    def _resolve_receipt(self, receipt_id: str) -> None:
+        pending = self._pending_receipts.pop(receipt_id, None)
+        if pending is None:
+            logger.warning("Received unknown receipt %s", receipt_id)
+            return
+
+        sent_at, future = pending
+        round_trip_time = time.perf_counter() - sent_at
+        self._stats.record_receipt_round_trip_time(round_trip_time)
+        logger.debug("Received receipt %s after %.3fs", receipt_id, round_trip_time)
+        if not future.done():
+            future.set_result(round_trip_time)
+
+    def _fail_pending_receipts(self) -> None:
+        pending_receipts = self._pending_receipts
+        self._pending_receipts = {}
+        for _, future in pending_receipts.values():
+            if not future.done():
+                future.set_exception(IllegalStateException("Connection closed before receipt"))
+
+    async def _send(self, frame: str) -> None:
+        if self._notification_socket is None:
+            raise IllegalStateException(__name__ + " is not connected")
+
+        await self._notification_socket.send(frame)
+        self._stats.record_sent(len(frame))
 
     async def _send_client_heartbeat_loop(self) -> None:
         logger.debug("Start send client heartbeat loop")
         while current_task_is_running() and self._notification_socket is not None:
             try:
                 logger.debug("Send heartbeat")
-                await self._notification_socket.send("\r\n")
+                await self._send("\r\n")
                 await asyncio.sleep(10)
             except websockets.ConnectionClosed as e:
                 raise e
@@ -177,50 +379,25 @@ class NotificationsWebsocket:
                 data = await self._notification_socket.recv()
                 if isinstance(data, bytes):
                     raise Exception("Binary frame was unexpected")
+                self._stats.record_received(len(data))
 
+                decode_started_at = time.perf_counter()
                 frame = stomp.parse_server_frame(data)
                 logger.debug("Received frame %s", frame)
+                interior_units, partial = (
+                    self._decode_interior_units(frame) if isinstance(frame, stomp.MessageFrame) else ([], False)
+                )
+                self._stats.record_decode_time(time.perf_counter() - decode_started_at)
                 match frame:
                     case None:
                         logger.debug("Frame was server-heartbeat")
                     case stomp.ConnectedFrame():
                         raise Exception("ConnectedFrame should have been received at initialization")
+                    case stomp.ReceiptFrame():
+                        self._resolve_receipt(frame.receipt_id)
                     case stomp.MessageFrame():
-                        if frame.body is None:
-                            raise Exception("Unexpected message without body")
-
-                        notification_type = frame.body.get("notificationType")
-                        if notification_type is None:
-                            raise Exception("Unexpected message without notificationType")
-
-                        if notification_type in ("ON_CONNECT", "BUCKET_UPDATE", "REFRESH_ALL"):
-                            interior_units = [
-                                InteriorUnitBase(
-                                    d["id"],
-                                    d["name"],
-                                    d["roomTemperature"],
-                                    d["relativeTemperature"],
-                                    utc_datetime_from_millis(d["updatedAt"]),
-                                    d["online"],
-                                    utc_datetime_from_millis(d["lastOnlineUpdatedAt"]),
-                                    d["model"],
-                                    str(d["modelTypeId"]),
-                                    d["serialNumber"],
-                                    d["vendorThingId"],
-                                    d["scheduletype"],
-                                    d["power"],
-                                    d["mode"],
-                                    d["iduTemperature"],
-                                    d["humidity"],
-                                    d["fanSpeed"],
-                                    d["fanSwing"],
-                                )
-                                for d in frame.body["data"]
-                            ]
-                            self.state_callback(interior_units, notification_type == "BUCKET_UPDATE")
-                        else:
-                            raise Exception("Unexpected message notification_type", notification_type)
-
+                        if len(interior_units) > 0:
+                            await self.state_callback(interior_units, partial)
                     case _:
                         logger.warning("Unexpected frame type : %s", frame.message)
             except websockets.ConnectionClosed as e:
@@ -230,6 +407,26 @@ class NotificationsWebsocket:
                 raise e
         logger.debug("End handle incoming frame loop")
 
+    def _decode_interior_units(self, frame: stomp.MessageFrame) -> tuple[list[InteriorUnitBase], bool]:
+        """Interior units of a notification not seen yet, and whether the notification is partial"""
+        if frame.body is None:
+            raise Exception("Unexpected message without body")
+
+        notification_type = frame.body.get("notificationType")
+        if notification_type is None:
+            raise Exception("Unexpected message without notificationType")
+        if notification_type not in ("ON_CONNECT", "BUCKET_UPDATE", "REFRESH_ALL"):
+            raise Exception("Unexpected message notification_type", notification_type)
+
+        if self._deduplicator.is_duplicate_message(frame.subscription, frame.message_id):
+            return [], False
+        interior_units = [
+            interior_unit_from_notification(d)
+            for d in frame.body["data"]
+            if not self._deduplicator.is_stale_interior_unit(d["id"], d["updatedAt"])
+        ]
+        return interior_units, notification_type == "BUCKET_UPDATE"
+
     async def close(self) -> None:
         self._closed_by_client = True
         try:
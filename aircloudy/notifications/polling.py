@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import time
+import traceback
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from ..api.rac import interior_unit_from_api
+from ..api.rac_models import InteriorUnitUserState
+from ..errors import IllegalStateException, InvalidArgumentException
+from ..interior_unit_base import InteriorUnitBase
+from ..metrics import LatencyGauge, LatencySnapshot
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PollingStats:
+    polls: int
+    unchanged_polls: int
+    failed_polls: int
+    decoded_interior_units: int
+    interval: float
+    poll_time: LatencySnapshot
+
+
+class AdaptivePoller:
+    """Poll the interior units list from the api, as a replacement of the notification websocket.
+
+    The api only lists all interior units at once, so the interval follows the most active unit: `min_interval` while
+    a unit changed or was sent a command during the last `active_window` seconds, then growing by `idle_growth` after
+    each poll until `max_interval`. Failed polls back off the same way.
+    Responses identical to the previous one are not decoded, and only interior units whose payload changed are
+    decoded and passed to `state_callback`, as a partial update. Ids of interior units no longer listed are passed
+    to `removal_callback`. A response is only remembered once both callbacks succeeded, so a failed callback gets
+    the same units again at the next poll.
+    """
+
+    _fetch: Callable[[], Awaitable[str]]
+    state_callback: Callable[[list[InteriorUnitBase], bool], Awaitable[None]]
+    removal_callback: Callable[[list[int]], Awaitable[None]] | None
+    _min_interval: float
+    _max_interval: float
+    _active_window: float
+    _idle_growth: float
+
+    _interval: float
+    _last_activity: dict[int, float]
+    _fingerprint: bytes | None
+    _payloads: dict[int, dict]
+    _wakeup: asyncio.Event
+    _waiters: list[asyncio.Future[float]]
+    _task: asyncio.Task[None] | None
+
+    _polls: int
+    _unchanged_polls: int
+    _failed_polls: int
+    _decoded_interior_units: int
+    _poll_time: LatencyGauge
+
+    def __init__(
+        self,
+        fetch: Callable[[], Awaitable[str]],
+        state_callback: Callable[[list[InteriorUnitBase], bool], Awaitable[None]],
+        min_interval: float = 5,
+        max_interval: float = 120,
+        active_window: float = 60,
+        idle_growth: float = 1.5,
+        removal_callback: Callable[[list[int]], Awaitable[None]] | None = None,
+    ) -> None:
+        if min_interval <= 0 or max_interval < min_interval:
+            raise InvalidArgumentException("Intervals must satisfy 0 < min_interval <= max_interval")
+        if idle_growth < 1:
+            raise InvalidArgumentException("idle_growth must be at least 1")
+
+        self._fetch = fetch
+        self.state_callback = state_callback
+        self.removal_callback = removal_callback
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._active_window = active_window
+        self._idle_growth = idle_growth
+
+        self._interval = min_interval
+        self._last_activity = {}
+        self._fingerprint = None
+        self._payloads = {}
+        self._wakeup = asyncio.Event()
+        self._waiters = []
+        self._task = None
+
+        self._polls = 0
+        self._unchanged_polls = 0
+        self._failed_polls = 0
+        self._decoded_interior_units = 0
+        self._poll_time = LatencyGauge()
+
+    @property
+    def is_open(self) -> bool:
+        return self._task is not None
+
+    @property
+    def interval(self) -> float:
+        """Delay before the next poll"""
+        return self._interval
+
+    def stats(self) -> PollingStats:
+        return PollingStats(
+            self._polls,
+            self._unchanged_polls,
+            self._failed_polls,
+            self._decoded_interior_units,
+            self._interval,
+            self._poll_time.snapshot(),
+        )
+
+    async def connect(self) -> None:
+        if self.is_open:
+            raise IllegalStateException(__name__ + " already connected")
+        self._task = asyncio.create_task(self._poll_loop())
+
+    async def subscribe(self) -> None:
+        """Nothing to subscribe to, all interior units are polled"""
+
+    def mark_active(self, rac_id: int) -> None:
+        """Poll fast for a while, the state of the unit is expected to change"""
+        self._last_activity[rac_id] = time.monotonic()
+        self._interval = self._min_interval
+
+    def record_command(self, command: InteriorUnitUserState) -> None:
+        """Command listener marking the commanded unit active"""
+        self.mark_active(command.rac_id)
+
+    async def refresh_all(self, receipt: bool = False) -> asyncio.Future[float] | None:
+        """Poll now
+
+        :param receipt: If true, return a future resolved with the duration (in seconds) of the poll
+        """
+        if not self.is_open:
+            raise IllegalStateException(__name__ + " is not connected")
+        future: asyncio.Future[float] | None = None
+        if receipt:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+        self._wakeup.set()
+        return future
+
+    async def refresh(self, rac_id: int, receipt: bool = False) -> asyncio.Future[float] | None:
+        """Poll now, and poll fast for a while"""
+        self.mark_active(rac_id)
+        return await self.refresh_all(receipt)
+
+    def _next_interval(self, changed: bool) -> float:
+        now = time.monotonic()
+        self._last_activity = {
+            rac_id: at for rac_id, at in self._last_activity.items() if now - at < self._active_window
+        }
+        if changed or len(self._last_activity) > 0:
+            return self._min_interval
+        return min(self._max_interval, self._interval * self._idle_growth)
+
+    async def _poll_loop(self) -> None:
+        while True:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), self._interval)
+            self._wakeup.clear()
+            await self._poll()
+
+    async def _poll(self) -> None:
+        waiters = self._waiters
+        self._waiters = []
+        started_at = time.perf_counter()
+        try:
+            changed = await self._poll_once()
+        except Exception as e:
+            self._failed_polls += 1
+            logger.warning("Failed to poll interior units : %s", traceback.format_exc())
+            self._interval = min(self._max_interval, self._interval * self._idle_growth)
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+            return
+
+        duration = time.perf_counter() - started_at
+        self._poll_time.record(duration)
+        self._interval = self._next_interval(changed)
+        logger.debug("Polled interior units in %.3fs, next poll in %.1fs", duration, self._interval)
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(duration)
+
+    async def _poll_once(self) -> bool:
+        """Fetch interior units and publish the changed ones, return True if any changed"""
+        body = await self._fetch()
+        self._polls += 1
+
+        fingerprint = hashlib.blake2b(body.encode(), digest_size=16).digest()
+        if fingerprint == self._fingerprint:
+            self._unchanged_polls += 1
+            return False
+
+        first_poll = self._fingerprint is None
+        payloads = {d["id"]: d for d in json.loads(body)}
+        changed = [interior_unit_from_api(d) for rac_id, d in payloads.items() if self._payloads.get(rac_id) != d]
+        removed = [rac_id for rac_id in self._payloads if rac_id not in payloads]
+        self._decoded_interior_units += len(changed)
+
+        if len(changed) > 0:
+            await self.state_callback(changed, True)
+        if len(removed) > 0 and self.removal_callback is not None:
+            await self.removal_callback(removed)
+        self._fingerprint = fingerprint
+        self._payloads = payloads
+        if len(changed) == 0:
+            return False
+
+        if first_poll:
+            # Everything is new on the first poll, it says nothing about activity
+            return False
+        for iu in changed:
+            self.mark_active(iu.rac_id)
+        return True
+
+    async def close(self) -> None:
+        task = self._task
+        self._task = None
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_exception(IllegalStateException("Poller closed before poll"))
+        self._waiters = []
+        logger.info("Poller closed")
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from ..metrics import LatencyGauge, LatencySnapshot, RateMeter
+
+
+@dataclass(frozen=True)
+class WebsocketStats:
+    compression_negotiated: bool
+    frames_received: int
+    chars_received: int
+    max_frame_chars: int
+    frames_per_second: float
+    frames_sent: int
+    chars_sent: int
+    wire_bytes_received: int
+    wire_bytes_sent: int
+    decode_time: LatencySnapshot
+    receipt_round_trip_time: LatencySnapshot
+    pending_receipts: int
+    dropped_duplicate_messages: int
+    dropped_stale_interior_units: int
+
+    @property
+    def mean_frame_chars(self) -> float | None:
+        return self.chars_received / self.frames_received if self.frames_received > 0 else None
+
+    @property
+    def compression_ratio(self) -> float | None:
+        """Received characters per byte on the wire"""
+        return self.chars_received / self.wire_bytes_received if self.wire_bytes_received > 0 else None
+
+
+class WebsocketStatsRecorder:
+    """Track size, rate and decode time of the frames going through the notification websocket.
+
+    Frame sizes are counted in characters of the text frames handed by the websocket library, after decompression.
+    The bytes on the wire are counted by the connection: websocket frames as compressed, handshake included, TLS
+    excluded. Decode time covers the parsing of every frame received.
+    """
+
+    compression_negotiated: bool
+    frames_received: int
+    chars_received: int
+    max_frame_chars: int
+    frames_sent: int
+    chars_sent: int
+    wire_bytes_received: int
+    wire_bytes_sent: int
+    _frame_rate: RateMeter
+    _decode_time: LatencyGauge
+    _receipt_round_trip_time: LatencyGauge
+
+    def __init__(self, rate_window: float = 60.0) -> None:
+        self.compression_negotiated = False
+        self.frames_received = 0
+        self.chars_received = 0
+        self.max_frame_chars = 0
+        self.frames_sent = 0
+        self.chars_sent = 0
+        self.wire_bytes_received = 0
+        self.wire_bytes_sent = 0
+        self._frame_rate = RateMeter(rate_window)
+        self._decode_time = LatencyGauge()
+        self._receipt_round_trip_time = LatencyGauge()
+
+    def record_received(self, chars: int) -> None:
+        self.frames_received += 1
+        self.chars_received += chars
+        self.max_frame_chars = max(self.max_frame_chars, chars)
+        self._frame_rate.mark()
+
+    def record_sent(self, chars: int) -> None:
+        self.frames_sent += 1
+        self.chars_sent += chars
+
+    def record_wire_received(self, size: int) -> None:
+        self.wire_bytes_received += size
+
+    def record_wire_sent(self, size: int) -> None:
+        self.wire_bytes_sent += size
+
+    def record_decode_time(self, seconds: float) -> None:
+        self._decode_time.record(seconds)
+
+    def record_receipt_round_trip_time(self, seconds: float) -> None:
+        self._receipt_round_trip_time.record(seconds)
+
+    def snapshot(
+        self, pending_receipts: int, dropped_duplicate_messages: int, dropped_stale_interior_units: int
+    ) -> WebsocketStats:
+        return WebsocketStats(
+            self.compression_negotiated,
+            self.frames_received,
+            self.chars_received,
+            self.max_frame_chars,
+            self._frame_rate.rate(),
+            self.frames_sent,
+            self.chars_sent,
+            self.wire_bytes_received,
+            self.wire_bytes_sent,
+            self._decode_time.snapshot(),
+            self._receipt_round_trip_time.snapshot(),
+            pending_receipts,
+            dropped_duplicate_messages,
+            dropped_stale_interior_units,
+        )
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from .interior_unit_base import InteriorUnitBase
+from .interior_unit_changes import InteriorUnitChanges
+from .serialization import interior_unit_base_from_dict, interior_unit_base_to_dict
+from .utils import utc_datetime_from_millis
+
+logger = logging.getLogger(__name__)
+
+_FORMAT_VERSION = 1
+
+
+@dataclass(frozen=True)
+class RegistrySnapshotData:
+    saved_at: datetime.datetime
+    interior_units: list[InteriorUnitBase]
+
+
+class RegistrySnapshot:
+    """Compact on-disk copy of the interior units registry of an account.
+
+    Units are stored as rows of values under a single header of field names. The file is replaced atomically, so a
+    crash while saving keeps the previous snapshot. Use `record` as an update listener of `HitachiAirCloud`.
+    """
+
+    _path: Path
+    _account: str
+    _latest: dict[int, InteriorUnitBase]
+    _dirty: bool
+
+    def __init__(self, path: str | Path, account: str) -> None:
+        self._path = Path(path)
+        # Only keep a digest of the account identifier (usually an email) on disk
+        self._account = hashlib.sha256(account.encode()).hexdigest()
+        self._latest = {}
+        self._dirty = False
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def record(self, interior_units: list[InteriorUnitBase], changes: dict[int, InteriorUnitChanges]) -> None:
+        for iu in interior_units:
+            if iu.rac_id not in self._latest or iu.rac_id in changes:
+                self._latest[iu.rac_id] = iu
+                self._dirty = True
+
+    def forget(self, rac_id: int) -> None:
+        if self._latest.pop(rac_id, None) is not None:
+            self._dirty = True
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        self._dirty = False
+
+        rows = [interior_unit_base_to_dict(iu) for iu in self._latest.values()]
+        fields = list(rows[0]) if len(rows) > 0 else []
+        data = {
+            "version": _FORMAT_VERSION,
+            "account": self._account,
+            "saved_at": time.time_ns() // 1_000_000,
+            "fields": fields,
+            "units": [[row[field] for field in fields] for row in rows],
+        }
+        temporary_path = self._path.with_name(self._path.name + ".tmp")
+        temporary_path.write_text(json.dumps(data, separators=(",", ":")))
+        os.replace(temporary_path, self._path)
+        logger.debug("Saved registry snapshot of %d interior units to %s", len(rows), self._path)
+
+    def load(self) -> RegistrySnapshotData | None:
+        """Read the snapshot, None if there is none usable for this account"""
+        try:
+            data = json.loads(self._path.read_text())
+            if data["version"] != _FORMAT_VERSION or data["account"] != self._account:
+                return None
+            fields = data["fields"]
+            interior_units = [
+                interior_unit_base_from_dict(dict(zip(fields, row, strict=True))) for row in data["units"]
+            ]
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignore unreadable registry snapshot %s", self._path)
+            return None
+
+        for iu in interior_units:
+            self._latest.setdefault(iu.rac_id, iu)
+        return RegistrySnapshotData(utc_datetime_from_millis(data["saved_at"]), interior_units)
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import Literal
+
+from .api.rac_models import InteriorUnitUserState
+from .contants import CommandPriority, FanSpeed, FanSwing, OperatingMode, Power
+
+type SceneOutcome = Literal["UNCHANGED", "APPLIED", "FAILED", "OFFLINE", "HELD", "NOT_FOUND"]
+
+
+@dataclass(frozen=True)
+class SceneState:
+    """Target state of a scene, fields left to None are kept as they are on each unit"""
+
+    power: Power | None = None
+    operating_mode: OperatingMode | None = None
+    requested_temperature: float | None = None
+    humidity: int | None = None
+    fan_speed: FanSpeed | None = None
+    fan_swing: FanSwing | None = None
+
+    def target(self, current: InteriorUnitUserState) -> InteriorUnitUserState | None:
+        """State to send to a unit currently in `current`, None if it is already in the scene state"""
+        target = current.copy(
+            self.power,
+            self.operating_mode,
+            self.requested_temperature,
+            self.humidity,
+            self.fan_speed,
+            self.fan_swing,
+        )
+        return None if target == current else target
+
+    def fields(self) -> dict:
+        """Arguments of `InteriorUnit.send_command` requesting this state"""
+        return {
+            "power": self.power,
+            "mode": self.operating_mode,
+            "requested_temperature": self.requested_temperature,
+            "humidity": self.humidity,
+            "fan_speed": self.fan_speed,
+            "fan_swing": self.fan_swing,
+        }
+
+
+@dataclass(frozen=True)
+class SceneUnitResult:
+    rac_id: int
+    outcome: SceneOutcome
+    error: str | None = None
+
+
+@dataclass(frozen=True)
+class SceneReport:
+    results: dict[int, SceneUnitResult]
+
+    def with_outcome(self, outcome: SceneOutcome) -> list[int]:
+        return [rac_id for rac_id, result in self.results.items() if result.outcome == outcome]
+
+    @property
+    def all_succeeded(self) -> bool:
+        return all(result.outcome in ("UNCHANGED", "APPLIED") for result in self.results.values())
+
+
+class ScenePowerBatch:
+    """
+    Power-only commands of a scene, taken from the state updaters of the units to be switched with one call
+
+    A command is taken only if it is the state computed by the scene, a unit whose pending state was merged with
+    other changes is sent on its own. The batch is closed once every unit gave its command, or after the window.
+    """
+
+    power: Power
+    priority: CommandPriority
+    targets: dict[int, InteriorUnitUserState]
+    _taken: dict[int, asyncio.Future[bool]]
+    _all_taken: asyncio.Event
+    _closed: bool
+
+    def __init__(self, power: Power, priority: CommandPriority, targets: dict[int, InteriorUnitUserState]) -> None:
+        self.power = power
+        self.priority = priority
+        self.targets = targets
+        self._taken = {}
+        self._all_taken = asyncio.Event()
+        self._closed = False
+
+    async def take(self, command: InteriorUnitUserState) -> bool:
+        """
+        Wait for the batch call if the command belongs to the batch
+
+        :return: True if the command was applied by the batch call, False if it has to be sent on its own
+        :raises:
+            CommandFailedException: If the batch call failed for this unit
+        """
+        if self._closed or command.rac_id in self._taken or self.targets.get(command.rac_id) != command:
+            return False
+        done: asyncio.Future[bool] = asyncio.get_running_loop().create_future()
+        self._taken[command.rac_id] = done
+        if len(self._taken) == len(self.targets):
+            self._all_taken.set()
+        return await done
+
+    async def close(self, window: float) -> list[InteriorUnitUserState]:
+        """Wait for the commands at most `window` seconds, return the commands taken"""
+        try:
+            async with asyncio.timeout(window):
+                await self._all_taken.wait()
+        except TimeoutError:
+            pass
+        self._closed = True
+        return [self.targets[rac_id] for rac_id in self._taken]
+
+    def resolve(self, rac_id: int, error: BaseException | None = None) -> None:
+        done = self._taken.get(rac_id)
+        if done is None or done.done():
+            return
+        if error is None:
+            done.set_result(True)
+        else:
+            done.set_exception(error)
+
+    def send_alone(self) -> None:
+        """Let the units whose command wasn't resolved by the batch call send it on their own"""
+        for done in self._taken.values():
+            if not done.done():
+                done.set_result(False)
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import datetime
+
+from .interior_unit_base import InteriorUnitBase
+from .interior_unit_changes import CHANGE_FIELDS, InteriorUnitChanges
+from .utils import utc_datetime_from_millis
+
+DATETIME_FIELDS = frozenset({"updated_at", "online_updated_at"})
+
+
+def millis_from_datetime(value: datetime.datetime) -> int:
+    return round(value.timestamp() * 1000)
+
+
+def interior_unit_base_to_dict(base: InteriorUnitBase) -> dict:
+    """Convert to a JSON compatible dict, dates are epoch millis"""
+    return {
+        "rac_id": base.rac_id,
+        "name": base.name,
+        "room_temperature": base.room_temperature,
+        "relative_temperature": base.relative_temperature,
+        "updated_at": millis_from_datetime(base.updated_at),
+        "online": base.online,
+        "online_updated_at": millis_from_datetime(base.online_updated_at),
+        "vendor": base.vendor,
+        "model_id": base.model_id,
+        "serial_number": base.serial_number,
+        "vendor_thing_id": base.vendor_thing_id,
+        "schedule_type": base.schedule_type,
+        "power": base.power,
+        "operating_mode": base.operating_mode,
+        "requested_temperature": base.requested_temperature,
+        "humidity": base.humidity,
+        "fan_speed": base.fan_speed,
+        "fan_swing": base.fan_swing,
+    }
+
+
+def interior_unit_base_from_dict(d: dict) -> InteriorUnitBase:
+    return InteriorUnitBase(
+        d["rac_id"],
+        d["name"],
+        d["room_temperature"],
+        d["relative_temperature"],
+        utc_datetime_from_millis(d["updated_at"]),
+        d["online"],
+        utc_datetime_from_millis(d["online_updated_at"]),
+        d["vendor"],
+        d["model_id"],
+        d["serial_number"],
+        d["vendor_thing_id"],
+        d["schedule_type"],
+        d["power"],
+        d["operating_mode"],
+        d["requested_temperature"],
+        d["humidity"],
+        d["fan_speed"],
+        d["fan_swing"],
+    )
+
+
+def interior_unit_changes_to_dict(changes: InteriorUnitChanges) -> dict[str, list]:
+    """Convert to a JSON compatible dict of `[before, after]` by changed field, dates are epoch millis"""
+    result: dict[str, list] = {}
+    for field in CHANGE_FIELDS:
+        change = getattr(changes, field)
+        if change is None:
+            continue
+        if field in DATETIME_FIELDS:
+            result[field] = [millis_from_datetime(change[0]), millis_from_datetime(change[1])]
+        else:
+            result[field] = [change[0], change[1]]
+    return result
+
+
+def interior_unit_changes_from_dict(d: dict[str, list]) -> InteriorUnitChanges:
+    fields: dict[str, tuple | None] = dict.fromkeys(CHANGE_FIELDS)
+    for field, (before, after) in d.items():
+        if field in DATETIME_FIELDS:
+            fields[field] = (utc_datetime_from_millis(before), utc_datetime_from_millis(after))
+        else:
+            fields[field] = (before, after)
+    return InteriorUnitChanges(**fields)
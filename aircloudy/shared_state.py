@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import datetime
+import logging
+import struct
+import time
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from types import TracebackType
+
+from .contants import FanSpeed, FanSwing, OperatingMode, Power
+from .errors import IllegalStateException
+from .interior_unit_base import InteriorUnitBase
+from .interior_unit_changes import InteriorUnitChanges
+from .serialization import millis_from_datetime
+from .state_codes import pack_state, unpack_state
+from .utils import utc_datetime_from_millis
+
+logger = logging.getLogger(__name__)
+
+# Header: magic, layout version, capacity, published rows
+_HEADER = struct.Struct("<4sIII")
+_MAGIC = b"ACST"
+_LAYOUT_VERSION = 1
+
+# Row: seqlock version, rac_id, updated_at (epoch millis), room, relative and requested temperature, humidity,
+# packed categorical state (see `state_codes.pack_state`), name length in the side table
+_ROW = struct.Struct("<QqqdddiiH6x")
+_VERSION = struct.Struct("<Q")
+_ROW_COUNT_OFFSET = 12
+
+NAME_SLOT_SIZE = 64
+
+
+@dataclass(frozen=True)
+class SharedUnitState:
+    rac_id: int
+    name: str
+    updated_at: datetime.datetime
+    room_temperature: float
+    relative_temperature: float
+    requested_temperature: float
+    humidity: int
+    power: Power | None
+    operating_mode: OperatingMode | None
+    fan_speed: FanSpeed | None
+    fan_swing: FanSwing | None
+    online: bool
+    version: int
+
+
+def _table_size(capacity: int) -> int:
+    return _HEADER.size + capacity * (_ROW.size + NAME_SLOT_SIZE)
+
+
+def _row_offset(row: int) -> int:
+    return _HEADER.size + row * _ROW.size
+
+
+def _name_offset(capacity: int, row: int) -> int:
+    return _HEADER.size + capacity * _ROW.size + row * NAME_SLOT_SIZE
+
+
+def _mapped_buffer(memory: SharedMemory) -> memoryview:
+    if memory.buf is None:
+        raise IllegalStateException(f"Shared memory {memory.name} is not mapped")
+    return memory.buf
+
+
+def _encode_name(name: str) -> bytes:
+    encoded = name.encode()[:NAME_SLOT_SIZE]
+    # Do not cut in the middle of a multibyte character
+    return encoded.decode(errors="ignore").encode()
+
+
+class SharedStateWriter:
+    """Publish interior units state in a shared memory table readable by other processes.
+
+    The table has a fixed-width record per unit and a side table of fixed-size slots for names. Each record is
+    guarded by a seqlock: its version is odd while the record is being written, so readers never need a lock.
+    Use `record` as an update listener of `HitachiAirCloud` and give `name` to `SharedStateReader`.
+    """
+
+    _memory: SharedMemory
+    _buf: memoryview
+    _capacity: int
+    _rows: dict[int, int]
+    _versions: list[int]
+    _full_warned: bool
+
+    def __init__(self, name: str | None = None, capacity: int = 1024) -> None:
+        self._memory = SharedMemory(name=name, create=True, size=_table_size(capacity))
+        self._buf = _mapped_buffer(self._memory)
+        self._capacity = capacity
+        self._rows = {}
+        self._versions = []
+        self._full_warned = False
+        _HEADER.pack_into(self._buf, 0, _MAGIC, _LAYOUT_VERSION, capacity, 0)
+
+    @property
+    def name(self) -> str:
+        return self._memory.name
+
+    def record(self, interior_units: list[InteriorUnitBase], changes: dict[int, InteriorUnitChanges]) -> None:
+        for iu in interior_units:
+            row = self._rows.get(iu.rac_id)
+            if row is None:
+                self._append(iu)
+            elif iu.rac_id in changes:
+                self._write(row, iu)
+
+    def _append(self, iu: InteriorUnitBase) -> None:
+        row = len(self._rows)
+        if row >= self._capacity:
+            if not self._full_warned:
+                logger.warning("Shared state table is full (%d units), unit %d is not published", row, iu.rac_id)
+                self._full_warned = True
+            return
+
+        self._rows[iu.rac_id] = row
+        self._versions.append(0)
+        self._write(row, iu)
+        # Publish the row only once fully written
+        struct.pack_into("<I", self._buf, _ROW_COUNT_OFFSET, row + 1)
+
+    def _write(self, row: int, iu: InteriorUnitBase) -> None:
+        buf = self._buf
+        offset = _row_offset(row)
+        name = _encode_name(iu.name)
+
+        version = self._versions[row] + 1
+        _VERSION.pack_into(buf, offset, version)
+        name_offset = _name_offset(self._capacity, row)
+        buf[name_offset : name_offset + len(name)] = name
+        _ROW.pack_into(
+            buf,
+            offset,
+            version,
+            iu.rac_id,
+            millis_from_datetime(iu.updated_at),
+            iu.room_temperature,
+            iu.relative_temperature,
+            iu.requested_temperature,
+            iu.humidity,
+            pack_state(iu.power, iu.operating_mode, iu.fan_speed, iu.fan_swing, iu.online),
+            len(name),
+        )
+        self._versions[row] = version + 1
+        _VERSION.pack_into(buf, offset, version + 1)
+
+    def close(self) -> None:
+        """Release and destroy the table, readers keep their mapping until they close it"""
+        self._memory.close()
+        self._memory.unlink()
+
+    def __enter__(self) -> SharedStateWriter:
+        return self
+
+    def __exit__(
+        self, exc_type: type[BaseException] | None, exc_val: BaseException | None, exc_tb: TracebackType | None
+    ) -> None:
+        self.close()
+
+
+class SharedStateReader:
+    """Read-only, lock-free access to a table published by `SharedStateWriter` from another process"""
+
+    _memory: SharedMemory
+    _buf: memoryview
+    _capacity: int
+    _rows: dict[int, int]
+    _max_retries: int
+
+    def __init__(self, name: str, max_retries: int = 1000) -> None:
+        self._memory = SharedMemory(name=name, track=False)
+        self._buf = _mapped_buffer(self._memory).toreadonly()
+        magic, layout_version, capacity, _ = _HEADER.unpack_from(self._buf, 0)
+        if magic != _MAGIC or layout_version != _LAYOUT_VERSION:
+            self.close()
+            raise IllegalStateException(f"Shared memory {name} is not a shared state table")
+        self._capacity = capacity
+        self._rows = {}
+        self._max_retries = max_retries
+
+    def _published_rows(self) -> int:
+        return int(struct.unpack_from("<I", self._buf, _ROW_COUNT_OFFSET)[0])
+
+    def _refresh_rows(self) -> None:
+        # Rows are append-only and a row rac_id never changes, so only new rows need to be indexed
+        for row in range(len(self._rows), self._published_rows()):
+            self._rows[self._read(row).rac_id] = row
+
+    def rac_ids(self) -> list[int]:
+        self._refresh_rows()
+        return list(self._rows)
+
+    def get(self, rac_id: int) -> SharedUnitState | None:
+        row = self._rows.get(rac_id)
+        if row is None:
+            self._refresh_rows()
+            row = self._rows.get(rac_id)
+            if row is None:
+                return None
+        return self._read(row)
+
+    def snapshot(self) -> dict[int, SharedUnitState]:
+        self._refresh_rows()
+        return {rac_id: self._read(row) for rac_id, row in self._rows.items()}
+
+    def _read(self, row: int) -> SharedUnitState:
+        buf = self._buf
+        offset = _row_offset(row)
+        name_offset = _name_offset(self._capacity, row)
+        for _ in range(self._max_retries):
+            (
+                version,
+                rac_id,
+                updated_at,
+                room_temperature,
+                relative_temperature,
+                requested_temperature,
+                humidity,
+                state,
+                name_length,
+            ) = _ROW.unpack_from(buf, offset)
+            if version % 2 == 0:
+                name = bytes(buf[name_offset : name_offset + name_length])
+                if _VERSION.unpack_from(buf, offset)[0] == version:
+                    power, operating_mode, fan_speed, fan_swing, online = unpack_state(state)
+                    return SharedUnitState(
+                        rac_id,
+                        name.decode(),
+                        utc_datetime_from_millis(updated_at),
+                        room_temperature,
+                        relative_temperature,
+                        requested_temperature,
+                        humidity,
+                        power,
+                        operating_mode,
+                        fan_speed,
+                        fan_swing,
+                        online,
+                        version,
+                    )
+            time.sleep(0)
+        raise IllegalStateException(f"Row {row} kept changing while being read")
+
+    def close(self) -> None:
+        self._buf.release()
+        self._memory.close()
+
+    def __enter__(self) -> SharedStateReader:
+        return self
+
+    def __exit__(
+        self, exc_type: type[BaseException] | None, exc_val: BaseException | None, exc_tb: TracebackType | None
+    ) -> None:
+        self.close()
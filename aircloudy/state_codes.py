@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from .contants import (
+    FAN_SPEED_VALUES,
+    FAN_SWING_VALUES,
+    OPERATING_MODE_VALUES,
+    POWER_VALUES,
+    FanSpeed,
+    FanSwing,
+    OperatingMode,
+    Power,
+)
+
+# Code used for a value unknown to this library version
+UNKNOWN_CODE = 0xF
+
+POWER_CODES = {value: code for code, value in enumerate(POWER_VALUES)}
+OPERATING_MODE_CODES = {value: code for code, value in enumerate(OPERATING_MODE_VALUES)}
+FAN_SPEED_CODES = {value: code for code, value in enumerate(FAN_SPEED_VALUES)}
+FAN_SWING_CODES = {value: code for code, value in enumerate(FAN_SWING_VALUES)}
+
+
+def _decode[T](values: tuple[T, ...], code: int) -> T | None:
+    return values[code] if code < len(values) else None
+
+
+def power_code(power: Power) -> int:
+    return POWER_CODES.get(power, UNKNOWN_CODE)
+
+
+def operating_mode_code(operating_mode: OperatingMode) -> int:
+    return OPERATING_MODE_CODES.get(operating_mode, UNKNOWN_CODE)
+
+
+def fan_speed_code(fan_speed: FanSpeed) -> int:
+    return FAN_SPEED_CODES.get(fan_speed, UNKNOWN_CODE)
+
+
+def fan_swing_code(fan_swing: FanSwing) -> int:
+    return FAN_SWING_CODES.get(fan_swing, UNKNOWN_CODE)
+
+
+def power_from_code(code: int) -> Power | None:
+    return _decode(POWER_VALUES, code)
+
+
+def operating_mode_from_code(code: int) -> OperatingMode | None:
+    return _decode(OPERATING_MODE_VALUES, code)
+
+
+def fan_speed_from_code(code: int) -> FanSpeed | None:
+    return _decode(FAN_SPEED_VALUES, code)
+
+
+def fan_swing_from_code(code: int) -> FanSwing | None:
+    return _decode(FAN_SWING_VALUES, code)
+
+
+def pack_state(
+    power: Power, operating_mode: OperatingMode, fan_speed: FanSpeed, fan_swing: FanSwing, online: bool
+) -> int:
+    """Pack the categorical state of an interior unit in an int (4 bits per value, online flag at bit 16)"""
+    return (
+        power_code(power)
+        | operating_mode_code(operating_mode) << 4
+        | fan_speed_code(fan_speed) << 8
+        | fan_swing_code(fan_swing) << 12
+        | int(online) << 16
+    )
+
+
+def unpack_state(
+    packed: int,
+) -> tuple[Power | None, OperatingMode | None, FanSpeed | None, FanSwing | None, bool]:
+    return (
+        power_from_code(packed & 0xF),
+        operating_mode_from_code(packed >> 4 & 0xF),
+        fan_speed_from_code(packed >> 8 & 0xF),
+        fan_swing_from_code(packed >> 12 & 0xF),
+        bool(packed >> 16 & 1),
+    )
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import bisect
+import datetime
+import inspect
+import time
+from array import array
+from dataclasses import dataclass
+
+from .errors import InvalidArgumentException
+from .interior_unit_base import InteriorUnitBase
+from .interior_unit_changes import CHANGE_FIELDS, InteriorUnitChanges
+from .serialization import millis_from_datetime
+
+_BASE_FIELDS = tuple(inspect.signature(InteriorUnitBase).parameters)
+
+type _Delta = tuple[int, InteriorUnitChanges | InteriorUnitBase]
+
+
+@dataclass(frozen=True)
+class _Checkpoint:
+    timestamp: int
+    # Index of the first delta recorded after this checkpoint
+    delta_index: int
+    states: dict[int, InteriorUnitBase]
+
+
+def apply_changes(base: InteriorUnitBase, changes: InteriorUnitChanges) -> InteriorUnitBase:
+    """Interior unit state after `changes` were applied to `base`"""
+    fields = {name: getattr(base, name) for name in _BASE_FIELDS}
+    for name in CHANGE_FIELDS:
+        change = getattr(changes, name)
+        if change is not None:
+            fields[name] = change[1]
+    return InteriorUnitBase(**fields)
+
+
+class StateHistory:
+    """Reconstruct the state of interior units at any recorded point in time.
+
+    The whole registry is checkpointed every `checkpoint_every` deltas, with only the changes recorded in between.
+    A lookup bisects to the nearest checkpoint before the requested time and applies at most `checkpoint_every`
+    deltas: a smaller spacing makes queries faster and uses more memory. When `max_checkpoints` is set, history
+    older than the oldest kept checkpoint is dropped.
+    Use `record` as an update listener of `HitachiAirCloud`.
+    """
+
+    _checkpoint_every: int
+    _max_checkpoints: int | None
+    _latest: dict[int, InteriorUnitBase]
+    _checkpoints: list[_Checkpoint]
+    _checkpoint_times: list[int]
+    _deltas: list[_Delta]
+    _delta_times: array
+    # Absolute index of `_deltas[0]`, deltas before it were dropped
+    _delta_offset: int
+    _last_timestamp: int
+
+    def __init__(self, checkpoint_every: int = 1000, max_checkpoints: int | None = None) -> None:
+        if checkpoint_every < 1:
+            raise InvalidArgumentException("checkpoint_every must be at least 1")
+        if max_checkpoints is not None and max_checkpoints < 1:
+            raise InvalidArgumentException("max_checkpoints must be at least 1")
+
+        self._checkpoint_every = checkpoint_every
+        self._max_checkpoints = max_checkpoints
+        self._latest = {}
+        self._checkpoints = []
+        self._checkpoint_times = []
+        self._deltas = []
+        self._delta_times = array("q")
+        self._delta_offset = 0
+        self._last_timestamp = 0
+
+    @property
+    def checkpoint_count(self) -> int:
+        return len(self._checkpoints)
+
+    @property
+    def delta_count(self) -> int:
+        return len(self._deltas)
+
+    def record(self, interior_units: list[InteriorUnitBase], changes: dict[int, InteriorUnitChanges]) -> None:
+        # Keep timestamps sorted even if the wall clock goes backward
+        now = max(time.time_ns() // 1_000_000, self._last_timestamp)
+        self._last_timestamp = now
+
+        for iu in interior_units:
+            if iu.rac_id not in self._latest:
+                self._append_delta(now, (iu.rac_id, iu))
+            elif iu.rac_id in changes:
+                self._append_delta(now, (iu.rac_id, changes[iu.rac_id]))
+            else:
+                continue
+            self._latest[iu.rac_id] = iu
+
+        last_checkpoint = self._checkpoints[-1] if len(self._checkpoints) > 0 else None
+        if last_checkpoint is None or self._next_delta_index() - last_checkpoint.delta_index >= self._checkpoint_every:
+            self._checkpoint(now)
+
+    def _next_delta_index(self) -> int:
+        return self._delta_offset + len(self._deltas)
+
+    def _append_delta(self, timestamp: int, delta: _Delta) -> None:
+        self._deltas.append(delta)
+        self._delta_times.append(timestamp)
+
+    def _checkpoint(self, timestamp: int) -> None:
+        self._checkpoints.append(_Checkpoint(timestamp, self._next_delta_index(), dict(self._latest)))
+        self._checkpoint_times.append(timestamp)
+
+        if self._max_checkpoints is not None and len(self._checkpoints) > self._max_checkpoints:
+            del self._checkpoints[0]
+            del self._checkpoint_times[0]
+            drop = self._checkpoints[0].delta_index - self._delta_offset
+            del self._deltas[:drop]
+            del self._delta_times[:drop]
+            self._delta_offset += drop
+
+    def _replay(
+        self, at: datetime.datetime, rac_id: int | None
+    ) -> tuple[dict[int, InteriorUnitBase], list[_Delta]] | None:
+        timestamp = millis_from_datetime(at)
+        checkpoint_index = bisect.bisect_right(self._checkpoint_times, timestamp) - 1
+        if checkpoint_index < 0:
+            return None
+
+        checkpoint = self._checkpoints[checkpoint_index]
+        first = checkpoint.delta_index - self._delta_offset
+        last = bisect.bisect_right(self._delta_times, timestamp, first)
+        deltas = self._deltas[first:last]
+        if rac_id is not None:
+            deltas = [delta for delta in deltas if delta[0] == rac_id]
+        return checkpoint.states, deltas
+
+    def state_at(self, rac_id: int, at: datetime.datetime) -> InteriorUnitBase | None:
+        """State of the interior unit at `at`, None if it was unknown at that time"""
+        replay = self._replay(at, rac_id)
+        if replay is None:
+            return None
+
+        states, deltas = replay
+        state = states.get(rac_id)
+        for _, delta in deltas:
+            state = delta if isinstance(delta, InteriorUnitBase) else _apply(state, delta)
+        return state
+
+    def fleet_at(self, at: datetime.datetime) -> dict[int, InteriorUnitBase]:
+        """State of all interior units known at `at`"""
+        replay = self._replay(at, None)
+        if replay is None:
+            return {}
+
+        states, deltas = replay
+        fleet = dict(states)
+        for rac_id, delta in deltas:
+            state = delta if isinstance(delta, InteriorUnitBase) else _apply(fleet.get(rac_id), delta)
+            if state is not None:
+                fleet[rac_id] = state
+        return fleet
+
+
+def _apply(base: InteriorUnitBase | None, changes: InteriorUnitChanges) -> InteriorUnitBase | None:
+    return apply_changes(base, changes) if base is not None else None
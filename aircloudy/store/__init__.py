@@ -0,0 +1,3 @@
+from .memory_state_store import MemoryStateStore
+from .sqlite_state_store import SqliteStateStore
+from .state_store import StateStore, StoredState
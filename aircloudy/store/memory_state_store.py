@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import bisect
+import datetime
+from collections import deque
+
+from ..interior_unit_base import InteriorUnitBase
+from ..interior_unit_changes import InteriorUnitChanges
+from .state_store import StateStore, StoredState
+
+
+class MemoryStateStore(StateStore):
+    """Keep the registry and the last `max_history` states of each unit in memory"""
+
+    _units: dict[int, InteriorUnitBase]
+    _history: dict[int, deque[StoredState]]
+    _max_history: int
+
+    def __init__(self, max_history: int = 1000) -> None:
+        self._units = {}
+        self._history = {}
+        self._max_history = max_history
+
+    def record(self, interior_units: list[InteriorUnitBase], changes: dict[int, InteriorUnitChanges]) -> None:
+        now = datetime.datetime.now(datetime.UTC)
+        for iu in interior_units:
+            if iu.rac_id not in self._units or iu.rac_id in changes:
+                history = self._history.setdefault(iu.rac_id, deque(maxlen=self._max_history))
+                history.append(StoredState(now, iu))
+            self._units[iu.rac_id] = iu
+
+    async def load_units(self) -> list[InteriorUnitBase]:
+        return list(self._units.values())
+
+    async def history(
+        self, rac_id: int, start: datetime.datetime | None = None, end: datetime.datetime | None = None
+    ) -> list[StoredState]:
+        states = list(self._history.get(rac_id, ()))
+        first = 0 if start is None else bisect.bisect_left(states, start, key=lambda state: state.recorded_at)
+        last = len(states) if end is None else bisect.bisect_left(states, end, key=lambda state: state.recorded_at)
+        return states[first:last]
+
+    def forget(self, rac_id: int) -> None:
+        self._units.pop(rac_id, None)
+
+    async def flush(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from dataclasses import dataclass
+from pathlib import Path
+
+from ..errors import IllegalStateException
+from ..interior_unit_base import InteriorUnitBase
+from ..interior_unit_changes import InteriorUnitChanges
+from ..serialization import interior_unit_base_from_dict, interior_unit_base_to_dict, millis_from_datetime
+from ..utils import utc_datetime_from_millis
+from .state_store import StateStore, StoredState
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS interior_unit (
+    rac_id INTEGER PRIMARY KEY,
+    recorded_at INTEGER NOT NULL,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS interior_unit_history (
+    rac_id INTEGER NOT NULL,
+    recorded_at INTEGER NOT NULL,
+    state TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS interior_unit_history_rac_id_recorded_at
+    ON interior_unit_history (rac_id, recorded_at);
+"""
+
+# Row to write: rac_id, recorded_at, state and whether it goes to history
+type _Row = tuple[int, int, str, bool]
+
+
+@dataclass(frozen=True)
+class _Forget:
+    rac_id: int
+
+
+class _Stop:
+    pass
+
+
+class SqliteStateStore(StateStore):
+    """Store the registry and its history in a SQLite database in WAL mode.
+
+    `record` only serializes and enqueues; a dedicated thread drains the queue and writes up to `max_batch_size`
+    rows per transaction, so the event loop never waits on disk. A transaction that fails is lost and fails the next
+    `flush`. Reads run in the default executor on their own connection, which WAL allows concurrently with the
+    writer.
+    """
+
+    _path: Path
+    _max_batch_size: int
+    _queue: queue.SimpleQueue[_Row | _Forget | Future[None] | _Stop]
+    _writer: threading.Thread
+    _known_units: set[int]
+    _writer_failed: bool
+    _closed: bool
+
+    def __init__(self, path: str | Path, max_batch_size: int = 500) -> None:
+        self._path = Path(path)
+        self._max_batch_size = max_batch_size
+        self._queue = queue.SimpleQueue()
+        self._known_units = set()
+        self._writer_failed = False
+        self._closed = False
+
+        connection = self._connect()
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+        finally:
+            connection.close()
+
+        self._writer = threading.Thread(target=self._write_loop, name=f"SqliteStateStore({self._path})", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self._path, check_same_thread=False)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def record(self, interior_units: list[InteriorUnitBase], changes: dict[int, InteriorUnitChanges]) -> None:
+        if self._closed:
+            return
+        now = time.time_ns() // 1_000_000
+        for iu in interior_units:
+            state = json.dumps(interior_unit_base_to_dict(iu))
+            is_history = iu.rac_id not in self._known_units or iu.rac_id in changes
+            self._known_units.add(iu.rac_id)
+            self._queue.put((iu.rac_id, now, state, is_history))
+
+    def forget(self, rac_id: int) -> None:
+        if self._closed:
+            return
+        self._known_units.discard(rac_id)
+        self._queue.put(_Forget(rac_id))
+
+    def _write_loop(self) -> None:
+        waiters: list[Future[None]] = []
+        try:
+            connection = self._connect()
+        except Exception as e:
+            self._stop_writer(waiters, e)
+            return
+        try:
+            stop = False
+            # Error of a lost batch, not reported yet to a flush
+            lost: sqlite3.Error | None = None
+            while not stop:
+                rows: list[_Row] = []
+                forgotten: list[int] = []
+                waiters = []
+                item = self._queue.get()
+                while True:
+                    match item:
+                        case _Stop():
+                            stop = True
+                        case Future():
+                            waiters.append(item)
+                        case _Forget(rac_id=rac_id):
+                            forgotten.append(rac_id)
+                        case _:
+                            rows.append(item)
+                    # Rows recorded after a forget go to the next batch, so a unit added again is not deleted
+                    if stop or len(forgotten) > 0 or len(rows) >= self._max_batch_size:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+
+                try:
+                    self._write_batch(connection, rows, forgotten)
+                except sqlite3.Error as e:
+                    logger.error("Failed to store %d interior unit states : %s", len(rows), traceback.format_exc())
+                    lost = e
+                for waiter in waiters:
+                    if lost is None:
+                        waiter.set_result(None)
+                    else:
+                        waiter.set_exception(IllegalStateException(f"Failed to store interior unit states: {lost!r}"))
+                if len(waiters) > 0:
+                    lost = None
+        except Exception as e:
+            self._stop_writer(waiters, e)
+        finally:
+            connection.close()
+
+    def _stop_writer(self, waiters: list[Future[None]], error: Exception) -> None:
+        logger.error("State store writer stopped : %s", traceback.format_exc())
+        self._writer_failed = True
+        self._fail_waiters(waiters, error)
+
+    def _fail_waiters(self, waiters: list[Future[None]], error: Exception) -> None:
+        """Fail the flushes waiting for a writer that stopped, including the ones still queued"""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, Future):
+                waiters.append(item)
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_exception(IllegalStateException(f"State store writer stopped: {error!r}"))
+
+    def _write_batch(self, connection: sqlite3.Connection, rows: list[_Row], forgotten: list[int]) -> None:
+        if len(rows) == 0 and len(forgotten) == 0:
+            return
+        with connection:
+            connection.executemany(
+                "INSERT INTO interior_unit (rac_id, recorded_at, state) VALUES (?, ?, ?) "
+                "ON CONFLICT (rac_id) DO UPDATE SET recorded_at = excluded.recorded_at, state = excluded.state",
+                [(rac_id, recorded_at, state) for rac_id, recorded_at, state, _ in rows],
+            )
+            connection.executemany(
+                "INSERT INTO interior_unit_history (rac_id, recorded_at, state) VALUES (?, ?, ?)",
+                [(rac_id, recorded_at, state) for rac_id, recorded_at, state, is_history in rows if is_history],
+            )
+            connection.executemany("DELETE FROM interior_unit WHERE rac_id = ?", [(rac_id,) for rac_id in forgotten])
+
+    async def load_units(self) -> list[InteriorUnitBase]:
+        rows = await asyncio.to_thread(self._query, "SELECT state FROM interior_unit ORDER BY rac_id", ())
+        return [interior_unit_base_from_dict(json.loads(state)) for (state,) in rows]
+
+    async def history(
+        self, rac_id: int, start: datetime.datetime | None = None, end: datetime.datetime | None = None
+    ) -> list[StoredState]:
+        rows = await asyncio.to_thread(
+            self._query,
+            "SELECT recorded_at, state FROM interior_unit_history "
+            "WHERE rac_id = ? AND recorded_at >= ? AND recorded_at < ? ORDER BY recorded_at, rowid",
+            (
+                rac_id,
+                millis_from_datetime(start) if start is not None else -(2**63),
+                millis_from_datetime(end) if end is not None else 2**63 - 1,
+            ),
+        )
+        return [
+            StoredState(utc_datetime_from_millis(recorded_at), interior_unit_base_from_dict(json.loads(state)))
+            for recorded_at, state in rows
+        ]
+
+    def _query(self, sql: str, parameters: tuple) -> list[tuple]:
+        connection = self._connect()
+        try:
+            return connection.execute(sql, parameters).fetchall()
+        finally:
+            connection.close()
+
+    async def flush(self) -> None:
+        """Wait until the states recorded so far are written
+
+        :raises:
+            IllegalStateException: If the writer thread stopped on an error, or states recorded since the previous
+                flush could not be written
+        """
+        if self._closed:
+            return
+        if self._writer_failed or not self._writer.is_alive():
+            raise IllegalStateException("State store writer stopped")
+        waiter: Future[None] = Future()
+        self._queue.put(waiter)
+        if self._writer_failed:
+            # The writer may have drained the queue before the waiter was put
+            self._fail_waiters([waiter], IllegalStateException("Writer stopped"))
+        await asyncio.wrap_future(waiter)
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_Stop())
+        await asyncio.to_thread(self._writer.join)
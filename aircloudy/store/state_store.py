@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import datetime
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
+from ..interior_unit_base import InteriorUnitBase
+from ..interior_unit_changes import InteriorUnitChanges
+
+
+@dataclass(frozen=True)
+class StoredState:
+    recorded_at: datetime.datetime
+    interior_unit: InteriorUnitBase
+
+
+class StateStore(ABC):
+    """Persist the interior units registry and the history of its changes.
+
+    `record` is used as an update listener of `HitachiAirCloud`: it runs in the notification receive loop and must
+    not block. The registry is stored on every update, history only for new or changed units.
+    """
+
+    @abstractmethod
+    def record(self, interior_units: list[InteriorUnitBase], changes: dict[int, InteriorUnitChanges]) -> None: ...
+
+    @abstractmethod
+    async def load_units(self) -> list[InteriorUnitBase]:
+        """Last stored state of every interior unit"""
+
+    @abstractmethod
+    async def history(
+        self, rac_id: int, start: datetime.datetime | None = None, end: datetime.datetime | None = None
+    ) -> list[StoredState]:
+        """Stored states of the interior unit with `start <= recorded_at < end`, oldest first"""
+
+    @abstractmethod
+    def forget(self, rac_id: int) -> None:
+        """Drop the interior unit from the registry, its history is kept"""
+
+    @abstractmethod
+    async def flush(self) -> None:
+        """Wait until everything recorded so far is stored"""
+
+    @abstractmethod
+    async def close(self) -> None: ...
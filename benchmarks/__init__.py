@@ -0,0 +1,13 @@
+from . import end_to_end, hot_paths
+from .load_test import LoadProfile, LoadReport, LoadTest, Percentiles
+from .runner import (
+    Benchmark,
+    BenchmarkResult,
+    Comparison,
+    benchmark,
+    benchmarks,
+    compare,
+    read_results,
+    run,
+    write_results,
+)
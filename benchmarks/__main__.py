@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from pathlib import Path
+
+from .load_test import LoadProfile, LoadReport, LoadTest, Percentiles
+from .runner import compare, read_results, run, write_results
+
+logger = logging.getLogger("benchmarks")
+
+
+def _format_time(seconds: float | None) -> str:
+    if seconds is None:
+        return "-"
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def run_command(args: argparse.Namespace) -> int:
+    results = run(args.filter, args.repeat, args.min_time, ("MICRO",) if args.micro_only else ("MICRO", "END_TO_END"))
+    for result in results:
+        sys.stdout.write(
+            f"{result.name:<50} {_format_time(result.median):>10} ± {_format_time(result.stdev):>10}"
+            f"  ({result.loops} loops x {len(result.samples)})\n"
+        )
+    if args.output is not None:
+        write_results(Path(args.output), results)
+        logger.info("Results written to %s", args.output)
+    return 0
+
+
+def compare_command(args: argparse.Namespace) -> int:
+    comparisons = compare(read_results(Path(args.baseline)), read_results(Path(args.current)), args.threshold)
+    for comparison in comparisons:
+        ratio = f"x{comparison.ratio:.2f}" if comparison.ratio is not None else ""
+        sys.stdout.write(
+            f"{comparison.name:<50} {_format_time(comparison.baseline):>10} -> {_format_time(comparison.current):>10}"
+            f" {ratio:>7} {comparison.status}\n"
+        )
+    return 1 if any(comparison.status == "REGRESSION" for comparison in comparisons) else 0
+
+
+def _format_percentiles(name: str, percentiles: Percentiles) -> str:
+    return (
+        f"{name:<26} n={percentiles.count:<7} p50={_format_time(percentiles.p50):>9}"
+        f" p95={_format_time(percentiles.p95):>9} p99={_format_time(percentiles.p99):>9}"
+        f" max={_format_time(percentiles.max):>9}\n"
+    )
+
+
+def _format_load_report(report: LoadReport) -> str:
+    return "".join(
+        [
+            f"sessions                   {report.sessions} connected, {report.failed_sessions} failed,"
+            f" {report.duration:.1f}s\n",
+            _format_percentiles("connect", report.connect),
+            f"commands                   {report.commands_sent} sent, {report.commands_failed} failed,"
+            f" {report.commands_timed_out} timed out\n",
+            _format_percentiles("command ack", report.command_ack),
+            f"notifications              {report.notifications_published} published,"
+            f" {report.notifications_missed} missed\n",
+            _format_percentiles("notification to callback", report.notification_to_callback),
+            _format_percentiles("event loop lag", report.event_loop_lag),
+            f"cpu                        client {report.client_cpu:.1%}, process {report.process_cpu:.1%}\n",
+            f"peak rss                   {report.peak_rss / 2**20:.1f}MiB"
+            f" (before {report.rss_before / 2**20:.1f}MiB)\n",
+        ]
+    )
+
+
+def load_command(args: argparse.Namespace) -> int:
+    profile = LoadProfile(
+        accounts=args.accounts,
+        units_per_account=args.units,
+        duration=args.duration,
+        command_rate=args.command_rate,
+        burst_rate=args.burst_rate,
+        burst_size=args.burst_size,
+        command_latency=(args.min_latency, args.max_latency),
+        connect_concurrency=args.connect_concurrency,
+        ack_timeout=args.ack_timeout,
+        seed=args.seed,
+    )
+    report = asyncio.run(LoadTest(profile).run())
+    sys.stdout.write(_format_load_report(report))
+    if args.output is not None:
+        Path(args.output).write_text(json.dumps(report.to_dict(), indent=2))
+        logger.info("Report written to %s", args.output)
+    return 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks of the client hot paths")
+    subparsers = parser.add_subparsers(required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("--output", default=None, help="JSON file to write the results to")
+    run_parser.add_argument("--filter", default=None, help="Only run benchmarks whose name contains this")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--min-time", type=float, default=0.2, help="Minimal duration of a repeat, in seconds")
+    run_parser.add_argument("--micro-only", action="store_true", help="Skip the end-to-end benchmarks")
+    run_parser.set_defaults(command=run_command)
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two result files, exit 1 on regression")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="Tolerated slowdown, 0.1 for 10%%")
+    compare_parser.set_defaults(command=compare_command)
+
+    load_parser = subparsers.add_parser("load", help="Load test HitachiAirCloud sessions against the simulator")
+    load_parser.add_argument("--accounts", type=int, default=10, help="Accounts, one session each")
+    load_parser.add_argument("--units", type=int, default=4, help="Interior units per account")
+    load_parser.add_argument("--duration", type=float, default=60, help="Duration of the load, in seconds")
+    load_parser.add_argument("--command-rate", type=float, default=0.1, help="Commands per second and account")
+    load_parser.add_argument("--burst-rate", type=float, default=1, help="Notification bursts per second")
+    load_parser.add_argument("--burst-size", type=int, default=4, help="Units changed by a notification burst")
+    load_parser.add_argument("--min-latency", type=float, default=0.5, help="Minimal command latency, in seconds")
+    load_parser.add_argument("--max-latency", type=float, default=1.5, help="Maximal command latency, in seconds")
+    load_parser.add_argument("--connect-concurrency", type=int, default=10, help="Sessions connecting at once")
+    load_parser.add_argument("--ack-timeout", type=float, default=30, help="Seconds before a command times out")
+    load_parser.add_argument("--seed", type=int, default=None)
+    load_parser.add_argument("--output", default=None, help="JSON file to write the report to")
+    load_parser.set_defaults(command=load_command)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(levelname)s %(message)s")
+    # The end-to-end benchmarks would otherwise log every command
+    logging.getLogger("aircloudy").setLevel(logging.WARNING)
+    logging.getLogger("aircloud_simulator").setLevel(logging.WARNING)
+    arguments = parse_args()
+    sys.exit(arguments.command(arguments))
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from aircloud_simulator import AirCloudSimulator
+from aircloudy import HitachiAirCloud
+from aircloudy.api import AuthManager, fetch_profile, get_commands_state, get_interior_units, send_command
+
+from .runner import end_to_end
+
+_COMMANDS_PER_REPEAT = 20
+
+
+@end_to_end("api.command_round_trip")
+async def command_round_trip(repeat: int) -> list[float]:
+    """Send a command and poll its state until DONE, one command at a time, against an instant simulator"""
+    async with AirCloudSimulator(units_per_account=1, command_latency=(0, 0), seed=0) as simulator:
+        account = simulator.accounts[0]
+        auth_manager = AuthManager(account.email, account.password, simulator.host, simulator.port)
+        profile = await fetch_profile(auth_manager.token, simulator.host, simulator.port)
+        [unit] = await get_interior_units(auth_manager.token, profile.familyId, simulator.host, simulator.port)
+
+        samples: list[float] = []
+        for _ in range(repeat):
+            started_at = time.perf_counter()
+            for i in range(_COMMANDS_PER_REPEAT):
+                command = unit.user_state.copy(requested_temperature=20.0 + i % 5)
+                response = await send_command(
+                    auth_manager.token, profile.familyId, command, simulator.host, simulator.port
+                )
+                state = None
+                while state != "DONE":
+                    states = await get_commands_state(auth_manager.token, [response], simulator.host, simulator.port)
+                    state = states.get(response.commandId)
+            samples.append((time.perf_counter() - started_at) / _COMMANDS_PER_REPEAT)
+    return samples
+
+
+@end_to_end("client.command_throughput")
+async def command_throughput(repeat: int) -> list[float]:
+    """Send one command to each of 20 units at once through HitachiAirCloud, without pacing
+
+    A repeat ends once the simulator accepted every command. The outcomes, resolved by the 2s poll of the command
+    state monitor, are awaited outside of the timing.
+    """
+    async with (
+        AirCloudSimulator(units_per_account=_COMMANDS_PER_REPEAT, command_latency=(0, 0), seed=0) as simulator,
+        HitachiAirCloud(
+            simulator.accounts[0].email,
+            simulator.accounts[0].password,
+            **simulator.client_options(),
+        ) as ac,
+    ):
+        samples: list[float] = []
+        for i in range(repeat):
+            expected = simulator.stats().commands + len(ac.interior_units)
+            started_at = time.perf_counter()
+            outcomes = [
+                await interior_unit.send_command(requested_temperature=26.0 + i % 2)
+                for interior_unit in ac.interior_units
+            ]
+            # The simulator has no event per accepted command
+            while simulator.stats().commands < expected:  # noqa: ASYNC110
+                await asyncio.sleep(0.001)
+            samples.append((time.perf_counter() - started_at) / len(outcomes))
+            await asyncio.gather(*outcomes)
+    return samples
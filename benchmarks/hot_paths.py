@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import uuid
+from collections.abc import Callable
+
+from aircloud_simulator import SimulatedUnit, encode_frame
+from aircloudy.api.rac import interior_unit_from_api
+from aircloudy.api.rac_models import InteriorUnitUserState
+from aircloudy.interior_unit import CommandOptions, InteriorUnit
+from aircloudy.notifications import stomp
+from aircloudy.notifications.hitachi_frame_models import RefreshInteriorUnitFrame, SubscribeFrame
+from aircloudy.notifications.notifications_websocket import interior_unit_from_notification
+
+from .runner import benchmark
+
+
+def _units(count: int) -> list[SimulatedUnit]:
+    return [
+        SimulatedUnit(rac_id, f"Unit {rac_id}", f"JCH-SIM-{rac_id:06d}", f"SIM{rac_id:08d}", power="ON")
+        for rac_id in range(1, count + 1)
+    ]
+
+
+def _message_frame(notification_type: str, units: list[SimulatedUnit]) -> str:
+    return encode_frame(
+        "MESSAGE",
+        {
+            "destination": "/notification/1001/2001",
+            "content-type": "application/json",
+            "subscription": str(uuid.UUID(int=1)),
+            "message-id": "session-1",
+        },
+        {"notificationType": notification_type, "data": [unit.to_notification() for unit in units]},
+    )
+
+
+async def _ignore_command(command: InteriorUnitUserState, options: CommandOptions) -> None:
+    pass
+
+
+@benchmark("stomp.parse_stomp_frame.bucket_update")
+def parse_bucket_update() -> Callable[[], object]:
+    frame = _message_frame("BUCKET_UPDATE", _units(1))
+    return lambda: stomp.parse_stomp_frame(frame)
+
+
+@benchmark("stomp.parse_server_frame.bucket_update")
+def parse_server_bucket_update() -> Callable[[], object]:
+    frame = _message_frame("BUCKET_UPDATE", _units(1))
+    return lambda: stomp.parse_server_frame(frame)
+
+
+@benchmark("stomp.parse_server_frame.refresh_all_20_units")
+def parse_server_refresh_all() -> Callable[[], object]:
+    frame = _message_frame("REFRESH_ALL", _units(20))
+    return lambda: stomp.parse_server_frame(frame)
+
+
+@benchmark("stomp.parse_server_frame.heart_beat")
+def parse_server_heart_beat() -> Callable[[], object]:
+    return lambda: stomp.parse_server_frame("\n")
+
+
+@benchmark("stomp.get_frame.subscribe")
+def get_subscribe_frame() -> Callable[[], object]:
+    frame = SubscribeFrame(uuid.UUID(int=1), 1001, 2001, "receipt-1")
+    return frame.get_frame
+
+
+@benchmark("stomp.get_frame.refresh")
+def get_refresh_frame() -> Callable[[], object]:
+    frame = RefreshInteriorUnitFrame("x" * 600, 1001, 2001, 3, "receipt-1")
+    return frame.get_frame
+
+
+@benchmark("interior_unit_base.from_rest")
+def interior_unit_base_from_rest() -> Callable[[], object]:
+    payload = _units(1)[0].to_rest()
+    return lambda: interior_unit_from_api(payload)
+
+
+@benchmark("interior_unit_base.from_notification")
+def interior_unit_base_from_notification() -> Callable[[], object]:
+    payload = _units(1)[0].to_notification()
+    return lambda: interior_unit_from_notification(payload)
+
+
+@benchmark("interior_unit.update.changed")
+def update_changed() -> Callable[[], object]:
+    unit = _units(1)[0]
+    before = interior_unit_from_api(unit.to_rest())
+    unit.room_temperature += 1
+    unit.idu_temperature += 1
+    unit.touch()
+    after = interior_unit_from_api(unit.to_rest())
+    interior_unit = InteriorUnit(_ignore_command, before)
+    states = [after, before]
+
+    def update() -> object:
+        states.reverse()
+        return interior_unit.update(states[0])
+
+    return update
+
+
+@benchmark("interior_unit.update.unchanged")
+def update_unchanged() -> Callable[[], object]:
+    base = interior_unit_from_api(_units(1)[0].to_rest())
+    interior_unit = InteriorUnit(_ignore_command, base)
+    return lambda: interior_unit.update(base)
+
+
+@benchmark("interior_unit_changes.repr")
+def changes_repr() -> Callable[[], object]:
+    unit = _units(1)[0]
+    interior_unit = InteriorUnit(_ignore_command, interior_unit_from_api(unit.to_rest()))
+    unit.room_temperature += 1
+    unit.power = "OFF"
+    unit.fan_speed = "LV3"
+    unit.touch()
+    changes = interior_unit.update(interior_unit_from_api(unit.to_rest()))
+    return changes.__repr__
@@ -0,0 +1,366 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import itertools
+import logging
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+from collections.abc import Coroutine
+from dataclasses import asdict, dataclass
+
+from aircloud_simulator import AirCloudSimulator, SimulatedAccount
+from aircloudy import HitachiAirCloud, InteriorUnit
+from aircloudy.errors import IllegalStateException, InvalidArgumentException
+from aircloudy.interior_unit_changes import InteriorUnitChanges
+
+logger = logging.getLogger(__name__)
+
+_TEMPERATURES = [t / 2 for t in range(36, 57)]
+_LAG_INTERVAL = 0.05
+
+
+@dataclass(frozen=True)
+class LoadProfile:
+    """Load applied to the client sessions, one `HitachiAirCloud` per simulated account
+
+    Each account sends `command_rate` commands per second to random units, the simulator pushes `burst_rate`
+    notification bursts per second, each changing `burst_size` units of a random account. Intervals are
+    exponentially distributed, drawn from `random.Random(seed)`.
+    """
+
+    accounts: int = 10
+    units_per_account: int = 4
+    duration: float = 60
+    command_rate: float = 0.1
+    burst_rate: float = 1
+    burst_size: int = 4
+    command_latency: tuple[float, float] = (0.5, 1.5)
+    connect_concurrency: int = 10
+    ack_timeout: float = 30
+    seed: int | None = None
+
+    def __post_init__(self) -> None:
+        if self.accounts < 1 or self.units_per_account < 1 or self.burst_size < 1 or self.connect_concurrency < 1:
+            raise InvalidArgumentException(
+                "accounts, units_per_account, burst_size and connect_concurrency must be >= 1"
+            )
+        if self.duration <= 0 or self.ack_timeout <= 0:
+            raise InvalidArgumentException("duration and ack_timeout must be > 0")
+        if self.command_rate < 0 or self.burst_rate < 0:
+            raise InvalidArgumentException("command_rate and burst_rate can't be negative")
+
+
+@dataclass(frozen=True)
+class Percentiles:
+    """Distribution of durations, in seconds"""
+
+    count: int
+    p50: float | None
+    p95: float | None
+    p99: float | None
+    max: float | None
+
+    @staticmethod
+    def of(samples: list[float]) -> Percentiles:
+        if len(samples) == 0:
+            return Percentiles(0, None, None, None, None)
+        if len(samples) == 1:
+            return Percentiles(1, samples[0], samples[0], samples[0], samples[0])
+        quantiles = statistics.quantiles(samples, n=100, method="inclusive")
+        return Percentiles(len(samples), quantiles[49], quantiles[94], quantiles[98], max(samples))
+
+
+@dataclass(frozen=True)
+class LoadReport:
+    """Outcome of a load test
+
+    CPU is the fraction of one core used over the run, by the thread of the client event loop and by the whole
+    process (which also runs the simulator). RSS is the peak of the process, in bytes.
+    """
+
+    profile: LoadProfile
+    duration: float
+    sessions: int
+    failed_sessions: int
+    connect: Percentiles
+    commands_sent: int
+    commands_failed: int
+    commands_timed_out: int
+    command_ack: Percentiles
+    notifications_published: int
+    notifications_missed: int
+    notification_to_callback: Percentiles
+    event_loop_lag: Percentiles
+    client_cpu: float
+    process_cpu: float
+    rss_before: int
+    peak_rss: int
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _peak_rss() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _SimulatorThread:
+    """Run the simulator in its own thread and event loop, so its work doesn't delay the client loop"""
+
+    simulator: AirCloudSimulator
+    _thread: threading.Thread | None
+    _loop: asyncio.AbstractEventLoop | None
+    _started: threading.Event
+    _stopping: asyncio.Event | None
+    _error: BaseException | None
+
+    def __init__(self, simulator: AirCloudSimulator) -> None:
+        self.simulator = simulator
+        self._thread = None
+        self._loop = None
+        self._started = threading.Event()
+        self._stopping = None
+        self._error = None
+
+    async def start(self) -> None:
+        self._thread = threading.Thread(target=asyncio.run, args=(self._serve(),), name="aircloud-simulator")
+        self._thread.start()
+        await asyncio.to_thread(self._started.wait)
+        if self._error is not None:
+            raise self._error
+
+    async def stop(self) -> None:
+        if self._loop is not None and self._stopping is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+
+    async def call[T](self, coroutine: Coroutine[object, object, T]) -> T:
+        if self._loop is None:
+            raise IllegalStateException("Simulator thread is not started")
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, self._loop))
+
+    async def _serve(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        try:
+            await self.simulator.start()
+        except BaseException as e:
+            self._error = e
+            raise
+        finally:
+            self._started.set()
+        try:
+            await self._stopping.wait()
+        finally:
+            await self.simulator.stop()
+
+
+async def _publish_burst(
+    simulator: AirCloudSimulator, account: SimulatedAccount, room_temperatures: dict[int, float]
+) -> int:
+    units = [account.units[rac_id] for rac_id in room_temperatures]
+    for unit in units:
+        unit.room_temperature = room_temperatures[unit.id]
+        unit.touch()
+    return await simulator.publish(account, units)
+
+
+class LoadTest:
+    """Drive `HitachiAirCloud` sessions against a local simulator, through the public api of the client only
+
+    Command ack latency runs from `send_command` to the resolution of its outcome. Notification-to-callback latency
+    runs from the simulator publishing a room temperature to `on_change` seeing it.
+    """
+
+    profile: LoadProfile
+    _random: random.Random
+    _markers: itertools.count[int]
+    _pending_notifications: dict[tuple[int, float], float]
+    _commands: set[asyncio.Task[None]]
+
+    _connect: list[float]
+    _command_ack: list[float]
+    _notification_to_callback: list[float]
+    _event_loop_lag: list[float]
+    _failed_sessions: int
+    _commands_sent: int
+    _commands_failed: int
+    _commands_timed_out: int
+    _notifications_published: int
+
+    def __init__(self, profile: LoadProfile) -> None:
+        self.profile = profile
+        self._random = random.Random(profile.seed)
+        self._markers = itertools.count(1)
+        self._pending_notifications = {}
+        self._commands = set()
+
+        self._connect = []
+        self._command_ack = []
+        self._notification_to_callback = []
+        self._event_loop_lag = []
+        self._failed_sessions = 0
+        self._commands_sent = 0
+        self._commands_failed = 0
+        self._commands_timed_out = 0
+        self._notifications_published = 0
+
+    async def run(self) -> LoadReport:
+        profile = self.profile
+        simulator = _SimulatorThread(
+            AirCloudSimulator(
+                accounts=profile.accounts,
+                units_per_account=profile.units_per_account,
+                command_latency=profile.command_latency,
+                seed=profile.seed,
+            )
+        )
+        rss_before = _peak_rss()
+        await simulator.start()
+        sessions: list[HitachiAirCloud] = []
+        try:
+            semaphore = asyncio.Semaphore(profile.connect_concurrency)
+            opened = await asyncio.gather(
+                *(
+                    self._open_session(simulator.simulator, account, semaphore)
+                    for account in simulator.simulator.accounts
+                )
+            )
+            sessions = [session for session in opened if session is not None]
+            logger.info("%d sessions connected, %d failed", len(sessions), self._failed_sessions)
+
+            started_at = time.perf_counter()
+            client_cpu_before = time.thread_time()
+            process_cpu_before = time.process_time()
+            drivers = [asyncio.create_task(self._measure_event_loop_lag())]
+            if profile.burst_rate > 0:
+                drivers.append(asyncio.create_task(self._drive_notifications(simulator)))
+            if profile.command_rate > 0:
+                drivers.extend(asyncio.create_task(self._drive_commands(session)) for session in sessions)
+            await asyncio.sleep(profile.duration)
+            for driver in drivers:
+                driver.cancel()
+            await asyncio.gather(*drivers, return_exceptions=True)
+            await self._drain()
+            duration = time.perf_counter() - started_at
+            client_cpu = (time.thread_time() - client_cpu_before) / duration
+            process_cpu = (time.process_time() - process_cpu_before) / duration
+        finally:
+            await asyncio.gather(*(session.close() for session in sessions), return_exceptions=True)
+            await simulator.stop()
+
+        return LoadReport(
+            profile,
+            duration,
+            len(sessions),
+            self._failed_sessions,
+            Percentiles.of(self._connect),
+            self._commands_sent,
+            self._commands_failed,
+            self._commands_timed_out,
+            Percentiles.of(self._command_ack),
+            self._notifications_published,
+            len(self._pending_notifications),
+            Percentiles.of(self._notification_to_callback),
+            Percentiles.of(self._event_loop_lag),
+            client_cpu,
+            process_cpu,
+            rss_before,
+            _peak_rss(),
+        )
+
+    async def _open_session(
+        self, simulator: AirCloudSimulator, account: SimulatedAccount, semaphore: asyncio.Semaphore
+    ) -> HitachiAirCloud | None:
+        session = HitachiAirCloud(account.email, account.password, **simulator.client_options())
+        session.on_change = self._on_change
+        async with semaphore:
+            started_at = time.perf_counter()
+            try:
+                await session.connect()
+            except Exception as e:
+                logger.warning("Session of %s failed to connect: %s", account.email, e)
+                self._failed_sessions += 1
+                await session.close()
+                return None
+            self._connect.append(time.perf_counter() - started_at)
+        return session
+
+    async def _drain(self) -> None:
+        """Wait for the commands in flight, then give the last notifications a few seconds to arrive"""
+        if len(self._commands) > 0:
+            await asyncio.wait(self._commands)
+        with contextlib.suppress(TimeoutError):
+            async with asyncio.timeout(5):
+                while len(self._pending_notifications) > 0:  # noqa: ASYNC110
+                    await asyncio.sleep(0.01)
+
+    async def _measure_event_loop_lag(self) -> None:
+        while True:
+            expected = time.perf_counter() + _LAG_INTERVAL
+            await asyncio.sleep(_LAG_INTERVAL)
+            self._event_loop_lag.append(max(0.0, time.perf_counter() - expected))
+
+    async def _drive_commands(self, session: HitachiAirCloud) -> None:
+        while True:
+            await asyncio.sleep(self._random.expovariate(self.profile.command_rate))
+            interior_units = session.interior_units
+            if len(interior_units) == 0:
+                continue
+            task = asyncio.create_task(self._send_command(self._random.choice(interior_units)))
+            self._commands.add(task)
+            task.add_done_callback(self._commands.discard)
+
+    async def _send_command(self, interior_unit: InteriorUnit) -> None:
+        self._commands_sent += 1
+        started_at = time.perf_counter()
+        try:
+            outcome = await interior_unit.send_command(requested_temperature=self._random.choice(_TEMPERATURES))
+            # Not wait_for: the outcome is shared with the commands merged into the same state
+            await asyncio.wait([outcome], timeout=self.profile.ack_timeout)
+            if not outcome.done():
+                self._commands_timed_out += 1
+                return
+            outcome.result()
+        except Exception as e:
+            logger.debug("Command to %d failed: %s", interior_unit.id, e)
+            self._commands_failed += 1
+            return
+        self._command_ack.append(time.perf_counter() - started_at)
+
+    def _marker(self) -> float:
+        # No unit reports these room temperatures, so each marker is seen as a change
+        return -1 - (next(self._markers) % 10_000) / 100
+
+    async def _drive_notifications(self, simulator: _SimulatorThread) -> None:
+        accounts = simulator.simulator.accounts
+        while True:
+            await asyncio.sleep(self._random.expovariate(self.profile.burst_rate))
+            account = self._random.choice(accounts)
+            rac_ids = self._random.sample(list(account.units), min(self.profile.burst_size, len(account.units)))
+            room_temperatures = {rac_id: self._marker() for rac_id in rac_ids}
+            published_at = time.perf_counter()
+            for rac_id, room_temperature in room_temperatures.items():
+                self._pending_notifications[(rac_id, room_temperature)] = published_at
+            self._notifications_published += len(room_temperatures)
+            try:
+                await simulator.call(_publish_burst(simulator.simulator, account, room_temperatures))
+            except Exception as e:
+                logger.warning("Notification burst to %s failed: %s", account.email, e)
+
+    def _on_change(self, changes: dict[int, InteriorUnitChanges]) -> None:
+        received_at = time.perf_counter()
+        for rac_id, change in changes.items():
+            if change.room_temperature is None:
+                continue
+            published_at = self._pending_notifications.pop((rac_id, change.room_temperature[1]), None)
+            if published_at is not None:
+                self._notification_to_callback.append(received_at - published_at)
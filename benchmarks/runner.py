@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import json
+import platform
+import statistics
+import timeit
+from collections.abc import Callable, Coroutine
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Literal
+
+type BenchmarkKind = Literal["MICRO", "END_TO_END"]
+type ComparisonStatus = Literal["REGRESSION", "IMPROVEMENT", "UNCHANGED", "NEW", "MISSING"]
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    """A micro benchmark `setup` returns the operation to time. An end-to-end one runs its own scenario and returns
+    the seconds per operation of each repeat."""
+
+    name: str
+    kind: BenchmarkKind
+    setup: Callable[[], Callable[[], object]] | None = None
+    scenario: Callable[[int], Coroutine[object, object, list[float]]] | None = None
+
+
+_benchmarks: dict[str, Benchmark] = {}
+
+
+def benchmark(name: str) -> Callable[[Callable[[], Callable[[], object]]], Callable[[], Callable[[], object]]]:
+    """Register a micro benchmark, the decorated function prepares the data and returns the operation to time"""
+
+    def register(setup: Callable[[], Callable[[], object]]) -> Callable[[], Callable[[], object]]:
+        _benchmarks[name] = Benchmark(name, "MICRO", setup=setup)
+        return setup
+
+    return register
+
+
+def end_to_end(
+    name: str,
+) -> Callable[
+    [Callable[[int], Coroutine[object, object, list[float]]]], Callable[[int], Coroutine[object, object, list[float]]]
+]:
+    """Register an end-to-end benchmark, the decorated coroutine function is given the number of repeats"""
+
+    def register(
+        scenario: Callable[[int], Coroutine[object, object, list[float]]],
+    ) -> Callable[[int], Coroutine[object, object, list[float]]]:
+        _benchmarks[name] = Benchmark(name, "END_TO_END", scenario=scenario)
+        return scenario
+
+    return register
+
+
+def benchmarks() -> list[Benchmark]:
+    return sorted(_benchmarks.values(), key=lambda b: b.name)
+
+
+@dataclass(frozen=True)
+class BenchmarkResult:
+    """Seconds per operation of each repeat"""
+
+    name: str
+    kind: BenchmarkKind
+    loops: int
+    samples: list[float]
+
+    @property
+    def best(self) -> float:
+        return min(self.samples)
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.samples)
+
+    @property
+    def stdev(self) -> float:
+        return statistics.stdev(self.samples) if len(self.samples) > 1 else 0.0
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "best": self.best, "median": self.median, "stdev": self.stdev}
+
+    @staticmethod
+    def from_dict(d: dict) -> BenchmarkResult:
+        return BenchmarkResult(d["name"], d["kind"], d["loops"], d["samples"])
+
+
+def _run_micro(name: str, setup: Callable[[], Callable[[], object]], repeat: int, min_time: float) -> BenchmarkResult:
+    timer = timeit.Timer(setup())
+    loops = 1
+    while timer.timeit(loops) < min_time:
+        loops *= 2
+    return BenchmarkResult(name, "MICRO", loops, [t / loops for t in timer.repeat(repeat, loops)])
+
+
+def run(
+    name_filter: str | None = None,
+    repeat: int = 5,
+    min_time: float = 0.2,
+    kinds: tuple[BenchmarkKind, ...] = ("MICRO", "END_TO_END"),
+) -> list[BenchmarkResult]:
+    """Run the registered benchmarks whose name contains `name_filter`
+
+    Each repeat of a micro benchmark loops for at least `min_time` seconds, timed like `timeit` (without collecting
+    garbage).
+    """
+    results = []
+    for b in benchmarks():
+        if b.kind not in kinds or (name_filter is not None and name_filter not in b.name):
+            continue
+        if b.setup is not None:
+            results.append(_run_micro(b.name, b.setup, repeat, min_time))
+        elif b.scenario is not None:
+            results.append(BenchmarkResult(b.name, b.kind, 1, asyncio.run(b.scenario(repeat))))
+    return results
+
+
+def write_results(path: Path, results: list[BenchmarkResult]) -> None:
+    path.write_text(
+        json.dumps(
+            {
+                "created_at": datetime.datetime.now(datetime.UTC).isoformat(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": [result.to_dict() for result in results],
+            },
+            indent=2,
+        )
+    )
+
+
+def read_results(path: Path) -> list[BenchmarkResult]:
+    return [BenchmarkResult.from_dict(d) for d in json.loads(path.read_text())["results"]]
+
+
+@dataclass(frozen=True)
+class Comparison:
+    name: str
+    baseline: float | None
+    current: float | None
+    status: ComparisonStatus
+
+    @property
+    def ratio(self) -> float | None:
+        if self.baseline is None or self.current is None or self.baseline == 0:
+            return None
+        return self.current / self.baseline
+
+
+def compare(
+    baseline: list[BenchmarkResult], current: list[BenchmarkResult], threshold: float = 0.1
+) -> list[Comparison]:
+    """Compare the median time per operation, a benchmark more than `threshold` slower is a regression"""
+    baseline_by_name = {result.name: result for result in baseline}
+    current_by_name = {result.name: result for result in current}
+    comparisons = []
+    for name in sorted(baseline_by_name.keys() | current_by_name.keys()):
+        before = baseline_by_name.get(name)
+        after = current_by_name.get(name)
+        if before is None or after is None:
+            status: ComparisonStatus = "NEW" if before is None else "MISSING"
+        elif after.median > before.median * (1 + threshold):
+            status = "REGRESSION"
+        elif after.median < before.median / (1 + threshold):
+            status = "IMPROVEMENT"
+        else:
+            status = "UNCHANGED"
+        comparisons.append(
+            Comparison(
+                name,
+                before.median if before is not None else None,
+                after.median if after is not None else None,
+                status,
+            )
+        )
+    return comparisons
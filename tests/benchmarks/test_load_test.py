@@ -0,0 +1,43 @@
+import pytest
+
+from aircloudy.errors import InvalidArgumentException
+from benchmarks import LoadProfile, LoadTest, Percentiles
+
+
+def test_percentiles():
+    percentiles = Percentiles.of([i / 100 for i in range(1, 101)])
+
+    assert percentiles.count == 100
+    assert percentiles.p50 == pytest.approx(0.505)
+    assert percentiles.p99 == pytest.approx(0.9901)
+    assert percentiles.max == 1.0
+    assert Percentiles.of([]) == Percentiles(0, None, None, None, None)
+
+
+@pytest.mark.asyncio
+async def test_load_test_reports_latencies():
+    profile = LoadProfile(
+        accounts=2,
+        units_per_account=2,
+        duration=1.5,
+        command_rate=2,
+        burst_rate=10,
+        burst_size=2,
+        command_latency=(0, 0),
+        seed=3,
+    )
+    report = await LoadTest(profile).run()
+
+    assert report.sessions == 2
+    assert report.failed_sessions == 0
+    assert report.connect.count == 2
+    assert report.command_ack.count == report.commands_sent - report.commands_failed > 0
+    assert report.notification_to_callback.count == report.notifications_published > 0
+    assert report.notifications_missed == 0
+    assert report.event_loop_lag.count > 0
+    assert report.peak_rss >= report.rss_before > 0
+
+
+def test_load_profile_is_validated():
+    with pytest.raises(InvalidArgumentException):
+        LoadProfile(accounts=0)
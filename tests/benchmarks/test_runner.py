@@ -0,0 +1,26 @@
+from benchmarks import BenchmarkResult, benchmarks, compare, read_results, run, write_results
+
+
+def result(name: str, median: float) -> BenchmarkResult:
+    return BenchmarkResult(name, "MICRO", 1, [median * 0.9, median, median * 1.1])
+
+
+def test_compare_flags_regressions():
+    baseline = [result("a", 1.0), result("b", 1.0), result("c", 1.0), result("gone", 1.0)]
+    current = [result("a", 1.05), result("b", 1.5), result("c", 0.5), result("new", 1.0)]
+
+    statuses = {comparison.name: comparison.status for comparison in compare(baseline, current, threshold=0.1)}
+
+    assert statuses == {"a": "UNCHANGED", "b": "REGRESSION", "c": "IMPROVEMENT", "gone": "MISSING", "new": "NEW"}
+
+
+def test_run_micro_benchmarks(tmp_path):
+    assert {"MICRO", "END_TO_END"} == {b.kind for b in benchmarks()}
+
+    results = run("stomp.", repeat=2, min_time=0.001, kinds=("MICRO",))
+    assert results
+    assert all(r.name.startswith("stomp.") and len(r.samples) == 2 and r.median > 0 for r in results)
+
+    path = tmp_path / "results.json"
+    write_results(path, results)
+    assert read_results(path) == results
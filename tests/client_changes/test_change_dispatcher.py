@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from aircloudy import HitachiAirCloud
+from aircloudy.change_dispatcher import ChangeDispatcher
+
+from .units import make_changes, make_interior_unit_base
+
+
+@pytest.mark.asyncio
+async def test_sync_and_async_handlers_receive_changes():
+    received_sync = []
+    received_async = []
+
+    async def async_handler(changes):
+        received_async.append(changes)
+
+    dispatcher = ChangeDispatcher()
+    dispatcher.subscribe(received_sync.append)
+    dispatcher.subscribe(async_handler)
+    await dispatcher.publish({1: make_changes(power=("OFF", "ON"))})
+    await asyncio.sleep(0.01)
+
+    assert received_sync == received_async
+    assert received_sync[0][1].power == ("OFF", "ON")
+
+
+@pytest.mark.asyncio
+async def test_rac_ids_filter():
+    received = []
+    dispatcher = ChangeDispatcher()
+    dispatcher.subscribe(received.append, rac_ids=[2])
+    await dispatcher.publish({1: make_changes(power=("OFF", "ON"))})
+    await dispatcher.publish({2: make_changes(power=("OFF", "ON"))})
+    await asyncio.sleep(0.01)
+
+    assert [list(changes.keys()) for changes in received] == [[2]]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_per_unit_when_handler_lags():
+    release = asyncio.Event()
+    received = []
+
+    async def slow_handler(changes):
+        await release.wait()
+        received.append(changes)
+
+    dispatcher = ChangeDispatcher()
+    subscription = dispatcher.subscribe(slow_handler, overflow_policy="COALESCE_PER_UNIT", max_queue_size=1)
+    await dispatcher.publish({1: make_changes(room_temperature=(18.0, 18.5))})
+    await asyncio.sleep(0.01)  # first batch is now being handled
+    await dispatcher.publish({1: make_changes(room_temperature=(18.5, 19.0))})
+    await dispatcher.publish({1: make_changes(room_temperature=(19.0, 19.5)), 2: make_changes(power=("ON", "OFF"))})
+    release.set()
+    await asyncio.sleep(0.01)
+
+    assert len(received) == 2
+    assert received[1][1].room_temperature == (18.5, 19.5)
+    assert received[1][2].power == ("ON", "OFF")
+    assert subscription.stats.coalesced == 1
+
+
+@pytest.mark.asyncio
+async def test_drop_oldest_when_queue_is_full():
+    release = asyncio.Event()
+    received = []
+
+    async def slow_handler(changes):
+        await release.wait()
+        received.append(changes)
+
+    dispatcher = ChangeDispatcher()
+    subscription = dispatcher.subscribe(slow_handler, overflow_policy="DROP_OLDEST", max_queue_size=1)
+    await dispatcher.publish({1: make_changes(humidity=(40, 41))})
+    await asyncio.sleep(0.01)
+    await dispatcher.publish({1: make_changes(humidity=(41, 42))})
+    await dispatcher.publish({1: make_changes(humidity=(42, 43))})
+    release.set()
+    await asyncio.sleep(0.01)
+
+    assert [changes[1].humidity for changes in received] == [(40, 41), (42, 43)]
+    assert subscription.stats.dropped == 1
+    await dispatcher.close()
+
+
+@pytest.mark.asyncio
+async def test_sync_handler_in_executor():
+    received = []
+    dispatcher = ChangeDispatcher()
+    subscription = dispatcher.subscribe(received.append, run_in_executor=True)
+    await dispatcher.publish({1: make_changes(power=("OFF", "ON"))})
+    await asyncio.sleep(0.1)
+
+    assert len(received) == 1
+    assert subscription.stats.handled == 1
+    assert subscription.stats.handler_latency.count == 1
+
+
+@pytest.mark.asyncio
+async def test_client_dispatches_unit_handlers_and_closes_subscriptions(monkeypatch):
+    async def open_connection(self):
+        await self._reconcile_interior_units([make_interior_unit_base(1)])
+
+    monkeypatch.setattr(HitachiAirCloud, "_open_connection", open_connection)
+    ac = HitachiAirCloud("user@example.com", "secret")
+    await ac.connect()
+
+    received = []
+    ac.interior_units[0].on_changes = received.append
+    release = asyncio.Event()
+
+    async def slow_handler(changes):
+        await release.wait()
+
+    subscription = ac.subscribe_changes(slow_handler)
+    await ac._update_interior_units([make_interior_unit_base(1, room_temperature=22.0)], True)
+    # Not called inline with the update
+    assert received == []
+    await asyncio.sleep(0.01)
+    assert [change.room_temperature for change in received] == [(20.0, 22.0)]
+
+    await ac.close()
+    assert subscription.closed
+    assert not release.is_set()
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+from aircloudy.change_feed import ChangeFeed
+from aircloudy.errors import IllegalStateException
+
+from .units import make_changes, make_interior_unit_base
+
+
+def record_room_temperature(feed, rac_id, before, after):
+    feed.record(
+        [make_interior_unit_base(rac_id, room_temperature=after)],
+        {rac_id: make_changes(room_temperature=(before, after))},
+    )
+
+
+@pytest.mark.asyncio
+async def test_resume_from_cursor():
+    feed = ChangeFeed()
+    record_room_temperature(feed, 1, 18.0, 19.0)
+    record_room_temperature(feed, 2, 18.0, 19.0)
+
+    first_read = await feed.read(0, limit=1)
+    assert [entry.sequence for entry in first_read.entries] == [1]
+
+    record_room_temperature(feed, 1, 19.0, 20.0)
+    second_read = await feed.read(first_read.cursor)
+    assert [(entry.sequence, entry.rac_id) for entry in second_read.entries] == [(2, 2), (3, 1)]
+    assert second_read.cursor == 3
+    assert (await feed.read(second_read.cursor)).entries == []
+
+
+@pytest.mark.asyncio
+async def test_evicted_cursor_gets_compacted_state():
+    feed = ChangeFeed(capacity=2)
+    for i in range(5):
+        record_room_temperature(feed, 1, 18.0 + i, 19.0 + i)
+
+    read = await feed.read(1)
+    assert read.entries == []
+    assert read.cursor == 5
+    assert read.snapshot[1].room_temperature == 23.0
+
+
+@pytest.mark.asyncio
+async def test_spilled_entries_can_be_read(tmp_path):
+    feed = ChangeFeed(capacity=2, spill_path=tmp_path / "feed.jsonl")
+    for i in range(10):
+        record_room_temperature(feed, 1, 18.0 + i, 19.0 + i)
+
+    # Entries not written yet are read from memory
+    assert [entry.sequence for entry in (await feed.read(0)).entries] == list(range(1, 11))
+
+    await feed.flush()
+    read = await feed.read(0)
+    assert read.snapshot is None
+    assert [entry.sequence for entry in read.entries] == list(range(1, 11))
+    assert read.entries[0].changes.room_temperature == (18.0, 19.0)
+    assert [entry.sequence for entry in (await feed.read(3, limit=2)).entries] == [4, 5]
+    await feed.close()
+
+
+@pytest.mark.asyncio
+async def test_spill_is_bounded_by_segments(tmp_path):
+    feed = ChangeFeed(capacity=2, spill_path=tmp_path / "feed.jsonl", spill_segment_size=3, max_spill_segments=2)
+    for i in range(20):
+        record_room_temperature(feed, 1, 18.0 + i, 19.0 + i)
+    await feed.flush()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["feed.jsonl.4", "feed.jsonl.5"]
+    assert feed.first_available_sequence == 13
+    assert (await feed.read(11)).snapshot is not None
+    assert [entry.sequence for entry in (await feed.read(12)).entries] == list(range(13, 21))
+    await feed.close()
+
+
+@pytest.mark.asyncio
+async def test_previous_spill_is_discarded_with_a_warning(tmp_path, caplog):
+    (tmp_path / "feed.jsonl.0").write_text("{}\n")
+    (tmp_path / "feed.jsonl.backup").write_text("kept")
+
+    feed = ChangeFeed(spill_path=tmp_path / "feed.jsonl")
+
+    assert "Discard 1 spill segments" in caplog.text
+    assert [path.name for path in tmp_path.iterdir()] == ["feed.jsonl.backup"]
+    await feed.close()
+
+
+@pytest.mark.asyncio
+async def test_flush_fails_once_writer_stopped(tmp_path):
+    feed = ChangeFeed(capacity=1, spill_path=tmp_path / "missing" / "feed.jsonl")
+    for i in range(3):
+        record_room_temperature(feed, 1, 18.0 + i, 19.0 + i)
+
+    with pytest.raises(IllegalStateException):
+        await asyncio.wait_for(feed.flush(), 1)
+    with pytest.raises(IllegalStateException):
+        await feed.flush()
+
+
+@pytest.mark.asyncio
+async def test_feed_keeps_memory_only_once_writer_stopped(tmp_path):
+    feed = ChangeFeed(capacity=1, spill_path=tmp_path / "missing" / "feed.jsonl")
+    for i in range(3):
+        record_room_temperature(feed, 1, 18.0 + i, 19.0 + i)
+    with pytest.raises(IllegalStateException):
+        await asyncio.wait_for(feed.flush(), 1)
+
+    for i in range(3, 10):
+        record_room_temperature(feed, 1, 18.0 + i, 19.0 + i)
+
+    assert feed.first_available_sequence == 10
+    assert (await feed.read(0)).snapshot[1].room_temperature == 28.0
+    assert [entry.sequence for entry in (await feed.read(9)).entries] == [10]
+
+
+@pytest.mark.asyncio
+async def test_wait_returns_once_entry_is_recorded():
+    feed = ChangeFeed()
+    waiter = asyncio.create_task(feed.wait(0))
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    record_room_temperature(feed, 1, 18.0, 19.0)
+    await asyncio.wait_for(waiter, 1)
@@ -0,0 +1,97 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from aircloudy.change_dispatcher import ChangeDispatcher
+from aircloudy.change_filter import ChangeFilter
+from aircloudy.errors import InvalidArgumentException
+from aircloudy.interior_unit_changes import InteriorUnitChanges
+
+
+def unit_state(room_temperature=20.0, power="ON", updated_at=1):
+    return SimpleNamespace(rac_id=1, room_temperature=room_temperature, power=power, updated_at=updated_at)
+
+
+def test_dead_band_is_relative_to_last_accepted_value():
+    change_filter = ChangeFilter(dead_bands={"room_temperature": 0.5})
+    current = unit_state(20.0)
+    assert change_filter.accepts(current, unit_state(20.2)) == False
+    assert change_filter.accepts(unit_state(20.2), unit_state(20.4)) == False
+    assert change_filter.accepts(unit_state(20.4), unit_state(20.5)) == True
+    assert change_filter.accepts(unit_state(20.5), unit_state(20.7)) == False
+
+
+def test_fields_ignore_other_changes():
+    change_filter = ChangeFilter(fields=["power"])
+    assert change_filter.accepts(unit_state(), unit_state(updated_at=2)) == False
+    assert change_filter.accepts(unit_state(), unit_state(power="OFF")) == True
+
+
+def test_min_interval_throttles_per_unit():
+    change_filter = ChangeFilter(fields=["power"], min_interval=60)
+    assert change_filter.decide(unit_state(power="ON"), unit_state(power="OFF")) == "ACCEPTED"
+    assert change_filter.decide(unit_state(power="OFF"), unit_state(power="ON")) == "THROTTLED"
+
+
+def power_change(before, after):
+    return InteriorUnitChanges(
+        None, None, None, None, None, None, None, None, (before, after), None, None, None, None, None
+    )
+
+
+@pytest.mark.asyncio
+async def test_min_interval_delivers_last_throttled_state():
+    change_filter = ChangeFilter(fields=["power"], min_interval=0.05)
+    delivered = []
+    change_filter.on_trailing = delivered.append
+
+    assert change_filter.decide(unit_state(power="OFF"), unit_state(power="ON")) == "ACCEPTED"
+    assert change_filter.decide(unit_state(power="ON"), unit_state(power="OFF")) == "THROTTLED"
+    change_filter.hold(1, power_change("ON", "OFF"))
+    assert change_filter.decide(unit_state(power="OFF"), unit_state(power="ON")) == "THROTTLED"
+    change_filter.hold(1, power_change("OFF", "ON"))
+    assert change_filter.decide(unit_state(power="ON"), unit_state(power="OFF")) == "THROTTLED"
+    change_filter.hold(1, power_change("ON", "OFF"))
+
+    await asyncio.sleep(0.1)
+    assert [change[1].power for change in delivered] == [("ON", "OFF")]
+    # The delivered state is the new reference
+    assert change_filter.decide(unit_state(power="OFF"), unit_state(power="OFF", updated_at=2)) == "REJECTED"
+
+
+@pytest.mark.asyncio
+async def test_min_interval_drops_throttled_updates_cancelling_each_other():
+    change_filter = ChangeFilter(fields=["power"], min_interval=0.05)
+    delivered = []
+    change_filter.on_trailing = delivered.append
+
+    change_filter.decide(unit_state(power="OFF"), unit_state(power="ON"))
+    change_filter.decide(unit_state(power="ON"), unit_state(power="OFF"))
+    change_filter.hold(1, power_change("ON", "OFF"))
+    change_filter.decide(unit_state(power="OFF"), unit_state(power="ON"))
+    change_filter.hold(1, power_change("OFF", "ON"))
+
+    await asyncio.sleep(0.1)
+    assert delivered == []
+
+
+def test_dead_band_requires_numeric_field():
+    with pytest.raises(InvalidArgumentException):
+        ChangeFilter(dead_bands={"power": 1})
+
+
+@pytest.mark.asyncio
+async def test_stream_receives_trailing_state():
+    dispatcher = ChangeDispatcher()
+    stream = dispatcher.open_stream(change_filter=ChangeFilter(fields=["power"], min_interval=0.05))
+
+    for before, after in (("OFF", "ON"), ("ON", "OFF")):
+        selection = dispatcher.new_selection()
+        selection.evaluate(unit_state(power=before), unit_state(power=after))
+        await dispatcher.publish({1: power_change(before, after)}, selection)
+
+    assert (await anext(stream))[1].power == ("OFF", "ON")
+    async with asyncio.timeout(1):
+        assert (await anext(stream))[1].power == ("ON", "OFF")
+    stream.close()
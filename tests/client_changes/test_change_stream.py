@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from aircloudy.change_dispatcher import ChangeDispatcher
+from aircloudy.errors import InvalidArgumentException
+
+from .units import make_changes
+
+
+@pytest.mark.asyncio
+async def test_streams_are_independent_and_coalesce():
+    dispatcher = ChangeDispatcher()
+    recorder = dispatcher.open_stream()
+    power_only = dispatcher.open_stream(fields=["power"])
+
+    await dispatcher.publish({1: make_changes(room_temperature=(18.0, 18.5))})
+    await dispatcher.publish({1: make_changes(room_temperature=(18.5, 19.0), power=("OFF", "ON"))})
+
+    batch = await anext(recorder)
+    assert batch[1].room_temperature == (18.0, 19.0)
+    assert batch[1].power == ("OFF", "ON")
+
+    batch = await anext(power_only)
+    assert batch[1].power == ("OFF", "ON")
+
+
+@pytest.mark.asyncio
+async def test_stream_stops_on_close():
+    dispatcher = ChangeDispatcher()
+    stream = dispatcher.open_stream(rac_ids=[2])
+    received = []
+
+    async def consume():
+        async for batch in stream:
+            received.append(batch)
+
+    consumer = asyncio.create_task(consume())
+    await dispatcher.publish({1: make_changes(power=("OFF", "ON")), 2: make_changes(power=("ON", "OFF"))})
+    await asyncio.sleep(0.01)
+    dispatcher.close_streams()
+    await asyncio.wait_for(consumer, 1)
+
+    assert [list(batch.keys()) for batch in received] == [[2]]
+    assert stream.closed
+
+
+def test_stream_rejects_unknown_field():
+    with pytest.raises(InvalidArgumentException):
+        ChangeDispatcher().open_stream(fields=["temperature"])
@@ -0,0 +1,57 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from aircloudy import HitachiAirCloud  # noqa: E402
+from aircloudy.fleet_view import FleetView  # noqa: E402
+
+from .units import make_changes, make_interior_unit_base  # noqa: E402
+
+
+def test_queries_and_incremental_update():
+    view = FleetView()
+    view.listener(1)([make_interior_unit_base(1, 18.0), make_interior_unit_base(2, 21.0)], {})
+    view.listener(2)([make_interior_unit_base(3, 24.0, power="OFF")], {})
+
+    assert len(view) == 3
+    assert view.count(view.mask(power="ON", operating_mode="HEATING")) == 2
+    assert view.far_from_setpoint(2) == [1, 3]
+    assert view.far_from_setpoint(2, view.mask(power="ON")) == [1]
+    assert view.mean_by("room_temperature", "family_id") == {1: 19.5, 2: 24.0}
+
+    view.listener(1)([make_interior_unit_base(1, 20.0, power="OFF")], {1: make_changes(power=("ON", "OFF"))})
+    assert view.select(view.mask(power="OFF")) == [1, 3]
+    # Room temperature was not part of the change mask
+    assert view.mean("room_temperature", view.mask(family_id=1)) == 19.5
+    assert view.column("room_temperature").tolist() == [18.0, 21.0, 24.0]
+
+
+def test_remove_moves_last_row():
+    # Third row outgrows the initial capacity
+    view = FleetView(capacity=2)
+    view.listener(1)([make_interior_unit_base(rac_id, 18.0 + rac_id) for rac_id in (1, 2, 3)], {})
+
+    view.remove([1, 4])
+    assert len(view) == 2
+    assert view.select(view.mask()) == [3, 2]
+    assert view.column("room_temperature").tolist() == [21.0, 20.0]
+    assert view.name(3) == "Unit 3"
+
+    view.remove([2])
+    view.remove([3])
+    assert len(view) == 0
+    assert view.mean("room_temperature") is None
+
+
+@pytest.mark.asyncio
+async def test_units_removed_from_account_leave_the_view():
+    ac = HitachiAirCloud("user@example.com", "secret")
+    view = FleetView()
+    ac.add_update_listener(view.listener(1))
+    ac.add_removal_listener(view.remove)
+
+    await ac._reconcile_interior_units([make_interior_unit_base(1), make_interior_unit_base(2)])
+    await ac._reconcile_interior_units([make_interior_unit_base(2), make_interior_unit_base(3)])
+
+    assert [iu.id for iu in ac.interior_units] == [2, 3]
+    assert sorted(view.select(view.mask())) == [2, 3]
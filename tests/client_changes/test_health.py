@@ -0,0 +1,147 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from aircloudy import CommandOutbox, HealthMonitor, HitachiAirCloud
+from aircloudy.api.rac_models import CommandResponse, InteriorUnitUserState
+from aircloudy.errors import CommandFailedException, ConnectionFailed
+from aircloudy.interior_unit import InteriorUnit
+
+from .units import make_interior_unit_base
+
+
+def test_health_transitions():
+    health = HealthMonitor()
+    transitions = []
+    health.add_listener(transitions.append)
+
+    health.notifications_lost("closed")
+    health.api_failed("timeout")
+    health.api_failed("timeout again")
+    health.notifications_recovered()
+    health.api_recovered()
+
+    assert [(t.previous, t.current) for t in transitions] == [
+        ("HEALTHY", "DEGRADED"),
+        ("DEGRADED", "OFFLINE"),
+        ("OFFLINE", "DEGRADED"),
+        ("DEGRADED", "HEALTHY"),
+    ]
+    assert health.transitions == transitions
+    assert transitions[1].reason == "timeout"
+
+
+@pytest.mark.asyncio
+async def test_outbox_keeps_last_command_per_unit():
+    outbox = CommandOutbox(max_size=2)
+
+    first = outbox.put(InteriorUnitUserState(1, "ON", "HEATING", 20.0, 50, "AUTO", "OFF"), "INTERACTIVE")
+    replaced = outbox.put(InteriorUnitUserState(1, "ON", "HEATING", 22.0, 50, "AUTO", "OFF"), "INTERACTIVE")
+    outbox.put(InteriorUnitUserState(2, "ON", "HEATING", 20.0, 50, "AUTO", "OFF"), "INTERACTIVE")
+    outbox.put(InteriorUnitUserState(3, "ON", "HEATING", 20.0, 50, "AUTO", "OFF"), "AUTOMATION")
+
+    assert first is replaced
+    with pytest.raises(CommandFailedException):
+        await first
+    assert [entry.command.rac_id for entry in outbox.take()] == [2, 3]
+    assert len(outbox) == 0
+
+
+@pytest.mark.asyncio
+async def test_outbox_expires_commands():
+    outbox = CommandOutbox(ttl=0)
+
+    future = outbox.put(InteriorUnitUserState(1, "ON", "HEATING", 20.0, 50, "AUTO", "OFF"), "INTERACTIVE")
+
+    assert outbox.take() == []
+    with pytest.raises(CommandFailedException, match="expired"):
+        await future
+
+
+@pytest.mark.asyncio
+async def test_outbox_expires_commands_without_further_use():
+    outbox = CommandOutbox(ttl=0.05)
+
+    future = outbox.put(InteriorUnitUserState(1, "ON", "HEATING", 20.0, 50, "AUTO", "OFF"), "INTERACTIVE")
+
+    with pytest.raises(CommandFailedException, match="expired"):
+        await asyncio.wait_for(future, 1)
+    assert len(outbox) == 0
+
+
+@pytest.mark.asyncio
+async def test_serve_stale_and_replay_commands(monkeypatch):
+    outbox = CommandOutbox()
+    ac = HitachiAirCloud("user@example.com", "secret", serve_stale=True, command_outbox=outbox)
+    api_up = False
+    sent = []
+
+    async def connection(self):
+        return SimpleNamespace(auth_manager=SimpleNamespace(token=None), user_profile=SimpleNamespace(familyId=4444))
+
+    async def get_interior_units(token_supplier, family_id, host, port):
+        if not api_up:
+            raise ConnectionFailed("Failed to connect to host")
+        return [make_interior_unit_base(1, room_temperature=23.0)]
+
+    async def send_command(token_supplier, family_id, command, host, port):
+        if not api_up:
+            raise ConnectionFailed("Failed to connect to host")
+        sent.append(command)
+        return CommandResponse({"commandId": "c1", "thingId": "t1"})
+
+    async def watch_command(command):
+        return SimpleNamespace(wait_done=lambda: asyncio.sleep(0))
+
+    async def request_update(rac_id, receipt=False):
+        return None
+
+    monkeypatch.setattr(HitachiAirCloud, "_connection", connection)
+    monkeypatch.setattr("aircloudy.aircloud.api.get_interior_units", get_interior_units)
+    monkeypatch.setattr("aircloudy.aircloud.api.send_command", send_command)
+    monkeypatch.setattr(ac._command_state_monitor, "watch_command", watch_command)
+    monkeypatch.setattr(ac, "request_update", request_update)
+    ac._interior_units = {1: InteriorUnit(ac._send_unit_command, make_interior_unit_base(1))}
+
+    await ac.update_all()
+    assert ac.health.state == "DEGRADED"
+    assert ac.get_interior_unit(1).room_temperature == 20.0
+    assert ac.staleness(1).is_stale
+
+    command = ac.get_interior_unit(1).user_state.copy(requested_temperature=25.0)
+    queued = asyncio.create_task(ac._send_command_and_wait_ack(command))
+    await asyncio.sleep(0)
+    assert len(outbox) == 1
+    assert not queued.done()
+
+    api_up = True
+    await ac.update_all()
+    await asyncio.wait_for(queued, 1)
+
+    assert ac.health.state == "HEALTHY"
+    assert ac.get_interior_unit(1).room_temperature == 23.0
+    assert ac.staleness(1).source == "REST"
+    assert not ac.staleness(1).is_stale
+    assert sent == [command]
+    await ac.close()
+
+
+@pytest.mark.asyncio
+async def test_update_all_raises_without_serve_stale(monkeypatch):
+    ac = HitachiAirCloud("user@example.com", "secret")
+
+    async def connection(self):
+        return SimpleNamespace(auth_manager=SimpleNamespace(token=None), user_profile=SimpleNamespace(familyId=4444))
+
+    async def get_interior_units(token_supplier, family_id, host, port):
+        raise ConnectionFailed("Failed to connect to host")
+
+    monkeypatch.setattr(HitachiAirCloud, "_connection", connection)
+    monkeypatch.setattr("aircloudy.aircloud.api.get_interior_units", get_interior_units)
+    ac._interior_units = {1: InteriorUnit(ac._send_unit_command, make_interior_unit_base(1))}
+
+    with pytest.raises(ConnectionFailed):
+        await ac.update_all()
+    assert ac.health.state == "DEGRADED"
+    await ac.close()
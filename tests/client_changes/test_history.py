@@ -0,0 +1,46 @@
+import datetime
+
+from aircloudy.history import HistoryRecorder
+from aircloudy.utils import utc_datetime_from_millis
+
+from .units import make_interior_unit_base
+
+
+def record_at(monkeypatch, recorder, millis, iu, changed=True):
+    monkeypatch.setattr("aircloudy.history.time.time_ns", lambda: millis * 1_000_000)
+    recorder.record([iu], {iu.rac_id: None} if changed else {})
+
+
+def test_ring_buffer_keeps_last_samples(monkeypatch):
+    recorder = HistoryRecorder(capacity=3)
+    for i in range(5):
+        record_at(monkeypatch, recorder, 1000 * i, make_interior_unit_base(1, room_temperature=18.0 + i))
+
+    samples = recorder.samples(1)
+    assert [sample.room_temperature for sample in samples] == [20.0, 21.0, 22.0]
+    assert samples[0].power == "ON"
+    assert samples[0].operating_mode == "HEATING"
+    assert samples[0].online == True
+
+
+def test_unchanged_updates_are_not_recorded(monkeypatch):
+    recorder = HistoryRecorder()
+    record_at(monkeypatch, recorder, 1000, make_interior_unit_base(1), changed=False)
+    record_at(monkeypatch, recorder, 2000, make_interior_unit_base(1), changed=False)
+    assert len(recorder.samples(1)) == 1
+
+
+def test_range_query_and_downsample(monkeypatch):
+    recorder = HistoryRecorder()
+    for i, temperature in enumerate([18.0, 20.0, 19.0, 22.0, 21.0]):
+        record_at(monkeypatch, recorder, 60_000 * i, make_interior_unit_base(1, room_temperature=temperature))
+
+    samples = recorder.samples(1, utc_datetime_from_millis(60_000), utc_datetime_from_millis(180_000))
+    assert [sample.room_temperature for sample in samples] == [20.0, 19.0]
+
+    buckets = recorder.downsample(1, "room_temperature", datetime.timedelta(minutes=2))
+    assert [(bucket.count, bucket.min, bucket.max, bucket.mean) for bucket in buckets] == [
+        (2, 18.0, 20.0, 19.0),
+        (2, 19.0, 22.0, 20.5),
+        (1, 21.0, 21.0, 21.0),
+    ]
@@ -0,0 +1,126 @@
+import shutil
+import time
+
+import pytest
+
+from aircloudy import HitachiAirCloud
+from aircloudy.api.rac_models import InteriorUnitUserState
+from aircloudy.errors import IllegalStateException
+from aircloudy.journal import EventJournal, JournalReader
+from aircloudy.utils import utc_datetime_from_millis
+
+from .units import make_interior_unit_base
+
+
+def record_at(monkeypatch, millis):
+    monkeypatch.setattr("aircloudy.journal.time.time_ns", lambda: millis * 1_000_000)
+
+
+@pytest.mark.asyncio
+async def test_records_are_read_back_across_rotated_files(monkeypatch, tmp_path):
+    # Room for 2 records per file
+    async with EventJournal(tmp_path, max_file_size=8 + 2 * 56) as journal:
+        for i in range(5):
+            record_at(monkeypatch, 1000 * i)
+            journal.record_states([make_interior_unit_base(1, room_temperature=18.0 + i)])
+        record_at(monkeypatch, 5000)
+        journal.record_command(InteriorUnitUserState(1, "OFF", "COOLING", 24.0, 50, "LV2", "OFF"))
+
+    assert len(list(tmp_path.glob("*.bin"))) == 3
+
+    with JournalReader(tmp_path) as reader:
+        records = list(reader)
+        assert len(reader) == 6
+        assert [record.room_temperature for record in records] == [18.0, 19.0, 20.0, 21.0, 22.0, None]
+        assert records[0].name == "Unit 1"
+        assert records[0].online == True
+        assert records[3].power == "ON"
+
+        command = records[5]
+        assert (command.kind, command.name, command.power, command.operating_mode) == (
+            "COMMAND",
+            None,
+            "OFF",
+            "COOLING",
+        )
+        assert command.online is None
+
+        in_range = reader.records(utc_datetime_from_millis(1000), utc_datetime_from_millis(4000))
+        assert [record.recorded_at for record in in_range] == [utc_datetime_from_millis(t) for t in (1000, 2000, 3000)]
+        assert len(list(reader.records(kind="COMMAND"))) == 1
+
+
+@pytest.mark.asyncio
+async def test_reopened_journal_keeps_timestamps_ordered(monkeypatch, tmp_path):
+    async with EventJournal(tmp_path) as journal:
+        record_at(monkeypatch, 2000)
+        journal.record_states([make_interior_unit_base(1)])
+
+    async with EventJournal(tmp_path) as journal:
+        # Wall clock went backward
+        record_at(monkeypatch, 1000)
+        journal.record_states([make_interior_unit_base(2)])
+
+    with JournalReader(tmp_path) as reader:
+        assert [(record.rac_id, record.recorded_at) for record in reader] == [
+            (1, utc_datetime_from_millis(2000)),
+            (2, utc_datetime_from_millis(2000)),
+        ]
+
+
+def wait_for_records(tmp_path, count, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with JournalReader(tmp_path) as reader:
+            if len(reader) >= count:
+                return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.mark.asyncio
+async def test_records_are_flushed_after_interval(tmp_path):
+    async with EventJournal(tmp_path, flush_interval=0.05) as journal:
+        journal.record_states([make_interior_unit_base(1)])
+        assert wait_for_records(tmp_path, 1)
+
+
+@pytest.mark.asyncio
+async def test_records_are_flushed_once_size_is_reached(tmp_path):
+    async with EventJournal(tmp_path, flush_size=3 * 56, flush_interval=60) as journal:
+        journal.record_states([make_interior_unit_base(rac_id) for rac_id in (1, 2)])
+        assert not wait_for_records(tmp_path, 1, timeout=0.1)
+        journal.record_states([make_interior_unit_base(3)])
+        assert wait_for_records(tmp_path, 3)
+
+        with JournalReader(tmp_path) as reader:
+            assert [record.name for record in reader] == ["Unit 1", "Unit 2", "Unit 3"]
+
+
+@pytest.mark.asyncio
+async def test_flush_fails_once_writer_stopped(tmp_path):
+    journal = EventJournal(tmp_path)
+    shutil.rmtree(tmp_path)
+    journal.record_states([make_interior_unit_base(1)])
+
+    with pytest.raises(IllegalStateException):
+        await journal.flush()
+    await journal.close()
+
+
+@pytest.mark.asyncio
+async def test_client_records_states_with_their_source(tmp_path):
+    async with EventJournal(tmp_path) as journal:
+        ac = HitachiAirCloud("user@example.com", "secret", event_journal=journal)
+        await ac._reconcile_interior_units([make_interior_unit_base(1)])
+        await ac._update_interior_units([make_interior_unit_base(1, room_temperature=22.0)], True)
+        await ac._update_interior_units([make_interior_unit_base(1, room_temperature=23.0)], False, "REST")
+        ac._notify_command_listeners(InteriorUnitUserState(1, "OFF", "COOLING", 24.0, 50, "LV2", "OFF"))
+
+    with JournalReader(tmp_path) as reader:
+        assert [(record.kind, record.room_temperature) for record in reader] == [
+            ("REST", 20.0),
+            ("NOTIFICATION", 22.0),
+            ("REST", 23.0),
+            ("COMMAND", None),
+        ]
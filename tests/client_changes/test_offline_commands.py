@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from aircloudy.errors import CommandFailedException, UnitIsOfflineException
+from aircloudy.interior_unit import InteriorUnit
+
+from .units import make_interior_unit_base
+
+
+def offline(base):
+    base._online = False
+    return base
+
+
+class Sender:
+    def __init__(self, error: Exception | None = None) -> None:
+        self.sent = []
+        self.error = error
+
+    async def __call__(self, command, options):
+        await asyncio.sleep(0)
+        self.sent.append(command)
+        if self.error is not None:
+            raise self.error
+
+
+@pytest.mark.asyncio
+async def test_offline_unit_raises_by_default():
+    interior_unit = InteriorUnit(Sender(), offline(make_interior_unit_base(1)))
+
+    with pytest.raises(UnitIsOfflineException):
+        await interior_unit.send_command(requested_temperature=25.0)
+
+
+@pytest.mark.asyncio
+async def test_held_state_flushed_when_back_online():
+    sender = Sender()
+    interior_unit = InteriorUnit(sender, offline(make_interior_unit_base(1)), offline_policy="HOLD")
+
+    first = await interior_unit.send_command(requested_temperature=25.0)
+    second = await interior_unit.send_command(fan_speed="LV3")
+    await asyncio.sleep(0.01)
+
+    assert first is second
+    assert sender.sent == []
+
+    interior_unit.update(make_interior_unit_base(1))
+    await asyncio.wait_for(first, 1)
+
+    assert len(sender.sent) == 1
+    assert sender.sent[0].requested_temperature == 25.0
+    assert sender.sent[0].fan_speed == "LV3"
+    assert interior_unit.requested_temperature == 25.0
+
+
+@pytest.mark.asyncio
+async def test_held_state_expires():
+    sender = Sender()
+    interior_unit = InteriorUnit(
+        sender, offline(make_interior_unit_base(1)), offline_policy="HOLD", offline_hold_ttl=0.01
+    )
+
+    outcome = await interior_unit.send_command(requested_temperature=25.0)
+
+    with pytest.raises(CommandFailedException, match="stayed offline"):
+        await asyncio.wait_for(outcome, 1)
+    interior_unit.update(make_interior_unit_base(1))
+    await asyncio.sleep(0.01)
+    assert sender.sent == []
+
+
+@pytest.mark.asyncio
+async def test_failure_reported_through_outcome():
+    interior_unit = InteriorUnit(Sender(CommandFailedException("Not acknowledged")), make_interior_unit_base(1))
+
+    outcome = await interior_unit.send_command(requested_temperature=25.0)
+
+    with pytest.raises(CommandFailedException, match="Not acknowledged"):
+        await asyncio.wait_for(outcome, 1)
+    assert interior_unit.requested_temperature == 21.0
+
+
+@pytest.mark.asyncio
+async def test_units_do_not_share_state_lock():
+    first = InteriorUnit(Sender(), make_interior_unit_base(1))
+    second = InteriorUnit(Sender(), make_interior_unit_base(2))
+
+    assert first._state_lock is not second._state_lock
+    async with first._state_lock:
+        await asyncio.wait_for(second.send_command(power="OFF"), 1)
+
+
+def test_direct_update_calls_on_changes_inline():
+    interior_unit = InteriorUnit(Sender(), make_interior_unit_base(1))
+    received = []
+    interior_unit.on_changes = received.append
+
+    interior_unit.update(make_interior_unit_base(1, room_temperature=22.0))
+    interior_unit.update(make_interior_unit_base(1, room_temperature=22.0))
+    interior_unit.update(make_interior_unit_base(1, room_temperature=23.0), call_on_changes=False)
+
+    assert [change.room_temperature for change in received] == [(20.0, 22.0), None]
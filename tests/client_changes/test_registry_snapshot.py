@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from aircloudy import HitachiAirCloud
+from aircloudy.errors import ConnectionFailed
+from aircloudy.registry_snapshot import RegistrySnapshot
+
+from .units import make_changes, make_interior_unit_base
+
+
+def test_snapshot_round_trip(tmp_path):
+    snapshot = RegistrySnapshot(tmp_path / "registry.json", "user@example.com")
+    assert snapshot.load() is None
+
+    snapshot.record([make_interior_unit_base(1, 18.0), make_interior_unit_base(2, 21.0, power="OFF")], {})
+    snapshot.record([make_interior_unit_base(1, 19.0)], {1: make_changes(room_temperature=(18.0, 19.0))})
+    snapshot.save()
+    assert not snapshot.dirty
+
+    data = RegistrySnapshot(tmp_path / "registry.json", "user@example.com").load()
+    assert data is not None
+    assert [(iu.rac_id, iu.room_temperature, iu.power, iu.serial_number) for iu in data.interior_units] == [
+        (1, 19.0, "ON", "XXXX"),
+        (2, 21.0, "OFF", "XXXX"),
+    ]
+    assert "user@example.com" not in (tmp_path / "registry.json").read_text()
+    assert RegistrySnapshot(tmp_path / "registry.json", "other@example.com").load() is None
+
+
+@pytest.mark.asyncio
+async def test_connect_starts_from_snapshot_then_reconciles(monkeypatch, tmp_path):
+    snapshot = RegistrySnapshot(tmp_path / "registry.json", "user@example.com")
+    snapshot.record([make_interior_unit_base(1, 18.0), make_interior_unit_base(2, 21.0)], {})
+    snapshot.save()
+
+    connected = asyncio.Event()
+
+    async def open_connection(self):
+        await connected.wait()
+        await self._reconcile_interior_units([make_interior_unit_base(1, 18.5), make_interior_unit_base(3)])
+
+    monkeypatch.setattr(HitachiAirCloud, "_open_connection", open_connection)
+    ac = HitachiAirCloud("user@example.com", "secret", registry_snapshot_path=tmp_path / "registry.json")
+    received = []
+    ac.on_change = received.append
+
+    await ac.connect()
+    assert [(iu.id, iu.room_temperature, iu.is_stale) for iu in ac.interior_units] == [(1, 18.0, True), (2, 21.0, True)]
+
+    connected.set()
+    await ac._connecting
+    assert [(iu.id, iu.room_temperature, iu.source) for iu in ac.interior_units] == [
+        (1, 18.5, "REST"),
+        (3, 20.0, "REST"),
+    ]
+    assert [list(changes) for changes in received] == [[1]]
+
+    await ac.close()
+    data = RegistrySnapshot(tmp_path / "registry.json", "user@example.com").load()
+    assert data is not None
+    assert [iu.room_temperature for iu in data.interior_units] == [18.5, 20.0]
+
+
+@pytest.mark.asyncio
+async def test_background_connection_failure_is_reported_and_retryable(monkeypatch, tmp_path):
+    snapshot = RegistrySnapshot(tmp_path / "registry.json", "user@example.com")
+    snapshot.record([make_interior_unit_base(1, 18.0)], {})
+    snapshot.save()
+
+    attempts = []
+
+    async def open_connection(self):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionFailed("api unreachable")
+        await self._reconcile_interior_units([make_interior_unit_base(1, 18.5)])
+
+    monkeypatch.setattr(HitachiAirCloud, "_open_connection", open_connection)
+    ac = HitachiAirCloud("user@example.com", "secret", registry_snapshot_path=tmp_path / "registry.json")
+
+    await ac.connect()
+    with pytest.raises(ConnectionFailed):
+        await ac.wait_connected()
+    assert not ac.health.api_available
+
+    await ac.connect()
+    await ac._connecting
+    assert len(attempts) == 2
+    assert ac.get_interior_unit(1).room_temperature == 18.5
+    await ac.close()
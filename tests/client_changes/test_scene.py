@@ -0,0 +1,161 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from aircloudy import HitachiAirCloud
+from aircloudy.api.rac_models import InteriorUnitUserState, PowerAllResponse
+from aircloudy.errors import ConnectionFailed
+from aircloudy.interior_unit import InteriorUnit
+from aircloudy.scene import SceneState
+
+from .units import make_interior_unit_base
+
+
+def test_scene_target_skips_no_op():
+    current = InteriorUnitUserState(1, "ON", "HEATING", 20.0, 50, "LV2", "OFF")
+    assert SceneState(power="ON", operating_mode="HEATING", requested_temperature=20.0).target(current) is None
+    assert SceneState(fan_speed="LV3").target(current) == current.copy(fan_speed="LV3")
+
+
+@pytest.mark.asyncio
+async def test_apply_scene_minimizes_fan_out(monkeypatch):
+    ac = HitachiAirCloud("user@example.com", "secret")
+    sent = []
+    power_all_calls = []
+
+    async def connection(self):
+        return SimpleNamespace(auth_manager=SimpleNamespace(token=None), user_profile=SimpleNamespace(familyId=4444))
+
+    async def send_command_and_wait_ack(command, priority="INTERACTIVE"):
+        if command.rac_id == 4:
+            raise TimeoutError
+        sent.append((command, priority))
+
+    async def set_power_all(token_supplier, family_id, power, commands, host, port):
+        power_all_calls.append((power, [command.rac_id for command in commands]))
+        return PowerAllResponse(
+            {
+                "allSucceeded": False,
+                "resultSet": [
+                    {"racId": 2, "success": False, "errorMessage": "Busy", "errorCode": 1, "commandResponse": None},
+                ],
+            }
+        )
+
+    async def request_update_all(receipt=False):
+        return None
+
+    monkeypatch.setattr(HitachiAirCloud, "_connection", connection)
+    monkeypatch.setattr("aircloudy.aircloud.api.set_power_all", set_power_all)
+    monkeypatch.setattr(ac, "_send_command_and_wait_ack", send_command_and_wait_ack)
+    monkeypatch.setattr(ac, "request_update_all", request_update_all)
+
+    ac._interior_units = {
+        1: InteriorUnit(ac._send_unit_command, make_interior_unit_base(1)),
+        2: InteriorUnit(ac._send_unit_command, make_interior_unit_base(2, power="OFF")),
+        3: InteriorUnit(ac._send_unit_command, make_interior_unit_base(3)),
+        4: InteriorUnit(ac._send_unit_command, make_interior_unit_base(4)),
+        6: InteriorUnit(ac._send_unit_command, make_interior_unit_base(6, power="OFF")),
+    }
+    for rac_id in (3, 4):
+        ac._interior_units[rac_id]._user_state = ac._interior_units[rac_id].user_state.copy(fan_speed="LV1")
+    ac._interior_units[6]._online = False
+
+    report = await ac.apply_scene(SceneState(power="ON", fan_speed="AUTO"), units=[1, 2, 3, 4, 5, 6])
+
+    assert power_all_calls == [("ON", [2])]
+    assert [(command.rac_id, priority) for command, priority in sent] == [(3, "AUTOMATION")]
+    assert ac._interior_units[3].fan_speed == "AUTO"
+    assert {rac_id: result.outcome for rac_id, result in sorted(report.results.items())} == {
+        1: "UNCHANGED",
+        2: "FAILED",
+        3: "APPLIED",
+        4: "FAILED",
+        5: "NOT_FOUND",
+        6: "OFFLINE",
+    }
+    assert not report.all_succeeded
+    assert sorted(report.with_outcome("FAILED")) == [2, 4]
+
+
+@pytest.mark.asyncio
+async def test_apply_scene_goes_through_unit_pipeline(monkeypatch):
+    ac = HitachiAirCloud("user@example.com", "secret", offline_policy="HOLD")
+    sent = []
+
+    async def connection(self):
+        return SimpleNamespace(auth_manager=SimpleNamespace(token=None), user_profile=SimpleNamespace(familyId=4444))
+
+    async def send_command_and_wait_ack(command, priority="INTERACTIVE"):
+        sent.append((command, priority))
+
+    async def set_power_all(token_supplier, family_id, power, commands, host, port):
+        raise ConnectionFailed("Unreachable")
+
+    async def request_update_all(receipt=False):
+        return None
+
+    monkeypatch.setattr(HitachiAirCloud, "_connection", connection)
+    monkeypatch.setattr("aircloudy.aircloud.api.set_power_all", set_power_all)
+    monkeypatch.setattr(ac, "_send_command_and_wait_ack", send_command_and_wait_ack)
+    monkeypatch.setattr(ac, "request_update_all", request_update_all)
+
+    ac._interior_units = {
+        rac_id: ac._new_interior_unit(make_interior_unit_base(rac_id, power="OFF")) for rac_id in (1, 2, 3)
+    }
+    ac._interior_units[3]._online = False
+
+    report = await ac.apply_scene(SceneState(power="ON"))
+
+    # The batched call failed, units 1 and 2 sent their state alone
+    assert sorted((command.rac_id, command.power, priority) for command, priority in sent) == [
+        (1, "ON", "AUTOMATION"),
+        (2, "ON", "AUTOMATION"),
+    ]
+    assert [ac._interior_units[rac_id].power for rac_id in (1, 2)] == ["ON", "ON"]
+    assert {rac_id: result.outcome for rac_id, result in report.results.items()} == {
+        1: "APPLIED",
+        2: "APPLIED",
+        3: "HELD",
+    }
+    assert ac._interior_units[3]._next_state.command.power == "ON"
+    ac._interior_units[3]._next_state.cancel_expiry()
+
+
+@pytest.mark.asyncio
+async def test_command_sent_during_scene_keeps_its_own_priority(monkeypatch):
+    ac = HitachiAirCloud("user@example.com", "secret")
+    sent = []
+    power_all_calls = []
+
+    async def connection(self):
+        return SimpleNamespace(auth_manager=SimpleNamespace(token=None), user_profile=SimpleNamespace(familyId=4444))
+
+    async def send_command_and_wait_ack(command, priority="INTERACTIVE"):
+        sent.append((command.power, command.requested_temperature, priority))
+
+    async def set_power_all(token_supplier, family_id, power, commands, host, port):
+        power_all_calls.append([command.rac_id for command in commands])
+        await asyncio.sleep(0.05)
+        raise ConnectionFailed("Unreachable")
+
+    async def request_update_all(receipt=False):
+        return None
+
+    monkeypatch.setattr(HitachiAirCloud, "_connection", connection)
+    monkeypatch.setattr("aircloudy.aircloud.api.set_power_all", set_power_all)
+    monkeypatch.setattr(ac, "_send_command_and_wait_ack", send_command_and_wait_ack)
+    monkeypatch.setattr(ac, "request_update_all", request_update_all)
+    ac._interior_units = {1: ac._new_interior_unit(make_interior_unit_base(1, power="OFF"))}
+
+    scene = asyncio.create_task(ac.apply_scene(SceneState(power="ON")))
+    await asyncio.sleep(0.01)
+    # Requested by the user while the scene state of the unit waits for the batched call
+    outcome = await ac._interior_units[1].send_command(requested_temperature=25.0)
+    report = await scene
+    await outcome
+
+    assert power_all_calls == [[1]]
+    assert sent == [("ON", 21.0, "AUTOMATION"), ("ON", 25.0, "INTERACTIVE")]
+    assert report.results[1].outcome == "APPLIED"
@@ -0,0 +1,53 @@
+import pytest
+
+from aircloudy.errors import IllegalStateException
+from aircloudy.shared_state import SharedStateReader, SharedStateWriter
+
+from .units import make_changes, make_interior_unit_base
+
+
+def test_reader_sees_published_state():
+    with SharedStateWriter(capacity=2) as writer, SharedStateReader(writer.name) as reader:
+        writer.record([make_interior_unit_base(1, 18.0), make_interior_unit_base(2, 21.0)], {})
+        assert reader.rac_ids() == [1, 2]
+
+        state = reader.get(1)
+        assert state is not None
+        assert (state.name, state.room_temperature, state.power, state.operating_mode) == (
+            "Unit 1",
+            18.0,
+            "ON",
+            "HEATING",
+        )
+
+        writer.record([make_interior_unit_base(1, 19.5, power="OFF")], {1: make_changes(power=("ON", "OFF"))})
+        updated = reader.get(1)
+        assert updated is not None
+        assert (updated.room_temperature, updated.power) == (19.5, "OFF")
+        assert updated.version > state.version
+
+        # Table is full
+        writer.record([make_interior_unit_base(3)], {})
+        assert reader.get(3) is None
+        assert set(reader.snapshot()) == {1, 2}
+
+
+def test_reader_gives_up_on_row_being_written():
+    with SharedStateWriter(capacity=1) as writer:
+        writer.record([make_interior_unit_base(1)], {})
+        # Simulate a writer stuck in the middle of an update (odd version of the first row)
+        writer._buf[16] = 3
+        with SharedStateReader(writer.name, max_retries=3) as reader, pytest.raises(IllegalStateException):
+            reader.get(1)
+
+
+def test_reader_rejects_foreign_memory():
+    from multiprocessing.shared_memory import SharedMemory
+
+    memory = SharedMemory(create=True, size=64)
+    try:
+        with pytest.raises(IllegalStateException):
+            SharedStateReader(memory.name)
+    finally:
+        memory.close()
+        memory.unlink()
@@ -0,0 +1,55 @@
+from aircloudy.state_history import StateHistory
+from aircloudy.utils import utc_datetime_from_millis
+
+from .units import make_changes, make_interior_unit_base
+
+
+def record_at(monkeypatch, history, millis, interior_units, changes):
+    monkeypatch.setattr("aircloudy.state_history.time.time_ns", lambda: millis * 1_000_000)
+    history.record(interior_units, changes)
+
+
+def test_state_at_replays_deltas_from_nearest_checkpoint(monkeypatch):
+    history = StateHistory(checkpoint_every=2)
+    record_at(monkeypatch, history, 1000, [make_interior_unit_base(1, 18.0)], {})
+    for i in range(1, 6):
+        temperature = 18.0 + i
+        record_at(
+            monkeypatch,
+            history,
+            1000 + 1000 * i,
+            [make_interior_unit_base(1, temperature)],
+            {1: make_changes(room_temperature=(temperature - 1, temperature))},
+        )
+    record_at(monkeypatch, history, 7000, [make_interior_unit_base(2, 25.0, power="OFF")], {})
+
+    assert history.checkpoint_count == 4
+    assert history.state_at(1, utc_datetime_from_millis(500)) is None
+    assert history.state_at(1, utc_datetime_from_millis(1000)).room_temperature == 18.0
+    assert history.state_at(1, utc_datetime_from_millis(4500)).room_temperature == 21.0
+    assert history.state_at(1, utc_datetime_from_millis(60_000)).room_temperature == 23.0
+    assert history.state_at(2, utc_datetime_from_millis(6999)) is None
+
+    fleet = history.fleet_at(utc_datetime_from_millis(7000))
+    assert {rac_id: iu.room_temperature for rac_id, iu in fleet.items()} == {1: 23.0, 2: 25.0}
+    assert fleet[1].name == "Unit 1"
+    assert fleet[2].power == "OFF"
+
+
+def test_old_history_is_dropped(monkeypatch):
+    history = StateHistory(checkpoint_every=1, max_checkpoints=2)
+    record_at(monkeypatch, history, 1000, [make_interior_unit_base(1, 18.0)], {})
+    for i in range(1, 4):
+        record_at(
+            monkeypatch,
+            history,
+            1000 + 1000 * i,
+            [make_interior_unit_base(1, 18.0 + i)],
+            {1: make_changes(room_temperature=(17.0 + i, 18.0 + i))},
+        )
+
+    assert history.checkpoint_count == 2
+    assert history.delta_count == 1
+    assert history.state_at(1, utc_datetime_from_millis(2500)) is None
+    assert history.state_at(1, utc_datetime_from_millis(3500)).room_temperature == 20.0
+    assert history.state_at(1, utc_datetime_from_millis(4000)).room_temperature == 21.0
@@ -0,0 +1,116 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from aircloudy import HitachiAirCloud
+from aircloudy.errors import IllegalStateException
+from aircloudy.store import MemoryStateStore, SqliteStateStore
+from aircloudy.utils import utc_datetime_from_millis
+
+from .units import make_changes, make_interior_unit_base
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store_factory(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStateStore
+    return lambda: SqliteStateStore(tmp_path / "state.db", max_batch_size=2)
+
+
+@pytest.mark.asyncio
+async def test_registry_and_history_are_stored(store_factory):
+    store = store_factory()
+    store.record([make_interior_unit_base(1, 18.0), make_interior_unit_base(2, 21.0)], {})
+    store.record([make_interior_unit_base(1, 18.0), make_interior_unit_base(2, 21.0)], {})
+    store.record([make_interior_unit_base(1, 19.0)], {1: make_changes(room_temperature=(18.0, 19.0))})
+    await store.flush()
+
+    units = await store.load_units()
+    assert [(iu.rac_id, iu.room_temperature, iu.name) for iu in units] == [(1, 19.0, "Unit 1"), (2, 21.0, "Unit 2")]
+    assert units[0].updated_at == utc_datetime_from_millis(1_700_000_000_000)
+
+    history = await store.history(1)
+    assert [state.interior_unit.room_temperature for state in history] == [18.0, 19.0]
+    assert len(await store.history(1, start=history[0].recorded_at)) == 2
+    assert await store.history(2, end=history[0].recorded_at) == []
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_forgotten_unit_is_not_loaded_again(store_factory):
+    store = store_factory()
+    store.record([make_interior_unit_base(1), make_interior_unit_base(2)], {})
+    store.forget(1)
+    store.record([make_interior_unit_base(3)], {})
+    store.forget(3)
+    store.record([make_interior_unit_base(3, 25.0)], {})
+    await store.flush()
+
+    assert [(iu.rac_id, iu.room_temperature) for iu in await store.load_units()] == [(2, 20.0), (3, 25.0)]
+    assert len(await store.history(1)) == 1
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_units_removed_from_account_are_forgotten(store_factory):
+    store = store_factory()
+    ac = HitachiAirCloud("user@example.com", "secret", state_store=store)
+
+    await ac._reconcile_interior_units([make_interior_unit_base(1), make_interior_unit_base(2)])
+    await ac._reconcile_interior_units([make_interior_unit_base(2), make_interior_unit_base(3)])
+    await store.flush()
+
+    assert [iu.rac_id for iu in await store.load_units()] == [2, 3]
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_survives_restart(tmp_path):
+    store = SqliteStateStore(tmp_path / "state.db")
+    store.record([make_interior_unit_base(1, 18.0, power="OFF")], {})
+    await store.close()
+
+    store = SqliteStateStore(tmp_path / "state.db")
+    units = await store.load_units()
+    assert [(iu.rac_id, iu.room_temperature, iu.power) for iu in units] == [(1, 18.0, "OFF")]
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_flush_fails_once_writer_stopped(monkeypatch, tmp_path):
+    def fail(connection, rows, forgotten):
+        raise RuntimeError("Disk is gone")
+
+    store = SqliteStateStore(tmp_path / "state.db")
+    monkeypatch.setattr(store, "_write_batch", fail)
+    store.record([make_interior_unit_base(1)], {})
+
+    with pytest.raises(IllegalStateException):
+        await asyncio.wait_for(store.flush(), 1)
+    with pytest.raises(IllegalStateException):
+        await store.flush()
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_flush_fails_when_a_batch_is_lost(monkeypatch, tmp_path):
+    store = SqliteStateStore(tmp_path / "state.db")
+    write_batch = store._write_batch
+    failures = [sqlite3.OperationalError("database is locked")]
+
+    def fail_once(connection, rows, forgotten):
+        if failures:
+            raise failures.pop()
+        write_batch(connection, rows, forgotten)
+
+    monkeypatch.setattr(store, "_write_batch", fail_once)
+    store.record([make_interior_unit_base(1)], {})
+    with pytest.raises(IllegalStateException, match="database is locked"):
+        await asyncio.wait_for(store.flush(), 1)
+
+    # The writer keeps going, later states are stored
+    store.record([make_interior_unit_base(2)], {})
+    await store.flush()
+    assert [iu.rac_id for iu in await store.load_units()] == [2]
+    await store.close()
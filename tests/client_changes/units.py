@@ -0,0 +1,32 @@
+from aircloudy.interior_unit_base import InteriorUnitBase
+from aircloudy.interior_unit_changes import InteriorUnitChanges
+from aircloudy.utils import utc_datetime_from_millis
+
+
+def make_changes(**changed_fields: tuple) -> InteriorUnitChanges:
+    fields = dict.fromkeys(InteriorUnitChanges.__dataclass_fields__)
+    fields.update(changed_fields)
+    return InteriorUnitChanges(**fields)
+
+
+def make_interior_unit_base(rac_id: int = 1, room_temperature: float = 20.0, power: str = "ON") -> InteriorUnitBase:
+    return InteriorUnitBase(
+        rac_id,
+        f"Unit {rac_id}",
+        room_temperature,
+        0.0,
+        utc_datetime_from_millis(1_700_000_000_000),
+        True,
+        utc_datetime_from_millis(1_700_000_000_000),
+        "HITACHI",
+        "155",
+        "XXXX",
+        "JCH-1",
+        "SCHEDULE_DISABLED",
+        power,
+        "HEATING",
+        21.0,
+        50,
+        "AUTO",
+        "OFF",
+    )
@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import pytest
+
+from aircloudy import HitachiAirCloud
+from aircloudy.api import CommandScheduler
+from aircloudy.errors import TooManyRequestsException
+
+TOO_MANY_REQUESTS = json.dumps({"type": "TOO_MANY_REQUESTS", "desc": "Command in progress"})
+
+
+@pytest.mark.asyncio
+async def test_interactive_commands_go_first():
+    scheduler = CommandScheduler(account_rate=100, account_burst=1, unit_rate=100)
+    order = []
+
+    def operation(name):
+        async def run():
+            order.append(name)
+            return name
+
+        return run
+
+    results = await asyncio.gather(
+        scheduler.submit("account", 1, operation("automation-1"), "AUTOMATION"),
+        scheduler.submit("account", 2, operation("automation-2"), "AUTOMATION"),
+        scheduler.submit("account", 3, operation("interactive"), "INTERACTIVE"),
+    )
+
+    assert results == ["automation-1", "automation-2", "interactive"]
+    assert order == ["interactive", "automation-1", "automation-2"]
+    stats = scheduler.stats()
+    assert stats.dispatched == 3
+    assert stats.queue_depth == 0
+    assert stats.wait_time.count == 3
+
+
+@pytest.mark.asyncio
+async def test_throttled_command_is_retried_at_lower_rate():
+    scheduler = CommandScheduler(account_rate=50, account_burst=1, unit_rate=50, rate_increase=0)
+    attempts = 0
+
+    async def operation():
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise TooManyRequestsException(TOO_MANY_REQUESTS)
+        return "done"
+
+    assert await scheduler.submit("account", 1, operation) == "done"
+    stats = scheduler.stats()
+    assert stats.throttled == 2
+    assert stats.account_rates == {"account": 12.5}
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_attempts():
+    scheduler = CommandScheduler(account_rate=100, unit_rate=100, max_attempts=2)
+
+    async def operation():
+        raise TooManyRequestsException(TOO_MANY_REQUESTS)
+
+    with pytest.raises(TooManyRequestsException):
+        await scheduler.submit("account", 1, operation)
+
+
+@pytest.mark.asyncio
+async def test_client_paces_commands_only_with_a_scheduler():
+    async def operation():
+        return "sent"
+
+    unpaced = HitachiAirCloud("user@example.com", "secret")
+    assert await unpaced._submit_command(1, operation, "INTERACTIVE") == "sent"
+    assert unpaced.command_scheduler_stats is None
+
+    paced = HitachiAirCloud("user@example.com", "secret", command_scheduler=CommandScheduler())
+    assert await paced._submit_command(1, operation, "INTERACTIVE") == "sent"
+    assert paced.command_scheduler_stats.dispatched == 1
@@ -0,0 +1,183 @@
+import asyncio
+import time
+from collections.abc import Iterator
+
+import pytest
+from pytest_httpserver import HTTPServer
+from werkzeug import Request, Response
+
+from aircloudy.api.http_client import perform_request
+from aircloudy.api.http_policy import (
+    RequestPolicy,
+    circuit_breaker,
+    parse_retry_after,
+    reset_circuit_breakers,
+    reset_request_policies,
+)
+from aircloudy.errors import (
+    CircuitOpenException,
+    HttpStatusException,
+    IllegalStateException,
+    RequestTimeoutException,
+)
+
+FAST_RETRY = RequestPolicy(backoff_base=0.0, max_retry_after=0.1)
+
+
+@pytest.fixture(autouse=True)
+def reset_registries() -> Iterator[None]:
+    yield
+    reset_circuit_breakers()
+    reset_request_policies()
+
+
+@pytest.mark.asyncio
+async def test_get_retried_on_server_error(httpserver: HTTPServer):
+    httpserver.expect_oneshot_request("/foo", "GET").respond_with_data("down", status=503)
+    httpserver.expect_request("/foo", "GET").respond_with_data("ok")
+
+    response = await perform_request("GET", "/foo", host=httpserver.host, port=httpserver.port, policy=FAST_RETRY)
+
+    assert response.status == 200
+    assert response.body == "ok"
+    assert len(httpserver.log) == 2
+
+
+@pytest.mark.asyncio
+async def test_post_not_retried(httpserver: HTTPServer):
+    httpserver.expect_request("/foo", "POST").respond_with_data("down", status=503)
+
+    with pytest.raises(HttpStatusException) as error:
+        await perform_request("POST", "/foo", host=httpserver.host, port=httpserver.port, policy=FAST_RETRY)
+
+    assert error.value.status == 503
+    assert error.value.retryable
+    assert len(httpserver.log) == 1
+
+
+@pytest.mark.asyncio
+async def test_client_error_not_retried(httpserver: HTTPServer):
+    httpserver.expect_request("/foo", "GET").respond_with_data("nope", status=404)
+
+    with pytest.raises(HttpStatusException) as error:
+        await perform_request("GET", "/foo", host=httpserver.host, port=httpserver.port, policy=FAST_RETRY)
+
+    assert not error.value.retryable
+    assert str(error.value) == "Call failed (status=404 body=nope)"
+    assert len(httpserver.log) == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_after_honored(httpserver: HTTPServer):
+    httpserver.expect_oneshot_request("/foo", "GET").respond_with_data(
+        "slow down", status=429, headers={"Retry-After": "1"}
+    )
+    httpserver.expect_request("/foo", "GET").respond_with_data("ok")
+    policy = RequestPolicy(backoff_base=0.0, max_retry_after=0.2)
+
+    start = time.monotonic()
+    response = await perform_request("GET", "/foo", host=httpserver.host, port=httpserver.port, policy=policy)
+
+    assert response.status == 200
+    # Retry-After is capped by the policy
+    assert 0.2 <= time.monotonic() - start < 1
+
+
+@pytest.mark.asyncio
+async def test_timeout(httpserver: HTTPServer):
+    def slow_handler(_: Request) -> Response:
+        time.sleep(0.5)
+        return Response("late")
+
+    httpserver.expect_request("/foo", "GET").respond_with_handler(slow_handler)
+    policy = RequestPolicy(total_timeout=0.1, max_attempts=1)
+
+    with pytest.raises(RequestTimeoutException) as error:
+        await perform_request("GET", "/foo", host=httpserver.host, port=httpserver.port, policy=policy)
+
+    assert error.value.retryable
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_fails_fast(httpserver: HTTPServer):
+    httpserver.expect_request("/down", "GET").respond_with_data("down", status=500)
+    policy = RequestPolicy(max_attempts=1, failure_threshold=2, reset_timeout=0.2)
+
+    for _ in range(2):
+        with pytest.raises(HttpStatusException):
+            await perform_request("GET", "/down", host=httpserver.host, port=httpserver.port, policy=policy)
+    assert circuit_breaker(httpserver.host, httpserver.port).state == "OPEN"
+
+    with pytest.raises(CircuitOpenException):
+        await perform_request("GET", "/down", host=httpserver.host, port=httpserver.port, policy=policy)
+    assert len([request for request, _ in httpserver.log if request.path == "/down"]) == 2
+
+    time.sleep(0.2)
+    httpserver.clear_all_handlers()
+    httpserver.expect_request("/down", "GET").respond_with_data("ok")
+
+    response = await perform_request("GET", "/down", host=httpserver.host, port=httpserver.port, policy=policy)
+    assert response.status == 200
+    assert circuit_breaker(httpserver.host, httpserver.port).state == "CLOSED"
+
+
+async def open_circuit(httpserver: HTTPServer, policy: RequestPolicy) -> None:
+    httpserver.expect_request("/down", "GET").respond_with_data("down", status=500)
+    with pytest.raises(HttpStatusException):
+        await perform_request("GET", "/down", host=httpserver.host, port=httpserver.port, policy=policy)
+    assert circuit_breaker(httpserver.host, httpserver.port).state == "OPEN"
+    time.sleep(policy.reset_timeout)
+    httpserver.clear_all_handlers()
+    httpserver.expect_request("/down", "GET").respond_with_data("ok")
+
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_releases_circuit(httpserver: HTTPServer):
+    policy = RequestPolicy(max_attempts=1, failure_threshold=1, reset_timeout=0.1)
+    await open_circuit(httpserver, policy)
+
+    probe_started = asyncio.Event()
+
+    async def slow_token() -> str:
+        probe_started.set()
+        await asyncio.sleep(10)
+        return "token"
+
+    probe = asyncio.create_task(
+        perform_request(
+            "GET", "/down", token_supplier=slow_token, host=httpserver.host, port=httpserver.port, policy=policy
+        )
+    )
+    await probe_started.wait()
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    response = await perform_request("GET", "/down", host=httpserver.host, port=httpserver.port, policy=policy)
+    assert response.status == 200
+    assert circuit_breaker(httpserver.host, httpserver.port).state == "CLOSED"
+
+
+@pytest.mark.asyncio
+async def test_probe_failing_before_request_releases_circuit(httpserver: HTTPServer):
+    policy = RequestPolicy(max_attempts=1, failure_threshold=1, reset_timeout=0.1)
+    await open_circuit(httpserver, policy)
+
+    async def failing_token() -> str:
+        raise IllegalStateException("Not logged in")
+
+    with pytest.raises(IllegalStateException):
+        await perform_request(
+            "GET", "/down", token_supplier=failing_token, host=httpserver.host, port=httpserver.port, policy=policy
+        )
+
+    assert circuit_breaker(httpserver.host, httpserver.port).state == "HALF_OPEN"
+    response = await perform_request("GET", "/down", host=httpserver.host, port=httpserver.port, policy=policy)
+    assert response.status == 200
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("12") == 12.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
@@ -2,6 +2,7 @@ import pytest
 from pytest_httpserver import HTTPServer
 
 import aircloudy.api
+from aircloudy.api.rac_models import InteriorUnitUserState
 from aircloudy.utils import awaitable
 
 
@@ -72,3 +73,37 @@ async def test_get_interior_units(httpserver: HTTPServer):
     # assert res[0].online_updated_at == 99998
     assert res[0].room_temperature == 18
     assert res[0].online == True
+
+
+@pytest.mark.asyncio
+async def test_set_power_all(httpserver: HTTPServer):
+    httpserver.expect_request(
+        "/rac/manage-idu/groups/4444/idu/stop",
+        "PUT",
+        headers={"Authorization": "Bearer xxxxToken"},
+        json=[
+            {"id": 1, "power": "OFF", "mode": "HEATING", "iduTemperature": 21.0, "humidity": 50,
+             "fanSpeed": "AUTO", "fanSwing": "OFF"},
+        ],
+    ).respond_with_json({
+        "allSucceeded": False,
+        "resultSet": [
+            {"racId": 1, "success": True, "errorMessage": None, "errorCode": 0,
+             "commandResponse": {"commandId": "c1", "thingId": "t1"}},
+            {"racId": 2, "success": False, "errorMessage": "Offline", "errorCode": 12, "commandResponse": None},
+        ],
+    }, status=207)
+
+    res = await aircloudy.api.set_power_all(
+        lambda: awaitable("xxxxToken"),
+        4444,
+        "OFF",
+        [InteriorUnitUserState(1, "ON", "HEATING", 21.0, 50, "AUTO", "OFF")],
+        httpserver.host,
+        httpserver.port,
+    )
+
+    assert not res.allSucceeded
+    assert [(r.racId, r.success) for r in res.resultSet] == [(1, True), (2, False)]
+    assert res.resultSet[0].commandResponse.commandId == "c1"
+    assert res.resultSet[1].commandResponse is None
@@ -0,0 +1,175 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from aircloudy import HitachiAirCloud
+from aircloudy.api.rac_models import InteriorUnitUserState
+from aircloudy.notifications import AdaptivePoller
+
+
+def idu(rac_id: int, room_temperature: float = 20.0) -> dict:
+    return {
+        "id": rac_id,
+        "name": f"Unit {rac_id}",
+        "roomTemperature": room_temperature,
+        "relativeTemperature": 0.0,
+        "updatedAt": 1_700_000_000_000,
+        "online": True,
+        "lastOnlineUpdatedAt": 1_700_000_000_000,
+        "model": "HITACHI",
+        "racTypeId": 155,
+        "serialNumber": "XXXX",
+        "vendorThingId": "JCH-1",
+        "scheduleType": "SCHEDULE_DISABLED",
+        "power": "ON",
+        "mode": "HEATING",
+        "iduTemperature": 21.0,
+        "humidity": 50,
+        "fanSpeed": "AUTO",
+        "fanSwing": "OFF",
+    }
+
+
+class Api:
+    def __init__(self) -> None:
+        self.units = [idu(1), idu(2)]
+        self.fetches = 0
+
+    async def fetch(self) -> str:
+        self.fetches += 1
+        return json.dumps(self.units)
+
+
+class Callback:
+    def __init__(self) -> None:
+        self.updates = []
+
+    async def __call__(self, interior_units, partial):
+        self.updates.append(([iu.rac_id for iu in interior_units], partial))
+
+
+@pytest.mark.asyncio
+async def test_only_changed_units_are_published():
+    api = Api()
+    callback = Callback()
+    poller = AdaptivePoller(api.fetch, callback, min_interval=60, max_interval=600)
+    await poller.connect()
+
+    await asyncio.wait_for(await poller.refresh_all(receipt=True), 1)
+    await asyncio.wait_for(await poller.refresh_all(receipt=True), 1)
+    api.units[1] = idu(2, room_temperature=22.5)
+    await asyncio.wait_for(await poller.refresh_all(receipt=True), 1)
+    await poller.close()
+
+    assert callback.updates == [([1, 2], True), ([2], True)]
+    stats = poller.stats()
+    assert (stats.polls, stats.unchanged_polls, stats.decoded_interior_units) == (3, 1, 3)
+
+
+@pytest.mark.asyncio
+async def test_interval_adapts_to_activity():
+    api = Api()
+    poller = AdaptivePoller(api.fetch, Callback(), min_interval=10, max_interval=40, idle_growth=2)
+    await poller.connect()
+
+    intervals = []
+    for _ in range(4):
+        await asyncio.wait_for(await poller.refresh_all(receipt=True), 1)
+        intervals.append(poller.interval)
+    assert intervals == [20, 40, 40, 40]
+
+    poller.record_command(InteriorUnitUserState(1, "ON", "HEATING", 25.0, 50, "AUTO", "OFF"))
+    assert poller.interval == 10
+    await asyncio.wait_for(await poller.refresh_all(receipt=True), 1)
+    assert poller.interval == 10
+
+    api.units[0] = idu(1, room_temperature=25.0)
+    poller._last_activity.clear()
+    await asyncio.wait_for(await poller.refresh_all(receipt=True), 1)
+    assert poller.interval == 10
+    await poller.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_poll_backs_off():
+    async def fail() -> str:
+        raise ConnectionError("down")
+
+    poller = AdaptivePoller(fail, Callback(), min_interval=10, max_interval=40, idle_growth=2)
+    await poller.connect()
+
+    with pytest.raises(ConnectionError):
+        await asyncio.wait_for(await poller.refresh_all(receipt=True), 1)
+
+    assert poller.interval == 20
+    assert poller.stats().failed_polls == 1
+    await poller.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_callback_gets_units_again():
+    api = Api()
+    updates = []
+
+    async def callback(interior_units, partial):
+        updates.append([iu.rac_id for iu in interior_units])
+        if len(updates) == 1:
+            raise RuntimeError("Boom")
+
+    poller = AdaptivePoller(api.fetch, callback, min_interval=60, max_interval=600)
+    await poller.connect()
+
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(await poller.refresh_all(receipt=True), 1)
+    await asyncio.wait_for(await poller.refresh_all(receipt=True), 1)
+    await poller.close()
+
+    assert updates == [[1, 2], [1, 2]]
+    assert poller.stats().unchanged_polls == 0
+
+
+@pytest.mark.asyncio
+async def test_units_appearing_and_disappearing_are_reported():
+    api = Api()
+    callback = Callback()
+    removed = []
+
+    async def removal_callback(rac_ids):
+        removed.append(rac_ids)
+
+    poller = AdaptivePoller(api.fetch, callback, min_interval=60, max_interval=600, removal_callback=removal_callback)
+    await poller.connect()
+
+    await asyncio.wait_for(await poller.refresh_all(receipt=True), 1)
+    api.units = [idu(2), idu(3)]
+    await asyncio.wait_for(await poller.refresh_all(receipt=True), 1)
+    await poller.close()
+
+    assert callback.updates == [([1, 2], True), ([3], True)]
+    assert removed == [[1]]
+
+
+@pytest.mark.asyncio
+async def test_client_follows_units_added_and_removed(monkeypatch):
+    api = Api()
+
+    async def fetch_interior_units_payload(token_supplier, family_id, host, port):
+        return await api.fetch()
+
+    monkeypatch.setattr("aircloudy.aircloud.api.fetch_interior_units_payload", fetch_interior_units_payload)
+    ac = HitachiAirCloud("user@example.com", "secret", notification_mode="POLLING")
+    removed = []
+    ac.add_removal_listener(removed.append)
+    poller = ac._create_poller(SimpleNamespace(token=None), SimpleNamespace(familyId=4444))
+    await poller.connect()
+
+    await asyncio.wait_for(await poller.refresh_all(receipt=True), 1)
+    assert [iu.id for iu in ac.interior_units] == [1, 2]
+    api.units = [idu(2), idu(3)]
+    await asyncio.wait_for(await poller.refresh_all(receipt=True), 1)
+    await poller.close()
+
+    assert [iu.id for iu in ac.interior_units] == [2, 3]
+    assert removed == [[1]]
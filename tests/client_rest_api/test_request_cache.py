@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from aircloudy.api import RequestCache
+
+
+class Fetcher:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> int:
+        self.calls += 1
+        await self.release.wait()
+        return self.calls
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_coalesced():
+    cache = RequestCache()
+    fetch = Fetcher()
+
+    pending = [asyncio.create_task(cache.get(("get_interior_units", 1), fetch)) for _ in range(5)]
+    await asyncio.sleep(0)
+    fetch.release.set()
+
+    assert await asyncio.gather(*pending) == [1] * 5
+    assert fetch.calls == 1
+    stats = cache.stats()
+    assert (stats.misses, stats.coalesced, stats.hits, stats.size) == (1, 4, 0, 0)
+
+    # Without ttl, nothing is kept once the request is done
+    assert await cache.get(("get_interior_units", 1), fetch) == 2
+
+
+@pytest.mark.asyncio
+async def test_ttl_and_invalidation():
+    cache = RequestCache(ttl=60)
+    fetch = Fetcher()
+    fetch.release.set()
+
+    assert await cache.get(("get_interior_units", 1), fetch) == 1
+    assert await cache.get(("get_interior_units", 1), fetch) == 1
+    assert await cache.get(("fetch_profile", "foo@example.com"), fetch) == 2
+    assert cache.stats().hits == 1
+
+    cache.invalidate("get_interior_units")
+    assert await cache.get(("get_interior_units", 1), fetch) == 3
+    assert await cache.get(("fetch_profile", "foo@example.com"), fetch) == 2
+    assert cache.stats().invalidations == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidation_detaches_pending_request():
+    cache = RequestCache(ttl=60)
+    fetch = Fetcher()
+
+    before = asyncio.create_task(cache.get(("get_interior_units", 1), fetch))
+    await asyncio.sleep(0)
+    cache.invalidate("get_interior_units")
+    after = asyncio.create_task(cache.get(("get_interior_units", 1), fetch))
+    await asyncio.sleep(0)
+    fetch.release.set()
+
+    assert await before == 2
+    assert await after == 2
+    assert fetch.calls == 2
+    # The request started before the invalidation isn't cached
+    assert await cache.get(("get_interior_units", 1), fetch) == 2
+    assert cache.stats().size == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_others():
+    cache = RequestCache()
+    fetch = Fetcher()
+
+    first = asyncio.create_task(cache.get(("get_interior_units", 1), fetch))
+    second = asyncio.create_task(cache.get(("get_interior_units", 1), fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+    fetch.release.set()
+
+    assert await second == 1
+    assert first.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_error_shared_and_not_cached():
+    cache = RequestCache(ttl=60)
+
+    async def fail() -> int:
+        await asyncio.sleep(0)
+        raise ConnectionError("down")
+
+    results = await asyncio.gather(
+        cache.get(("get_interior_units", 1), fail), cache.get(("get_interior_units", 1), fail), return_exceptions=True
+    )
+
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert cache.stats().size == 0
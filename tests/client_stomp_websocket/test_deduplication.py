@@ -0,0 +1,28 @@
+from aircloudy.notifications.deduplication import NotificationDeduplicator
+
+
+def test_duplicate_message_is_dropped_per_subscription():
+    deduplicator = NotificationDeduplicator()
+    assert deduplicator.is_duplicate_message("sub-1", "msg-1") == False
+    assert deduplicator.is_duplicate_message("sub-1", "msg-1") == True
+    assert deduplicator.is_duplicate_message("sub-2", "msg-1") == False
+    assert deduplicator.duplicate_messages == 1
+
+
+def test_message_ids_are_bounded():
+    deduplicator = NotificationDeduplicator(max_message_ids=2)
+    deduplicator.is_duplicate_message("sub", "msg-1")
+    deduplicator.is_duplicate_message("sub", "msg-2")
+    deduplicator.is_duplicate_message("sub", "msg-3")
+    assert deduplicator.is_duplicate_message("sub", "msg-1") == False
+    assert deduplicator.is_duplicate_message("sub", "msg-3") == True
+
+
+def test_out_of_order_interior_unit_state_is_dropped():
+    deduplicator = NotificationDeduplicator()
+    assert deduplicator.is_stale_interior_unit(1234, 2000) == False
+    assert deduplicator.is_stale_interior_unit(1234, 2000) == False
+    assert deduplicator.is_stale_interior_unit(1234, 1000) == True
+    assert deduplicator.is_stale_interior_unit(1235, 1000) == False
+    assert deduplicator.is_stale_interior_unit(1234, 3000) == False
+    assert deduplicator.stale_interior_units == 1
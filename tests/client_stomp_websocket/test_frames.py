@@ -0,0 +1,23 @@
+import uuid
+
+from aircloudy.notifications import hitachi_frame_models, stomp
+
+
+def test_subscribe_frame_with_receipt():
+    subscription_id = uuid.uuid4()
+    frame = hitachi_frame_models.SubscribeFrame(subscription_id, 1, 2, "receipt-1")
+    parsed = stomp.parse_stomp_frame(frame.get_frame())
+    assert parsed.message == "SUBSCRIBE"
+    assert parsed.headers["id"] == str(subscription_id)
+    assert parsed.headers["receipt"] == "receipt-1"
+
+
+def test_refresh_frame_without_receipt():
+    frame = hitachi_frame_models.RefreshInteriorUnitFrame("token", 1, 2, 1234)
+    assert "receipt" not in frame.headers
+
+
+def test_parse_receipt_frame():
+    frame = stomp.parse_server_frame("RECEIPT\nreceipt-id:receipt-1\n\n\0")
+    assert isinstance(frame, stomp.ReceiptFrame)
+    assert frame.receipt_id == "receipt-1"
@@ -0,0 +1,138 @@
+import asyncio
+import re
+
+import pytest
+import websockets
+from websockets.frames import Close
+
+from aircloudy.errors import IllegalStateException
+from aircloudy.notifications import NotificationsWebsocket
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+        self.frames = asyncio.Queue()
+        self.response = None
+
+    async def send(self, frame):
+        self.sent.append(frame)
+
+    async def recv(self):
+        frame = await self.frames.get()
+        if isinstance(frame, BaseException):
+            raise frame
+        return frame
+
+    async def close(self):
+        self.frames.put_nowait(websockets.ConnectionClosed(Close(1000, ""), None))
+
+    def receipt_ids(self):
+        return [match for frame in self.sent for match in re.findall(r"^receipt:(.+)$", frame, re.MULTILINE)]
+
+
+async def token_supplier():
+    return "token"
+
+
+async def ignore_state(interior_units, partial):
+    pass
+
+
+def open_websocket(**kwargs):
+    websocket = NotificationsWebsocket("localhost", token_supplier, 1001, 2001, ignore_state, **kwargs)
+    socket = FakeSocket()
+    websocket._notification_socket = socket
+    websocket._closed_by_client = False
+    websocket._handle_connection_task = asyncio.create_task(websocket._handle_connection())
+    return websocket, socket
+
+
+@pytest.mark.asyncio
+async def test_receipt_resolves_with_round_trip_time():
+    websocket, socket = open_websocket()
+
+    receipt = await websocket.refresh_all(receipt=True)
+    [receipt_id] = socket.receipt_ids()
+    assert websocket.stats().pending_receipts == 1
+
+    socket.frames.put_nowait(f"RECEIPT\nreceipt-id:{receipt_id}\n\n\0")
+    round_trip_time = await asyncio.wait_for(receipt, 1)
+
+    stats = websocket.stats()
+    assert round_trip_time >= 0
+    assert stats.pending_receipts == 0
+    assert stats.receipt_round_trip_time.count == 1
+    assert stats.receipt_round_trip_time.last == round_trip_time
+    await websocket.close()
+
+
+@pytest.mark.asyncio
+async def test_unknown_receipt_is_ignored():
+    websocket, socket = open_websocket()
+
+    receipt = await websocket.refresh(3, receipt=True)
+    socket.frames.put_nowait("RECEIPT\nreceipt-id:unknown\n\n\0")
+    await asyncio.sleep(0.01)
+
+    assert not receipt.done()
+    assert websocket.stats().receipt_round_trip_time.count == 0
+    await websocket.close()
+
+
+@pytest.mark.asyncio
+async def test_receipt_times_out():
+    websocket, socket = open_websocket(receipt_timeout=0.05)
+
+    receipt = await websocket.refresh_all(receipt=True)
+    with pytest.raises(TimeoutError):
+        await receipt
+    assert websocket.stats().pending_receipts == 0
+
+    # A receipt arriving after the timeout is not recorded
+    socket.frames.put_nowait(f"RECEIPT\nreceipt-id:{socket.receipt_ids()[0]}\n\n\0")
+    await asyncio.sleep(0.01)
+    assert websocket.stats().receipt_round_trip_time.count == 0
+    await websocket.close()
+
+
+@pytest.mark.asyncio
+async def test_subscribe_receipt_times_out():
+    websocket, _ = open_websocket(receipt_timeout=0.05)
+
+    with pytest.raises(TimeoutError):
+        await websocket.subscribe(receipt=True)
+    await websocket.close()
+
+
+@pytest.mark.asyncio
+async def test_pending_receipts_fail_on_close():
+    websocket, _ = open_websocket()
+
+    receipts = [await websocket.refresh_all(receipt=True), await websocket.refresh(3, receipt=True)]
+    await websocket.close()
+
+    for receipt in receipts:
+        with pytest.raises(IllegalStateException):
+            await receipt
+    assert websocket.stats().pending_receipts == 0
+
+
+@pytest.mark.asyncio
+async def test_pending_receipts_fail_on_disconnect():
+    closed = []
+
+    async def on_unexpected_connection_close(e):
+        closed.append(e)
+
+    websocket, socket = open_websocket()
+    websocket.on_unexpected_connection_close = on_unexpected_connection_close
+
+    receipt = await websocket.refresh_all(receipt=True)
+    socket.frames.put_nowait(websockets.ConnectionClosed(Close(1006, "Gone"), None))
+
+    with pytest.raises(IllegalStateException):
+        await asyncio.wait_for(receipt, 1)
+    await websocket._handle_connection_task
+    assert len(closed) == 1
+    assert not websocket.is_open
@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+import pytest
+
+from aircloudy.notifications.websocket_stats import WebsocketStatsRecorder
+
+from .test_receipts import open_websocket
+
+
+def test_recorder_counts_frames_and_chars():
+    recorder = WebsocketStatsRecorder()
+    recorder.record_received(10)
+    recorder.record_received(30)
+    recorder.record_sent(5)
+
+    stats = recorder.snapshot(0, 0, 0)
+    assert (stats.frames_received, stats.chars_received, stats.max_frame_chars) == (2, 40, 30)
+    assert stats.mean_frame_chars == 20
+    assert (stats.frames_sent, stats.chars_sent) == (1, 5)
+    assert WebsocketStatsRecorder().snapshot(0, 0, 0).mean_frame_chars is None
+
+
+@pytest.mark.asyncio
+async def test_every_frame_is_counted_and_decoded():
+    received = []
+
+    async def state_callback(interior_units, partial):
+        received.append((interior_units, partial))
+
+    websocket, socket = open_websocket()
+    websocket.state_callback = state_callback
+    message = (
+        "MESSAGE\ndestination:/notification/1001/2001\nsubscription:1\nmessage-id:1\n\n"
+        + json.dumps({"notificationType": "BUCKET_UPDATE", "data": []})
+        + "\0"
+    )
+    frames = ["\n", "RECEIPT\nreceipt-id:unknown\n\n\0", message, message]
+    for frame in frames:
+        socket.frames.put_nowait(frame)
+    await asyncio.sleep(0.01)
+
+    stats = websocket.stats()
+    assert stats.frames_received == 4
+    assert stats.chars_received == sum(len(frame) for frame in frames)
+    # Heart-beat, receipt, message and duplicate message are all decoded
+    assert stats.decode_time.count == 4
+    assert stats.dropped_duplicate_messages == 1
+    assert received == []
+
+    await websocket.refresh_all()
+    stats = websocket.stats()
+    # The client heart-beat was sent when the connection was opened
+    assert stats.frames_sent == len(socket.sent) == 2
+    assert stats.chars_sent == sum(len(frame) for frame in socket.sent)
+    await websocket.close()
@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+import pytest
+import websockets
+
+from aircloud_simulator import AirCloudSimulator, EndpointFaults, FaultInjector, FaultPlan, FaultScenario, Latency
+from aircloudy import TooManyRequestsException
+from aircloudy.api import AuthManager, fetch_profile, get_commands_state, get_interior_units, send_command
+from aircloudy.contants import SSL_CONTEXT
+from aircloudy.notifications import NotificationsWebsocket, stomp
+from aircloudy.notifications.hitachi_frame_models import SubscribeFrame
+
+PLAN = FaultPlan(
+    {"send_command": EndpointFaults(Latency.lognormal(0.1, 0.5), error_rate=0.3, error_status=429, drop_rate=0.1)},
+    stuck_command_rate=0.2,
+    malformed_frame_rate=0.1,
+)
+
+
+def draws(injector: FaultInjector) -> list:
+    return [
+        (injector.request_fault("send_command"), injector.command_stuck(), injector.corrupt("MESSAGE\na:b\n\n{}\0"))
+        for _ in range(50)
+    ]
+
+
+def test_seeded_injectors_draw_the_same_faults():
+    assert draws(FaultInjector(PLAN, seed=7)) == draws(FaultInjector(PLAN, seed=7))
+    assert draws(FaultInjector(PLAN, seed=7)) != draws(FaultInjector(PLAN, seed=8))
+
+
+def test_scenario_from_json():
+    scenario = FaultScenario.from_json(
+        """{"seed": 3, "steps": [
+            {"at": 5, "plan": {"heart_beat_loss_rate": 1}},
+            {"at": 0, "plan": {"endpoints": {"get_interior_units": {"latency": {"uniform": [0.1, 0.2]}}}}}
+        ]}"""
+    )
+
+    assert scenario.seed == 3
+    assert [at for at, _ in scenario.steps] == [0, 5]
+    assert scenario.steps[0][1].endpoints["get_interior_units"].latency == Latency.uniform(0.1, 0.2)
+    assert scenario.steps[1][1].heart_beat_loss_rate == 1
+
+
+async def connect(simulator: AirCloudSimulator) -> tuple[AuthManager, int]:
+    account = simulator.accounts[0]
+    auth_manager = AuthManager(account.email, account.password, simulator.host, simulator.port)
+    profile = await fetch_profile(auth_manager.token, simulator.host, simulator.port)
+    return auth_manager, profile.familyId
+
+
+@pytest.mark.asyncio
+async def test_rest_faults():
+    faults = FaultInjector(
+        FaultPlan(
+            {"send_command": EndpointFaults(error_rate=1, error_status=429)},
+            tls_handshake_delay=Latency.fixed(0.2),
+        )
+    )
+    async with AirCloudSimulator(units_per_account=1, command_latency=(0, 0), faults=faults) as simulator:
+        started_at = time.monotonic()
+        auth_manager, family_id = await connect(simulator)
+        assert time.monotonic() - started_at >= 0.2
+        [unit] = await get_interior_units(auth_manager.token, family_id, simulator.host, simulator.port)
+
+        with pytest.raises(TooManyRequestsException):
+            await send_command(auth_manager.token, family_id, unit.user_state, simulator.host, simulator.port)
+
+        faults.apply(FaultPlan(stuck_command_rate=1))
+        response = await send_command(auth_manager.token, family_id, unit.user_state, simulator.host, simulator.port)
+        await asyncio.sleep(0.05)
+        states = await get_commands_state(auth_manager.token, [response], simulator.host, simulator.port)
+        assert states == {response.commandId: "SENDING"}
+
+        stats = faults.stats()
+        assert (stats.failed_requests, stats.stuck_commands) == (1, 1)
+        assert stats.slow_handshakes >= 1
+
+
+@pytest.mark.asyncio
+async def test_dropped_websocket():
+    faults = FaultInjector(FaultPlan(websocket_lifetime=Latency.fixed(0.1)))
+    async with AirCloudSimulator(faults=faults) as simulator:
+        auth_manager, family_id = await connect(simulator)
+        closed = asyncio.get_running_loop().create_future()
+
+        async def on_close(e):
+            closed.set_result(e)
+
+        async def on_state(interior_units, partial):
+            pass
+
+        user_id = simulator.accounts[0].user_id
+        socket = NotificationsWebsocket(
+            simulator.notification_host, auth_manager.token, user_id, family_id, on_state, on_close
+        )
+        await socket.connect()
+        await socket.subscribe(receipt=True)
+
+        assert isinstance(await asyncio.wait_for(closed, 5), websockets.ConnectionClosed)
+        assert faults.stats().dropped_websockets == 1
+        await socket.close()
+
+
+@pytest.mark.asyncio
+async def test_stomp_faults():
+    faults = FaultInjector(FaultPlan(heart_beat_loss_rate=1, malformed_frame_rate=1), seed=1)
+    async with AirCloudSimulator(heart_beat=50, faults=faults) as simulator:
+        auth_manager, family_id = await connect(simulator)
+        url = f"wss://{simulator.notification_host}/rac-notifications/websocket"
+        async with websockets.connect(url, ssl=SSL_CONTEXT) as ws:
+            headers = {"accept-version": "1.2", "heart-beat": "0,50", "Authorization": f"Bearer {await auth_manager.token()}"}
+            await ws.send(stomp.StompFrame("CONNECT", headers).get_frame())
+            assert isinstance(stomp.parse_server_frame(await ws.recv()), stomp.ConnectedFrame)
+
+            await ws.send(SubscribeFrame("s1", simulator.accounts[0].user_id, family_id).get_frame())
+            with pytest.raises(Exception):  # noqa: B017, PT011
+                stomp.parse_server_frame(await asyncio.wait_for(ws.recv(), 1))
+
+            with pytest.raises(TimeoutError):
+                await asyncio.wait_for(ws.recv(), 0.3)
+
+        stats = faults.stats()
+        assert stats.malformed_frames == 1
+        assert stats.skipped_heart_beats >= 3
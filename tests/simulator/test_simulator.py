@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from aircloud_simulator import AirCloudSimulator, StompProtocolException, parse_client_frame
+from aircloudy import HitachiAirCloud, TooManyRequestsException
+from aircloudy.api import AuthManager, fetch_profile, get_commands_state, get_interior_units, send_command
+from aircloudy.notifications.hitachi_frame_models import RefreshAllInteriorUnitFrame
+
+
+def test_parse_client_frames():
+    frame = parse_client_frame(RefreshAllInteriorUnitFrame("token", 1, 2, "r1").get_frame())
+
+    assert frame.command == "MESSAGE"
+    assert frame.headers["destination"] == "/app/racs/1/2"
+    assert frame.headers["receipt"] == "r1"
+    assert frame.body == {"racId": 0, "requestType": "REFRESH_ALL"}
+    assert parse_client_frame("\r\n") is None
+    with pytest.raises(StompProtocolException):
+        parse_client_frame("SUBSCRIBE\nid\n\n\0")
+
+
+@pytest.mark.asyncio
+async def test_command_lifecycle():
+    async with AirCloudSimulator(units_per_account=1, command_latency=(0.05, 0.05)) as simulator:
+        account = simulator.accounts[0]
+        auth_manager = AuthManager(account.email, account.password, simulator.host, simulator.port)
+        profile = await fetch_profile(auth_manager.token, simulator.host, simulator.port)
+        [unit] = await get_interior_units(auth_manager.token, profile.familyId, simulator.host, simulator.port)
+
+        command = unit.user_state.copy(requested_temperature=26.0)
+        response = await send_command(auth_manager.token, profile.familyId, command, simulator.host, simulator.port)
+        with pytest.raises(TooManyRequestsException):
+            await send_command(auth_manager.token, profile.familyId, command, simulator.host, simulator.port)
+
+        states = await get_commands_state(auth_manager.token, [response], simulator.host, simulator.port)
+        assert states == {response.commandId: "SENDING"}
+        await asyncio.sleep(0.1)
+        states = await get_commands_state(auth_manager.token, [response], simulator.host, simulator.port)
+        assert states == {response.commandId: "DONE"}
+
+        [unit] = await get_interior_units(auth_manager.token, profile.familyId, simulator.host, simulator.port)
+        assert unit.requested_temperature == 26.0
+        assert simulator.stats().rejected_commands == 1
+
+
+@pytest.mark.asyncio
+async def test_client_receives_notifications():
+    async with AirCloudSimulator(units_per_account=2, command_latency=(0.05, 0.1), seed=1) as simulator:
+        account = simulator.accounts[0]
+        changes = []
+        async with HitachiAirCloud(account.email, account.password, **simulator.client_options()) as ac:
+            ac.on_change = changes.append
+            assert sorted(iu.id for iu in ac.interior_units) == sorted(account.units)
+            rac_id = ac.interior_units[0].id
+
+            outcome = await ac.get_interior_unit(rac_id).send_command(requested_temperature=27.0, fan_speed="LV2")
+            await asyncio.wait_for(outcome, 10)
+            assert account.units[rac_id].idu_temperature == 27.0
+
+            await simulator.update_unit(rac_id, room_temperature=30.0)
+            async with asyncio.timeout(5):
+                while ac.get_interior_unit(rac_id).room_temperature != 30.0:
+                    await asyncio.sleep(0.01)
+
+            assert ac.get_interior_unit(rac_id).requested_temperature == 27.0
+            assert any(rac_id in change for change in changes)
+            assert simulator.stats().sessions == 1
+
+
+@pytest.mark.asyncio
+async def test_notification_stats_count_compressed_bytes_on_the_wire():
+    async with AirCloudSimulator(units_per_account=2, command_latency=(0, 0), seed=1) as simulator:
+        account = simulator.accounts[0]
+        async with HitachiAirCloud(account.email, account.password, **simulator.client_options()) as ac:
+            rac_id = ac.interior_units[0].id
+            for i in range(5):
+                await simulator.update_unit(rac_id, room_temperature=20.0 + i)
+            async with asyncio.timeout(5):
+                while ac.get_interior_unit(rac_id).room_temperature != 24.0:
+                    await asyncio.sleep(0.01)
+
+            stats = ac.notification_stats
+            assert stats.compression_negotiated
+            assert stats.wire_bytes_sent > 0
+            # Repeated notifications compress well, the wire carries fewer bytes than the decoded text
+            assert stats.compression_ratio > 1